@@ -0,0 +1,285 @@
+"""
+准入控制，按路由划分并发隔离舱，过载时快速拒绝而不是无限排队
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """请求被准入控制拒绝"""
+
+    def __init__(self, bulkhead: str, reason: str, retry_after: int):
+        self.bulkhead = bulkhead
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{bulkhead} 过载（{reason}），{retry_after} 秒后重试")
+
+
+class Bulkhead:
+    """
+    并发隔离舱
+
+    最多 max_concurrent 个请求同时执行，其余请求按先来先服务排队，
+    排队数量超过 max_queue 或等待超过 max_wait 秒时立即拒绝。
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait: float):
+        """
+        初始化隔离舱
+
+        Args:
+            name: 名称
+            max_concurrent: 最大并发数
+            max_queue: 最大排队数
+            max_wait: 最长排队时间（秒）
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+        # 平均服务时间（指数滑动平均），用于估算 Retry-After
+        self.service_time = 0.1
+        self.admitted = 0
+        self.rejected = 0
+
+    def retry_after(self) -> int:
+        """估算排队清空所需的秒数"""
+        backlog = len(self.waiters) + 1
+        return max(1, math.ceil(self.service_time * backlog / max(self.max_concurrent, 1)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        return AdmissionRejected(self.name, reason, self.retry_after())
+
+    async def _acquire(self) -> None:
+        """获取执行名额"""
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            raise self._reject("队列已满")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # 超时的同时被分配了名额，直接使用
+                return
+            waiter.cancel()
+            raise self._reject("排队超时")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            try:
+                self.waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def _release(self) -> None:
+        """释放名额，直接转交给下一个仍在等待的请求"""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        在隔离舱内执行
+
+        Raises:
+            AdmissionRejected: 队列已满或排队超时时
+        """
+        await self._acquire()
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取隔离舱指标
+
+        Returns:
+            指标字典
+        """
+        return {
+            "active": self.active,
+            "queued": len(self.waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "service_time": self.service_time,
+            "admitted": self.admitted,
+            "rejected": self.rejected
+        }
+
+
+class AdmissionController:
+    """
+    按路由前缀选择隔离舱
+
+    规则按前缀长度从长到短匹配，未匹配的路由使用 default 隔离舱；
+    exempt 中的前缀不做准入控制（例如 SSE 长连接）。
+    """
+
+    def __init__(self, bulkheads: Dict[str, Bulkhead], rules: List[Tuple[str, str]], exempt: Optional[List[str]] = None):
+        """
+        初始化准入控制器
+
+        Args:
+            bulkheads: 名称到隔离舱的映射，必须包含 default
+            rules: (路由前缀, 隔离舱名称) 列表
+            exempt: 不做准入控制的路由前缀或后缀
+        """
+        self.bulkheads = bulkheads
+        self.rules = sorted(rules, key=lambda rule: len(rule[0]), reverse=True)
+        self.exempt = exempt or []
+
+    def route(self, path: str) -> Optional[Bulkhead]:
+        """
+        获取路径对应的隔离舱
+
+        Args:
+            path: 请求路径
+
+        Returns:
+            隔离舱，免于准入控制时返回 None
+        """
+        if any(path.startswith(item) or path.endswith(item) for item in self.exempt):
+            return None
+        for prefix, name in self.rules:
+            if path.startswith(prefix):
+                return self.bulkheads[name]
+        return self.bulkheads["default"]
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取所有隔离舱的指标
+
+        Returns:
+            指标字典
+        """
+        return {name: bulkhead.metrics() for name, bulkhead in self.bulkheads.items()}
+
+
+class AdmissionMiddleware:
+    """
+    准入控制 ASGI 中间件
+
+    不使用 @app.middleware("http")：call_next 在响应头就绪时就返回，流式响应的正文还没有发送，
+    名额会被提前释放。这里包装 send，在最后一段正文（more_body=False）发出后才释放名额。
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, enabled: bool = True):
+        """
+        初始化准入控制中间件
+
+        Args:
+            app: 下游 ASGI 应用
+            controller: 准入控制器
+            enabled: 是否启用准入控制
+        """
+        self.app = app
+        self.controller = controller
+        self.enabled = enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        bulkhead = self.controller.route(scope["path"]) if self.enabled and scope["type"] == "http" else None
+        if bulkhead is None:
+            await self.app(scope, receive, send)
+            return
+
+        async with AsyncExitStack() as stack:
+            try:
+                await stack.enter_async_context(bulkhead.admit())
+            except AdmissionRejected as e:
+                logger.warning(f"请求被拒绝 {scope['path']}: {str(e)}")
+                response = JSONResponse(
+                    status_code=503,
+                    content={"error": "服务繁忙，请稍后再试"},
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+                await response(scope, receive, send)
+                return
+
+            async def send_and_release(message: Message) -> None:
+                await send(message)
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    # 正文已全部发出，后台任务不再占用名额
+                    await stack.aclose()
+
+            await self.app(scope, receive, send_and_release)
+
+
+def create_admission_controller() -> AdmissionController:
+    """
+    根据配置创建准入控制器
+
+    cheap 隔离舱服务不访问 GitHub 的轻量路由，github 隔离舱服务依赖 GitHub API 的路由，
+    二者互不占用名额，GitHub 侧饱和时健康检查和 /api/auth/me 仍能及时响应。
+
+    Returns:
+        AdmissionController 实例
+    """
+    max_wait = float(get_value("ADMISSION_MAX_WAIT", 2.0))
+
+    def bulkhead(name: str, concurrency: int, queue: int) -> Bulkhead:
+        key = name.upper()
+        return Bulkhead(
+            name,
+            max_concurrent=int(get_value(f"ADMISSION_{key}_CONCURRENCY", concurrency)),
+            max_queue=int(get_value(f"ADMISSION_{key}_QUEUE", queue)),
+            max_wait=max_wait
+        )
+
+    bulkheads = {
+        "cheap": bulkhead("cheap", 256, 256),
+        "github": bulkhead("github", 32, 64),
+        "oauth": bulkhead("oauth", 16, 32),
+        "database": bulkhead("database", 16, 64),
+        "default": bulkhead("default", 64, 128),
+    }
+    rules = [
+        ("/health", "cheap"),
+        ("/api/auth/me", "cheap"),
+        ("/api/auth/logout", "cheap"),
+        ("/api/reviews/scheduler", "cheap"),
+        ("/api/auth/github/callback", "oauth"),
+        ("/api/auth/github/login", "cheap"),
+        ("/api/auth/github/", "github"),
+        ("/api/findings", "database"),
+        ("/api/analytics", "database"),
+    ]
+    # SSE 连接会持续数十秒，不占用隔离舱名额；诊断接口在过载时也必须可用
+    return AdmissionController(bulkheads, rules, exempt=["/events", "/api/admin/"])
+
+
+# 创建全局准入控制器（每个工作进程一个）
+admission_controller = create_admission_controller()
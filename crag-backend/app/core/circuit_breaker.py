@@ -0,0 +1,174 @@
+"""
+熔断器，下游持续失败时快速失败，避免请求堆积在注定失败的调用上
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """
+    熔断器处于打开状态，调用被直接拒绝
+
+    不继承 httpx 的异常：服务层会把 httpx 的网络错误包装为 GitHubApiError，
+    熔断必须原样传到中间件，由中间件返回 503 和 Retry-After。
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} 熔断中，{retry_after:.0f} 秒后重试")
+
+
+class CircuitBreaker:
+    """
+    基于滑动时间窗口失败率的熔断器
+
+    - closed: 正常放行，窗口内调用数达到 min_calls 且失败率超过 failure_ratio 时打开
+    - open: 直接拒绝，经过 open_seconds 后进入半开
+    - half_open: 只放行 half_open_calls 个探测调用，全部成功则关闭，任一失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+            self,
+            name: str,
+            failure_ratio: float = 0.5,
+            min_calls: int = 20,
+            window: float = 30.0,
+            open_seconds: float = 15.0,
+            half_open_calls: int = 3
+    ):
+        """
+        初始化熔断器
+
+        Args:
+            name: 名称
+            failure_ratio: 触发熔断的失败率
+            min_calls: 窗口内触发熔断所需的最少调用数
+            window: 统计窗口（秒）
+            open_seconds: 打开状态持续时间（秒）
+            half_open_calls: 半开状态放行的探测调用数
+        """
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.outcomes: Deque[Tuple[float, bool]] = deque()
+        self.failures = 0
+        self.probes = 0
+        self.probe_successes = 0
+        self.rejected = 0
+
+    def _trim(self, now: float) -> None:
+        """移除窗口外的调用记录"""
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            _, failed = self.outcomes.popleft()
+            self.failures -= failed
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning(f"熔断器 {self.name} 状态变更: {self.state} -> {state}")
+        self.state = state
+        self.probes = 0
+        self.probe_successes = 0
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        elif state == self.CLOSED:
+            self.outcomes.clear()
+            self.failures = 0
+
+    def allow(self) -> bool:
+        """
+        判断是否放行本次调用，放行后必须调用 record 报告结果
+
+        Returns:
+            是否放行
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._transition(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            if self.probes >= self.half_open_calls:
+                self.rejected += 1
+                return False
+            self.probes += 1
+        return True
+
+    def check(self) -> None:
+        """
+        放行本次调用，否则抛出异常
+
+        Raises:
+            CircuitOpenError: 熔断器拒绝调用时
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record(self, success: bool) -> None:
+        """
+        报告调用结果
+
+        Args:
+            success: 调用是否成功
+        """
+        if self.state == self.HALF_OPEN:
+            if not success:
+                self._transition(self.OPEN)
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= self.half_open_calls:
+                self._transition(self.CLOSED)
+            return
+
+        if self.state == self.OPEN:
+            return
+
+        now = time.monotonic()
+        self.outcomes.append((now, not success))
+        self.failures += not success
+        self._trim(now)
+        if len(self.outcomes) >= self.min_calls and self.failures / len(self.outcomes) >= self.failure_ratio:
+            self._transition(self.OPEN)
+
+    def release(self) -> None:
+        """放行的调用被取消、没有产生结果时归还探测名额"""
+        if self.state == self.HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def retry_after(self) -> float:
+        """距离进入半开状态的秒数"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self.open_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取熔断器指标
+
+        Returns:
+            指标字典
+        """
+        self._trim(time.monotonic())
+        return {
+            "state": self.state,
+            "calls": len(self.outcomes),
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after()
+        }
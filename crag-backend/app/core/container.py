@@ -0,0 +1,205 @@
+"""
+依赖注入容器，支持单例、按令牌和按请求三种生命周期
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Type, TypeVar
+
+from fastapi import Request
+
+from app.core.session import session_manager
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+# 服务类型变量
+T = TypeVar('T')
+
+
+class Lifetime:
+    """服务生命周期"""
+    # 每个工作进程一个实例
+    SINGLETON = "singleton"
+    # 每个 GitHub 访问令牌一个实例，按 LRU 淘汰
+    PER_TOKEN = "per_token"
+    # 每个请求一个实例，缓存在 request.state 上
+    REQUEST = "request"
+
+
+@dataclass
+class RequestAuth:
+    """当前请求的认证信息，每个请求只读取一次会话"""
+    session_id: Optional[str] = None
+    session_data: Dict[str, Any] = field(default_factory=dict)
+    user: Optional[Dict[str, Any]] = None
+    access_token: Optional[str] = None
+
+    @property
+    def user_id(self) -> Any:
+        """当前用户 ID"""
+        return (self.user or {}).get("id")
+
+
+def load_request_auth(request: Request) -> RequestAuth:
+    """
+    读取当前请求的会话和访问令牌
+
+    Args:
+        request: FastAPI 请求对象
+
+    Returns:
+        RequestAuth 实例
+    """
+    session_id = session_manager.get_session_id(request)
+    if not session_id:
+        return RequestAuth(user=session_manager.get_user(request))
+
+    session_data = session_manager.get_session_data(session_id)
+    return RequestAuth(
+        session_id=session_id,
+        session_data=session_data,
+        user=session_data.get("user"),
+        access_token=session_data.get("github", {}).get("access_token")
+    )
+
+
+@dataclass
+class _Registration:
+    factory: Callable[..., Any]
+    lifetime: str
+
+
+class Container:
+    """
+    依赖注入容器
+
+    工厂函数的参数由生命周期决定：
+    - SINGLETON: factory()
+    - PER_TOKEN: factory(access_token)，访问令牌来自当前请求的 RequestAuth
+    - REQUEST: factory(request)
+    """
+
+    def __init__(self, max_token_instances: int = 1024):
+        """
+        初始化容器
+
+        Args:
+            max_token_instances: 按令牌缓存的实例数量上限
+        """
+        self.registrations: Dict[type, _Registration] = {}
+        self.singletons: Dict[type, Any] = {}
+        self.token_instances: "OrderedDict[Tuple[type, Hashable], Any]" = OrderedDict()
+        self.max_token_instances = max_token_instances
+
+    def register(self, service_type: Type[T], factory: Callable[..., T], lifetime: str = Lifetime.SINGLETON) -> None:
+        """
+        注册服务
+
+        Args:
+            service_type: 服务类型
+            factory: 创建服务的工厂函数
+            lifetime: 生命周期
+        """
+        self.registrations[service_type] = _Registration(factory, lifetime)
+        self.singletons.pop(service_type, None)
+
+    def register_instance(self, service_type: Type[T], instance: T) -> None:
+        """
+        注册已创建的单例
+
+        Args:
+            service_type: 服务类型
+            instance: 服务实例
+        """
+        self.registrations[service_type] = _Registration(lambda: instance, Lifetime.SINGLETON)
+        self.singletons[service_type] = instance
+
+    def resolve(self, service_type: Type[T], request: Optional[Request] = None) -> T:
+        """
+        解析服务实例
+
+        Args:
+            service_type: 服务类型
+            request: 当前请求，按令牌和按请求的服务必须提供
+
+        Returns:
+            服务实例
+        """
+        registration = self.registrations.get(service_type)
+        if registration is None:
+            raise KeyError(f"服务未注册: {service_type.__name__}")
+
+        if registration.lifetime == Lifetime.SINGLETON:
+            if service_type not in self.singletons:
+                self.singletons[service_type] = registration.factory()
+            return self.singletons[service_type]
+
+        if request is None:
+            raise ValueError(f"解析 {service_type.__name__} 需要当前请求")
+
+        cache = getattr(request.state, "services", None)
+        if cache is None:
+            cache = {}
+            request.state.services = cache
+        if service_type in cache:
+            return cache[service_type]
+
+        if registration.lifetime == Lifetime.REQUEST:
+            instance = registration.factory(request)
+        else:
+            instance = self._resolve_per_token(service_type, registration, request)
+
+        cache[service_type] = instance
+        return instance
+
+    def _resolve_per_token(self, service_type: type, registration: _Registration, request: Request) -> Any:
+        """按访问令牌复用实例，缓存键只保存令牌摘要"""
+        access_token = self.resolve(RequestAuth, request).access_token
+        token_key = hashlib.sha256(access_token.encode()).hexdigest() if access_token else None
+        key = (service_type, token_key)
+
+        instance = self.token_instances.get(key)
+        if instance is not None:
+            self.token_instances.move_to_end(key)
+            return instance
+
+        instance = registration.factory(access_token)
+        self.token_instances[key] = instance
+        while len(self.token_instances) > self.max_token_instances:
+            self.token_instances.popitem(last=False)
+        return instance
+
+    def invalidate_token(self, access_token: str) -> None:
+        """
+        移除某个访问令牌对应的全部实例，例如用户登出时
+
+        Args:
+            access_token: GitHub 访问令牌
+        """
+        token_key = hashlib.sha256(access_token.encode()).hexdigest()
+        for key in [key for key in self.token_instances if key[1] == token_key]:
+            del self.token_instances[key]
+
+    def provide(self, service_type: Type[T]) -> Callable[[Request], T]:
+        """
+        生成 FastAPI 依赖函数
+
+        Args:
+            service_type: 服务类型
+
+        Returns:
+            可用于 Depends 的函数
+        """
+        # 异步依赖在事件循环内直接执行，不会被 FastAPI 派发到线程池
+        async def dependency(request: Request) -> T:
+            return self.resolve(service_type, request)
+
+        dependency.__name__ = f"provide_{service_type.__name__}"
+        return dependency
+
+
+# 创建全局容器（每个工作进程一个）
+container = Container()
+container.register(RequestAuth, load_request_auth, Lifetime.REQUEST)
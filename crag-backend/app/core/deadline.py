@@ -0,0 +1,91 @@
+"""
+请求截止时间，由中间件为每个请求设置，并传递给请求内的所有外部调用
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# 当前请求的截止时间（time.monotonic() 时间点），None 表示不限
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    请求截止时间已到，不再发出外部调用
+
+    不继承 httpx 的异常：服务层会把 httpx 的网络错误包装为 GitHubApiError，
+    截止时间耗尽必须原样传到中间件，由中间件返回 504。
+    """
+
+    def __init__(self, message: str = "请求截止时间已到"):
+        super().__init__(message)
+
+
+def get_deadline() -> Optional[float]:
+    """
+    获取当前上下文的截止时间
+
+    Returns:
+        截止时间点，未设置时返回 None
+    """
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """
+    获取当前上下文剩余的时间预算
+
+    Returns:
+        剩余秒数，未设置截止时间时返回 None
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def budget(timeout: float) -> float:
+    """
+    计算外部调用可用的超时时间，取调用自身超时和剩余预算中较小的一个
+
+    Args:
+        timeout: 调用自身的超时时间（秒）
+
+    Returns:
+        可用的超时时间（秒）
+
+    Raises:
+        DeadlineExceeded: 剩余预算已用完时
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(timeout, left)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    在代码块内设置截止时间，嵌套时只会收紧不会放宽
+
+    Args:
+        seconds: 从现在开始的时间预算，None 表示清除截止时间（用于后台任务）
+    """
+    if seconds is None:
+        token = _deadline.set(None)
+    else:
+        deadline = time.monotonic() + seconds
+        current = _deadline.get()
+        token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def clear_deadline() -> None:
+    """清除当前上下文的截止时间，后台任务不应继承发起请求的截止时间"""
+    _deadline.set(None)
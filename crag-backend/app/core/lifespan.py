@@ -0,0 +1,191 @@
+"""
+应用生命周期管理器，负责每个工作进程内资源的打开、关闭以及后台任务的管理
+
+多进程部署时每个工作进程都会重新导入应用模块，因此这里的所有状态
+（连接池、缓存、后台任务）都只属于当前进程，进程之间不共享任何内存状态。
+"""
+import asyncio
+import contextvars
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional, Set
+
+from app.core.deadline import clear_deadline
+from app.util.config import get_value
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+# 生命周期钩子类型
+Hook = Callable[[], Awaitable[None]]
+
+
+class BackgroundTaskManager:
+    """
+    后台任务管理器，跟踪当前进程内创建的所有后台任务，退出时统一取消
+    """
+
+    def __init__(self):
+        self.tasks: Set[asyncio.Task] = set()
+
+    def spawn(self, coro: Coroutine[Any, Any, Any], name: Optional[str] = None) -> asyncio.Task:
+        """
+        创建并跟踪一个后台任务
+
+        Args:
+            coro: 要运行的协程
+            name: 任务名称，便于日志排查
+
+        Returns:
+            创建的任务
+        """
+        # 后台任务可能由请求触发（例如缓存后台刷新），不继承该请求的截止时间
+        context = contextvars.copy_context()
+        context.run(clear_deadline)
+        task = context.run(asyncio.get_running_loop().create_task, coro, name=name)
+        self.tasks.add(task)
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        """任务结束时移除引用并记录异常"""
+        self.tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.error(f"后台任务 {task.get_name()} 异常退出: {exc!r}")
+
+    async def shutdown(self, timeout: float = 10.0) -> None:
+        """
+        取消所有后台任务并等待其退出
+
+        Args:
+            timeout: 等待任务退出的最长时间（秒）
+        """
+        if not self.tasks:
+            return
+
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning(f"{len(pending)} 个后台任务未能在 {timeout} 秒内退出")
+        logger.info(f"已停止 {len(done)} 个后台任务")
+
+
+class LifespanManager:
+    """
+    生命周期管理器，按注册顺序执行启动钩子，按相反顺序执行关闭钩子
+    """
+
+    def __init__(self):
+        self.startup_hooks: List[Hook] = []
+        self.shutdown_hooks: List[Hook] = []
+        self.background = BackgroundTaskManager()
+        self.started = False
+
+    def on_startup(self, func: Hook) -> Hook:
+        """
+        注册启动钩子，可作为装饰器使用
+
+        Args:
+            func: 无参数的异步函数
+
+        Returns:
+            原函数
+        """
+        self.startup_hooks.append(func)
+        return func
+
+    def on_shutdown(self, func: Hook) -> Hook:
+        """
+        注册关闭钩子，可作为装饰器使用
+
+        Args:
+            func: 无参数的异步函数
+
+        Returns:
+            原函数
+        """
+        self.shutdown_hooks.append(func)
+        return func
+
+    def spawn(self, coro: Coroutine[Any, Any, Any], name: Optional[str] = None) -> asyncio.Task:
+        """
+        创建一个随进程生命周期管理的后台任务
+
+        Args:
+            coro: 要运行的协程
+            name: 任务名称
+
+        Returns:
+            创建的任务
+        """
+        return self.background.spawn(coro, name=name)
+
+    def run_periodic(self, func: Hook, interval: float, name: Optional[str] = None) -> asyncio.Task:
+        """
+        按固定间隔周期性执行异步函数，单次异常不会终止循环
+
+        Args:
+            func: 无参数的异步函数
+            interval: 执行间隔（秒）
+            name: 任务名称
+
+        Returns:
+            创建的任务
+        """
+        async def _loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await func()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"周期任务 {name or func.__name__} 执行失败: {str(e)}")
+
+        return self.spawn(_loop(), name=name or func.__name__)
+
+    async def startup(self) -> None:
+        """执行所有启动钩子"""
+        for hook in self.startup_hooks:
+            await hook()
+        self.started = True
+        logger.info(f"工作进程 {os.getpid()} 已启动")
+
+    async def shutdown(self) -> None:
+        """停止后台任务并按相反顺序执行关闭钩子"""
+        timeout = float(get_value("GRACEFUL_SHUTDOWN_TIMEOUT", 10))
+        await self.background.shutdown(timeout)
+
+        for hook in reversed(self.shutdown_hooks):
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"关闭钩子 {hook.__name__} 执行失败: {str(e)}")
+
+        self.started = False
+        logger.info(f"工作进程 {os.getpid()} 已退出")
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        """
+        FastAPI lifespan 入口
+
+        Args:
+            app: FastAPI 应用实例
+        """
+        await self.startup()
+        try:
+            yield
+        finally:
+            await self.shutdown()
+
+
+# 创建全局生命周期管理器（每个工作进程一个）
+lifespan_manager = LifespanManager()
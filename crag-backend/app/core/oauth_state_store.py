@@ -0,0 +1,185 @@
+"""
+OAuth 状态值存储，用于防止 CSRF 攻击，支持过期时间和容量上限
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+
+from app.util.config import get_value
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+
+class OAuthStateStore(ABC):
+    """
+    OAuth 状态值存储接口
+    """
+
+    def __init__(self, ttl: float = 600, max_size: int = 10000):
+        """
+        初始化状态值存储
+
+        Args:
+            ttl: 状态值有效期（秒）
+            max_size: 最多保存的状态值数量
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @abstractmethod
+    def put(self, state: str) -> None:
+        """
+        保存状态值
+
+        Args:
+            state: 状态值
+        """
+
+    @abstractmethod
+    def consume(self, state: str) -> bool:
+        """
+        一次性消费状态值，无论成功与否该状态值都不能再次使用
+
+        Args:
+            state: 状态值
+
+        Returns:
+            状态值存在且未过期时返回 True
+        """
+
+    @abstractmethod
+    def cleanup(self) -> int:
+        """
+        清理过期状态值
+
+        Returns:
+            清理的数量
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """当前保存的状态值数量"""
+
+
+class MemoryOAuthStateStore(OAuthStateStore):
+    """
+    进程内状态值存储
+
+    所有状态值的有效期相同，因此插入顺序即过期顺序，
+    过期清理和容量淘汰都只需要从队首弹出。
+    """
+
+    def __init__(self, ttl: float = 600, max_size: int = 10000):
+        super().__init__(ttl, max_size)
+        self.states: "OrderedDict[str, float]" = OrderedDict()
+
+    def put(self, state: str) -> None:
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        # 超出容量时淘汰最早签发的状态值
+        while len(self.states) >= self.max_size:
+            self.states.popitem(last=False)
+
+        self.states[state] = now + self.ttl
+
+    def consume(self, state: str) -> bool:
+        expires_at = self.states.pop(state, None)
+        if expires_at is None:
+            return False
+        return expires_at > time.monotonic()
+
+    def cleanup(self) -> int:
+        return self._evict_expired(time.monotonic())
+
+    def _evict_expired(self, now: float) -> int:
+        """从队首弹出所有已过期的状态值"""
+        removed = 0
+        while self.states:
+            state, expires_at = next(iter(self.states.items()))
+            if expires_at > now:
+                break
+            del self.states[state]
+            removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+
+class DatabaseOAuthStateStore(OAuthStateStore):
+    """
+    基于数据库的状态值存储，多个工作进程共享同一份状态值
+
+    消费操作是一条带条件的 DELETE，由数据库保证同一个状态值只能被消费一次。
+    容量上限由周期清理任务统一执行，避免每次写入都统计行数。
+    """
+
+    def __init__(self, ttl: float = 600, max_size: int = 10000):
+        super().__init__(ttl, max_size)
+        # 延迟导入，内存模式下不需要初始化数据库
+        from app.model.database import session_scope
+        from app.model.oauth_state import OAuthState
+        self._session_scope = session_scope
+        self._model = OAuthState
+
+    def put(self, state: str) -> None:
+        with self._session_scope() as session:
+            session.add(self._model(state=state, expires_at=time.time() + self.ttl))
+
+    def consume(self, state: str) -> bool:
+        model = self._model
+        with self._session_scope() as session:
+            result = session.execute(
+                delete(model).where(model.state == state, model.expires_at > time.time())
+            )
+            consumed = result.rowcount == 1
+            if not consumed:
+                session.execute(delete(model).where(model.state == state))
+            return consumed
+
+    def cleanup(self) -> int:
+        model = self._model
+        with self._session_scope() as session:
+            removed = session.execute(delete(model).where(model.expires_at <= time.time())).rowcount
+
+            # 超出容量时删除最早签发的状态值
+            count = session.scalar(select(func.count()).select_from(model))
+            overflow = count - self.max_size
+            if overflow > 0:
+                oldest = select(model.state).order_by(model.expires_at).limit(overflow)
+                removed += session.execute(delete(model).where(model.state.in_(oldest))).rowcount
+
+        if removed:
+            logger.info(f"已清理 {removed} 个 OAuth 状态值")
+        return removed
+
+    def __len__(self) -> int:
+        with self._session_scope() as session:
+            return session.scalar(select(func.count()).select_from(self._model))
+
+
+def create_state_store(backend: Optional[str] = None) -> OAuthStateStore:
+    """
+    根据配置创建状态值存储
+
+    Args:
+        backend: 存储后端，可选值：memory, database，默认读取 OAUTH_STATE_BACKEND
+
+    Returns:
+        状态值存储实例
+    """
+    backend = backend or get_value("OAUTH_STATE_BACKEND", "memory")
+    ttl = float(get_value("OAUTH_STATE_TTL", 600))
+    max_size = int(get_value("OAUTH_STATE_MAX_SIZE", 10000))
+
+    if backend == "database":
+        return DatabaseOAuthStateStore(ttl, max_size)
+    if backend != "memory":
+        logger.warning(f"未知的 OAuth 状态存储后端: {backend}，使用内存存储")
+    return MemoryOAuthStateStore(ttl, max_size)
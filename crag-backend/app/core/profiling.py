@@ -0,0 +1,271 @@
+"""
+运行时诊断工具：采样 CPU 分析、内存分配快照、asyncio 任务转储和事件循环阻塞检测
+"""
+import asyncio
+import linecache
+import logging
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.lifespan import lifespan_manager
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame) -> str:
+    """生成栈帧标签：函数名 (文件:行号)"""
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+
+def _function_label(frame) -> str:
+    """生成函数标签，不含行号，用于汇总"""
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    采样 CPU 分析器
+
+    在独立线程中按固定间隔读取目标线程（事件循环线程）的调用栈，
+    统计每个函数出现在栈顶（自身耗时）和栈中（累计耗时）的次数，
+    同时输出可直接生成火焰图的折叠栈格式。分析期间目标线程无需任何插桩。
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 64):
+        """
+        初始化分析器
+
+        Args:
+            thread_id: 被采样的线程 ID
+            interval: 采样间隔（秒）
+            max_depth: 记录的最大栈深度
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+
+    def run(self, duration: float) -> Dict[str, Any]:
+        """
+        执行采样，阻塞调用线程 duration 秒
+
+        Args:
+            duration: 采样时长（秒）
+
+        Returns:
+            分析结果
+        """
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        stacks: Counter = Counter()
+        samples = 0
+
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(_function_label(frame))
+                frame = frame.f_back
+
+            samples += 1
+            self_counts[labels[0]] += 1
+            for label in set(labels):
+                total_counts[label] += 1
+            stacks[";".join(reversed(labels))] += 1
+            time.sleep(self.interval)
+
+        def top(counts: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"function": label, "samples": count, "ratio": count / samples}
+                for label, count in counts.most_common(30)
+            ] if samples else []
+
+        return {
+            "duration": duration,
+            "interval": self.interval,
+            "samples": samples,
+            "self": top(self_counts),
+            "cumulative": top(total_counts),
+            "folded": [f"{stack} {count}" for stack, count in stacks.most_common(200)]
+        }
+
+
+def memory_snapshot(top: int = 20, previous: Optional[tracemalloc.Snapshot] = None) -> Dict[str, Any]:
+    """
+    获取当前内存分配最多的代码位置
+
+    Args:
+        top: 返回的条目数量
+        previous: 上一次快照，提供时额外返回增长最多的位置
+
+    Returns:
+        快照结果，包含 snapshot 对象供下次比较
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, linecache.__file__),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+
+    def location(stat) -> str:
+        frame = stat.traceback[0]
+        return f"{frame.filename}:{frame.lineno}"
+
+    result = {
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "top": [
+            {"location": location(stat), "size": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:top]
+        ],
+        "snapshot": snapshot
+    }
+    if previous is not None:
+        result["growth"] = [
+            {"location": location(stat), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in snapshot.compare_to(previous, "lineno")[:top]
+        ]
+    return result
+
+
+def dump_tasks(limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    转储当前事件循环中的所有 asyncio 任务
+
+    Args:
+        limit: 每个任务最多记录的栈帧数量
+
+    Returns:
+        任务列表
+    """
+    tasks = []
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        tasks.append({
+            "name": task.get_name(),
+            "coro": getattr(coro, "__qualname__", repr(coro)),
+            "done": task.done(),
+            "cancelled": task.cancelled(),
+            "stack": [_frame_label(frame) for frame in task.get_stack(limit=limit)]
+        })
+    tasks.sort(key=lambda item: item["name"])
+    return tasks
+
+
+class EventLoopWatchdog:
+    """
+    事件循环阻塞检测
+
+    事件循环中的心跳协程定期更新时间戳，监视线程发现心跳超过阈值未更新时，
+    说明有回调在同步阻塞事件循环，立即记录事件循环线程当前的调用栈。
+    同一次阻塞只记录一次。
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, history: int = 50):
+        """
+        初始化阻塞检测
+
+        Args:
+            threshold: 判定为阻塞的时长（秒）
+            interval: 心跳间隔（秒）
+            history: 保留的阻塞事件数量
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.blocked_count = 0
+        self._heartbeat = time.monotonic()
+        self._thread_id: Optional[int] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._current: Optional[Dict[str, Any]] = None
+
+    async def heartbeat(self) -> None:
+        """事件循环中的心跳协程"""
+        self._thread_id = threading.get_ident()
+        while not self._stopping.is_set():
+            self._heartbeat = time.monotonic()
+            self._finish_event()
+            await asyncio.sleep(self.interval)
+
+    def _finish_event(self) -> None:
+        """心跳恢复时记录本次阻塞的总时长"""
+        event, self._current = self._current, None
+        if event is None:
+            return
+
+        event["duration"] = time.monotonic() - event["started_at"]
+        logger.warning(f"事件循环被阻塞 {event['duration']:.3f} 秒，阻塞位置:\n" + "".join(event["stack"]))
+
+    def _watch(self) -> None:
+        """监视线程"""
+        while not self._stopping.wait(self.interval):
+            if self._thread_id is None or self._current is not None:
+                continue
+            stalled = time.monotonic() - self._heartbeat
+            if stalled < self.threshold + self.interval:
+                continue
+
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self.blocked_count += 1
+            self._current = {
+                "detected_at": time.time(),
+                "started_at": self._heartbeat + self.interval,
+                "duration": None,
+                "stack": traceback.format_stack(frame, limit=30)
+            }
+            self.events.append(self._current)
+
+    def start(self) -> asyncio.Task:
+        """
+        在当前事件循环中启动阻塞检测
+
+        Returns:
+            心跳任务
+        """
+        self._stopping.clear()
+        self._heartbeat = time.monotonic()
+        self._thread = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"事件循环阻塞检测已启动，阈值 {self.threshold} 秒")
+        return lifespan_manager.spawn(self.heartbeat(), name="event_loop_watchdog")
+
+    def stop(self) -> None:
+        """停止阻塞检测"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """
+        获取最近的阻塞事件
+
+        Returns:
+            阻塞事件列表，最新的在前
+        """
+        return [
+            {
+                "detected_at": event["detected_at"],
+                "duration": event["duration"],
+                "stack": event["stack"]
+            }
+            for event in reversed(self.events)
+        ]
+
+
+# 创建全局事件循环阻塞检测（每个工作进程一个）
+event_loop_watchdog = EventLoopWatchdog(threshold=float(get_value("EVENT_LOOP_BLOCK_THRESHOLD", 0.25)))
@@ -0,0 +1,243 @@
+"""
+进程内发布/订阅，每个订阅者拥有有界缓冲区，慢订阅者不会拖慢发布者或占用无限内存
+
+主题只存在于创建它的工作进程中，其他进程无法订阅。uvicorn 的多个工作进程共用同一端口、
+由内核分配连接，创建评审（POST /api/reviews）和订阅进度（GET /api/reviews/{job_id}/events）
+可能落在不同进程上而返回 404。需要评审进度的部署应保持 WORKERS=1，通过运行多个单进程实例
+扩容，并在负载均衡上按会话 Cookie 开启会话保持，使同一用户的请求始终到达同一实例。
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Hashable, Iterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 主题结束事件类型
+END_EVENT = "end"
+
+
+@dataclass
+class Event:
+    """主题中的一条事件，id 在进程内单调递增，可作为 SSE 的 Last-Event-ID"""
+    id: int
+    type: str
+    data: Any
+
+
+class Subscription:
+    """
+    单个订阅者的事件缓冲区
+
+    缓冲区满时丢弃最旧的事件并记录丢弃数量，发布者永远不会因为订阅者消费慢而阻塞。
+    """
+
+    def __init__(self, max_buffer: int):
+        """
+        初始化订阅
+
+        Args:
+            max_buffer: 缓冲区最多保留的事件数量
+        """
+        self.buffer: Deque[Event] = deque(maxlen=max_buffer)
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def push(self, event: Event) -> None:
+        """
+        放入一条事件，缓冲区满时挤掉最旧的事件
+
+        Args:
+            event: 事件
+        """
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(event)
+        if event.type == END_EVENT:
+            self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        取出下一条事件
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            事件；超时或订阅已结束且缓冲区为空时返回 None
+        """
+        while not self.buffer:
+            if self.closed:
+                return None
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.buffer.popleft()
+
+
+@dataclass
+class Topic:
+    """一个主题的订阅者和最近事件"""
+    history: Deque[Event]
+    subscribers: Set[Subscription] = field(default_factory=set)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = field(default_factory=time.monotonic)
+    closed_at: Optional[float] = None
+
+
+class PubSub:
+    """
+    进程内发布/订阅
+
+    每个主题保留最近的少量事件，新订阅者（或带 Last-Event-ID 重连的订阅者）
+    先收到缺失的历史事件再接收实时事件。事件只在当前工作进程内分发。
+    """
+
+    def __init__(
+            self,
+            max_buffer: int = 256,
+            history_size: int = 64,
+            retention: float = 300.0,
+            idle_timeout: float = 3600.0
+    ):
+        """
+        初始化发布/订阅
+
+        Args:
+            max_buffer: 每个订阅者的缓冲区大小
+            history_size: 每个主题保留的历史事件数量
+            retention: 主题结束后保留历史的秒数
+            idle_timeout: 未结束的主题无事件发布多少秒后视为废弃
+        """
+        self.max_buffer = max_buffer
+        self.history_size = history_size
+        self.retention = retention
+        self.idle_timeout = idle_timeout
+        self.topics: Dict[Hashable, Topic] = {}
+        self._ids = itertools.count(1)
+
+    def open(self, topic: Hashable, **metadata: Any) -> Topic:
+        """
+        创建主题，已存在时更新元数据
+
+        Args:
+            topic: 主题键
+            **metadata: 主题元数据，例如所属用户
+
+        Returns:
+            主题
+        """
+        entry = self.topics.get(topic)
+        if entry is None:
+            entry = Topic(history=deque(maxlen=self.history_size))
+            self.topics[topic] = entry
+        entry.metadata.update(metadata)
+        return entry
+
+    def get_topic(self, topic: Hashable) -> Optional[Topic]:
+        """
+        获取主题
+
+        Args:
+            topic: 主题键
+
+        Returns:
+            主题，不存在时返回 None
+        """
+        return self.topics.get(topic)
+
+    def publish(self, topic: Hashable, event_type: str, data: Any = None) -> Optional[Event]:
+        """
+        发布事件，不会阻塞
+
+        Args:
+            topic: 主题键
+            event_type: 事件类型
+            data: 事件数据
+
+        Returns:
+            发布的事件；主题已结束时返回 None
+        """
+        entry = self.topics.get(topic) or self.open(topic)
+        if entry.closed_at is not None:
+            logger.warning(f"主题 {topic} 已结束，忽略事件 {event_type}")
+            return None
+
+        event = Event(id=next(self._ids), type=event_type, data=data)
+        entry.history.append(event)
+        entry.updated_at = time.monotonic()
+        for subscription in entry.subscribers:
+            subscription.push(event)
+
+        if event_type == END_EVENT:
+            entry.closed_at = time.monotonic()
+        return event
+
+    def close(self, topic: Hashable, data: Any = None) -> None:
+        """
+        结束主题，所有订阅者收到结束事件后停止
+
+        Args:
+            topic: 主题键
+            data: 结束事件数据
+        """
+        self.publish(topic, END_EVENT, data)
+
+    def close_all(self) -> None:
+        """结束所有未结束的主题，关闭进程前调用，使长连接订阅者及时退出"""
+        for topic, entry in list(self.topics.items()):
+            if entry.closed_at is None:
+                self.close(topic)
+
+    @contextmanager
+    def subscribe(self, topic: Hashable, last_event_id: Optional[int] = None) -> Iterator[Subscription]:
+        """
+        订阅主题，先补发历史中 last_event_id 之后的事件
+
+        Args:
+            topic: 主题键
+            last_event_id: 客户端最后收到的事件 ID
+
+        Yields:
+            订阅
+        """
+        entry = self.topics.get(topic) or self.open(topic)
+        subscription = Subscription(self.max_buffer)
+        for event in entry.history:
+            if last_event_id is None or event.id > last_event_id:
+                subscription.push(event)
+
+        entry.subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            entry.subscribers.discard(subscription)
+            if subscription.dropped:
+                logger.info(f"主题 {topic} 的订阅者丢弃了 {subscription.dropped} 条事件")
+
+    def cleanup(self) -> int:
+        """
+        清理已结束且超过保留时间的主题，以及长时间没有事件的废弃主题
+
+        Returns:
+            清理的主题数量
+        """
+        now = time.monotonic()
+        expired = [
+            topic for topic, entry in self.topics.items()
+            if not entry.subscribers and (
+                (entry.closed_at is not None and now - entry.closed_at > self.retention)
+                or now - entry.updated_at > self.idle_timeout
+            )
+        ]
+        for topic in expired:
+            del self.topics[topic]
+        return len(expired)
@@ -2,6 +2,7 @@
 服务上下文管理器，用于管理服务的生命周期
 """
 from typing import Dict, Any, Type, TypeVar, Optional
+import inspect
 import logging
 
 # 获取日志记录器
@@ -40,8 +41,8 @@ class ServiceContext:
         """
         service_name = service_class.__name__
         if service_name not in self.services:
-            # 如果 kwargs 中没有 config_dict，则添加
-            if 'config_dict' not in kwargs and hasattr(service_class, '__init__') and 'config_dict' in service_class.__init__.__code__.co_varnames:
+            # 如果 kwargs 中没有 config_dict 且构造函数接受该参数，则添加
+            if 'config_dict' not in kwargs and 'config_dict' in inspect.signature(service_class).parameters:
                 kwargs['config_dict'] = self.config
             
             # 创建服务实例
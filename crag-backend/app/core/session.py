@@ -1,17 +1,53 @@
+import logging
 import secrets
 import time
 from typing import Dict, Any, Optional
 from fastapi import Request, Response
+from app.core.session_cookie import ClaimsCodec
 from app.util.config import get_value
 
+logger = logging.getLogger(__name__)
+
+# Cookie 模式下会话密钥的最短长度
+MIN_SECRET_KEY_LENGTH = 32
+
+
 class SessionManager:
-    """会话管理器，用于处理用户会话"""
+    """
+    会话管理器，用于处理用户会话
+
+    SESSION_MODE 为 server（默认）时用户信息只保存在服务端会话中；
+    为 cookie 时用户的非敏感信息（ID、登录名、头像、过期时间）额外以加密 Cookie 下发，
+    识别当前用户不再需要查询服务端会话，访问令牌等敏感数据仍只保存在服务端。
+    """
     
     def __init__(self):
-        self.secret_key = get_value("SESSION_SECRET_KEY", "default_secret_key")
+        """
+        初始化会话管理器
+
+        Raises:
+            RuntimeError: SESSION_MODE=cookie 但未配置足够长的 SESSION_SECRET_KEY 时
+        """
         self.cookie_name = "crag_session"
+        self.claims_cookie_name = "crag_claims"
         self.sessions: Dict[str, Dict[str, Any]] = {}
         self.session_lifetime = int(get_value("SESSION_LIFETIME", 3600))  # 默认1小时
+        self.mode = get_value("SESSION_MODE", "server")
+
+        # Cookie 模式下任何人都能用公开的默认密钥伪造用户身份，必须显式配置密钥；
+        # 服务端模式不校验 Cookie 中的声明，未配置时使用进程内随机密钥
+        secret_key = get_value("SESSION_SECRET_KEY")
+        if self.mode == "cookie" and (not secret_key or len(str(secret_key)) < MIN_SECRET_KEY_LENGTH):
+            raise RuntimeError(f"SESSION_MODE=cookie 需要配置至少 {MIN_SECRET_KEY_LENGTH} 个字符的 SESSION_SECRET_KEY")
+        self.secret_key = str(secret_key) if secret_key else secrets.token_urlsafe(32)
+
+        # 轮换密钥时将旧密钥放入 SESSION_PREVIOUS_KEYS（逗号分隔）
+        previous_keys = get_value("SESSION_PREVIOUS_KEYS") or []
+        if isinstance(previous_keys, str):
+            previous_keys = [key.strip() for key in previous_keys.split(",") if key.strip()]
+        if self.mode == "cookie" and any(len(str(key)) < MIN_SECRET_KEY_LENGTH for key in previous_keys):
+            raise RuntimeError(f"SESSION_PREVIOUS_KEYS 中的密钥不能短于 {MIN_SECRET_KEY_LENGTH} 个字符")
+        self.claims_codec = ClaimsCodec([self.secret_key, *previous_keys], self.session_lifetime)
     
     def create_session(self) -> str:
         """创建新会话并返回会话ID"""
@@ -83,6 +119,62 @@ class SessionManager:
     def clear_session_cookie(self, response: Response) -> None:
         """清除会话Cookie"""
         response.delete_cookie(key=self.cookie_name)
+        response.delete_cookie(key=self.claims_cookie_name)
+
+    def set_claims_cookie(self, response: Response, user: Dict[str, Any]) -> None:
+        """
+        下发包含用户信息的加密 Cookie，仅在 cookie 会话模式下生效
+
+        Args:
+            response: 响应对象
+            user: 用户信息
+        """
+        if self.mode != "cookie":
+            return
+
+        claims = {
+            "uid": user.get("id"),
+            "login": user.get("login"),
+            "name": user.get("name"),
+            "avatar": user.get("avatar_url")
+        }
+        response.set_cookie(
+            key=self.claims_cookie_name,
+            value=self.claims_codec.encode(claims),
+            httponly=True,
+            secure=get_value("COOKIE_SECURE", False),
+            max_age=self.session_lifetime,
+            samesite="lax"
+        )
+
+    def get_user(self, request: Request) -> Optional[Dict[str, Any]]:
+        """
+        获取当前登录用户，cookie 模式下直接从加密 Cookie 解析，不查询服务端会话
+
+        Args:
+            request: 请求对象
+
+        Returns:
+            用户信息，未登录时返回 None
+        """
+        if self.mode == "cookie":
+            claims, needs_refresh = self.claims_codec.decode(request.cookies.get(self.claims_cookie_name))
+            if claims is not None:
+                user = {
+                    "id": claims.get("uid"),
+                    "login": claims.get("login"),
+                    "name": claims.get("name"),
+                    "avatar_url": claims.get("avatar")
+                }
+                if needs_refresh:
+                    # 由会话中间件在响应中重新签发
+                    request.state.refresh_claims = user
+                return user
+
+        session_id = self.get_session_id(request)
+        if not session_id:
+            return None
+        return self.get_session_data(session_id).get("user")
     
     def _is_session_expired(self, session_id: str) -> bool:
         """检查会话是否过期"""
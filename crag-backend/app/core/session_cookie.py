@@ -0,0 +1,101 @@
+"""
+无状态会话 Cookie 编解码，会话声明经 Fernet 认证加密后存放在 Cookie 中
+"""
+import base64
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+logger = logging.getLogger(__name__)
+
+
+def derive_key(secret: str) -> bytes:
+    """
+    由任意长度的密钥字符串派生 Fernet 密钥
+
+    Args:
+        secret: 密钥字符串
+
+    Returns:
+        urlsafe base64 编码的 32 字节密钥
+    """
+    return base64.urlsafe_b64encode(hashlib.sha256(b"crag-session-cookie:" + secret.encode()).digest())
+
+
+class ClaimsCodec:
+    """
+    会话声明编解码器
+
+    第一个密钥用于加密，其余密钥只用于解密，轮换密钥时把新密钥放在最前面，
+    旧密钥保留到所有旧 Cookie 过期为止。使用旧密钥解密成功的 Cookie 会被标记为需要重新签发。
+    """
+
+    def __init__(self, secrets: List[str], lifetime: int):
+        """
+        初始化编解码器
+
+        Args:
+            secrets: 密钥列表，第一个为当前密钥
+            lifetime: 声明有效期（秒）
+        """
+        if not secrets:
+            raise ValueError("至少需要一个会话密钥")
+        self.fernets = [Fernet(derive_key(secret)) for secret in secrets]
+        self.current = self.fernets[0]
+        self.multi = MultiFernet(self.fernets)
+        self.lifetime = lifetime
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        """
+        加密会话声明，自动写入过期时间
+
+        Args:
+            claims: 会话声明
+
+        Returns:
+            Cookie 值
+        """
+        payload = dict(claims, exp=int(time.time()) + self.lifetime)
+        data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+        return self.current.encrypt(data).decode()
+
+    def decode(self, value: Optional[str]) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        解密并校验会话声明
+
+        Args:
+            value: Cookie 值
+
+        Returns:
+            (会话声明, 是否需要重新签发)；无效或过期时声明为 None
+        """
+        if not value:
+            return None, False
+
+        token = value.encode()
+        try:
+            data = self.multi.decrypt(token, ttl=self.lifetime)
+        except InvalidToken:
+            return None, False
+
+        try:
+            claims = json.loads(data)
+        except ValueError:
+            return None, False
+
+        now = time.time()
+        if claims.get("exp", 0) < now:
+            return None, False
+
+        # 旧密钥签发或剩余有效期不足一半时重新签发，实现密钥轮换和滑动过期
+        needs_refresh = claims["exp"] - now < self.lifetime / 2
+        if not needs_refresh and len(self.fernets) > 1:
+            try:
+                self.current.decrypt(token)
+            except InvalidToken:
+                needs_refresh = True
+        return claims, needs_refresh
@@ -0,0 +1,78 @@
+"""
+单飞（single-flight）调用合并，相同键的并发调用只执行一次，结果分发给所有等待者
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core.deadline import DeadlineExceeded, clear_deadline, remaining
+
+# 返回值类型变量
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    合并相同键的并发异步调用
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        """
+        判断指定键是否有正在进行的调用
+
+        Args:
+            key: 调用键
+
+        Returns:
+            是否正在进行
+        """
+        return key in self.calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行调用，若相同键的调用正在进行则等待其结果
+
+        Args:
+            key: 调用键
+            fn: 无参数的异步函数
+
+        Returns:
+            调用结果，异常同样会传递给所有等待者
+
+        Raises:
+            DeadlineExceeded: 当前等待者的截止时间先于调用完成到达时
+        """
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_task(self._run(key, fn))
+            # 所有等待者都被取消时仍需取走异常，避免 "exception was never retrieved" 警告
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self.calls[key] = future
+        return await self._wait(future)
+
+    @staticmethod
+    async def _wait(future: asyncio.Future) -> Any:
+        """按当前等待者自己的截止时间等待共享调用，shield 确保单个等待者超时或被取消时不会取消共享的调用"""
+        left = remaining()
+        if left is None:
+            return await asyncio.shield(future)
+        if left <= 0:
+            raise DeadlineExceeded()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=left)
+        except asyncio.TimeoutError as e:
+            if future.done():
+                # 共享调用自身抛出的超时
+                raise
+            raise DeadlineExceeded() from e
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行实际调用，结束后移除键"""
+        # 共享调用不继承第一个调用者的截止时间，否则预算最短的调用者会让所有等待者一起失败
+        clear_deadline()
+        try:
+            return await fn()
+        finally:
+            self.calls.pop(key, None)
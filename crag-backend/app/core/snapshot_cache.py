@@ -0,0 +1,148 @@
+"""
+快照缓存，支持过期后继续返回旧值并在后台刷新（stale-while-revalidate）
+"""
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Generic, Hashable, List, Optional, TypeVar
+
+from app.core.lifespan import lifespan_manager
+from app.core.singleflight import SingleFlight
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+# 缓存值类型变量
+T = TypeVar('T')
+
+# 加载函数类型
+Loader = Callable[[], Awaitable[T]]
+
+# 刷新监听器类型
+Listener = Callable[[Hashable, Any], None]
+
+
+@dataclass
+class CacheEntry(Generic[T]):
+    """缓存条目"""
+    value: T
+    fetched_at: float
+
+
+class SnapshotCache(Generic[T]):
+    """
+    带容量上限的快照缓存
+
+    - 未超过 ttl 的条目直接返回
+    - 超过 ttl 但未超过 max_stale 的条目立即返回旧值，同时在后台刷新
+    - 不存在或超过 max_stale 的条目同步加载
+    相同键的并发加载通过 SingleFlight 合并为一次上游调用。
+    """
+
+    def __init__(self, ttl: float = 60, max_stale: float = 3600, max_entries: int = 1000, name: str = "snapshot"):
+        """
+        初始化快照缓存
+
+        Args:
+            ttl: 条目保持新鲜的时间（秒）
+            max_stale: 条目允许作为旧值返回的最长时间（秒）
+            max_entries: 最多缓存的条目数量，超出时淘汰最久未使用的条目
+            name: 缓存名称，用于日志和后台任务命名
+        """
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.name = name
+        self.entries: "OrderedDict[Hashable, CacheEntry[T]]" = OrderedDict()
+        self.flights = SingleFlight()
+        self.listeners: List[Listener] = []
+
+    def add_listener(self, listener: Listener) -> None:
+        """
+        注册缓存写入监听器，每次加载到新值后调用
+
+        Args:
+            listener: 接收缓存键和新值的回调函数
+        """
+        self.listeners.append(listener)
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry[T]]:
+        """
+        获取缓存条目，不触发加载
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存条目，不存在时返回 None
+        """
+        return self.entries.get(key)
+
+    async def get(self, key: Hashable, loader: Loader, force_refresh: bool = False) -> T:
+        """
+        获取缓存值
+
+        Args:
+            key: 缓存键
+            loader: 缓存未命中或需要刷新时调用的加载函数
+            force_refresh: 是否忽略缓存强制同步加载
+
+        Returns:
+            缓存值
+        """
+        entry = self.entries.get(key)
+        if entry is not None and not force_refresh:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.max_stale:
+                self.entries.move_to_end(key)
+                if age >= self.ttl:
+                    self._refresh_in_background(key, loader)
+                return entry.value
+
+        return await self.flights.do(key, lambda: self._fetch(key, loader))
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        删除缓存条目
+
+        Args:
+            key: 缓存键
+        """
+        self.entries.pop(key, None)
+
+    def _refresh_in_background(self, key: Hashable, loader: Loader) -> None:
+        """在后台刷新缓存，已有相同键的刷新时跳过"""
+        if self.flights.in_flight(key):
+            return
+
+        async def _refresh():
+            try:
+                await self.flights.do(key, lambda: self._fetch(key, loader))
+            except Exception as e:
+                # 刷新失败时保留旧值，等待下次请求再次触发
+                logger.warning(f"{self.name} 缓存后台刷新失败: {str(e)}")
+
+        lifespan_manager.spawn(_refresh(), name=f"{self.name}_refresh")
+
+    async def _fetch(self, key: Hashable, loader: Loader) -> T:
+        """调用加载函数并写入缓存"""
+        value = await loader()
+        self._store(key, value)
+        return value
+
+    def _store(self, key: Hashable, value: T) -> None:
+        """写入缓存并按 LRU 淘汰超出容量的条目"""
+        self.entries[key] = CacheEntry(value=value, fetched_at=time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        for listener in self.listeners:
+            try:
+                listener(key, value)
+            except Exception as e:
+                logger.error(f"{self.name} 缓存监听器执行失败: {str(e)}")
+
+    def __len__(self) -> int:
+        return len(self.entries)
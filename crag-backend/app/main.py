@@ -1,18 +1,35 @@
+import asyncio
 import os
 import uvicorn
 import logging
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import routes
 from app.util.config import load_config, get_value, setup_logging
 from app.core.session import session_manager
 from app.core.service_provider import service_provider
 from app.core.service_context import ServiceContext
+from app.core.admission import AdmissionMiddleware, admission_controller
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.container import Lifetime, container
+from app.core.deadline import DeadlineExceeded, deadline_scope
+from app.core.lifespan import lifespan_manager
+from app.core.profiling import event_loop_watchdog
+from app.services.github_client import github_client
+from app.services.github_app_auth import github_app_auth
+from app.services.blob_store import blob_store
+from app.services.review_progress import review_events
+from app.services.review_scheduler import review_scheduler
 from app.services.github_oauth_service import GitHubOAuthService, create_github_service
+from app.services.github_repos_service import GithubReposService, create_repos_service
 
 # 标记服务是否已注册
 _services_registered = False
 
+# 标记生命周期钩子是否已注册
+_lifespan_registered = False
+
 # 预加载配置，确保只加载一次
 def preload_config():
     """预加载配置，确保只加载一次"""
@@ -42,15 +59,64 @@ def create_app() -> FastAPI:
     
     # 注册服务
     register_services()
+
+    # 注册生命周期钩子
+    register_lifespan_hooks()
     
     # 创建应用
     app = FastAPI(
         title="CRAG API",
         description="代码审查智能助手 API",
-        version="0.1.0"
+        version="0.1.0",
+        lifespan=lifespan_manager.lifespan
     )
 
-    # 配置CORS
+    # 添加会话 Cookie 刷新中间件，过期会话由生命周期中的定期任务统一清理
+    @app.middleware("http")
+    async def session_middleware(request: Request, call_next):
+        response = await call_next(request)
+
+        # 使用旧密钥或即将过期的会话 Cookie 在响应中重新签发
+        refresh_claims = getattr(request.state, "refresh_claims", None)
+        if refresh_claims:
+            session_manager.set_claims_cookie(response, refresh_claims)
+
+        return response
+
+    # 添加准入控制中间件，过载时快速返回 503 而不是无限排队
+    admission_enabled = str(get_value("ADMISSION_ENABLED", True)).lower() != "false"
+
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller, enabled=admission_enabled)
+
+    # 添加截止时间中间件，请求内的 GitHub 调用共享同一个时间预算（包含准入排队时间）
+    default_deadline = float(get_value("REQUEST_DEADLINE", 30.0))
+    max_deadline = float(get_value("REQUEST_DEADLINE_MAX", 60.0))
+
+    @app.middleware("http")
+    async def deadline_middleware(request: Request, call_next):
+        # 客户端可以通过 X-Request-Timeout 缩短（不能超过上限）本次请求的预算
+        seconds = default_deadline
+        requested = request.headers.get("x-request-timeout")
+        if requested:
+            try:
+                seconds = min(max(float(requested), 0.1), max_deadline)
+            except ValueError:
+                pass
+
+        with deadline_scope(seconds):
+            try:
+                return await call_next(request)
+            except DeadlineExceeded:
+                logging.warning(f"请求超过截止时间 {request.url.path}")
+                return JSONResponse(status_code=504, content={"error": "请求超时"})
+            except CircuitOpenError as e:
+                return JSONResponse(
+                    status_code=503,
+                    content={"error": "GitHub 服务暂时不可用，请稍后再试"},
+                    headers={"Retry-After": str(max(int(e.retry_after), 1))}
+                )
+
+    # 配置CORS，最后添加的中间件位于最外层，拒绝响应同样带有 CORS 头
     app.add_middleware(
         CORSMiddleware,
         allow_origins=get_value("CORS_ORIGINS", ["*"]),  # 允许的来源列表
@@ -59,19 +125,6 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
-    # 添加会话清理中间件
-    @app.middleware("http")
-    async def session_middleware(request: Request, call_next):
-        # 处理请求前的操作
-        response = await call_next(request)
-        
-        # 处理请求后的操作
-        # 每100个请求清理一次过期会话（可以根据需要调整）
-        if hash(request.url.path) % 100 == 0:
-            session_manager.cleanup_expired_sessions()
-        
-        return response
-
     # 注册API路由
     app.include_router(routes.router, prefix="/api")
 
@@ -98,10 +151,100 @@ def register_services():
     
     # 同时注册到服务提供者，保持向后兼容
     service_provider.register_instance(GitHubOAuthService, github_service)
+
+    # 注册到依赖注入容器，路由通过 container.provide 获取
+    container.register_instance(GitHubOAuthService, github_service)
+    container.register(GithubReposService, create_repos_service, Lifetime.PER_TOKEN)
     
     _services_registered = True
 
 
+def register_lifespan_hooks():
+    """
+    注册每个工作进程的启动和关闭钩子，确保只注册一次
+    """
+    global _lifespan_registered
+
+    if _lifespan_registered:
+        return
+
+    @lifespan_manager.on_startup
+    async def open_github_client():
+        await github_client.open()
+
+    @lifespan_manager.on_startup
+    async def start_session_cleanup():
+        interval = float(get_value("SESSION_CLEANUP_INTERVAL", 300))
+        lifespan_manager.run_periodic(cleanup_sessions, interval, name="session_cleanup")
+
+    @lifespan_manager.on_startup
+    async def start_oauth_state_cleanup():
+        interval = float(get_value("OAUTH_STATE_CLEANUP_INTERVAL", 60))
+        lifespan_manager.run_periodic(cleanup_oauth_states, interval, name="oauth_state_cleanup")
+
+    @lifespan_manager.on_startup
+    async def start_review_events_cleanup():
+        interval = float(get_value("REVIEW_EVENTS_CLEANUP_INTERVAL", 60))
+        lifespan_manager.run_periodic(cleanup_review_events, interval, name="review_events_cleanup")
+
+    @lifespan_manager.on_startup
+    async def start_installation_token_refresh():
+        if github_app_auth.is_configured:
+            interval = float(get_value("GITHUB_APP_TOKEN_REFRESH_INTERVAL", 60))
+            lifespan_manager.run_periodic(github_app_auth.refresh_due, interval, name="installation_token_refresh")
+
+    @lifespan_manager.on_startup
+    async def start_event_loop_watchdog():
+        if str(get_value("EVENT_LOOP_WATCHDOG", True)).lower() != "false":
+            event_loop_watchdog.start()
+
+    @lifespan_manager.on_shutdown
+    async def stop_event_loop_watchdog():
+        event_loop_watchdog.stop()
+
+    @lifespan_manager.on_startup
+    async def start_review_scheduler():
+        review_scheduler.start()
+
+    @lifespan_manager.on_shutdown
+    async def stop_review_scheduler():
+        review_scheduler.stop()
+
+    @lifespan_manager.on_shutdown
+    async def close_review_events():
+        # 结束所有事件流，SSE 连接不会拖住优雅关闭
+        review_events.close_all()
+
+    @lifespan_manager.on_shutdown
+    async def close_github_client():
+        await github_client.aclose()
+
+    @lifespan_manager.on_shutdown
+    async def close_blob_store():
+        blob_store.close()
+
+    @lifespan_manager.on_shutdown
+    async def close_services():
+        service_context.__exit__(None, None, None)
+
+    _lifespan_registered = True
+
+
+async def cleanup_sessions():
+    """定期清理过期会话"""
+    session_manager.cleanup_expired_sessions()
+
+
+async def cleanup_oauth_states():
+    """定期清理过期的 OAuth 状态值"""
+    await asyncio.to_thread(service_context.get(GitHubOAuthService).state_store.cleanup)
+
+
+async def cleanup_review_events():
+    """定期清理已结束的评审事件主题"""
+    review_events.cleanup()
+
+
 # 创建应用实例
 run = create_app()
 # 如果直接运行此文件，则启动服务器
@@ -119,14 +262,32 @@ if __name__ == "__main__":
     
     host = get_value("HOST", "127.0.0.1")
     port = int(get_value("PORT", 8001))
+
+    # 工作进程数量，每个进程独立持有连接池、缓存和后台任务
+    workers = int(get_value("WORKERS", 1))
+    if enable_reload and workers > 1:
+        logging.warning("热重载模式不支持多进程，工作进程数量已调整为 1")
+        workers = 1
+    if workers > 1:
+        # 会话、评审调度器和评审进度主题都只存在于单个进程内，而同一端口上的多个工作进程
+        # 由内核分配连接，负载均衡的会话保持无法把请求固定到某个工作进程
+        logging.warning(
+            "多进程模式下内存会话、评审任务和评审进度事件不在进程间共享，订阅评审进度可能返回 404；"
+            "需要评审进度时请保持 WORKERS=1，以多个单进程实例扩容并在负载均衡上开启会话保持"
+        )
+
+    # 收到 SIGTERM 后等待进行中请求完成的最长时间
+    graceful_timeout = int(get_value("GRACEFUL_SHUTDOWN_TIMEOUT", 10))
     
-    print(f"启动服务器: http://{host}:{port} {'(热重载已启用)' if enable_reload else '(热重载已禁用)'}")
+    print(f"启动服务器: http://{host}:{port} {'(热重载已启用)' if enable_reload else '(热重载已禁用)'}, 工作进程: {workers}")
     
 
     uvicorn.run(
     "app.main:run",
         host=host,
         port=port,
+        workers=workers,
+        timeout_graceful_shutdown=graceful_timeout,
         reload=enable_reload,  # 根据环境变量决定是否启用热重载
         reload_excludes=["*.pyc", "*.pyo", "__pycache__"] if enable_reload else None,  # 排除缓存文件
         log_level="warning"  # 降低日志级别
@@ -0,0 +1,134 @@
+"""
+数据库连接管理，基于 SQLAlchemy 提供引擎、会话工厂和模型基类
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+
+from app.util.config import get_value
+
+# 获取日志记录器
+logger = logging.getLogger(__name__)
+
+
+class Base(DeclarativeBase):
+    """所有数据模型的基类"""
+    pass
+
+
+# 数据库引擎和会话工厂单例（每个工作进程一个）
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+
+# 已创建的表名集合
+_created_tables = set()
+
+# 数据库调用可能同时来自多个工作线程，建表只能执行一次
+_init_lock = threading.Lock()
+
+
+def get_database_url() -> str:
+    """
+    获取数据库连接地址，默认使用后端目录下的 SQLite 文件
+
+    Returns:
+        数据库连接地址
+    """
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    default_url = f"sqlite:///{os.path.join(base_dir, 'crag.db')}"
+    return get_value("DATABASE_URL", default_url)
+
+
+def get_engine() -> Engine:
+    """
+    获取数据库引擎，首次调用时创建
+
+    Returns:
+        SQLAlchemy 引擎
+    """
+    global _engine
+
+    if _engine is None:
+        url = get_database_url()
+        if url.startswith("sqlite"):
+            _engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+
+            # 启用 WAL，允许多个工作进程并发读写同一个数据库文件
+            @event.listens_for(_engine, "connect")
+            def _set_sqlite_pragma(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.close()
+        else:
+            _engine = create_engine(url, pool_pre_ping=True)
+        logger.info("数据库引擎已创建")
+
+    return _engine
+
+
+def init_db() -> None:
+    """
+    创建所有已注册模型的表结构，已创建过的表不会重复检查
+    """
+    tables = set(Base.metadata.tables)
+    if tables <= _created_tables:
+        return
+
+    with _init_lock:
+        if tables <= _created_tables:
+            return
+        Base.metadata.create_all(get_engine())
+        _created_tables.update(tables)
+
+
+def get_session_factory() -> sessionmaker:
+    """
+    获取会话工厂
+
+    Returns:
+        sessionmaker 实例
+    """
+    global _session_factory
+
+    init_db()
+    if _session_factory is None:
+        _session_factory = sessionmaker(bind=get_engine(), expire_on_commit=False)
+
+    return _session_factory
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    提供事务范围的数据库会话，正常退出时提交，异常时回滚
+
+    Yields:
+        数据库会话
+    """
+    session = get_session_factory()()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def dispose_engine() -> None:
+    """释放数据库连接池"""
+    global _engine, _session_factory
+
+    if _engine is not None:
+        _engine.dispose()
+        logger.info("数据库连接池已释放")
+    _engine = None
+    _session_factory = None
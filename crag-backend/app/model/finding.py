@@ -0,0 +1,73 @@
+"""
+评审运行与评审问题数据模型
+"""
+import time
+from typing import Optional
+
+from sqlalchemy import Float, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.model.database import Base
+
+
+def normalize_repo(repo: str) -> str:
+    """
+    仓库全名的存储形式，GitHub 的 owner/repo 不区分大小写，统一存储和查询为小写
+
+    Args:
+        repo: 仓库全名 owner/repo
+
+    Returns:
+        规范化后的仓库全名
+    """
+    return repo.strip().lower()
+
+
+class ReviewRun(Base):
+    """一次评审运行，记录评审的提交和产生的问题数量"""
+
+    __tablename__ = "review_runs"
+    __table_args__ = (
+        Index("ix_review_runs_repo_pr_id", "repo", "pr_number", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    repo: Mapped[str] = mapped_column(String(255))
+    pr_number: Mapped[int] = mapped_column(Integer)
+    commit_sha: Mapped[str] = mapped_column(String(40))
+    status: Mapped[str] = mapped_column(String(16), default="running")
+    finding_count: Mapped[int] = mapped_column(Integer, default=0)
+    started_at: Mapped[float] = mapped_column(Float, default=time.time)
+    finished_at: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+
+class Finding(Base):
+    """
+    评审产生的单条问题
+
+    查询总是按 id 倒序做键集分页，因此每个组合索引都以 id 结尾，
+    过滤条件与分页游标可以在同一个索引上完成范围扫描。
+    """
+
+    __tablename__ = "findings"
+    __table_args__ = (
+        Index("ix_findings_repo_id", "repo", "id"),
+        Index("ix_findings_repo_pr_id", "repo", "pr_number", "id"),
+        Index("ix_findings_repo_rule_id", "repo", "rule", "id"),
+        Index("ix_findings_repo_severity_id", "repo", "severity", "id"),
+        Index("ix_findings_run_id", "run_id", "id"),
+        Index("ix_findings_fingerprint", "fingerprint"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    run_id: Mapped[int] = mapped_column(Integer, ForeignKey("review_runs.id", ondelete="CASCADE"))
+    repo: Mapped[str] = mapped_column(String(255))
+    pr_number: Mapped[int] = mapped_column(Integer)
+    commit_sha: Mapped[str] = mapped_column(String(40))
+    path: Mapped[str] = mapped_column(String(1024))
+    line: Mapped[int] = mapped_column(Integer)
+    rule: Mapped[str] = mapped_column(String(128))
+    severity: Mapped[str] = mapped_column(String(16))
+    fingerprint: Mapped[str] = mapped_column(String(16))
+    message: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[float] = mapped_column(Float, default=time.time)
@@ -0,0 +1,21 @@
+"""
+GitHub App 安装令牌数据模型，多个工作进程通过数据库共享同一个令牌
+"""
+from typing import Optional
+
+from sqlalchemy import Float, Integer, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.model.database import Base
+
+
+class InstallationToken(Base):
+    """GitHub App 安装令牌，令牌以加密形式存储"""
+
+    __tablename__ = "installation_tokens"
+
+    installation_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    token: Mapped[str] = mapped_column(Text)
+    expires_at: Mapped[float] = mapped_column(Float, index=True)
+    # 刷新租约到期时间，同一时刻只有一个工作进程刷新令牌
+    lease_until: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
@@ -0,0 +1,16 @@
+"""
+OAuth 状态值数据模型
+"""
+from sqlalchemy import Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.model.database import Base
+
+
+class OAuthState(Base):
+    """OAuth 登录过程中签发的一次性状态值"""
+
+    __tablename__ = "oauth_states"
+
+    state: Mapped[str] = mapped_column(String(64), primary_key=True)
+    expires_at: Mapped[float] = mapped_column(Float, index=True)
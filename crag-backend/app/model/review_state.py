@@ -0,0 +1,25 @@
+"""
+PR 评审历史数据模型
+"""
+import time
+
+from sqlalchemy import Float, Integer, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.model.database import Base
+
+
+class ReviewState(Base):
+    """记录每个 PR 最后一次评审到的 head 提交"""
+
+    __tablename__ = "review_states"
+    __table_args__ = (
+        UniqueConstraint("repo", "pr_number", name="uq_review_states_repo_pr"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    repo: Mapped[str] = mapped_column(String(255))
+    pr_number: Mapped[int] = mapped_column(Integer)
+    head_sha: Mapped[str] = mapped_column(String(40))
+    base_sha: Mapped[str] = mapped_column(String(40))
+    reviewed_at: Mapped[float] = mapped_column(Float, default=time.time)
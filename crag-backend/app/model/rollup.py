@@ -0,0 +1,43 @@
+"""
+仓库级统计汇总数据模型，评审运行完成时增量更新
+"""
+from sqlalchemy import Float, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.model.database import Base
+
+
+class RuleDailyRollup(Base):
+    """每个仓库每天各规则、各严重程度的问题数量"""
+
+    __tablename__ = "rollup_rule_daily"
+
+    repo: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # 自 1970-01-01 起的 UTC 天数
+    day: Mapped[int] = mapped_column(Integer, primary_key=True)
+    rule: Mapped[str] = mapped_column(String(128), primary_key=True)
+    severity: Mapped[str] = mapped_column(String(16), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class RunDailyRollup(Base):
+    """每个仓库每天的评审次数、问题数量和评审耗时累计"""
+
+    __tablename__ = "rollup_run_daily"
+
+    repo: Mapped[str] = mapped_column(String(255), primary_key=True)
+    day: Mapped[int] = mapped_column(Integer, primary_key=True)
+    run_count: Mapped[int] = mapped_column(Integer, default=0)
+    finding_count: Mapped[int] = mapped_column(Integer, default=0)
+    latency_sum: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+class PrSizeDailyRollup(Base):
+    """每个仓库每天首次评审的 PR 按变更行数分桶的数量"""
+
+    __tablename__ = "rollup_pr_size_daily"
+
+    repo: Mapped[str] = mapped_column(String(255), primary_key=True)
+    day: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[str] = mapped_column(String(8), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
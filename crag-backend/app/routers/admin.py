@@ -0,0 +1,138 @@
+from fastapi import APIRouter, Request, HTTPException, Depends
+from app.core.admission import admission_controller
+from app.core.container import RequestAuth, container
+from app.core.profiling import SamplingProfiler, dump_tasks, event_loop_watchdog, memory_snapshot
+from app.services.github_client import github_client
+from app.services.review_scheduler import review_scheduler
+from app.util.config import get_value
+import asyncio
+import hmac
+import logging
+import threading
+import tracemalloc
+
+# 设置日志
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# 同一时刻只允许一个 CPU 分析，避免多个采样线程叠加开销
+_profile_lock = asyncio.Lock()
+
+# 上一次内存快照，用于计算增长
+_last_memory_snapshot = None
+
+
+def _admin_logins() -> set:
+    """管理员 GitHub 登录名集合"""
+    logins = get_value("ADMIN_LOGINS") or []
+    if isinstance(logins, str):
+        logins = logins.split(",")
+    return {login.strip().lower() for login in logins if login.strip()}
+
+
+async def require_admin(request: Request, auth: RequestAuth = Depends(container.provide(RequestAuth))) -> None:
+    """
+    校验管理员身份：请求头 X-Admin-Token 与 ADMIN_TOKEN 一致，或当前用户在 ADMIN_LOGINS 中
+
+    Args:
+        request: FastAPI 请求对象
+        auth: 当前请求的认证信息
+
+    Raises:
+        HTTPException: 非管理员时
+    """
+    admin_token = get_value("ADMIN_TOKEN")
+    provided = request.headers.get("x-admin-token")
+    if admin_token and provided and hmac.compare_digest(provided.encode(), str(admin_token).encode()):
+        return
+
+    login = (auth.user or {}).get("login")
+    if login and login.lower() in _admin_logins():
+        return
+
+    raise HTTPException(status_code=403, detail="需要管理员权限")
+
+
+@router.post("/profile/cpu", dependencies=[Depends(require_admin)])
+async def profile_cpu(seconds: float = 5.0, interval_ms: float = 5.0):
+    """
+    对事件循环线程做限时采样 CPU 分析
+
+    Args:
+        seconds: 采样时长，最长 60 秒
+        interval_ms: 采样间隔（毫秒）
+    """
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="已有 CPU 分析正在进行")
+
+    async with _profile_lock:
+        profiler = SamplingProfiler(threading.get_ident(), interval=max(interval_ms, 1.0) / 1000)
+        duration = min(max(seconds, 0.1), 60.0)
+        logger.info(f"开始 CPU 分析，时长 {duration} 秒")
+        return await asyncio.get_running_loop().run_in_executor(None, profiler.run, duration)
+
+
+@router.post("/profile/memory", dependencies=[Depends(require_admin)])
+async def profile_memory(top: int = 20, frames: int = 1):
+    """
+    获取内存分配最多的代码位置，首次调用开始跟踪，之后的调用同时返回与上次相比的增长
+
+    Args:
+        top: 返回的条目数量
+        frames: 开始跟踪时每次分配记录的栈帧数量
+    """
+    global _last_memory_snapshot
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(frames, 1))
+        _last_memory_snapshot = None
+        logger.info("已开始内存分配跟踪")
+        return {"tracing": True, "started": True}
+
+    result = memory_snapshot(min(max(top, 1), 200), _last_memory_snapshot)
+    _last_memory_snapshot = result.pop("snapshot")
+    return dict(result, tracing=True, started=False)
+
+
+@router.delete("/profile/memory", dependencies=[Depends(require_admin)])
+async def stop_profile_memory():
+    """停止内存分配跟踪并释放快照"""
+    global _last_memory_snapshot
+
+    _last_memory_snapshot = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        logger.info("已停止内存分配跟踪")
+    return {"tracing": False}
+
+
+@router.get("/tasks", dependencies=[Depends(require_admin)])
+async def asyncio_tasks(limit: int = 20):
+    """
+    转储当前工作进程的所有 asyncio 任务及其调用栈
+
+    Args:
+        limit: 每个任务最多记录的栈帧数量
+    """
+    tasks = dump_tasks(min(max(limit, 1), 100))
+    return {"count": len(tasks), "tasks": tasks}
+
+
+@router.get("/event-loop", dependencies=[Depends(require_admin)])
+async def event_loop_blocks():
+    """获取最近检测到的事件循环阻塞及其调用栈"""
+    return {
+        "threshold": event_loop_watchdog.threshold,
+        "blocked_count": event_loop_watchdog.blocked_count,
+        "events": event_loop_watchdog.recent()
+    }
+
+
+@router.get("/stats", dependencies=[Depends(require_admin)])
+async def runtime_stats():
+    """获取准入控制、评审调度和 GitHub 客户端的运行指标"""
+    return {
+        "admission": admission_controller.metrics(),
+        "review_scheduler": review_scheduler.metrics(),
+        "github": github_client.metrics()
+    }
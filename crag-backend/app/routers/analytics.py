@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Request
+from starlette.concurrency import run_in_threadpool
+from app.routers.findings import require_repo_access
+from app.services.analytics_service import analytics_service
+import logging
+
+# 设置日志
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/rules")
+async def rule_trends(request: Request, repo: str, days: int = 30, severity: str = None):
+    """
+    各规则每天的问题数量趋势
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        days: 统计最近多少天
+        severity: 严重程度过滤
+    """
+    await require_repo_access(request, repo)
+    return await run_in_threadpool(analytics_service.rule_trends, repo, min(max(days, 1), 365), severity)
+
+
+@router.get("/latency")
+async def review_latency(request: Request, repo: str, days: int = 30):
+    """
+    每天的评审次数和平均评审耗时
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        days: 统计最近多少天
+    """
+    await require_repo_access(request, repo)
+    return await run_in_threadpool(analytics_service.review_latency, repo, min(max(days, 1), 365))
+
+
+@router.get("/pr-sizes")
+async def pr_sizes(request: Request, repo: str, days: int = 90):
+    """
+    PR 规模分布
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        days: 统计最近多少天
+    """
+    await require_repo_access(request, repo)
+    return await run_in_threadpool(analytics_service.pr_sizes, repo, min(max(days, 1), 365))
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import RedirectResponse
+from app.core.container import container
 from app.core.session import session_manager
 
 router = APIRouter()
@@ -16,6 +17,11 @@ async def logout(request: Request):
     session_id = session_manager.get_session_id(request)
     
     if session_id:
+        # 释放按令牌缓存的服务实例
+        access_token = session_manager.get_session_data(session_id).get("github", {}).get("access_token")
+        if access_token:
+            container.invalidate_token(access_token)
+
         # 删除会话
         session_manager.delete_session(session_id)
     
@@ -35,15 +41,7 @@ async def get_current_user(request: Request):
     Args:
         request: FastAPI请求对象
     """
-    # 获取会话ID
-    session_id = session_manager.get_session_id(request)
-    
-    if not session_id:
-        return {"authenticated": False}
-    
-    # 获取会话数据
-    session_data = session_manager.get_session_data(session_id)
-    user = session_data.get("user")
+    user = session_manager.get_user(request)
     
     if not user:
         return {"authenticated": False}
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Request, HTTPException, Body
+from typing import Any, Dict, List, Tuple
+from app.routers.findings import require_repo_access
+from app.services.code_index import code_index_service
+from app.services.code_search import code_search_service
+import logging
+
+# 设置日志
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def split_repo(repo: str) -> Tuple[str, str]:
+    """
+    拆分仓库全名
+
+    Args:
+        repo: 仓库全名 owner/repo
+
+    Returns:
+        (所有者, 仓库名称)
+
+    Raises:
+        HTTPException: 格式不正确时
+    """
+    owner, _, name = repo.strip().partition("/")
+    if not owner or not name or "/" in name:
+        raise HTTPException(status_code=400, detail="repo 必须是 owner/repo 格式")
+    return owner, name
+
+
+@router.get("/search")
+async def search_code(request: Request, repo: str, q: str, k: int = 10, mode: str = "semantic"):
+    """
+    在仓库已索引的代码中检索，索引在每次评审后同步到 PR 的最新 head
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        q: 查询文本
+        k: 返回的结果数
+        mode: semantic 使用向量检索，keyword 使用 BM25 关键词检索
+    """
+    if mode not in ("semantic", "keyword"):
+        raise HTTPException(status_code=400, detail="mode 必须是 semantic 或 keyword")
+    owner, name = split_repo(repo)
+    await require_repo_access(request, repo)
+
+    k = min(max(k, 1), 50)
+    if mode == "keyword":
+        hits = await code_search_service.search(owner, name, q, k)
+    else:
+        hits = (await code_index_service.search(owner, name, [q], k))[0]
+    return {"hits": [hit.to_dict() for hit in hits]}
+
+
+@router.get("/usages")
+async def find_usages(request: Request, repo: str, identifier: str, limit: int = 200):
+    """
+    查找标识符在仓库中的全部用法
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        identifier: 标识符
+        limit: 最多返回的片段数
+    """
+    owner, name = split_repo(repo)
+    await require_repo_access(request, repo)
+
+    hits = await code_search_service.usages(owner, name, identifier, min(max(limit, 1), 500))
+    return {"usages": [hit.to_dict() for hit in hits]}
+
+
+@router.post("/context")
+async def hunk_context(
+        request: Request,
+        repo: str = Body(...),
+        hunks: List[Dict[str, Any]] = Body(...),
+        k: int = Body(5)
+):
+    """
+    为每个变更块检索仓库中的相关代码，排除与变更块本身重叠的片段
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        hunks: 变更块列表，每项包含 path、start_line、end_line、text
+        k: 每个变更块返回的结果数
+    """
+    owner, name = split_repo(repo)
+    await require_repo_access(request, repo)
+
+    if len(hunks) > 100:
+        raise HTTPException(status_code=400, detail="一次最多查询 100 个变更块")
+    try:
+        queries = [(item["path"], int(item["start_line"]), int(item["end_line"]), item["text"]) for item in hunks]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="变更块必须包含 path、start_line、end_line、text")
+
+    contexts = await code_index_service.context_for_hunks(owner, name, queries, min(max(k, 1), 20))
+    return {"contexts": [[hit.to_dict() for hit in hits] for hits in contexts]}
@@ -0,0 +1,119 @@
+from fastapi import APIRouter, Request, HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.core.container import RequestAuth, container
+from app.routers.github import require_access_token
+from app.services.findings_service import finding_store
+from app.services.github_repos_service import GitHubApiError
+from app.services.github_snapshot_service import snapshot_service
+import logging
+
+# 设置日志
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+async def require_repo_access(request: Request, repo: str) -> None:
+    """
+    校验当前登录用户可以访问指定仓库
+
+    仓库列表来自用户快照缓存，不会为每次查询访问 GitHub。
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+
+    Raises:
+        HTTPException: 未登录或无权访问仓库时
+    """
+    auth = container.resolve(RequestAuth, request)
+    require_access_token(auth)
+
+    try:
+        snapshot = await snapshot_service.get_snapshot(auth.user_id, auth.access_token)
+    except GitHubApiError as e:
+        logger.error(f"获取仓库列表失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取仓库列表失败: {str(e)}")
+
+    repo_name = repo.lower()
+    if not any((item.get("full_name") or "").lower() == repo_name for item in snapshot.repos):
+        raise HTTPException(status_code=404, detail="仓库不存在或无权访问")
+
+
+@router.get("")
+async def list_findings(
+        request: Request,
+        repo: str,
+        pr: int = None,
+        rule: str = None,
+        severity: str = None,
+        path: str = None,
+        run_id: int = None,
+        cursor: int = None,
+        limit: int = 50
+):
+    """
+    分页查询仓库的历史评审问题
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        pr: PR 编号
+        rule: 规则
+        severity: 严重程度
+        path: 文件路径
+        run_id: 评审运行 ID
+        cursor: 上一页返回的 next_cursor
+        limit: 每页数量
+    """
+    await require_repo_access(request, repo)
+
+    page = await run_in_threadpool(
+        finding_store.query,
+        repo,
+        pr_number=pr,
+        rule=rule,
+        severity=severity,
+        path=path,
+        run_id=run_id,
+        cursor=cursor,
+        limit=min(max(limit, 1), 200)
+    )
+
+    return {
+        "findings": page.items,
+        "next_cursor": page.next_cursor
+    }
+
+
+@router.get("/runs")
+async def list_runs(
+        request: Request,
+        repo: str,
+        pr: int = None,
+        cursor: int = None,
+        limit: int = 20
+):
+    """
+    分页查询仓库的评审运行记录
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        pr: PR 编号
+        cursor: 上一页返回的 next_cursor
+        limit: 每页数量
+    """
+    await require_repo_access(request, repo)
+
+    page = await run_in_threadpool(
+        finding_store.list_runs,
+        repo,
+        pr_number=pr,
+        cursor=cursor,
+        limit=min(max(limit, 1), 100)
+    )
+
+    return {
+        "runs": page.items,
+        "next_cursor": page.next_cursor
+    }
@@ -1,52 +1,42 @@
-from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi import APIRouter, Request, HTTPException, Depends, Body
+from typing import List
 from fastapi.responses import RedirectResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from app.services.github_oauth_service import GitHubOAuthService
-from app.services.github_repos_service import GithubReposService, create_repos_service, GitHubApiError, RateLimitExceededError
+from app.services.github_repos_service import GithubReposService, GitHubApiError, RateLimitExceededError
+from app.services.github_snapshot_service import snapshot_service, query_repos
+from app.services.repo_details_service import normalize_names, repo_details_service
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.container import RequestAuth, container
+from app.core.deadline import DeadlineExceeded
 from app.core.session import session_manager
-from app.core.service_provider import service_provider
-from app.core.service_context import service_context
+from app.util.config import get_value
 import logging
 
 # 设置日志
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# 依赖函数，用于获取 GitHubOAuthService 实例
-def get_github_service() -> GitHubOAuthService:
-    """
-    获取 GitHubOAuthService 实例
-    
-    Returns:
-        GitHubOAuthService 实例
-    """
-    # 优先从服务上下文获取
-    if service_context:
-        return service_context.get(GitHubOAuthService)
-    
-    # 如果服务上下文不可用，则从服务提供者获取
-    return service_provider.get(GitHubOAuthService)
+# 依赖函数
+get_github_service = container.provide(GitHubOAuthService)
+get_request_auth = container.provide(RequestAuth)
+get_repos_service = container.provide(GithubReposService)
 
-
-# 添加依赖项函数
-def get_repos_service(request: Request):
+def require_access_token(auth: RequestAuth) -> None:
     """
-    获取 GitHub 仓库服务实例
+    校验当前请求已登录且持有 GitHub 访问令牌
 
     Args:
-        request: FastAPI 请求对象
+        auth: 当前请求的认证信息
 
-    Returns:
-        GithubReposService 实例
+    Raises:
+        HTTPException: 未登录或没有访问令牌时
     """
-    session_id = session_manager.get_session_id(request)
-    if not session_id:
-        return create_repos_service()
-
-    session_data = session_manager.get_session_data(session_id)
-    github_data = session_data.get("github", {})
-    access_token = github_data.get("access_token")
+    if not auth.session_id:
+        raise HTTPException(status_code=401, detail="未登录，请先登录")
+    if not auth.access_token:
+        raise HTTPException(status_code=401, detail="未找到有效的GitHub令牌，请重新登录")
 
-    return create_repos_service(access_token)
 
 @router.get("/login")
 async def github_login(request: Request, github_service: GitHubOAuthService = Depends(get_github_service)):
@@ -54,8 +44,8 @@ async def github_login(request: Request, github_service: GitHubOAuthService = De
     重定向到GitHub授权页面
     """
 
-    # 生成状态并存储重定向URL
-    state = github_service.generate_state()
+    # 生成状态并存储重定向URL，数据库模式下状态值写入是同步的数据库调用，放到线程池中执行
+    state = await run_in_threadpool(github_service.generate_state)
     
     # 创建或获取会话
     session_id = session_manager.get_session_id(request)
@@ -102,9 +92,9 @@ async def github_callback(
         # 获取会话数据
         session_data = session_manager.get_session_data(session_id)
 
-        # 验证状态
+        # 验证状态，状态值必须与会话一致且未被使用过
         stored_state = session_data.get("oauth_state")
-        if not state or state != stored_state:
+        if not state or state != stored_state or not await run_in_threadpool(github_service.validate_state, state):
             raise HTTPException(status_code=400, detail="无效的状态参数")
 
         # 获取登录后重定向URL
@@ -146,6 +136,7 @@ async def github_callback(
 
         # 设置会话Cookie
         session_manager.set_session_cookie(response, session_id)
+        session_manager.set_claims_cookie(response, session_manager.get_session_data(session_id)["user"])
 
         return response
 
@@ -155,6 +146,9 @@ async def github_callback(
             status_code=e.status_code,
             content={"error": e.detail}
         )
+    except (DeadlineExceeded, CircuitOpenError):
+        # 交给中间件返回 504/503
+        raise
     except Exception as e:
         logger.error(f"GitHub OAuth未知错误: {str(e)}")
         return JSONResponse(
@@ -172,11 +166,14 @@ async def github_repos(
         per_page: int = 30,
         page: int = 1,
         visibility: str = "all",
-        repos_service=Depends(get_repos_service)
+        refresh: bool = False,
+        auth: RequestAuth = Depends(get_request_auth)
 ):
     """
     获取已登录用户的仓库列表
 
+    仓库列表来自用户快照缓存，快照过期时先返回旧数据并在后台刷新。
+
     Args:
         request: FastAPI 请求对象
         sort: 排序字段
@@ -184,62 +181,25 @@ async def github_repos(
         per_page: 每页结果数量
         page: 页码
         visibility: 可见性过滤
-        repos_service: GitHub 仓库服务实例
+        refresh: 是否强制从 GitHub 刷新快照
+        auth: 当前请求的认证信息
     """
-    # 获取会话ID
-    session_id = session_manager.get_session_id(request)
-    if not session_id:
-        raise HTTPException(status_code=401, detail="未登录，请先登录")
-
-    # 获取会话数据
-    session_data = session_manager.get_session_data(session_id)
-    github_data = session_data.get("github", {})
-    access_token = github_data.get("access_token")
-
-    if not access_token:
-        raise HTTPException(status_code=401, detail="未找到有效的GitHub令牌，请重新登录")
-
-    # 确保服务有正确的访问令牌
-    repos_service.set_access_token(access_token)
+    require_access_token(auth)
 
     try:
-        # 获取仓库列表
-        repos = await repos_service.get_authenticated_user_repos(
-            sort=sort,
-            direction=direction,
-            per_page=per_page,
-            page=page,
-            visibility=visibility
-        )
+        # 获取用户快照
+        snapshot = await snapshot_service.get_snapshot(auth.user_id, auth.access_token, force_refresh=refresh)
 
-        # 处理响应数据，只返回需要的字段
-        simplified_repos = []
-        for repo in repos:
-            simplified_repos.append({
-                "id": repo.get("id"),
-                "name": repo.get("name"),
-                "full_name": repo.get("full_name"),
-                "description": repo.get("description"),
-                "html_url": repo.get("html_url"),
-                "language": repo.get("language"),
-                "stargazers_count": repo.get("stargazers_count"),
-                "forks_count": repo.get("forks_count"),
-                "visibility": repo.get("visibility"),
-                "default_branch": repo.get("default_branch"),
-                "created_at": repo.get("created_at"),
-                "updated_at": repo.get("updated_at"),
-                "pushed_at": repo.get("pushed_at"),
-                "owner": {
-                    "login": repo.get("owner", {}).get("login"),
-                    "avatar_url": repo.get("owner", {}).get("avatar_url")
-                }
-            })
+        # 在快照中过滤、排序并分页
+        repos = query_repos(snapshot.repos, sort=sort, direction=direction, visibility=visibility)
+        start = max(page - 1, 0) * per_page
 
         return {
-            "repos": simplified_repos,
+            "repos": repos[start:start + per_page],
             "page": page,
             "per_page": per_page,
-            "total": len(simplified_repos)  # 注意：这不是总数，只是当前页的数量
+            "total": len(repos),
+            "fetched_at": snapshot.fetched_at
         }
 
     except RateLimitExceededError as e:
@@ -253,11 +213,91 @@ async def github_repos(
         logger.error(f"获取仓库列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取仓库列表失败: {str(e)}")
 
+    except (DeadlineExceeded, CircuitOpenError):
+        raise
+
     except Exception as e:
         logger.exception(f"未知错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
 
 
+@router.get("/repos/search")
+async def github_repos_search(
+        request: Request,
+        q: str = "",
+        language: str = None,
+        visibility: str = None,
+        limit: int = 20,
+        auth: RequestAuth = Depends(get_request_auth)
+):
+    """
+    在本地索引中搜索已登录用户的仓库，不访问 GitHub
+
+    Args:
+        request: FastAPI 请求对象
+        q: 查询串，匹配仓库名称前缀或名称/描述子串
+        language: 语言过滤
+        visibility: 可见性过滤
+        limit: 最多返回的结果数量
+        auth: 当前请求的认证信息
+    """
+    require_access_token(auth)
+
+    try:
+        index = await snapshot_service.get_search_index(auth.user_id, auth.access_token)
+        return index.search(q, language=language, visibility=visibility, limit=min(max(limit, 1), 100))
+
+    except RateLimitExceededError as e:
+        logger.error(f"GitHub API 速率限制: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=f"GitHub API 速率限制已达到，请稍后再试: {str(e)}"
+        )
+
+    except GitHubApiError as e:
+        logger.error(f"搜索仓库失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"搜索仓库失败: {str(e)}")
+
+
+@router.post("/repos/batch")
+async def github_repos_batch(
+        request: Request,
+        repos: List[str] = Body(..., embed=True),
+        refresh: bool = False,
+        auth: RequestAuth = Depends(get_request_auth),
+        repos_service: GithubReposService = Depends(get_repos_service)
+):
+    """
+    批量获取仓库详情，单个仓库失败时在对应条目中返回错误
+
+    Args:
+        request: FastAPI 请求对象
+        repos: 仓库全名列表 owner/repo
+        refresh: 是否忽略缓存
+        auth: 当前请求的认证信息
+        repos_service: 当前用户的 GitHub 仓库服务
+    """
+    require_access_token(auth)
+
+    names = normalize_names(repos)
+    max_repos = int(get_value("REPO_BATCH_MAX", 100))
+    if len(names) > max_repos:
+        raise HTTPException(status_code=400, detail=f"一次最多查询 {max_repos} 个仓库")
+
+    results = await repo_details_service.get_many(
+        repos_service,
+        auth.user_id,
+        auth.access_token,
+        names,
+        refresh=refresh
+    )
+    return {
+        "repos": results,
+        "total": len(results),
+        "failed": sum(1 for item in results if item["error"])
+    }
+
+
 @router.get("/pullrequest")
 async  def github_pull_request(request):
     pass
@@ -0,0 +1,145 @@
+from fastapi import APIRouter, Request, HTTPException, Depends, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.core.container import RequestAuth, container
+from app.core.pubsub import END_EVENT, Event
+from app.routers.admin import require_admin
+from app.routers.github import require_access_token
+from app.services.github_pull_request_service import create_pull_request_service
+from app.services.github_repos_service import GitHubApiError, RateLimitExceededError, RepoNotFoundError
+from app.services.review_pipeline import submit_review
+from app.services.review_progress import review_events, topic_for
+from app.services.review_scheduler import QueueFullError, review_scheduler
+from app.util.config import get_value
+import json
+import logging
+
+# 设置日志
+logger = logging.getLogger(__name__)
+router = APIRouter()
+get_request_auth = container.provide(RequestAuth)
+
+# 无事件时发送心跳注释的间隔（秒），防止代理断开空闲连接
+KEEPALIVE_INTERVAL = float(get_value("SSE_KEEPALIVE_INTERVAL", 15))
+
+
+def format_event(event: Event) -> str:
+    """
+    将事件编码为 SSE 消息
+
+    Args:
+        event: 事件
+
+    Returns:
+        SSE 消息文本
+    """
+    data = json.dumps(event.data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+@router.post("", status_code=202)
+async def request_review(
+        request: Request,
+        repo: str = Body(...),
+        number: int = Body(...),
+        interactive: bool = Body(False),
+        auth: RequestAuth = Depends(get_request_auth)
+):
+    """
+    提交 PR 评审任务，任务在评审调度器中排队执行，进度通过 GET /reviews/{job_id}/events 订阅
+
+    Args:
+        request: FastAPI 请求对象
+        repo: 仓库全名 owner/repo
+        number: PR 编号
+        interactive: 是否为用户主动发起的重新评审，只有已评审过的 PR 进入最高优先级通道，否则按 PR 大小分配通道
+        auth: 当前请求的认证信息
+    """
+    require_access_token(auth)
+
+    owner, _, name = repo.strip().partition("/")
+    if not owner or not name or "/" in name:
+        raise HTTPException(status_code=400, detail="repo 必须是 owner/repo 格式")
+
+    try:
+        job, progress = await submit_review(
+            create_pull_request_service(auth.access_token), owner, name, number,
+            user_id=auth.user_id, interactive=interactive
+        )
+    except QueueFullError as e:
+        logger.warning(f"评审任务被拒绝 {repo}#{number}: {str(e)}")
+        return JSONResponse(
+            status_code=503,
+            content={"error": "评审队列已满，请稍后再试"},
+            headers={"Retry-After": str(int(get_value("REVIEW_QUEUE_RETRY_AFTER", 30)))}
+        )
+    except RateLimitExceededError as e:
+        logger.error(f"GitHub API 速率限制: {str(e)}")
+        raise HTTPException(status_code=429, detail=f"GitHub API 速率限制已达到，请稍后再试: {str(e)}")
+    except RepoNotFoundError:
+        raise HTTPException(status_code=404, detail="PR 不存在或无权访问")
+    except GitHubApiError as e:
+        logger.error(f"获取 PR 信息失败: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"获取 PR 信息失败: {str(e)}")
+
+    return {"job_id": progress.job_id, "repo": job.repo, "number": job.number, "lane": job.lane}
+
+
+@router.get("/scheduler/metrics", dependencies=[Depends(require_admin)])
+async def review_scheduler_metrics():
+    """
+    获取评审调度器的队列深度和等待时间指标，包含仓库和租户名称，只对管理员开放
+    """
+    return review_scheduler.metrics()
+
+
+@router.get("/{job_id}/events")
+async def review_event_stream(request: Request, job_id: str, auth: RequestAuth = Depends(get_request_auth)):
+    """
+    以 Server-Sent Events 推送评审进度、逐文件的问题和最终汇总
+
+    断线重连时浏览器会带上 Last-Event-ID，只补发之后的事件。事件只保存在创建评审的工作进程中，
+    多进程部署时该请求必须到达同一进程，见 app.core.pubsub。
+
+    Args:
+        request: FastAPI 请求对象
+        job_id: 评审任务 ID
+        auth: 当前请求的认证信息
+    """
+    if not auth.user:
+        raise HTTPException(status_code=401, detail="未登录，请先登录")
+
+    user_id = auth.user_id
+
+    topic = topic_for(job_id)
+    entry = review_events.get_topic(topic)
+    if entry is None or entry.metadata.get("owner_id") != user_id:
+        raise HTTPException(status_code=404, detail="评审任务不存在")
+
+    last_event_id = request.headers.get("last-event-id")
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    async def stream():
+        with review_events.subscribe(topic, last_event_id) as subscription:
+            dropped = 0
+            while True:
+                event = await subscription.get(timeout=KEEPALIVE_INTERVAL)
+                if subscription.dropped > dropped:
+                    # 客户端消费过慢，告知其部分进度事件被跳过
+                    yield f"event: lagged\ndata: {subscription.dropped - dropped}\n\n"
+                    dropped = subscription.dropped
+
+                if event is None:
+                    if subscription.closed or await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield format_event(event)
+                if event.type == END_EVENT:
+                    break
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
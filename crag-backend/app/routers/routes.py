@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.routers import auth, github
+from app.routers import admin, analytics, auth, code, findings, github, reviews
 
 # 创建主路由
 router = APIRouter()
@@ -17,3 +17,38 @@ router.include_router(
     prefix="/auth/github",
     tags=["github"]
 )
+
+# 注册评审问题路由
+router.include_router(
+    findings.router,
+    prefix="/findings",
+    tags=["findings"]
+)
+
+# 注册仓库统计路由
+router.include_router(
+    analytics.router,
+    prefix="/analytics",
+    tags=["analytics"]
+)
+
+# 注册评审进度路由
+router.include_router(
+    reviews.router,
+    prefix="/reviews",
+    tags=["reviews"]
+)
+
+# 注册代码检索路由
+router.include_router(
+    code.router,
+    prefix="/code",
+    tags=["code"]
+)
+
+# 注册运行时诊断路由
+router.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["admin"]
+)
@@ -0,0 +1,270 @@
+"""
+仓库统计服务，在评审运行完成时增量更新汇总表，统计接口只读取汇总表
+"""
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app.model.database import Base, session_scope
+from app.model.finding import ReviewRun, normalize_repo
+from app.model.rollup import PrSizeDailyRollup, RuleDailyRollup, RunDailyRollup
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+# PR 规模分桶：(桶名, 变更行数上限)
+PR_SIZE_BUCKETS: List[Tuple[str, Optional[int]]] = [
+    ("XS", 10),
+    ("S", 50),
+    ("M", 250),
+    ("L", 1000),
+    ("XL", None),
+]
+
+
+def day_of(timestamp: float) -> int:
+    """
+    计算时间戳对应的 UTC 天数
+
+    Args:
+        timestamp: Unix 时间戳
+
+    Returns:
+        自 1970-01-01 起的天数
+    """
+    return int(timestamp // SECONDS_PER_DAY)
+
+
+def day_label(day: int) -> str:
+    """
+    将天数转换为 ISO 日期
+
+    Args:
+        day: 自 1970-01-01 起的天数
+
+    Returns:
+        YYYY-MM-DD 格式的日期
+    """
+    return datetime.fromtimestamp(day * SECONDS_PER_DAY, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def size_bucket(changed_lines: int) -> str:
+    """
+    获取 PR 规模所在的分桶
+
+    Args:
+        changed_lines: 新增与删除的总行数
+
+    Returns:
+        桶名
+    """
+    for name, upper in PR_SIZE_BUCKETS:
+        if upper is None or changed_lines < upper:
+            return name
+    return PR_SIZE_BUCKETS[-1][0]
+
+
+def _increment(session: Session, model: Type[Base], keys: Dict[str, Any], amounts: Dict[str, Any]) -> None:
+    """
+    对汇总表中的一行做累加，行不存在时插入
+
+    SQLite 和 PostgreSQL 使用 INSERT ... ON CONFLICT DO UPDATE 原子累加，
+    其他数据库先尝试 UPDATE，未命中再 INSERT。
+    """
+    dialect = session.get_bind().dialect.name
+    columns = model.__table__.c
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        statement = dialect_insert(model).values(**keys, **amounts)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: columns[name] + statement.excluded[name] for name in amounts}
+        )
+        session.execute(statement)
+        return
+
+    conditions = [columns[name] == value for name, value in keys.items()]
+    result = session.execute(
+        update(model).where(*conditions).values({name: columns[name] + value for name, value in amounts.items()})
+    )
+    if result.rowcount == 0:
+        session.execute(insert(model).values(**keys, **amounts))
+
+
+def record_run_rollups(
+        session: Session,
+        run: ReviewRun,
+        findings: Iterable[Dict[str, Any]],
+        finished_at: float,
+        requested_at: Optional[float] = None,
+        changed_lines: Optional[int] = None
+) -> None:
+    """
+    将一次完成的评审运行累加到汇总表，与写入问题在同一个事务中执行
+
+    Args:
+        session: 数据库会话
+        run: 评审运行记录
+        findings: 本次写入的问题行
+        finished_at: 完成时间
+        requested_at: 评审请求时间，未提供时使用运行开始时间计算耗时
+        changed_lines: PR 新增与删除的总行数
+    """
+    day = day_of(finished_at)
+
+    counts = Counter((row["rule"], row["severity"]) for row in findings)
+    for (rule, severity), count in counts.items():
+        _increment(session, RuleDailyRollup,
+                   {"repo": run.repo, "day": day, "rule": rule, "severity": severity},
+                   {"count": count})
+
+    latency = max(finished_at - (requested_at or run.started_at), 0.0)
+    _increment(session, RunDailyRollup,
+               {"repo": run.repo, "day": day},
+               {"run_count": 1, "finding_count": sum(counts.values()), "latency_sum": latency})
+
+    if changed_lines is None:
+        return
+
+    # 同一个 PR 只在首次完成评审时计入规模分布
+    earlier = session.scalar(
+        select(ReviewRun.id)
+        .where(ReviewRun.repo == run.repo, ReviewRun.pr_number == run.pr_number,
+               ReviewRun.id != run.id, ReviewRun.status == "completed")
+        .limit(1)
+    )
+    if earlier is None:
+        _increment(session, PrSizeDailyRollup,
+                   {"repo": run.repo, "day": day, "bucket": size_bucket(changed_lines)},
+                   {"count": 1})
+
+
+def _day_range(days: int) -> Tuple[int, int]:
+    """最近 days 天（含今天）的起止天数"""
+    today = day_of(time.time())
+    return today - max(days, 1) + 1, today
+
+
+class AnalyticsService:
+    """
+    仓库统计查询
+
+    所有查询只扫描汇总表中时间范围内的行，开销与时间桶数量成正比，与问题总数无关。
+    """
+
+    def rule_trends(self, repo: str, days: int = 30, severity: Optional[str] = None) -> Dict[str, Any]:
+        """
+        各规则每天的问题数量
+
+        Args:
+            repo: 仓库全名 owner/repo
+            days: 统计最近多少天
+            severity: 严重程度过滤
+
+        Returns:
+            包含日期序列和各规则计数序列的字典
+        """
+        start, end = _day_range(days)
+        statement = select(RuleDailyRollup).where(
+            RuleDailyRollup.repo == normalize_repo(repo), RuleDailyRollup.day.between(start, end)
+        )
+        if severity:
+            statement = statement.where(RuleDailyRollup.severity == severity)
+
+        with session_scope() as session:
+            rows = session.scalars(statement).all()
+
+        series: Dict[str, List[int]] = defaultdict(lambda: [0] * (end - start + 1))
+        totals: Counter = Counter()
+        for row in rows:
+            series[row.rule][row.day - start] += row.count
+            totals[row.rule] += row.count
+
+        return {
+            "days": [day_label(day) for day in range(start, end + 1)],
+            "rules": [
+                {"rule": rule, "total": total, "counts": series[rule]}
+                for rule, total in totals.most_common()
+            ]
+        }
+
+    def review_latency(self, repo: str, days: int = 30) -> Dict[str, Any]:
+        """
+        每天的评审次数、问题数量和平均评审耗时
+
+        Args:
+            repo: 仓库全名 owner/repo
+            days: 统计最近多少天
+
+        Returns:
+            包含每日统计和整体平均耗时的字典
+        """
+        start, end = _day_range(days)
+        statement = select(RunDailyRollup).where(
+            RunDailyRollup.repo == normalize_repo(repo), RunDailyRollup.day.between(start, end)
+        ).order_by(RunDailyRollup.day)
+
+        with session_scope() as session:
+            rows = session.scalars(statement).all()
+
+        run_count = sum(row.run_count for row in rows)
+        latency_sum = sum(row.latency_sum for row in rows)
+        return {
+            "days": [
+                {
+                    "day": day_label(row.day),
+                    "runs": row.run_count,
+                    "findings": row.finding_count,
+                    "mean_latency": row.latency_sum / row.run_count if row.run_count else None
+                }
+                for row in rows
+            ],
+            "runs": run_count,
+            "mean_latency": latency_sum / run_count if run_count else None
+        }
+
+    def pr_sizes(self, repo: str, days: int = 90) -> Dict[str, Any]:
+        """
+        首次评审的 PR 规模分布
+
+        Args:
+            repo: 仓库全名 owner/repo
+            days: 统计最近多少天
+
+        Returns:
+            各分桶的 PR 数量
+        """
+        start, end = _day_range(days)
+        statement = select(PrSizeDailyRollup).where(
+            PrSizeDailyRollup.repo == normalize_repo(repo), PrSizeDailyRollup.day.between(start, end)
+        )
+
+        with session_scope() as session:
+            rows = session.scalars(statement).all()
+
+        counts: Counter = Counter()
+        for row in rows:
+            counts[row.bucket] += row.count
+
+        return {
+            "buckets": [
+                {"bucket": name, "max_lines": upper, "count": counts[name]}
+                for name, upper in PR_SIZE_BUCKETS
+            ],
+            "total": sum(counts.values())
+        }
+
+
+# 创建全局统计服务
+analytics_service = AnalyticsService()
@@ -0,0 +1,361 @@
+"""
+内容寻址的本地文件存储，评审期间所有分析器通过 mmap 共享同一份文件内容
+"""
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, Optional
+
+from app.core.singleflight import SingleFlight
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStoreError(Exception):
+    """blob 内容与 SHA 不符或无法读取"""
+    pass
+
+
+def git_blob_sha(content: bytes) -> str:
+    """
+    计算与 git 一致的 blob SHA
+
+    Args:
+        content: 文件内容
+
+    Returns:
+        40 位十六进制 SHA-1
+    """
+    header = f"blob {len(content)}\0".encode()
+    return hashlib.sha1(header + content).hexdigest()
+
+
+class Blob:
+    """
+    通过 mmap 打开的只读文件内容
+
+    行偏移表在首次按行访问时计算一次，之后按行切片只返回 memoryview，不复制数据。
+    """
+
+    def __init__(self, sha: str, path: str):
+        """
+        打开文件并建立内存映射
+
+        Args:
+            sha: blob SHA
+            path: 磁盘上的文件路径
+        """
+        self.sha = sha
+        self.size = os.path.getsize(path)
+        self._file = open(path, "rb")
+        # 空文件无法 mmap
+        self._mmap: Optional[mmap.mmap] = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        )
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b"")
+        self._line_offsets: Optional[array] = None
+        # 借用计数，由 BlobStore 在锁内维护；被淘汰时仍有借用则等最后一个归还后再关闭
+        self.refs = 0
+        self.evicted = False
+
+    @property
+    def data(self) -> memoryview:
+        """整个文件内容的只读视图"""
+        return self._view
+
+    def _offsets(self) -> array:
+        """每一行起始位置的偏移表，最后追加文件末尾位置"""
+        if self._line_offsets is None:
+            offsets = array("Q", [0])
+            if self._mmap is not None:
+                position = self._mmap.find(b"\n")
+                while position != -1:
+                    offsets.append(position + 1)
+                    position = self._mmap.find(b"\n", position + 1)
+            if offsets[-1] != self.size:
+                offsets.append(self.size)
+            self._line_offsets = offsets
+        return self._line_offsets
+
+    @property
+    def line_count(self) -> int:
+        """文件行数"""
+        return len(self._offsets()) - 1
+
+    def lines(self, start: int, end: Optional[int] = None) -> memoryview:
+        """
+        获取行区间的只读视图
+
+        Args:
+            start: 起始行（从 1 开始，包含）
+            end: 结束行（包含），默认为文件末尾
+
+        Returns:
+            行区间对应的 memoryview
+        """
+        offsets = self._offsets()
+        count = len(offsets) - 1
+        start = min(max(start, 1), count + 1)
+        end = count if end is None else min(max(end, start - 1), count)
+        return self._view[offsets[start - 1]:offsets[end]]
+
+    def text(self, start: int = 1, end: Optional[int] = None, encoding: str = "utf-8") -> str:
+        """
+        将行区间解码为字符串，只在真正需要字符串时调用
+
+        Args:
+            start: 起始行
+            end: 结束行
+            encoding: 文本编码
+
+        Returns:
+            解码后的文本
+        """
+        return str(self.lines(start, end), encoding, errors="replace")
+
+    def close(self) -> None:
+        """释放内存映射和文件句柄，仍有外部切片引用时 mmap.close 会抛出 BufferError"""
+        self._view.release()
+        self._file.close()
+        if self._mmap is not None:
+            self._mmap.close()
+
+
+class BlobStore:
+    """
+    内容寻址的本地文件存储
+
+    文件按 SHA 前两位分片存放在 root 目录下，写入先落到临时文件再原子重命名，
+    多个工作进程可以安全地并发写入同一个 blob。已打开的 Blob 按 LRU 保留，
+    超出上限时关闭最久未使用的映射，进程常驻内存由操作系统页缓存统一管理。
+
+    跨 await 或在工作线程中使用的 Blob 必须通过 borrow/pin 借用，被淘汰的 Blob
+    在最后一个借用者归还后才关闭。
+    """
+
+    def __init__(self, root: Optional[str] = None, max_open: int = 256):
+        """
+        初始化存储
+
+        Args:
+            root: 存储根目录，默认读取 BLOB_STORE_DIR
+            max_open: 同时保持打开的 Blob 数量上限
+        """
+        if root is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            root = get_value("BLOB_STORE_DIR", os.path.join(base_dir, "data", "blobs"))
+        self.root = root
+        self.max_open = max_open
+        self.open_blobs: "OrderedDict[str, Blob]" = OrderedDict()
+        self.flights = SingleFlight()
+        # 借用和归还可能发生在工作线程中
+        self.lock = threading.Lock()
+
+    def path_for(self, sha: str) -> str:
+        """
+        计算 blob 在磁盘上的路径
+
+        Args:
+            sha: blob SHA
+
+        Returns:
+            文件路径
+        """
+        return os.path.join(self.root, sha[:2], sha[2:])
+
+    def contains(self, sha: str) -> bool:
+        """
+        判断 blob 是否已存储
+
+        Args:
+            sha: blob SHA
+
+        Returns:
+            是否存在
+        """
+        return sha in self.open_blobs or os.path.exists(self.path_for(sha))
+
+    def put(self, content: bytes, sha: Optional[str] = None) -> str:
+        """
+        存储文件内容，已存在时直接返回
+
+        Args:
+            content: 文件内容
+            sha: 已知的 blob SHA（例如来自 GitHub API），未提供时计算
+
+        Returns:
+            blob SHA
+
+        Raises:
+            BlobStoreError: 内容与提供的 SHA 不符时（例如下载被截断），不写入存储
+        """
+        verified = sha is None
+        if verified:
+            sha = git_blob_sha(content)
+        path = self.path_for(sha)
+        if os.path.exists(path):
+            return sha
+
+        # 内容寻址的存储一旦写入错误内容，后续所有读取都会拿到它，写入前必须校验
+        if not verified:
+            actual = git_blob_sha(content)
+            if actual != sha:
+                raise BlobStoreError(f"blob 内容与 SHA 不符: 期望 {sha}，实际 {actual}")
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return sha
+
+    def get(self, sha: str) -> Optional[Blob]:
+        """
+        打开 blob，同一 blob 在进程内只映射一次
+
+        返回的 Blob 随时可能因 LRU 淘汰被关闭，只能立即使用；需要跨 await 或
+        交给工作线程时使用 borrow。
+
+        Args:
+            sha: blob SHA
+
+        Returns:
+            Blob 实例，不存在时返回 None
+        """
+        with self.lock:
+            return self._open(sha)
+
+    def _open(self, sha: str) -> Optional[Blob]:
+        """打开 blob 并淘汰超出上限的映射，调用方持有锁"""
+        blob = self.open_blobs.get(sha)
+        if blob is not None:
+            self.open_blobs.move_to_end(sha)
+            return blob
+
+        path = self.path_for(sha)
+        if not os.path.exists(path):
+            return None
+
+        blob = Blob(sha, path)
+        self.open_blobs[sha] = blob
+        while len(self.open_blobs) > self.max_open:
+            _, evicted = self.open_blobs.popitem(last=False)
+            evicted.evicted = True
+            if evicted.refs == 0:
+                self._close_blob(evicted)
+        return blob
+
+    def pin(self, sha: str) -> Optional[Blob]:
+        """
+        借用 blob，归还前不会被淘汰关闭，必须与 release 成对调用
+
+        Args:
+            sha: blob SHA
+
+        Returns:
+            Blob 实例，不存在时返回 None
+        """
+        with self.lock:
+            blob = self._open(sha)
+            if blob is not None:
+                blob.refs += 1
+            return blob
+
+    def release(self, blob: Blob) -> None:
+        """
+        归还借用的 blob，已被淘汰且没有其他借用者时关闭
+
+        Args:
+            blob: pin 返回的 Blob
+        """
+        with self.lock:
+            blob.refs -= 1
+            if blob.refs == 0 and blob.evicted:
+                self._close_blob(blob)
+
+    @contextmanager
+    def borrow(self, sha: str) -> Iterator[Optional[Blob]]:
+        """
+        在代码块内借用 blob
+
+        Args:
+            sha: blob SHA
+
+        Yields:
+            Blob 实例，不存在时为 None
+        """
+        blob = self.pin(sha)
+        try:
+            yield blob
+        finally:
+            if blob is not None:
+                self.release(blob)
+
+    async def fetch(self, sha: str, fetcher: Callable[[], Awaitable[bytes]]) -> None:
+        """
+        本地不存在时下载并存储 blob，同一 blob 的并发下载只执行一次
+
+        Args:
+            sha: blob SHA
+            fetcher: 下载文件内容的异步函数
+        """
+        if self.contains(sha):
+            return
+
+        async def _fetch() -> None:
+            self.put(await fetcher(), sha=sha)
+
+        await self.flights.do(sha, _fetch)
+
+    async def pin_or_fetch(self, sha: str, fetcher: Callable[[], Awaitable[bytes]]) -> Blob:
+        """
+        借用 blob，本地不存在时先下载，必须与 release 成对调用
+
+        Args:
+            sha: blob SHA
+            fetcher: 下载文件内容的异步函数
+
+        Returns:
+            Blob 实例
+
+        Raises:
+            BlobStoreError: 下载的内容与 SHA 不符，或存储中的文件已被删除时
+        """
+        await self.fetch(sha, fetcher)
+        # 下载完成后同步借用，中间没有 await，不会被其他协程淘汰
+        blob = self.pin(sha)
+        if blob is None:
+            raise BlobStoreError(f"blob 不在存储中: {sha}")
+        return blob
+
+    @staticmethod
+    def _close_blob(blob: Blob) -> None:
+        """关闭被淘汰的 Blob，仍有外部 memoryview 引用时交给垃圾回收处理"""
+        try:
+            blob.close()
+        except BufferError:
+            logger.debug(f"Blob {blob.sha[:7]} 仍被引用，延迟释放")
+
+    def close(self) -> None:
+        """关闭所有已打开的 Blob"""
+        with self.lock:
+            while self.open_blobs:
+                _, blob = self.open_blobs.popitem()
+                self._close_blob(blob)
+
+
+# 创建全局 blob 存储（每个工作进程一个）
+blob_store = BlobStore(max_open=int(get_value("BLOB_STORE_MAX_OPEN", 256)))
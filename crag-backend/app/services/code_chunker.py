@@ -0,0 +1,513 @@
+"""
+按函数和类将源码切分为检索单元，并提供向量索引和关键词索引共用的文件下载、切分和同步逻辑
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.blob_store import Blob, BlobStoreError, blob_store
+from app.services.code_scope import Scope, ScopeMap, build_scope_map, scope_index
+from app.services.file_triage import TriageRules, file_triage
+from app.services.github_repos_service import GitHubApiError
+
+logger = logging.getLogger(__name__)
+
+# 仓库目录名中不允许的字符
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9._-]")
+
+
+@dataclass(frozen=True)
+class CodeChunk:
+    """源码片段"""
+    path: str
+    start_line: int
+    end_line: int
+    # 限定名，例如 Foo.bar；模块级代码为空字符串
+    name: str
+    kind: str
+    text: str
+
+    @property
+    def hash(self) -> str:
+        """
+        片段摘要，路径、名称和内容都不变时向量可以复用（只有行号变化也视为不变）
+
+        Returns:
+            32 位十六进制摘要
+        """
+        raw = "\0".join([self.path, self.name, self.text])
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def embedding_text(self) -> str:
+        """
+        用于向量化和检索的文本，包含路径和名称
+
+        Returns:
+            文本
+        """
+        header = f"{self.path} {self.name}".strip()
+        return f"{header}\n{self.text}"
+
+
+@dataclass(frozen=True)
+class IndexedChunk:
+    """索引中的片段，只保存位置信息，内容从 blob 存储中按行读取"""
+    id: int
+    hash: str
+    path: str
+    start_line: int
+    end_line: int
+    name: str
+    kind: str
+    blob_sha: str
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "hash": self.hash, "path": self.path, "start": self.start_line,
+            "end": self.end_line, "name": self.name, "kind": self.kind, "blob": self.blob_sha
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "IndexedChunk":
+        return cls(
+            record["id"], record["hash"], record["path"], record["start"],
+            record["end"], record["name"], record["kind"], record["blob"]
+        )
+
+
+@dataclass
+class SearchHit:
+    """检索结果"""
+    chunk: IndexedChunk
+    score: float
+    text: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "path": self.chunk.path,
+            "start_line": self.chunk.start_line,
+            "end_line": self.chunk.end_line,
+            "name": self.chunk.name,
+            "kind": self.chunk.kind,
+            "score": round(self.score, 4),
+            "text": self.text
+        }
+
+
+def _meaningful(lines: List[str], start: int, end: int, min_lines: int) -> bool:
+    """区间内非空行数是否足够，过滤只有右花括号或空行的片段"""
+    count = 0
+    for line in lines[start - 1:end]:
+        if line.strip():
+            count += 1
+            if count >= min_lines:
+                return True
+    return False
+
+
+class _Chunker:
+    """切分单个文件"""
+
+    def __init__(self, path: str, lines: List[str], scope_map: ScopeMap, max_lines: int, min_lines: int):
+        self.path = path
+        self.lines = lines
+        self.scopes = scope_map.scopes
+        self.max_lines = max_lines
+        self.min_lines = min_lines
+        self.children: Dict[Optional[int], List[int]] = {}
+        for index, scope in enumerate(self.scopes):
+            self.children.setdefault(scope.parent, []).append(index)
+        self.chunks: List[CodeChunk] = []
+
+    def qualified_name(self, index: int) -> str:
+        names = []
+        current: Optional[int] = index
+        while current is not None:
+            names.append(self.scopes[current].name)
+            current = self.scopes[current].parent
+        return ".".join(reversed(names))
+
+    def emit(self, start: int, end: int, name: str, kind: str) -> None:
+        """按最大行数切分区间并输出片段"""
+        end = min(end, len(self.lines))
+        for window_start in range(start, end + 1, self.max_lines):
+            window_end = min(window_start + self.max_lines - 1, end)
+            if _meaningful(self.lines, window_start, window_end, self.min_lines):
+                text = "\n".join(self.lines[window_start - 1:window_end])
+                self.chunks.append(CodeChunk(self.path, window_start, window_end, name, kind, text))
+
+    def emit_gaps(self, start: int, end: int, children: List[int], name: str, kind: str) -> None:
+        """输出区间内不属于任何子作用域的部分，例如导入语句和类的字段声明"""
+        cursor = start
+        for child in children:
+            scope = self.scopes[child]
+            if scope.start_line > cursor:
+                self.emit(cursor, scope.start_line - 1, name, kind)
+            cursor = max(cursor, scope.end_line + 1)
+        if cursor <= end:
+            self.emit(cursor, end, name, kind)
+
+    def visit(self, index: int) -> None:
+        """足够小的作用域作为一个片段，否则递归切分子作用域"""
+        scope: Scope = self.scopes[index]
+        name = self.qualified_name(index)
+        children = self.children.get(index, [])
+        if scope.end_line - scope.start_line + 1 <= self.max_lines or not children:
+            self.emit(scope.start_line, scope.end_line, name, scope.kind)
+            return
+
+        self.emit_gaps(scope.start_line, scope.end_line, children, name, scope.kind)
+        for child in children:
+            self.visit(child)
+
+    def run(self) -> List[CodeChunk]:
+        top_level = self.children.get(None, [])
+        self.emit_gaps(1, len(self.lines), top_level, "", "module")
+        for index in top_level:
+            self.visit(index)
+        self.chunks.sort(key=lambda chunk: chunk.start_line)
+        return self.chunks
+
+
+def chunk_file(
+        path: str,
+        text: str,
+        scope_map: Optional[ScopeMap] = None,
+        max_lines: int = 80,
+        min_lines: int = 2
+) -> List[CodeChunk]:
+    """
+    将文件切分为函数大小的片段
+
+    函数和类作为整体；超过 max_lines 的类拆成方法和类体其余部分，没有子作用域的长函数和
+    模块级代码按 max_lines 分窗。无法识别语言的文件整体按窗口切分。
+
+    Args:
+        path: 文件路径
+        text: 文件内容
+        scope_map: 已构建的作用域表，未提供时现场构建
+        max_lines: 单个片段的最大行数
+        min_lines: 片段的最少非空行数
+
+    Returns:
+        按起始行排序的片段列表
+    """
+    lines = text.splitlines()
+    if not lines:
+        return []
+    scope_map = scope_map if scope_map is not None else build_scope_map(path, text)
+    return _Chunker(path, lines, scope_map, max_lines, min_lines).run()
+
+
+def chunk_spans(chunks: List[CodeChunk]) -> List[Tuple[int, int]]:
+    """
+    片段覆盖的行区间
+
+    Args:
+        chunks: 片段列表
+
+    Returns:
+        (起始行, 结束行) 列表
+    """
+    return [(chunk.start_line, chunk.end_line) for chunk in chunks]
+
+
+def repo_dirname(owner: str, repo: str) -> str:
+    """
+    仓库索引在磁盘上的名称
+
+    Args:
+        owner: 仓库所有者
+        repo: 仓库名称
+
+    Returns:
+        只包含安全字符的名称
+    """
+    return _UNSAFE_NAME.sub("_", f"{owner}__{repo}".lower())
+
+
+def chunk_text(chunk: IndexedChunk) -> Optional[str]:
+    """
+    从 blob 存储中读取片段内容
+
+    Args:
+        chunk: 索引中的片段
+
+    Returns:
+        片段内容，blob 不在本地时返回 None
+    """
+    with blob_store.borrow(chunk.blob_sha) as blob:
+        return blob.text(chunk.start_line, chunk.end_line) if blob is not None else None
+
+
+def _chunk_blobs(
+        contents: Dict[str, Optional[Blob]],
+        max_lines: int
+) -> Dict[str, Optional[Tuple[str, List[CodeChunk]]]]:
+    """直接从借用的 mmap 解码并切分文件，不复制原始字节，在工作线程中执行"""
+    files: Dict[str, Optional[Tuple[str, List[CodeChunk]]]] = {}
+    for path, blob in contents.items():
+        if blob is None:
+            files[path] = None
+            continue
+        text = str(blob.data, "utf-8", "replace")
+        # 作用域表按 blob SHA 缓存，同一文件版本被两个索引各切分一次时只做一次词法分析
+        files[path] = (blob.sha, chunk_file(path, text, scope_index.get(blob.sha, path, text), max_lines=max_lines))
+    return files
+
+
+async def load_changed_chunks(
+        pr_service,
+        owner: str,
+        repo: str,
+        commit_sha: str,
+        files: List[Tuple[str, Optional[str]]],
+        indexed: Dict[str, str],
+        rules: Optional[TriageRules] = None,
+        max_lines: int = 80,
+        max_file_bytes: int = 512 * 1024,
+        fetch_concurrency: int = 8
+) -> Dict[str, Optional[Tuple[str, List[CodeChunk]]]]:
+    """
+    下载并切分一个提交中相对索引发生变化的文件
+
+    blob SHA 与 indexed 中相同的文件直接跳过；生成文件、第三方代码等不需要评审的文件和超过大小上限的文件
+    按删除处理；下载失败的文件不出现在结果中，索引保留旧的片段，下次提交再重试。
+
+    Args:
+        pr_service: GitHub Pull Request 服务
+        owner: 仓库所有者
+        repo: 仓库名称
+        commit_sha: 提交 SHA
+        files: (路径, blob SHA) 列表，blob SHA 为空表示文件已删除
+        indexed: 索引中的 路径 -> blob SHA
+        rules: 仓库分诊规则
+        max_lines: 单个片段的最大行数
+        max_file_bytes: 文件大小上限
+        fetch_concurrency: 最大并发下载数
+
+    Returns:
+        路径 -> (blob SHA, 片段列表)，值为 None 表示应从索引中删除
+    """
+    changed = [(path, sha) for path, sha in files if indexed.get(path) != sha]
+    contents: Dict[str, Optional[Blob]] = {path: None for path, sha in changed if not sha}
+
+    present = [(path, sha) for path, sha in changed if sha]
+    report = await file_triage.triage(pr_service, owner, repo, commit_sha, present, rules)
+    semaphore = asyncio.Semaphore(fetch_concurrency)
+    # 借用的 blob 在切分完成前不会被 LRU 淘汰关闭
+    pinned: List[Blob] = []
+
+    async def fetch(path: str, blob_sha: str) -> None:
+        if not report.reviewable(path):
+            contents[path] = None
+            return
+        try:
+            async with semaphore:
+                blob = await blob_store.pin_or_fetch(
+                    blob_sha, lambda: pr_service.get_blob_content(owner, repo, blob_sha)
+                )
+        except (GitHubApiError, BlobStoreError) as e:
+            logger.warning(f"获取文件内容失败，跳过索引 {path}: {str(e)}")
+            return
+        pinned.append(blob)
+        contents[path] = blob if blob.size <= max_file_bytes else None
+
+    try:
+        # 等所有下载结束再抛出异常，避免仍在进行的下载在归还之后才借用
+        results = await asyncio.gather(*(fetch(path, sha) for path, sha in present), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return await asyncio.to_thread(_chunk_blobs, contents, max_lines)
+    finally:
+        for blob in pinned:
+            blob_store.release(blob)
+
+
+class ChunkIndexService(ABC):
+    """
+    按仓库管理片段索引的服务基类
+
+    负责打开、缓存各仓库的索引，以及下载、分诊和切分变化的文件；子类只需提供索引的打开方式
+    和统计日志。索引需要提供 refresh()、update(files, commit_sha)、path_blobs 和 commit。
+    """
+
+    # 日志中的索引名称
+    label = "片段索引"
+
+    def __init__(
+            self,
+            root: str,
+            max_open: int = 32,
+            fetch_concurrency: int = 8,
+            chunk_lines: int = 80,
+            max_file_bytes: int = 512 * 1024
+    ):
+        """
+        初始化索引服务
+
+        Args:
+            root: 索引根目录
+            max_open: 同时保持打开的仓库索引数量
+            fetch_concurrency: 下载文件的最大并发数
+            chunk_lines: 单个片段的最大行数
+            max_file_bytes: 超过该大小的文件不建立索引
+        """
+        self.root = root
+        self.max_open = max_open
+        self.fetch_concurrency = fetch_concurrency
+        self.chunk_lines = chunk_lines
+        self.max_file_bytes = max_file_bytes
+        self.indexes: "OrderedDict[str, Any]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @abstractmethod
+    def open_index(self, owner: str, repo: str) -> Any:
+        """
+        打开或创建仓库索引
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+
+        Returns:
+            索引实例
+        """
+
+    def describe(self, stats: Dict[str, int]) -> str:
+        """
+        格式化一次更新的统计，用于日志
+
+        Args:
+            stats: 索引 update 的统计
+
+        Returns:
+            日志文本
+        """
+        return f"新增 {stats['added']} 个片段, 删除 {stats['removed']} 个"
+
+    def get_index(self, owner: str, repo: str) -> Any:
+        """
+        打开仓库索引，最近使用的 max_open 个索引保持打开
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+
+        Returns:
+            索引实例
+        """
+        key = f"{owner}/{repo}".lower()
+        index = self.indexes.get(key)
+        if index is not None:
+            self.indexes.move_to_end(key)
+            return index
+
+        index = self.open_index(owner, repo)
+        self.indexes[key] = index
+        while len(self.indexes) > self.max_open:
+            self.indexes.popitem(last=False)
+        return index
+
+    async def index_commit(
+            self,
+            pr_service,
+            owner: str,
+            repo: str,
+            commit_sha: str,
+            files: List[Tuple[str, Optional[str]]],
+            rules: Optional[TriageRules] = None
+    ) -> Dict[str, int]:
+        """
+        将一个提交中变化的文件更新到索引
+
+        blob SHA 与已索引的相同的文件直接跳过；生成文件、第三方代码等不需要评审的文件不建立索引。
+
+        Args:
+            pr_service: GitHub Pull Request 服务
+            owner: 仓库所有者
+            repo: 仓库名称
+            commit_sha: 提交 SHA
+            files: (路径, blob SHA) 列表，blob SHA 为空表示文件已删除
+            rules: 仓库分诊规则
+
+        Returns:
+            统计：files 处理的文件数，以及索引 update 的统计
+        """
+        index = self.get_index(owner, repo)
+        lock = self._locks.setdefault(f"{owner}/{repo}".lower(), asyncio.Lock())
+        async with lock:
+            await asyncio.to_thread(index.refresh)
+            chunked = await load_changed_chunks(
+                pr_service, owner, repo, commit_sha, files, index.path_blobs, rules,
+                max_lines=self.chunk_lines,
+                max_file_bytes=self.max_file_bytes,
+                fetch_concurrency=self.fetch_concurrency
+            )
+            stats = await asyncio.to_thread(index.update, chunked, commit_sha)
+
+        if stats["added"] or stats["removed"]:
+            logger.info(f"{self.label} {owner}/{repo}@{commit_sha[:7]}: {len(chunked)} 个文件, {self.describe(stats)}")
+        return dict(stats, files=len(chunked))
+
+    async def build(self, pr_service, owner: str, repo: str, commit_sha: str, rules: Optional[TriageRules] = None) -> Dict[str, int]:
+        """
+        按提交的完整文件树同步索引，已索引且未变化的文件不会重新下载；
+        文件树被 GitHub 截断时只更新返回的文件，不删除其余已索引的文件
+
+        Args:
+            pr_service: GitHub Pull Request 服务
+            owner: 仓库所有者
+            repo: 仓库名称
+            commit_sha: 提交 SHA
+            rules: 仓库分诊规则
+
+        Returns:
+            同 index_commit
+        """
+        tree, truncated = await pr_service.get_tree(owner, repo, commit_sha)
+        files: List[Tuple[str, Optional[str]]] = [(entry["path"], entry["sha"]) for entry in tree]
+        if truncated:
+            # 截断的文件树缺少大量文件，不能当作删除处理，只更新返回的部分
+            logger.warning(f"{owner}/{repo}@{commit_sha[:7]} 文件树被截断，本次同步不删除索引中的文件")
+        else:
+            index = self.get_index(owner, repo)
+            await asyncio.to_thread(index.refresh)
+            paths = {path for path, _ in files}
+            files.extend((path, None) for path in list(index.path_blobs) if path not in paths)
+        return await self.index_commit(pr_service, owner, repo, commit_sha, files, rules)
+
+    async def sync(
+            self,
+            pr_service,
+            owner: str,
+            repo: str,
+            commit_sha: str,
+            files: List[Tuple[str, Optional[str]]],
+            rules: Optional[TriageRules] = None
+    ) -> Dict[str, int]:
+        """
+        同步索引到新的提交：仓库从未建立过索引时按完整文件树建立，之后只更新变化的文件
+
+        Args:
+            pr_service: GitHub Pull Request 服务
+            owner: 仓库所有者
+            repo: 仓库名称
+            commit_sha: 提交 SHA
+            files: 本次提交变化的 (路径, blob SHA) 列表，blob SHA 为空表示文件已删除
+            rules: 仓库分诊规则
+
+        Returns:
+            同 index_commit
+        """
+        index = self.get_index(owner, repo)
+        await asyncio.to_thread(index.refresh)
+        if index.commit is None:
+            return await self.build(pr_service, owner, repo, commit_sha, rules)
+        return await self.index_commit(pr_service, owner, repo, commit_sha, files, rules)
@@ -0,0 +1,546 @@
+"""
+代码片段向量索引，为评审提供与变更相关的仓库上下文
+
+每个仓库一个目录，包含：
+- vectors-<代>.npy：float32 向量矩阵，通过 np.memmap 映射，容量不足时翻倍到新的一代
+- chunks-<代>.jsonl：只追加的片段表，每行是一个片段 {"id", "hash", "path", ...} 或一组墓碑 {"dead": [id, ...]}
+- state.json：提交、行数、片段表有效长度等元数据，最后原子写入
+
+写入按 向量 -> 片段表 -> state.json 的顺序进行，读取只使用 state.json 记录的行数和片段表长度，
+写入中途失败不会让其他进程读到不完整的数据。多个工作进程通过文件锁串行写入，读取不加文件锁。
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from filelock import FileLock
+
+from app.services.code_chunker import ChunkIndexService, CodeChunk, IndexedChunk, SearchHit, chunk_text, repo_dirname
+from app.services.embedding import Embedder, create_embedder
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 索引格式版本，格式变化时旧索引被丢弃重建
+INDEX_VERSION = 1
+
+def top_k(vectors: np.ndarray, live: np.ndarray, queries: np.ndarray, k: int, block_rows: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    分块计算余弦相似度并取每个查询的前 k 个结果
+
+    向量和查询都已 L2 归一化，内积即余弦相似度。按行分块计算，峰值内存为 block_rows × 查询数，
+    与索引大小无关。
+
+    Args:
+        vectors: (n, dim) 向量矩阵
+        live: (n,) 布尔数组，False 表示已删除
+        queries: (q, dim) 查询矩阵
+        k: 每个查询返回的结果数
+
+    Returns:
+        (ids, scores)，形状均为 (q, k')，按相似度降序，k' = min(k, 有效行数)
+    """
+    count = vectors.shape[0]
+    query_count = queries.shape[0]
+    best_ids = np.empty((query_count, 0), dtype=np.int64)
+    best_scores = np.empty((query_count, 0), dtype=np.float32)
+
+    for start in range(0, count, block_rows):
+        end = min(start + block_rows, count)
+        scores = queries @ np.asarray(vectors[start:end]).T
+        scores[:, ~live[start:end]] = -np.inf
+
+        take = min(k, end - start)
+        if take < end - start:
+            candidates = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+        else:
+            candidates = np.broadcast_to(np.arange(end - start), (query_count, end - start))
+        best_ids = np.concatenate([best_ids, candidates + start], axis=1)
+        best_scores = np.concatenate([best_scores, np.take_along_axis(scores, candidates, axis=1)], axis=1)
+
+        # 合并后只保留前 k 个，避免候选随块数增长
+        if best_ids.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_ids = np.take_along_axis(best_ids, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best_ids = np.take_along_axis(best_ids, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    valid = min(int(live.sum()), best_ids.shape[1])
+    return best_ids[:, :valid], best_scores[:, :valid]
+
+
+def _atomic_write(path: str, data: str) -> None:
+    """写入临时文件后原子重命名"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class CodeIndex:
+    """
+    单个仓库的片段向量索引
+
+    片段按 (路径, 名称, 内容) 的摘要复用向量：一次提交只为内容发生变化的片段调用向量化模型，
+    其余片段（包括只是行号移动的）直接复制原有向量。被替换的片段标记为墓碑，
+    墓碑超过总行数一半时压缩为新的一代。
+    """
+
+    def __init__(self, directory: str, embedder: Embedder, batch_size: int = 64, min_capacity: int = 1024):
+        """
+        打开或创建索引
+
+        Args:
+            directory: 索引目录
+            embedder: 向量化模型，名称或维度与已有索引不一致时索引被重建
+            batch_size: 每次调用向量化模型的片段数
+            min_capacity: 向量矩阵的初始容量
+        """
+        self.directory = directory
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.min_capacity = min_capacity
+        os.makedirs(directory, exist_ok=True)
+        self.state_path = os.path.join(directory, "state.json")
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(os.path.join(directory, ".lock"))
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._clear()
+        self.refresh()
+
+    def _clear(self) -> None:
+        """清空内存中的索引数据"""
+        self.state: Dict[str, Any] = {}
+        self.vectors: Optional[np.memmap] = None
+        self.vectors_file: Optional[str] = None
+        self.journal_file: Optional[str] = None
+        self.journal_offset = 0
+        self.rows: List[IndexedChunk] = []
+        self.live = np.zeros(0, dtype=bool)
+        self.by_path: Dict[str, List[int]] = {}
+        self.by_hash: Dict[str, int] = {}
+        # 路径 -> 已索引的 blob SHA，内容未变的文件直接跳过
+        self.path_blobs: Dict[str, str] = {}
+
+    @property
+    def count(self) -> int:
+        """已写入的行数（包括墓碑）"""
+        return len(self.rows)
+
+    @property
+    def live_count(self) -> int:
+        """有效片段数"""
+        return int(self.live[:self.count].sum())
+
+    @property
+    def commit(self) -> Optional[str]:
+        """最近一次索引的提交"""
+        return self.state.get("commit")
+
+    def _compatible(self, state: Dict[str, Any]) -> bool:
+        return (
+            state.get("version") == INDEX_VERSION
+            and state.get("model") == self.embedder.name
+            and state.get("dim") == self.embedder.dim
+        )
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_vectors(self, name: str) -> np.memmap:
+        return np.load(self._path(name), mmap_mode="r+")
+
+    def _add_row(self, chunk: IndexedChunk) -> None:
+        self.rows.append(chunk)
+        self.by_path.setdefault(chunk.path, []).append(chunk.id)
+        self.by_hash[chunk.hash] = chunk.id
+        self.path_blobs[chunk.path] = chunk.blob_sha
+
+    def _kill_row(self, row_id: int) -> None:
+        if not self.live[row_id]:
+            return
+        self.live[row_id] = False
+        chunk = self.rows[row_id]
+        ids = self.by_path.get(chunk.path)
+        if ids is not None:
+            ids.remove(row_id)
+            if not ids:
+                del self.by_path[chunk.path]
+                self.path_blobs.pop(chunk.path, None)
+        if self.by_hash.get(chunk.hash) == row_id:
+            del self.by_hash[chunk.hash]
+
+    def _ensure_live(self, capacity: int) -> None:
+        if len(self.live) < capacity:
+            live = np.zeros(max(capacity, len(self.live) * 2), dtype=bool)
+            live[:len(self.live)] = self.live
+            self.live = live
+
+    def _replay(self, data: bytes) -> None:
+        """应用片段表中的一段记录"""
+        for line in data.splitlines():
+            record = json.loads(line)
+            if "dead" in record:
+                for row_id in record["dead"]:
+                    self._kill_row(row_id)
+                continue
+            chunk = IndexedChunk.from_record(record)
+            self._ensure_live(chunk.id + 1)
+            self.live[chunk.id] = True
+            self._add_row(chunk)
+
+    def refresh(self) -> None:
+        """state.json 变化时（其他进程写入）增量加载新的记录，换代时全量重新加载"""
+        with self._lock:
+            try:
+                stat = os.stat(self.state_path)
+            except FileNotFoundError:
+                if self._stamp is not None:
+                    self._clear()
+                    self._stamp = None
+                return
+
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp == self._stamp:
+                return
+
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+            if not self._compatible(state):
+                logger.info(f"代码索引与当前向量化模型不一致，将重建: {self.directory}")
+                self._clear()
+                self._stamp = stamp
+                return
+
+            if state["journal"] != self.journal_file or state["journal_size"] < self.journal_offset:
+                self._clear()
+                self.journal_file = state["journal"]
+            if state["vectors"] != self.vectors_file:
+                self.vectors = self._open_vectors(state["vectors"])
+                self.vectors_file = state["vectors"]
+
+            with open(self._path(state["journal"]), "rb") as file:
+                file.seek(self.journal_offset)
+                self._replay(file.read(state["journal_size"] - self.journal_offset))
+            self.journal_offset = state["journal_size"]
+            self.state = state
+            self._stamp = stamp
+
+    def _write_state(self, **changes: Any) -> None:
+        state = dict(self.state, **changes)
+        state["count"] = self.count
+        state["live"] = self.live_count
+        _atomic_write(self.state_path, json.dumps(state, ensure_ascii=False))
+        self.state = state
+        stat = os.stat(self.state_path)
+        self._stamp = (stat.st_mtime_ns, stat.st_size)
+
+    def _create(self) -> None:
+        """创建空索引的第一代文件"""
+        self._clear()
+        for name in os.listdir(self.directory):
+            if name.startswith(("vectors-", "chunks-")):
+                os.unlink(self._path(name))
+        generation = 1
+        vectors_file = f"vectors-{generation}.npy"
+        journal_file = f"chunks-{generation}.jsonl"
+        self.vectors = np.lib.format.open_memmap(
+            self._path(vectors_file), mode="w+", dtype=np.float32, shape=(self.min_capacity, self.embedder.dim)
+        )
+        open(self._path(journal_file), "wb").close()
+        self.vectors_file, self.journal_file = vectors_file, journal_file
+        self.state = {
+            "version": INDEX_VERSION, "model": self.embedder.name, "dim": self.embedder.dim,
+            "generation": generation, "vectors": vectors_file, "journal": journal_file, "journal_size": 0
+        }
+        self._write_state()
+
+    def _grow(self, needed: int) -> None:
+        """容量不足时复制到容量翻倍的新向量文件"""
+        capacity = self.vectors.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+
+        generation = self.state["generation"] + 1
+        vectors_file = f"vectors-{generation}.npy"
+        vectors = np.lib.format.open_memmap(
+            self._path(vectors_file), mode="w+", dtype=np.float32, shape=(capacity, self.embedder.dim)
+        )
+        vectors[:self.count] = self.vectors[:self.count]
+        vectors.flush()
+        old_file = self.vectors_file
+        self.vectors, self.vectors_file = vectors, vectors_file
+        self._write_state(generation=generation, vectors=vectors_file)
+        # 其他进程仍持有的映射在文件删除后继续有效
+        os.unlink(self._path(old_file))
+
+    def _recover(self) -> None:
+        """丢弃上次写入失败留下的、state.json 未记录的片段表尾部"""
+        journal_path = self._path(self.journal_file)
+        if os.path.getsize(journal_path) > self.journal_offset:
+            with open(journal_path, "r+b") as file:
+                file.truncate(self.journal_offset)
+
+    def update(self, files: Dict[str, Optional[Tuple[str, List[CodeChunk]]]], commit_sha: Optional[str] = None) -> Dict[str, int]:
+        """
+        按文件替换索引中的片段
+
+        Args:
+            files: 路径 -> (blob SHA, 片段列表)，值为 None 表示文件已删除
+            commit_sha: 本次索引的提交
+
+        Returns:
+            统计：added 新增片段数、embedded 调用模型的片段数、removed 删除片段数
+        """
+        with self._lock, self._file_lock:
+            self.refresh()
+            if not self.state:
+                self._create()
+            self._recover()
+
+            new_rows: List[IndexedChunk] = []
+            new_vectors: List[Optional[np.ndarray]] = []
+            to_embed: List[Tuple[int, str]] = []
+            dead: List[int] = []
+            next_id = self.count
+
+            for path, entry in files.items():
+                dead.extend(self.by_path.get(path, []))
+                if entry is None:
+                    continue
+                blob_sha, chunks = entry
+                for chunk in chunks:
+                    row = IndexedChunk(
+                        next_id + len(new_rows), chunk.hash, path, chunk.start_line,
+                        chunk.end_line, chunk.name, chunk.kind, blob_sha
+                    )
+                    source = self.by_hash.get(chunk.hash)
+                    if source is not None:
+                        new_vectors.append(np.array(self.vectors[source]))
+                    else:
+                        new_vectors.append(None)
+                        to_embed.append((len(new_rows), chunk.embedding_text()))
+                    new_rows.append(row)
+
+            if not new_rows and not dead:
+                if commit_sha and commit_sha != self.commit:
+                    self._write_state(commit=commit_sha)
+                return {"added": 0, "embedded": 0, "removed": 0}
+
+            self._grow(next_id + len(new_rows))
+            for position, vector in enumerate(new_vectors):
+                if vector is not None:
+                    self.vectors[next_id + position] = vector
+            for start in range(0, len(to_embed), self.batch_size):
+                batch = to_embed[start:start + self.batch_size]
+                embedded = self.embedder.embed([text for _, text in batch])
+                for (position, _), vector in zip(batch, embedded):
+                    self.vectors[next_id + position] = vector
+            self.vectors.flush()
+
+            lines = [json.dumps(row.to_record(), ensure_ascii=False) for row in new_rows]
+            if dead:
+                lines.append(json.dumps({"dead": dead}))
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            with open(self._path(self.journal_file), "ab") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+
+            self._replay(data)
+            self.journal_offset += len(data)
+            self._write_state(journal_size=self.journal_offset, commit=commit_sha or self.commit)
+
+            if self.count > self.min_capacity and self.live_count < self.count / 2:
+                self._compact()
+
+            return {"added": len(new_rows), "embedded": len(to_embed), "removed": len(dead)}
+
+    def _compact(self) -> None:
+        """只保留有效片段，重新编号后写入新的一代"""
+        live_ids = np.flatnonzero(self.live[:self.count])
+        capacity = self.min_capacity
+        while capacity < len(live_ids) * 2:
+            capacity *= 2
+
+        generation = self.state["generation"] + 1
+        vectors_file = f"vectors-{generation}.npy"
+        journal_file = f"chunks-{generation}.jsonl"
+        vectors = np.lib.format.open_memmap(
+            self._path(vectors_file), mode="w+", dtype=np.float32, shape=(capacity, self.embedder.dim)
+        )
+        vectors[:len(live_ids)] = self.vectors[live_ids]
+        vectors.flush()
+
+        rows = [
+            IndexedChunk(new_id, *(getattr(self.rows[old_id], name) for name in (
+                "hash", "path", "start_line", "end_line", "name", "kind", "blob_sha"
+            )))
+            for new_id, old_id in enumerate(live_ids.tolist())
+        ]
+        data = "".join(json.dumps(row.to_record(), ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+        with open(self._path(journal_file), "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        old_files = (self.vectors_file, self.journal_file)
+        removed = self.count - len(rows)
+        state = self.state
+        self._clear()
+        self.state = state
+        self.vectors, self.vectors_file, self.journal_file = vectors, vectors_file, journal_file
+        self._replay(data)
+        self.journal_offset = len(data)
+        self._write_state(generation=generation, vectors=vectors_file, journal=journal_file, journal_size=len(data))
+        for name in old_files:
+            os.unlink(self._path(name))
+        logger.info(f"代码索引压缩完成: 删除 {removed} 行, 保留 {len(rows)} 行 ({self.directory})")
+
+    def search(self, queries: np.ndarray, k: int = 8) -> List[List[Tuple[IndexedChunk, float]]]:
+        """
+        批量检索
+
+        Args:
+            queries: (q, dim) 已归一化的查询向量
+            k: 每个查询返回的结果数
+
+        Returns:
+            每个查询的 (片段, 相似度) 列表，按相似度降序
+        """
+        with self._lock:
+            self.refresh()
+            count = self.count
+            if not count or self.vectors is None:
+                return [[] for _ in range(len(queries))]
+            # 换代和压缩只替换引用，持有快照后计算期间不需要加锁
+            vectors, rows, live = self.vectors[:count], self.rows, self.live[:count].copy()
+
+        ids, scores = top_k(vectors, live, np.asarray(queries, dtype=np.float32), k)
+        return [
+            [(rows[row_id], float(score)) for row_id, score in zip(query_ids.tolist(), query_scores.tolist())]
+            for query_ids, query_scores in zip(ids, scores)
+        ]
+
+
+class CodeIndexService(ChunkIndexService):
+    """
+    代码索引服务，管理各仓库的向量索引
+
+    CPU 密集的切分、向量化和检索都在线程池中执行，不阻塞事件循环。
+    """
+
+    label = "代码索引"
+
+    def __init__(
+            self,
+            embedder: Embedder,
+            root: Optional[str] = None,
+            max_open: int = 32,
+            fetch_concurrency: int = 8,
+            chunk_lines: int = 80,
+            max_file_bytes: int = 512 * 1024
+    ):
+        """
+        初始化代码索引服务
+
+        Args:
+            embedder: 向量化模型
+            root: 索引根目录，默认读取 CODE_INDEX_DIR
+            max_open: 同时保持打开的仓库索引数量
+            fetch_concurrency: 下载文件的最大并发数
+            chunk_lines: 单个片段的最大行数
+            max_file_bytes: 超过该大小的文件不建立索引
+        """
+        if root is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            root = get_value("CODE_INDEX_DIR", os.path.join(base_dir, "data", "code_index"))
+        super().__init__(root, max_open, fetch_concurrency, chunk_lines, max_file_bytes)
+        self.embedder = embedder
+
+    def open_index(self, owner: str, repo: str) -> CodeIndex:
+        return CodeIndex(os.path.join(self.root, repo_dirname(owner, repo)), self.embedder)
+
+    def describe(self, stats: Dict[str, int]) -> str:
+        return f"新增 {stats['added']} 个片段 (向量化 {stats['embedded']}), 删除 {stats['removed']} 个"
+
+    async def search(self, owner: str, repo: str, queries: Sequence[str], k: int = 8) -> List[List[SearchHit]]:
+        """
+        批量检索与查询文本相关的片段
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            queries: 查询文本列表
+            k: 每个查询返回的结果数
+
+        Returns:
+            每个查询的检索结果，包含片段内容
+        """
+        if not queries:
+            return []
+        index = self.get_index(owner, repo)
+        matrix = await asyncio.to_thread(self.embedder.embed, list(queries))
+        results = await asyncio.to_thread(index.search, matrix, k)
+        return [[SearchHit(chunk, score, chunk_text(chunk)) for chunk, score in hits] for hits in results]
+
+    async def context_for_hunks(
+            self,
+            owner: str,
+            repo: str,
+            hunks: Sequence[Tuple[str, int, int, str]],
+            k: int = 5
+    ) -> List[List[SearchHit]]:
+        """
+        为每个变更块检索相关上下文，排除与变更块本身重叠的片段
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            hunks: (路径, 起始行, 结束行, 变更内容) 列表
+            k: 每个变更块返回的结果数
+
+        Returns:
+            与 hunks 顺序一致的检索结果
+        """
+        if not hunks:
+            return []
+        index = self.get_index(owner, repo)
+        queries = [f"{path}\n{text}" for path, _, _, text in hunks]
+        matrix = await asyncio.to_thread(self.embedder.embed, queries)
+        # 多取几个以抵消被排除的重叠片段
+        results = await asyncio.to_thread(index.search, matrix, k + 4)
+
+        contexts = []
+        for (path, start, end, _), hits in zip(hunks, results):
+            selected = [
+                SearchHit(chunk, score, chunk_text(chunk)) for chunk, score in hits
+                if not (chunk.path == path and chunk.start_line <= end and chunk.end_line >= start)
+            ]
+            contexts.append(selected[:k])
+        return contexts
+
+
+# 创建全局代码索引服务（每个工作进程一个）
+code_index_service = CodeIndexService(
+    embedder=create_embedder(),
+    max_open=int(get_value("CODE_INDEX_MAX_OPEN", 32)),
+    fetch_concurrency=int(get_value("CODE_INDEX_FETCH_CONCURRENCY", 8)),
+    chunk_lines=int(get_value("CODE_INDEX_CHUNK_LINES", 80)),
+    max_file_bytes=int(get_value("CODE_INDEX_MAX_FILE_BYTES", 512 * 1024))
+)
@@ -0,0 +1,403 @@
+"""
+基于 Pygments 的语法感知作用域提取，用于定位变更块所在的函数或类
+"""
+import bisect
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from pygments.lexer import Lexer
+from pygments.lexers import get_lexer_for_filename
+from pygments.token import Comment, Keyword, Name, Punctuation, String, Text
+from pygments.util import ClassNotFound
+
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 以缩进划分代码块的语言
+_INDENT_LANGUAGES = {"Python", "Python 2.x", "Cython", "NumPy", "Starlark"}
+
+# 花括号语言中引出类型定义的关键字
+_TYPE_KEYWORDS = {"class", "struct", "interface", "enum", "trait", "impl", "union", "record", "object", "namespace", "type"}
+
+# 花括号语言中引出函数定义的关键字
+_FUNC_KEYWORDS = {"func", "function", "fn", "fun", "sub"}
+
+# 声明变量的关键字，其后可能是箭头函数
+_VAR_KEYWORDS = {"const", "let", "var"}
+
+# Python 中引出作用域的关键字
+_DEF_KEYWORDS = {"def": "function", "class": "class"}
+
+
+@dataclass(frozen=True)
+class Scope:
+    """源码中的一个作用域（函数或类）"""
+    name: str
+    kind: str
+    start_line: int
+    end_line: int
+    parent: Optional[int] = None
+
+
+@lru_cache(maxsize=256)
+def _lexer_for(key: str) -> Optional[Lexer]:
+    """按扩展名（无扩展名时按文件名）缓存词法分析器"""
+    try:
+        return get_lexer_for_filename(key, stripnl=False, stripall=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+
+def get_lexer(path: str) -> Optional[Lexer]:
+    """
+    获取文件对应的词法分析器，同一语言只创建一次
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        词法分析器，无法识别的语言返回 None
+    """
+    basename = os.path.basename(path)
+    ext = os.path.splitext(basename)[1].lower()
+    return _lexer_for(f"file{ext}" if ext else basename)
+
+
+class ScopeMap:
+    """
+    单个文件的作用域表
+
+    作用域按嵌套关系展开为互不重叠的行区间，每个区间记录最内层作用域，
+    查询某一行所在作用域只需一次二分查找。
+    """
+
+    def __init__(self, scopes: List[Scope]):
+        """
+        初始化作用域表
+
+        Args:
+            scopes: 作用域列表，允许嵌套但不允许交叉
+        """
+        # 起止行相同时类型定义视为外层
+        ordered = sorted(scopes, key=lambda scope: (scope.start_line, -scope.end_line, scope.kind != "class"))
+        self.scopes: List[Scope] = []
+        self._starts: List[int] = [1]
+        self._owners: List[Optional[int]] = [None]
+
+        stack: List[int] = []
+        for scope in ordered:
+            while stack and self.scopes[stack[-1]].end_line < scope.start_line:
+                self._close(stack)
+            index = len(self.scopes)
+            self.scopes.append(Scope(scope.name, scope.kind, scope.start_line, scope.end_line,
+                                     parent=stack[-1] if stack else None))
+            stack.append(index)
+            self._mark(scope.start_line, index)
+        while stack:
+            self._close(stack)
+
+    def _close(self, stack: List[int]) -> None:
+        """关闭栈顶作用域，其后的行归属外层作用域"""
+        closed = stack.pop()
+        self._mark(self.scopes[closed].end_line + 1, stack[-1] if stack else None)
+
+    def _mark(self, line: int, owner: Optional[int]) -> None:
+        """从指定行开始的区间归属 owner"""
+        if self._starts[-1] == line:
+            self._owners[-1] = owner
+        else:
+            self._starts.append(line)
+            self._owners.append(owner)
+
+    def enclosing(self, line: int) -> Optional[Scope]:
+        """
+        查询某一行所在的最内层作用域
+
+        Args:
+            line: 行号（从 1 开始）
+
+        Returns:
+            作用域，位于顶层时返回 None
+        """
+        owner = self._owners[bisect.bisect_right(self._starts, line) - 1]
+        return self.scopes[owner] if owner is not None else None
+
+    def enclosing_range(self, start_line: int, end_line: int) -> Optional[Scope]:
+        """
+        查询同时包含起止行的最内层作用域
+
+        Args:
+            start_line: 起始行
+            end_line: 结束行
+
+        Returns:
+            作用域，不存在时返回 None
+        """
+        scope = self.enclosing(start_line)
+        while scope is not None and scope.end_line < end_line:
+            scope = self.scopes[scope.parent] if scope.parent is not None else None
+        return scope
+
+    def chain(self, line: int) -> List[Scope]:
+        """
+        查询某一行由内到外的全部作用域
+
+        Args:
+            line: 行号
+
+        Returns:
+            作用域列表
+        """
+        chain = []
+        scope = self.enclosing(line)
+        while scope is not None:
+            chain.append(scope)
+            scope = self.scopes[scope.parent] if scope.parent is not None else None
+        return chain
+
+    def __len__(self) -> int:
+        return len(self.scopes)
+
+
+def _tokens_with_lines(lexer: Lexer, text: str):
+    """遍历词法单元并附带其起始行号"""
+    line = 1
+    for token_type, value in lexer.get_tokens(text):
+        yield token_type, value, line
+        line += value.count("\n")
+
+
+def _indent_scopes(lexer: Lexer, text: str) -> List[Scope]:
+    """提取以缩进划分代码块的语言（如 Python）中的作用域"""
+    lines = text.split("\n")
+
+    # 只有位于括号外、且首个词法单元不是注释或字符串的行才参与缩进判断，
+    # 多行字符串和括号续行内部的行不会影响作用域边界
+    significant: List[int] = []
+    seen_lines = set()
+    depth = 0
+    pending: Optional[Tuple[str, int]] = None
+    starts = {}
+
+    for token_type, value, line in _tokens_with_lines(lexer, text):
+        if not value.strip():
+            continue
+
+        if line not in seen_lines:
+            seen_lines.add(line)
+            if depth == 0 and token_type not in Comment and token_type not in String:
+                significant.append(line)
+
+        if token_type in Punctuation:
+            depth += value.count("(") + value.count("[") + value.count("{")
+            depth -= value.count(")") + value.count("]") + value.count("}")
+            depth = max(depth, 0)
+        elif token_type in Keyword and value in _DEF_KEYWORDS:
+            pending = (_DEF_KEYWORDS[value], line)
+        elif pending and token_type in Name:
+            starts.setdefault(pending[1], (value, pending[0]))
+            pending = None
+
+    def indent_of(line_no: int) -> int:
+        raw = lines[line_no - 1]
+        return len(raw) - len(raw.lstrip())
+
+    def close(opened: Tuple[str, str, int, int], boundary: int) -> Scope:
+        name, kind, start, indent = opened
+        end = boundary - 1
+        # 去掉作用域末尾的空行和外层缩进的注释
+        while end > start and (not lines[end - 1].strip()
+                               or (lines[end - 1].lstrip().startswith("#") and indent_of(end) <= indent)):
+            end -= 1
+        return Scope(name, kind, start, end)
+
+    scopes: List[Scope] = []
+    stack: List[Tuple[str, str, int, int]] = []
+    for line_no in significant:
+        indent = indent_of(line_no)
+        while stack and stack[-1][3] >= indent:
+            scopes.append(close(stack.pop(), line_no))
+        if line_no in starts:
+            name, kind = starts[line_no]
+            stack.append((name, kind, line_no, indent))
+    while stack:
+        scopes.append(close(stack.pop(), len(lines) + 1))
+    return scopes
+
+
+def _brace_scopes(lexer: Lexer, text: str) -> List[Scope]:
+    """
+    提取以花括号划分代码块的语言中的作用域
+
+    除了由关键字或函数名词法单元引出的定义，还识别两类只能从形状判断的函数：
+    类体中 name(...) { 形式的方法（JS/TS 的方法名只是普通名称），
+    以及 const/let/var 声明的箭头函数 name = (...) => {。
+    """
+    scopes: List[Scope] = []
+    stack: List[Optional[Tuple[str, str, int]]] = []
+    pending: Optional[Tuple[str, str, int]] = None
+    type_keyword_line: Optional[int] = None
+    func_keyword_line: Optional[int] = None
+    last_name: Optional[str] = None
+    # 圆括号深度，方法名和箭头函数都只在声明所在的深度上识别
+    depth = 0
+    # 前一个词法单元是名称时的 (名称, 行号)
+    previous_name: Optional[Tuple[str, int]] = None
+    previous = ""
+    declaring = False
+    # 类体中紧接 "(" 的名称，之后遇到同一深度的 "{" 即为方法
+    method: Optional[Tuple[str, int]] = None
+    # const/let/var 声明的 (名称, 行号, 圆括号深度)
+    declared: Optional[Tuple[str, int, int]] = None
+    arrow: Optional[Tuple[str, int, int]] = None
+
+    for token_type, value, line in _tokens_with_lines(lexer, text):
+        if token_type in Comment or token_type in String or token_type in Text:
+            continue
+
+        in_class = bool(stack) and stack[-1] is not None and stack[-1][1] == "class"
+        is_name = token_type in Name or (token_type in Keyword and value == "constructor")
+        if is_name and declaring:
+            declared = (value, line, depth)
+
+        if token_type in Name.Function:
+            pending = (value, "function", func_keyword_line or line)
+            func_keyword_line = None
+        elif token_type in Name.Class or (token_type in Name and type_keyword_line is not None):
+            pending = (value, "class", type_keyword_line or line)
+            type_keyword_line = None
+        elif token_type in Name and func_keyword_line is not None:
+            # 部分词法分析器不区分函数名，取 func/function 之后紧邻 "(" 的名称
+            last_name = value
+        elif token_type in Keyword and value in _TYPE_KEYWORDS:
+            type_keyword_line = line
+        elif token_type in Keyword and value in _FUNC_KEYWORDS:
+            func_keyword_line = line
+            last_name = None
+        elif value == "(":
+            if func_keyword_line is not None and last_name:
+                pending = (last_name, "function", func_keyword_line)
+                func_keyword_line = None
+            elif in_class and depth == 0 and previous_name is not None:
+                method = previous_name
+            last_name = None
+            depth += 1
+        elif value == ")":
+            depth = max(depth - 1, 0)
+        elif value == "=>":
+            if declared is not None and declared[2] == depth:
+                arrow = declared
+        elif value == "{" or value.endswith("{"):
+            if pending is None and previous == "=>" and arrow is not None:
+                pending = (arrow[0], "function", arrow[1])
+            elif pending is None and method is not None and depth == 0:
+                pending = (method[0], "function", method[1])
+            stack.append(pending)
+            pending = None
+            type_keyword_line = None
+            func_keyword_line = None
+            method = None
+            arrow = None
+        elif value == "}" or value.startswith("}"):
+            if stack:
+                opened = stack.pop()
+                if opened is not None:
+                    name, kind, start = opened
+                    scopes.append(Scope(name, kind, start, line))
+        elif value == ";":
+            pending = None
+            type_keyword_line = None
+            func_keyword_line = None
+            method = None
+            declared = None
+            arrow = None
+        elif value == "=" and depth == 0:
+            # 类字段的初始值不是方法
+            method = None
+
+        declaring = token_type in Keyword and value in _VAR_KEYWORDS
+        previous_name = (value, line) if is_name else None
+        previous = value
+
+    return scopes
+
+
+def build_scope_map(path: str, text: str) -> ScopeMap:
+    """
+    对文件做一次词法分析并构建作用域表
+
+    Args:
+        path: 文件路径，用于选择词法分析器
+        text: 文件内容
+
+    Returns:
+        作用域表，无法识别的语言返回空表
+    """
+    lexer = get_lexer(path)
+    if lexer is None:
+        return ScopeMap([])
+
+    try:
+        if lexer.name in _INDENT_LANGUAGES:
+            return ScopeMap(_indent_scopes(lexer, text))
+        return ScopeMap(_brace_scopes(lexer, text))
+    except Exception as e:
+        logger.warning(f"构建作用域表失败 {path}: {str(e)}")
+        return ScopeMap([])
+
+
+class ScopeIndex:
+    """
+    作用域表缓存，按 (blob SHA, 词法分析器) 缓存，同一文件版本只做一次词法分析
+
+    相同内容在不同扩展名下（例如 a.py 和 a.js）会被识别为不同语言，因此键中必须包含词法分析器。
+    切分在工作线程中执行，缓存读写加锁，词法分析在锁外进行。
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        """
+        初始化作用域表缓存
+
+        Args:
+            max_entries: 最多缓存的作用域表数量
+        """
+        self.max_entries = max_entries
+        self.maps: "OrderedDict[Tuple[str, Optional[str]], ScopeMap]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, blob_sha: str, path: str, text: str) -> ScopeMap:
+        """
+        获取文件版本的作用域表
+
+        Args:
+            blob_sha: 文件内容的 blob SHA
+            path: 文件路径
+            text: 文件内容，缓存命中时不会被使用
+
+        Returns:
+            作用域表
+        """
+        lexer = get_lexer(path)
+        key = (blob_sha, lexer.name if lexer is not None else None)
+        with self._lock:
+            scope_map = self.maps.get(key)
+            if scope_map is not None:
+                self.maps.move_to_end(key)
+                return scope_map
+
+        scope_map = build_scope_map(path, text)
+        with self._lock:
+            self.maps[key] = scope_map
+            while len(self.maps) > self.max_entries:
+                self.maps.popitem(last=False)
+        return scope_map
+
+
+# 创建全局作用域表缓存（每个工作进程一个）
+scope_index = ScopeIndex(int(get_value("SCOPE_CACHE_SIZE", 2048)))
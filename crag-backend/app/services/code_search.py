@@ -0,0 +1,456 @@
+"""
+BM25 代码关键词检索，补充向量检索对精确标识符不敏感的问题
+
+每个仓库一个 .npz 文件，倒排表以连续数组保存：
+- terms / offsets：按词编号排列的词表，offsets[i]:offsets[i + 1] 是第 i 个词的倒排区间
+- doc_ids / tfs：倒排表中的片段编号（uint32，词内递增）和词频（uint16）
+- lengths：片段长度（词数）
+- paths / starts / ends / names / kinds / blobs / hashes：片段表
+
+每次更新都在内存中逐词合并成新的数组并整体原子替换文件，删除的片段不会留下墓碑，
+加载时只需要读取数组和建立词表字典。代价是每次提交都要重写整个文件（与倒排表总长度成线性，
+单个仓库通常只有几 MB），换来读取端不需要合并多个分段。
+"""
+import asyncio
+import dataclasses
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from filelock import FileLock
+
+from app.services.code_chunker import (
+    ChunkIndexService,
+    CodeChunk,
+    IndexedChunk,
+    SearchHit,
+    chunk_text,
+    repo_dirname,
+)
+from app.services.code_tokenizer import tokenize_code
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 索引格式版本，格式变化时旧索引被丢弃重建
+INDEX_VERSION = 1
+
+# 词频上限，超过的按上限计（BM25 对高词频本身是饱和的）
+_MAX_TF = np.iinfo(np.uint16).max
+
+
+class Bm25Index:
+    """
+    单个仓库的 BM25 倒排索引
+
+    文档是 code_chunker 切分出的片段，词是 tokenize_code 的结果：完整标识符和拆分后的子词都会被索引，
+    查询 set_session_data 时精确匹配的片段得分最高，只包含 session、data 的片段排在后面。
+    数组只会被整体替换，不会原地修改，检索时持有引用即可在锁外计算。
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        """
+        打开或创建索引
+
+        Args:
+            path: 索引文件路径
+            k1: BM25 词频饱和参数
+            b: BM25 长度归一化参数
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path + ".lock")
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._clear()
+        self.refresh()
+
+    def _clear(self) -> None:
+        """清空内存中的索引数据"""
+        self.commit: Optional[str] = None
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.uint32)
+        self.tfs = np.zeros(0, dtype=np.uint16)
+        self.lengths = np.zeros(0, dtype=np.uint32)
+        self.docs: List[IndexedChunk] = []
+        self.by_path: Dict[str, List[int]] = {}
+        # 路径 -> 已索引的 blob SHA，内容未变的文件直接跳过
+        self.path_blobs: Dict[str, str] = {}
+
+    @property
+    def count(self) -> int:
+        """片段数"""
+        return len(self.docs)
+
+    def _set_docs(self, docs: List[IndexedChunk]) -> None:
+        self.docs = docs
+        self.by_path = {}
+        self.path_blobs = {}
+        for doc in docs:
+            self.by_path.setdefault(doc.path, []).append(doc.id)
+            self.path_blobs[doc.path] = doc.blob_sha
+
+    def _set_terms(self, terms: List[str]) -> None:
+        self.terms = terms
+        self.term_ids = {term: index for index, term in enumerate(terms)}
+
+    def refresh(self) -> None:
+        """索引文件变化时（其他进程写入）重新加载"""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                if self._stamp is not None:
+                    self._clear()
+                    self._stamp = None
+                return
+
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp == self._stamp:
+                return
+
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != INDEX_VERSION:
+                    logger.info(f"代码检索索引版本不一致，将重建: {self.path}")
+                    self._clear()
+                    self._stamp = stamp
+                    return
+
+                self.offsets = data["offsets"]
+                self.doc_ids = data["doc_ids"]
+                self.tfs = data["tfs"]
+                self.lengths = data["lengths"]
+                self._set_terms(data["terms"].tolist())
+                self._set_docs([
+                    IndexedChunk(index, *fields) for index, fields in enumerate(zip(
+                        data["hashes"].tolist(), data["paths"].tolist(), data["starts"].tolist(),
+                        data["ends"].tolist(), data["names"].tolist(), data["kinds"].tolist(), data["blobs"].tolist()
+                    ))
+                ])
+            self.commit = meta.get("commit")
+            self._stamp = stamp
+
+    def _save(self) -> None:
+        """写入临时文件后原子替换"""
+        meta = {"version": INDEX_VERSION, "commit": self.commit}
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez(
+                    file,
+                    meta=np.array(json.dumps(meta)),
+                    terms=np.array(self.terms, dtype=str),
+                    offsets=self.offsets,
+                    doc_ids=self.doc_ids,
+                    tfs=self.tfs,
+                    lengths=self.lengths,
+                    hashes=np.array([doc.hash for doc in self.docs], dtype=str),
+                    paths=np.array([doc.path for doc in self.docs], dtype=str),
+                    starts=np.array([doc.start_line for doc in self.docs], dtype=np.uint32),
+                    ends=np.array([doc.end_line for doc in self.docs], dtype=np.uint32),
+                    names=np.array([doc.name for doc in self.docs], dtype=str),
+                    kinds=np.array([doc.kind for doc in self.docs], dtype=str),
+                    blobs=np.array([doc.blob_sha for doc in self.docs], dtype=str),
+                )
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        stat = os.stat(self.path)
+        self._stamp = (stat.st_mtime_ns, stat.st_size)
+
+    def update(self, files: Dict[str, Optional[Tuple[str, List[CodeChunk]]]], commit_sha: Optional[str] = None) -> Dict[str, int]:
+        """
+        按文件替换索引中的片段
+
+        旧的倒排表按词有序、词内按片段编号有序，新片段的编号都大于旧片段，因此只需对新片段的
+        倒排项排序，再逐词接在旧项之后。合并和写入与倒排表总长度成线性，排序只涉及变化的文件。
+
+        Args:
+            files: 路径 -> (blob SHA, 片段列表)，值为 None 表示文件已删除
+            commit_sha: 本次索引的提交
+
+        Returns:
+            统计：added 新增片段数、removed 删除片段数、terms 词表大小
+        """
+        with self._lock, self._file_lock:
+            self.refresh()
+            old_count = self.count
+            keep = np.ones(old_count, dtype=bool)
+            removed = 0
+            for path in files:
+                ids = self.by_path.get(path, [])
+                keep[ids] = False
+                removed += len(ids)
+
+            terms = list(self.terms)
+            term_ids = dict(self.term_ids)
+            new_docs: List[IndexedChunk] = []
+            new_terms: List[int] = []
+            new_docs_ids: List[int] = []
+            new_tfs: List[int] = []
+            new_lengths: List[int] = []
+            for path, entry in files.items():
+                if entry is None:
+                    continue
+                blob_sha, chunks = entry
+                for chunk in chunks:
+                    doc_id = old_count + len(new_docs)
+                    counts = Counter(tokenize_code(chunk.embedding_text()))
+                    for term, tf in counts.items():
+                        term_id = term_ids.get(term)
+                        if term_id is None:
+                            term_id = term_ids[term] = len(terms)
+                            terms.append(term)
+                        new_terms.append(term_id)
+                        new_docs_ids.append(doc_id)
+                        new_tfs.append(tf)
+                    new_lengths.append(sum(counts.values()))
+                    new_docs.append(IndexedChunk(
+                        doc_id, chunk.hash, path, chunk.start_line, chunk.end_line, chunk.name, chunk.kind, blob_sha
+                    ))
+
+            if not new_docs and not removed:
+                if commit_sha and commit_sha != self.commit:
+                    self.commit = commit_sha
+                    self._save()
+                return {"added": 0, "removed": 0, "terms": len(self.terms)}
+
+            # 逐词合并倒排表：旧项已按词有序，只需对新项排序，再按词把新项放到旧项之后，
+            # 不对全部倒排项重新排序
+            alive = np.concatenate([keep, np.ones(len(new_docs), dtype=bool)])
+            renumber = np.cumsum(alive) - 1
+
+            old_terms = np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(self.offsets))
+            old_docs, old_tfs = self.doc_ids.astype(np.int64), self.tfs
+            if removed:
+                mask = keep[old_docs]
+                old_terms, old_docs, old_tfs = old_terms[mask], old_docs[mask], old_tfs[mask]
+            old_docs = renumber[old_docs]
+
+            added_terms = np.array(new_terms, dtype=np.int64)
+            order = np.argsort(added_terms, kind="stable")
+            added_terms = added_terms[order]
+            added_docs = renumber[np.array(new_docs_ids, dtype=np.int64)[order]]
+            added_tfs = np.minimum(np.array(new_tfs, dtype=np.int64), _MAX_TF).astype(np.uint16)[order]
+
+            old_counts = np.bincount(old_terms, minlength=len(terms))
+            added_counts = np.bincount(added_terms, minlength=len(terms))
+            counts = old_counts + added_counts
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+            old_starts = np.concatenate([[0], np.cumsum(old_counts)[:-1]]).astype(np.int64)
+            added_starts = np.concatenate([[0], np.cumsum(added_counts)[:-1]]).astype(np.int64)
+
+            old_positions = starts[old_terms] + np.arange(len(old_terms)) - old_starts[old_terms]
+            added_positions = (starts[added_terms] + old_counts[added_terms]
+                               + np.arange(len(added_terms)) - added_starts[added_terms])
+            posting_docs = np.empty(len(old_terms) + len(added_terms), dtype=np.uint32)
+            posting_tfs = np.empty(len(posting_docs), dtype=np.uint16)
+            posting_docs[old_positions], posting_docs[added_positions] = old_docs, added_docs
+            posting_tfs[old_positions], posting_tfs[added_positions] = old_tfs, added_tfs
+
+            # 去掉不再出现的词
+            used = counts > 0
+            self.offsets = np.concatenate([[0], np.cumsum(counts[used])]).astype(np.int64)
+            self.doc_ids = posting_docs
+            self.tfs = posting_tfs
+            self.lengths = np.concatenate([self.lengths, np.array(new_lengths, dtype=np.uint32)])[alive]
+            self._set_terms([term for term, flag in zip(terms, used.tolist()) if flag])
+            survivors = [doc for doc, flag in zip(self.docs, keep.tolist()) if flag] + new_docs
+            self._set_docs([dataclasses.replace(doc, id=index) for index, doc in enumerate(survivors)])
+            self.commit = commit_sha or self.commit
+            self._save()
+
+            return {"added": len(new_docs), "removed": removed, "terms": len(self.terms)}
+
+    def _postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return None
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[IndexedChunk, float]]:
+        """
+        BM25 检索
+
+        Args:
+            query: 查询文本，按与源码相同的规则分词
+            k: 返回的结果数
+
+        Returns:
+            (片段, 得分) 列表，按得分降序
+        """
+        with self._lock:
+            self.refresh()
+            if not self.docs:
+                return []
+            docs, lengths = self.docs, self.lengths
+            postings = [self._postings(term) for term in dict.fromkeys(tokenize_code(query))]
+
+        total = len(docs)
+        average_length = max(float(lengths.mean()), 1.0)
+        scores = np.zeros(total, dtype=np.float32)
+        for entry in postings:
+            if entry is None:
+                continue
+            ids, tfs = entry
+            frequency = len(ids)
+            idf = math.log(1.0 + (total - frequency + 0.5) / (frequency + 0.5))
+            tf = tfs.astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[ids] / average_length)
+            scores[ids] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(docs[index], float(scores[index])) for index in candidates.tolist()]
+
+    def usages(self, identifier: str, limit: int = 200) -> List[Tuple[IndexedChunk, int]]:
+        """
+        查找包含指定标识符的全部片段（不区分大小写）
+
+        复合标识符（例如 set_session_data）本身就是一个词项，倒排表只包含完整出现的片段。
+        单段标识符（例如 session）与复合标识符拆出的子词是同一个词项，因此再按单词边界
+        检查片段内容，排除只在 user_session、getSession 之类的标识符中出现的片段；
+        内容不在本地 blob 存储中的片段无法检查，按倒排表结果保留。
+
+        Args:
+            identifier: 标识符，例如 set_session_data
+            limit: 最多返回的片段数
+
+        Returns:
+            (片段, 出现次数) 列表，按路径和行号排序
+        """
+        tokens = tokenize_code(identifier, min_length=1)
+        if not tokens:
+            return []
+        with self._lock:
+            self.refresh()
+            docs = self.docs
+            entry = self._postings(tokens[0])
+        if entry is None:
+            return []
+
+        ids, tfs = entry
+        hits = sorted(zip(ids.tolist(), tfs.tolist()), key=lambda item: (docs[item[0]].path, docs[item[0]].start_line))
+        if len(tokens) > 1:
+            return [(docs[doc_id], tf) for doc_id, tf in hits[:limit]]
+
+        pattern = re.compile(rf"(?<![A-Za-z0-9_]){re.escape(identifier.strip())}(?![A-Za-z0-9_])", re.IGNORECASE)
+        results: List[Tuple[IndexedChunk, int]] = []
+        for doc_id, tf in hits:
+            text = chunk_text(docs[doc_id])
+            if text is not None:
+                tf = len(pattern.findall(text))
+                if tf == 0:
+                    continue
+            results.append((docs[doc_id], tf))
+            if len(results) >= limit:
+                break
+        return results
+
+
+class CodeSearchService(ChunkIndexService):
+    """
+    代码关键词检索服务，管理各仓库的 BM25 索引
+
+    文件的下载、分诊和切分与向量索引共用 ChunkIndexService，分词、合并和检索在线程池中执行。
+    """
+
+    label = "代码检索索引"
+
+    def __init__(
+            self,
+            root: Optional[str] = None,
+            max_open: int = 32,
+            fetch_concurrency: int = 8,
+            chunk_lines: int = 80,
+            max_file_bytes: int = 512 * 1024,
+            k1: float = 1.2,
+            b: float = 0.75
+    ):
+        """
+        初始化代码关键词检索服务
+
+        Args:
+            root: 索引根目录，默认读取 CODE_SEARCH_DIR
+            max_open: 同时保持在内存中的仓库索引数量
+            fetch_concurrency: 下载文件的最大并发数
+            chunk_lines: 单个片段的最大行数
+            max_file_bytes: 超过该大小的文件不建立索引
+            k1: BM25 词频饱和参数
+            b: BM25 长度归一化参数
+        """
+        if root is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            root = get_value("CODE_SEARCH_DIR", os.path.join(base_dir, "data", "code_search"))
+        super().__init__(root, max_open, fetch_concurrency, chunk_lines, max_file_bytes)
+        self.k1 = k1
+        self.b = b
+
+    def open_index(self, owner: str, repo: str) -> Bm25Index:
+        return Bm25Index(os.path.join(self.root, f"{repo_dirname(owner, repo)}.npz"), k1=self.k1, b=self.b)
+
+    def describe(self, stats: Dict[str, int]) -> str:
+        return f"新增 {stats['added']} 个片段, 删除 {stats['removed']} 个, 词表 {stats['terms']}"
+
+    async def search(self, owner: str, repo: str, query: str, k: int = 10) -> List[SearchHit]:
+        """
+        关键词检索
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            query: 查询文本
+            k: 返回的结果数
+
+        Returns:
+            检索结果，包含片段内容
+        """
+        index = self.get_index(owner, repo)
+        hits = await asyncio.to_thread(index.search, query, k)
+        return [SearchHit(chunk, score, chunk_text(chunk)) for chunk, score in hits]
+
+    async def usages(self, owner: str, repo: str, identifier: str, limit: int = 200) -> List[SearchHit]:
+        """
+        查找标识符的全部用法
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            identifier: 标识符
+            limit: 最多返回的片段数
+
+        Returns:
+            检索结果，score 为片段中的出现次数
+        """
+        index = self.get_index(owner, repo)
+        hits = await asyncio.to_thread(index.usages, identifier, limit)
+        return [SearchHit(chunk, float(count), chunk_text(chunk)) for chunk, count in hits]
+
+
+# 创建全局代码关键词检索服务（每个工作进程一个）
+code_search_service = CodeSearchService(
+    max_open=int(get_value("CODE_SEARCH_MAX_OPEN", 32)),
+    fetch_concurrency=int(get_value("CODE_INDEX_FETCH_CONCURRENCY", 8)),
+    chunk_lines=int(get_value("CODE_INDEX_CHUNK_LINES", 80)),
+    max_file_bytes=int(get_value("CODE_INDEX_MAX_FILE_BYTES", 512 * 1024)),
+    k1=float(get_value("BM25_K1", 1.2)),
+    b=float(get_value("BM25_B", 0.75))
+)
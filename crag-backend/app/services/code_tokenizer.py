@@ -0,0 +1,64 @@
+"""
+源码分词，将标识符按驼峰和下划线拆分，供向量化和关键词检索共用
+"""
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+# 标识符和数字
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+
+# 驼峰拆分，例如 HTTPServerError -> HTTP, Server, Error
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+# 常见语言关键字和无区分度的词
+STOPWORDS = frozenset({
+    "a", "an", "and", "as", "at", "be", "by", "do", "else", "for", "from", "if", "in", "is", "it",
+    "not", "of", "on", "or", "the", "to", "def", "return", "self", "this", "import", "class",
+    "function", "func", "fn", "var", "let", "const", "public", "private", "protected", "static",
+    "void", "new", "true", "false", "null", "none", "nil", "package", "end", "then", "elif",
+})
+
+
+@lru_cache(maxsize=65536)
+def split_identifier(identifier: str) -> Tuple[str, ...]:
+    """
+    将标识符拆分为小写的子词
+
+    Args:
+        identifier: 标识符，例如 getUserName、MAX_RETRY_COUNT
+
+    Returns:
+        子词元组，例如 ("get", "user", "name")
+    """
+    parts = []
+    for piece in identifier.split("_"):
+        parts.extend(match.lower() for match in _CAMEL.findall(piece))
+    return tuple(parts)
+
+
+def tokenize_code(text: str, min_length: int = 2) -> List[str]:
+    """
+    源码分词
+
+    由多个子词组成的标识符同时保留完整标识符（小写）和各个子词，
+    既能精确匹配 get_user_name，也能通过 user 匹配到它。
+
+    Args:
+        text: 源码或查询文本
+        min_length: 最短词长
+
+    Returns:
+        词列表，保持出现顺序
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        parts = split_identifier(word)
+        if len(parts) > 1:
+            whole = word.lower().strip("_")
+            if len(whole) >= min_length and whole not in STOPWORDS:
+                tokens.append(whole)
+        for part in parts:
+            if len(part) >= min_length and part not in STOPWORDS:
+                tokens.append(part)
+    return tokens
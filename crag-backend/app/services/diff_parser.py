@@ -0,0 +1,160 @@
+"""
+统一 diff 解析工具，用于提取变更块并在两个提交之间映射行号
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Set
+
+# 变更块头部，例如 @@ -10,7 +10,8 @@ def foo():
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+
+@dataclass
+class Hunk:
+    """diff 中的一个变更块"""
+    old_start: int
+    old_lines: int
+    new_start: int
+    new_lines: int
+    header: str = ""
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def old_end(self) -> int:
+        """旧文件中变更块最后一行的下一行"""
+        return self.old_start + self.old_lines
+
+    @property
+    def new_end(self) -> int:
+        """新文件中变更块最后一行的下一行"""
+        return self.new_start + self.new_lines
+
+    def added_lines(self) -> List[int]:
+        """
+        获取新文件中新增行的行号
+
+        Returns:
+            行号列表
+        """
+        added = []
+        new_line = self.new_start
+        for line in self.lines:
+            if line.startswith("+"):
+                added.append(new_line)
+                new_line += 1
+            elif line.startswith("-"):
+                continue
+            elif line.startswith("\\"):
+                # "\ No newline at end of file"
+                continue
+            else:
+                new_line += 1
+        return added
+
+
+def parse_patch(patch: Optional[str]) -> List[Hunk]:
+    """
+    解析 GitHub 返回的单文件 patch
+
+    Args:
+        patch: 不含文件头的统一 diff 文本
+
+    Returns:
+        变更块列表
+    """
+    hunks: List[Hunk] = []
+    if not patch:
+        return hunks
+
+    current: Optional[Hunk] = None
+    for line in patch.splitlines():
+        match = _HUNK_HEADER.match(line)
+        if match:
+            old_start, old_lines, new_start, new_lines, header = match.groups()
+            current = Hunk(
+                old_start=int(old_start),
+                old_lines=int(old_lines) if old_lines is not None else 1,
+                new_start=int(new_start),
+                new_lines=int(new_lines) if new_lines is not None else 1,
+                header=header.strip()
+            )
+            hunks.append(current)
+        elif current is not None:
+            current.lines.append(line)
+
+    return hunks
+
+
+def added_line_set(hunks: Iterable[Hunk]) -> Set[int]:
+    """
+    汇总所有变更块在新文件中的新增行号
+
+    Args:
+        hunks: 变更块列表
+
+    Returns:
+        行号集合
+    """
+    lines: Set[int] = set()
+    for hunk in hunks:
+        lines.update(hunk.added_lines())
+    return lines
+
+
+def map_line(hunks: List[Hunk], old_line: int) -> Optional[int]:
+    """
+    将旧文件的行号映射到新文件
+
+    Args:
+        hunks: 旧文件到新文件的变更块列表（按位置排序）
+        old_line: 旧文件行号
+
+    Returns:
+        新文件行号；该行被删除或修改时返回 None
+    """
+    offset = 0
+    for hunk in hunks:
+        # 纯新增的变更块（旧行数为 0）插入在 old_start 之后
+        start = hunk.old_start if hunk.old_lines else hunk.old_start + 1
+        if old_line < start:
+            break
+        if old_line >= start + hunk.old_lines:
+            offset += hunk.new_lines - hunk.old_lines
+            continue
+
+        # 行号落在变更块内，逐行定位
+        old_cursor = hunk.old_start
+        new_cursor = hunk.new_start
+        for line in hunk.lines:
+            if line.startswith("+"):
+                new_cursor += 1
+            elif line.startswith("-"):
+                if old_cursor == old_line:
+                    return None
+                old_cursor += 1
+            elif line.startswith("\\"):
+                continue
+            else:
+                if old_cursor == old_line:
+                    return new_cursor
+                old_cursor += 1
+                new_cursor += 1
+        return None
+
+    return old_line + offset
+
+
+def hunks_touching(hunks: Iterable[Hunk], lines: Set[int]) -> List[Hunk]:
+    """
+    筛选新增行与给定行号集合有交集的变更块
+
+    用于从比较范围的 diff 中剔除不属于 PR 本身的变更（例如合并基础分支带来的改动）。
+
+    Args:
+        hunks: 变更块列表
+        lines: 新文件行号集合
+
+    Returns:
+        变更块列表
+    """
+    return [hunk for hunk in hunks if lines.intersection(hunk.added_lines())]
@@ -0,0 +1,120 @@
+"""
+文本向量化模型，通过 EMBEDDING_MODEL 配置选择实现
+
+内置的 HashingEmbedder 不依赖任何模型文件，结果完全确定，适合本地开发和测试；
+生产环境可以配置为 "包名.模块:类名" 加载自定义实现。
+"""
+import hashlib
+import importlib
+import logging
+import math
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Sequence
+
+import numpy as np
+
+from app.services.code_tokenizer import tokenize_code
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+
+class Embedder(ABC):
+    """
+    向量化模型接口
+
+    实现类需要提供 name（写入索引，模型变化时索引会被重建）、dim 和 embed。
+    """
+
+    name: str = "embedder"
+    dim: int = 0
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        批量向量化
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为 (len(texts), dim) 的 float32 矩阵，每行 L2 归一化
+        """
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    按行 L2 归一化，零向量保持为零
+
+    Args:
+        matrix: 二维矩阵
+
+    Returns:
+        归一化后的 float32 矩阵
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class HashingEmbedder(Embedder):
+    """
+    特征哈希向量化
+
+    对源码分词后的单词和相邻词对做带符号的特征哈希，词频取对数衰减，
+    相同的输入在任何进程、任何机器上都得到相同的向量。
+    """
+
+    def __init__(self, dim: int = 512):
+        """
+        初始化特征哈希向量化
+
+        Args:
+            dim: 向量维度
+        """
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _bucket(self, feature: str) -> int:
+        """特征的带符号桶编号，最高位决定符号"""
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+        bucket = value % self.dim
+        return bucket if value >> 63 else -bucket - 1
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize_code(text)
+            features = Counter(tokens)
+            features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+            for feature, count in features.items():
+                bucket = self._bucket(feature)
+                weight = 1.0 + math.log(count)
+                if bucket >= 0:
+                    matrix[row, bucket] += weight
+                else:
+                    matrix[row, -bucket - 1] -= weight
+        return normalize_rows(matrix)
+
+
+def create_embedder(spec: str = None) -> Embedder:
+    """
+    根据配置创建向量化模型
+
+    Args:
+        spec: "hashing"、"hashing:维度" 或 "包名.模块:类名"，默认读取 EMBEDDING_MODEL
+
+    Returns:
+        Embedder 实例
+    """
+    spec = spec or get_value("EMBEDDING_MODEL", "hashing")
+    name, _, argument = spec.partition(":")
+    if name == "hashing":
+        return HashingEmbedder(int(argument) if argument else int(get_value("EMBEDDING_DIM", 512)))
+
+    module = importlib.import_module(name)
+    embedder = getattr(module, argument)()
+    logger.info(f"已加载向量化模型 {embedder.name}，维度 {embedder.dim}")
+    return embedder
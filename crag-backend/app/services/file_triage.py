@@ -0,0 +1,522 @@
+"""
+文件分诊，在分析前排除生成文件、第三方依赖、锁文件和二进制文件
+
+按代价从低到高依次判断：仓库规则 → .gitattributes 的 linguist 属性 → 默认路径规则 → 文件内容嗅探，
+只有判定为人工编写的源码才会交给后续的分析器和大模型。
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.blob_store import BlobStoreError, blob_store
+from app.services.github_repos_service import GitHubApiError
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 内容嗅探读取的字节数，与 git 判断二进制文件的范围一致
+SNIFF_BYTES = 8000
+
+# 文件头部的生成标记，例如 Go 的 "Code generated ... DO NOT EDIT." 和 Facebook 的 @generated
+_GENERATED_MARKER = re.compile(
+    rb"@generated\b|code generated .{0,80}do not edit|"
+    rb"this (?:file|code) (?:is|was|has been) (?:auto-?|automatically )?generated|"
+    rb"auto-?generated (?:file|code|by)|generated by the protocol buffer compiler",
+    re.IGNORECASE
+)
+
+# 可能被压缩的文本文件扩展名
+_MINIFIABLE = (".js", ".mjs", ".cjs", ".css", ".json", ".svg", ".html")
+
+# 默认锁文件
+DEFAULT_LOCKFILES = [
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb",
+    "poetry.lock", "Pipfile.lock", "pdm.lock", "uv.lock", "Cargo.lock", "go.sum", "composer.lock",
+    "Gemfile.lock", "Podfile.lock", "packages.lock.json", "flake.lock", "mix.lock", "pubspec.lock",
+]
+
+# 默认第三方依赖目录
+DEFAULT_VENDORED = [
+    "vendor/", "vendors/", "third_party/", "third-party/", "thirdparty/", "external/",
+    "node_modules/", "bower_components/", "Pods/", "Carthage/", ".yarn/", "site-packages/",
+]
+
+# 默认生成文件
+DEFAULT_GENERATED = [
+    "*.min.js", "*.min.css", "*.min.mjs", "*.bundle.js", "*.chunk.js", "*.map",
+    "*.pb.go", "*.pb.cc", "*.pb.h", "*_pb2.py", "*_pb2_grpc.py", "*.pb.swift", "*_grpc.pb.go",
+    "*.generated.*", "*.g.dart", "*.freezed.dart", "*.designer.cs", "*.g.cs",
+    "__generated__/", "generated/", "dist/", "build/", "out/", ".next/", "coverage/",
+    "*.snap", "*.pyc",
+]
+
+# 默认二进制文件
+DEFAULT_BINARY = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.bmp", "*.ico", "*.webp", "*.tif", "*.tiff", "*.psd",
+    "*.pdf", "*.doc", "*.docx", "*.xls", "*.xlsx", "*.ppt", "*.pptx",
+    "*.zip", "*.tar", "*.gz", "*.tgz", "*.bz2", "*.xz", "*.7z", "*.rar", "*.jar", "*.war", "*.whl",
+    "*.exe", "*.dll", "*.so", "*.dylib", "*.a", "*.o", "*.obj", "*.class", "*.wasm",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp3", "*.mp4", "*.wav", "*.ogg", "*.mov", "*.avi", "*.webm",
+    "*.sqlite", "*.db", "*.bin", "*.dat", "*.pkl", "*.npy", "*.onnx", "*.pt",
+]
+
+
+class Category:
+    """分诊类别"""
+    SOURCE = "source"
+    GENERATED = "generated"
+    VENDORED = "vendored"
+    LOCKFILE = "lockfile"
+    BINARY = "binary"
+    MINIFIED = "minified"
+    EXCLUDED = "excluded"
+
+
+def glob_to_regex(pattern: str, match_dirs: bool = True) -> str:
+    """
+    将 gitignore 风格的通配模式转换为正则表达式
+
+    - 不含斜杠的模式匹配任意目录下的文件名，含斜杠（或以 / 开头）的模式相对仓库根目录
+    - * 不跨目录，** 跨任意层目录，? 匹配单个字符，[...] 为字符集
+    - 以 / 结尾的模式只匹配目录，即目录下的全部文件
+
+    Args:
+        pattern: 通配模式
+        match_dirs: 模式匹配到目录时是否同时匹配目录下的全部文件
+
+    Returns:
+        正则表达式（不含首尾锚点）
+    """
+    directory = pattern.endswith("/")
+    pattern = pattern.strip("/") if directory else pattern
+    anchored = pattern.startswith("/") or "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif char == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif char == "?":
+            parts.append("[^/]")
+            i += 1
+        elif char == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(char))
+            i += 1
+
+    regex = "".join(parts)
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    if directory:
+        regex += "/.*"
+    elif match_dirs:
+        regex += "(?:/.*)?"
+    return regex
+
+
+class GlobSet:
+    """
+    一组通配模式，编译为单个正则表达式，一次匹配即可得到命中的模式
+    """
+
+    def __init__(self, patterns: Iterable[str], match_dirs: bool = True):
+        """
+        初始化通配模式集合
+
+        Args:
+            patterns: 通配模式列表，空行和 # 开头的注释会被忽略
+            match_dirs: 模式匹配到目录时是否同时匹配目录下的全部文件
+        """
+        self.patterns = [p.strip() for p in patterns if p and p.strip() and not p.strip().startswith("#")]
+        if self.patterns:
+            groups = "|".join(f"(?P<p{i}>{glob_to_regex(p, match_dirs)})" for i, p in enumerate(self.patterns))
+            self.regex: Optional[re.Pattern] = re.compile(f"^(?:{groups})$", re.DOTALL)
+        else:
+            self.regex = None
+
+    def match(self, path: str) -> Optional[str]:
+        """
+        匹配路径
+
+        Args:
+            path: 相对仓库根目录的路径
+
+        Returns:
+            命中的模式，未命中返回 None
+        """
+        if self.regex is None:
+            return None
+        matched = self.regex.match(path)
+        if matched is None:
+            return None
+        return self.patterns[int(matched.lastgroup[1:])]
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+
+class GitAttributes:
+    """
+    .gitattributes 解析结果
+
+    同一路径匹配多行时后出现的行覆盖先出现的行，与 git 的语义一致。
+    """
+
+    # git 内置的宏属性
+    MACROS = {"binary": {"diff": False, "merge": False, "text": False}}
+
+    def __init__(self, rules: List[Tuple[re.Pattern, Dict[str, Any]]]):
+        self.rules = rules
+
+    @classmethod
+    def parse(cls, text: str) -> "GitAttributes":
+        """
+        解析 .gitattributes 内容
+
+        Args:
+            text: 文件内容
+
+        Returns:
+            GitAttributes 实例
+        """
+        rules = []
+        for raw in text.splitlines():
+            line = raw.strip()
+            if not line or line.startswith("#") or line.startswith("[attr]"):
+                continue
+            pattern, *items = line.split()
+            attrs: Dict[str, Any] = {}
+            for item in items:
+                if item.startswith("-"):
+                    attrs[item[1:]] = False
+                elif item.startswith("!"):
+                    attrs[item[1:]] = None
+                elif "=" in item:
+                    name, value = item.split("=", 1)
+                    lowered = value.lower()
+                    attrs[name] = True if lowered == "true" else False if lowered == "false" else value
+                else:
+                    attrs[item] = True
+                    attrs.update(cls.MACROS.get(item, {}))
+            # gitattributes 的模式不会递归匹配目录下的文件
+            rules.append((re.compile(f"^{glob_to_regex(pattern, match_dirs=False)}$", re.DOTALL), attrs))
+        return cls(rules)
+
+    def lookup(self, path: str) -> Dict[str, Any]:
+        """
+        获取路径的属性
+
+        Args:
+            path: 相对仓库根目录的路径
+
+        Returns:
+            属性字典，值为 True/False/字符串，未设置的属性不出现
+        """
+        result: Dict[str, Any] = {}
+        for regex, attrs in self.rules:
+            if regex.match(path):
+                result.update(attrs)
+        return {name: value for name, value in result.items() if value is not None}
+
+
+@dataclass(frozen=True)
+class TriageRules:
+    """仓库级分诊规则"""
+    # 强制评审的文件，优先级最高
+    include: Tuple[str, ...] = ()
+    # 额外排除的文件
+    exclude: Tuple[str, ...] = ()
+
+    @property
+    def key(self) -> str:
+        """规则摘要，用于缓存键"""
+        raw = "\0".join(self.include) + "\1" + "\0".join(self.exclude)
+        return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+@lru_cache(maxsize=256)
+def compile_rules(rules: TriageRules) -> Tuple[GlobSet, GlobSet]:
+    """
+    编译仓库规则，相同规则只编译一次
+
+    Args:
+        rules: 仓库规则
+
+    Returns:
+        (include, exclude) 通配模式集合
+    """
+    return GlobSet(rules.include), GlobSet(rules.exclude)
+
+
+@dataclass
+class TriageResult:
+    """单个文件的分诊结果"""
+    path: str
+    category: str
+    reason: str
+
+    @property
+    def reviewable(self) -> bool:
+        """是否需要评审"""
+        return self.category == Category.SOURCE
+
+
+@dataclass
+class TriageReport:
+    """一次提交的分诊结果"""
+    results: Dict[str, TriageResult] = field(default_factory=dict)
+
+    @property
+    def skipped(self) -> List[TriageResult]:
+        """被跳过的文件"""
+        return [result for result in self.results.values() if not result.reviewable]
+
+    def reviewable(self, path: str) -> bool:
+        """
+        判断文件是否需要评审，未分诊的文件视为需要评审
+
+        Args:
+            path: 文件路径
+        """
+        result = self.results.get(path)
+        return result is None or result.reviewable
+
+
+def sniff(path: str, head: bytes) -> Optional[Tuple[str, str]]:
+    """
+    根据文件开头的内容判断类别
+
+    Args:
+        path: 文件路径
+        head: 文件开头最多 SNIFF_BYTES 字节
+
+    Returns:
+        (类别, 原因)，判断为源码时返回 None
+    """
+    if b"\0" in head:
+        return Category.BINARY, "包含 NUL 字节"
+
+    # 生成标记通常位于前几行注释中
+    if _GENERATED_MARKER.search(head[:1024]):
+        return Category.GENERATED, "文件头部包含生成标记"
+
+    if path.lower().endswith(_MINIFIABLE) and len(head) >= 2048:
+        lines = head.count(b"\n") + 1
+        if len(head) / lines > 300:
+            return Category.MINIFIED, f"平均行长 {len(head) // lines} 字节"
+    return None
+
+
+class FileTriage:
+    """
+    文件分诊服务
+
+    每个提交的 .gitattributes 和分诊结果按 (仓库, 提交, 规则) 缓存，
+    同一提交被多次评审（重试、多个分析器）时不会重复获取和嗅探文件。
+    """
+
+    def __init__(self, max_commits: int = 256, fetch_concurrency: int = 8):
+        """
+        初始化文件分诊服务
+
+        Args:
+            max_commits: 最多缓存的提交数量
+            fetch_concurrency: 嗅探内容时的最大并发下载数
+        """
+        self.lockfiles = GlobSet(get_value("TRIAGE_LOCKFILES", DEFAULT_LOCKFILES))
+        self.vendored = GlobSet(get_value("TRIAGE_VENDORED", DEFAULT_VENDORED))
+        self.generated = GlobSet(get_value("TRIAGE_GENERATED", DEFAULT_GENERATED))
+        self.binary = GlobSet(get_value("TRIAGE_BINARY", DEFAULT_BINARY))
+        self.sniff_content = str(get_value("TRIAGE_SNIFF_CONTENT", True)).lower() != "false"
+        self.max_commits = max_commits
+        self.fetch_concurrency = fetch_concurrency
+        self.commits: "OrderedDict[Tuple[str, str, str], Dict[Tuple[str, Optional[str]], TriageResult]]" = OrderedDict()
+        self.attributes: "OrderedDict[Tuple[str, str], GitAttributes]" = OrderedDict()
+
+    def _remember(self, cache: OrderedDict, key: Any, value: Any) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_commits:
+            cache.popitem(last=False)
+
+    async def get_attributes(self, pr_service, owner: str, repo: str, commit_sha: str) -> GitAttributes:
+        """
+        获取提交根目录的 .gitattributes
+
+        Args:
+            pr_service: GitHub Pull Request 服务
+            owner: 仓库所有者
+            repo: 仓库名称
+            commit_sha: 提交 SHA
+
+        Returns:
+            GitAttributes 实例，文件不存在或获取失败时为空
+        """
+        key = (f"{owner}/{repo}", commit_sha)
+        attributes = self.attributes.get(key)
+        if attributes is not None:
+            self.attributes.move_to_end(key)
+            return attributes
+
+        try:
+            content = await pr_service.get_file_content(owner, repo, ".gitattributes", commit_sha)
+        except GitHubApiError as e:
+            logger.warning(f"获取 .gitattributes 失败 {owner}/{repo}@{commit_sha[:7]}: {str(e)}")
+            return GitAttributes([])
+
+        attributes = GitAttributes.parse(content.decode("utf-8", "replace")) if content else GitAttributes([])
+        self._remember(self.attributes, key, attributes)
+        return attributes
+
+    def classify_path(self, path: str, attributes: GitAttributes, rules: TriageRules) -> Optional[TriageResult]:
+        """
+        只根据路径判断类别
+
+        Args:
+            path: 文件路径
+            attributes: .gitattributes
+            rules: 仓库规则
+
+        Returns:
+            分诊结果，需要嗅探内容才能判断时返回 None
+        """
+        include, exclude = compile_rules(rules)
+        pattern = include.match(path)
+        if pattern:
+            return TriageResult(path, Category.SOURCE, f"仓库规则 include: {pattern}")
+
+        pattern = exclude.match(path)
+        if pattern:
+            return TriageResult(path, Category.EXCLUDED, f"仓库规则 exclude: {pattern}")
+
+        attrs = attributes.lookup(path)
+        for name, category in (("linguist-generated", Category.GENERATED), ("linguist-vendored", Category.VENDORED)):
+            if attrs.get(name) is True:
+                return TriageResult(path, category, f".gitattributes {name}")
+        if attrs.get("diff") is False or attrs.get("text") is False:
+            return TriageResult(path, Category.BINARY, ".gitattributes binary")
+
+        # .gitattributes 显式声明不是生成文件或第三方代码时不再套用对应的默认规则
+        checks = [(self.lockfiles, Category.LOCKFILE), (self.binary, Category.BINARY)]
+        if attrs.get("linguist-vendored") is not False:
+            checks.append((self.vendored, Category.VENDORED))
+        if attrs.get("linguist-generated") is not False:
+            checks.append((self.generated, Category.GENERATED))
+
+        for globs, category in checks:
+            pattern = globs.match(path)
+            if pattern:
+                return TriageResult(path, category, f"默认规则: {pattern}")
+        return None
+
+    async def _sniff(self, pr_service, owner: str, repo: str, path: str, blob_sha: str) -> TriageResult:
+        """下载文件开头的内容并嗅探类别，下载失败时按源码处理"""
+        try:
+            blob = await blob_store.pin_or_fetch(blob_sha, lambda: pr_service.get_blob_content(owner, repo, blob_sha))
+        except (GitHubApiError, BlobStoreError) as e:
+            logger.warning(f"获取文件内容失败，按源码处理 {path}: {str(e)}")
+            return TriageResult(path, Category.SOURCE, "内容获取失败")
+
+        try:
+            sniffed = sniff(path, bytes(blob.data[:SNIFF_BYTES]))
+        finally:
+            blob_store.release(blob)
+        if sniffed is None:
+            return TriageResult(path, Category.SOURCE, "源码")
+        return TriageResult(path, sniffed[0], sniffed[1])
+
+    async def triage(
+            self,
+            pr_service,
+            owner: str,
+            repo: str,
+            commit_sha: str,
+            files: List[Tuple[str, Optional[str]]],
+            rules: Optional[TriageRules] = None
+    ) -> TriageReport:
+        """
+        对一个提交中的文件分诊
+
+        Args:
+            pr_service: GitHub Pull Request 服务，用于获取 .gitattributes 和文件内容
+            owner: 仓库所有者
+            repo: 仓库名称
+            commit_sha: 提交 SHA
+            files: (路径, blob SHA) 列表，blob SHA 为空时不做内容嗅探
+            rules: 仓库规则
+
+        Returns:
+            分诊结果
+        """
+        rules = rules or TriageRules()
+        key = (f"{owner}/{repo}", commit_sha, rules.key)
+        cached = self.commits.get(key)
+        if cached is None:
+            cached = {}
+            self._remember(self.commits, key, cached)
+        else:
+            self.commits.move_to_end(key)
+
+        report = TriageReport()
+        pending: List[Tuple[str, Optional[str]]] = []
+        for path, blob_sha in files:
+            result = cached.get((path, blob_sha))
+            if result is not None:
+                report.results[path] = result
+            else:
+                pending.append((path, blob_sha))
+
+        if not pending:
+            return report
+
+        attributes = await self.get_attributes(pr_service, owner, repo, commit_sha)
+        to_sniff: List[Tuple[str, str]] = []
+        for path, blob_sha in pending:
+            result = self.classify_path(path, attributes, rules)
+            if result is None and blob_sha and self.sniff_content:
+                to_sniff.append((path, blob_sha))
+                continue
+            result = result or TriageResult(path, Category.SOURCE, "源码")
+            cached[(path, blob_sha)] = report.results[path] = result
+
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def sniff_one(path: str, blob_sha: str) -> None:
+            async with semaphore:
+                result = await self._sniff(pr_service, owner, repo, path, blob_sha)
+            cached[(path, blob_sha)] = report.results[path] = result
+
+        await asyncio.gather(*(sniff_one(path, blob_sha) for path, blob_sha in to_sniff))
+
+        skipped = report.skipped
+        if skipped:
+            logger.info(f"{owner}/{repo}@{commit_sha[:7]} 分诊跳过 {len(skipped)}/{len(report.results)} 个文件")
+        return report
+
+
+# 创建全局文件分诊服务（每个工作进程一个）
+file_triage = FileTriage(
+    max_commits=int(get_value("TRIAGE_CACHE_COMMITS", 256)),
+    fetch_concurrency=int(get_value("TRIAGE_FETCH_CONCURRENCY", 8))
+)
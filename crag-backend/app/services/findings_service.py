@@ -0,0 +1,297 @@
+"""
+评审问题存储服务，负责批量写入评审结果和按条件分页查询历史问题
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, select, update
+
+from app.model.database import session_scope
+from app.model.finding import Finding, ReviewRun, normalize_repo
+from app.services.analytics_service import record_run_rollups
+from app.services.github_pull_request_service import ReviewFinding
+
+logger = logging.getLogger(__name__)
+
+# 单次 executemany 写入的行数
+INSERT_BATCH_SIZE = 1000
+
+
+@dataclass
+class FindingPage:
+    """一页查询结果"""
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    # 下一页游标，没有更多数据时为 None
+    next_cursor: Optional[int] = None
+
+
+def finding_to_dict(finding: Finding) -> Dict[str, Any]:
+    """
+    将问题记录转换为接口返回的字典
+
+    Args:
+        finding: 问题记录
+
+    Returns:
+        问题字典
+    """
+    return {
+        "id": finding.id,
+        "run_id": finding.run_id,
+        "repo": finding.repo,
+        "pr_number": finding.pr_number,
+        "commit_sha": finding.commit_sha,
+        "path": finding.path,
+        "line": finding.line,
+        "rule": finding.rule,
+        "severity": finding.severity,
+        "fingerprint": finding.fingerprint,
+        "message": finding.message,
+        "created_at": finding.created_at
+    }
+
+
+def run_to_dict(run: ReviewRun) -> Dict[str, Any]:
+    """
+    将评审运行记录转换为接口返回的字典
+
+    Args:
+        run: 评审运行记录
+
+    Returns:
+        评审运行字典
+    """
+    return {
+        "id": run.id,
+        "repo": run.repo,
+        "pr_number": run.pr_number,
+        "commit_sha": run.commit_sha,
+        "status": run.status,
+        "finding_count": run.finding_count,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at
+    }
+
+
+class FindingStore:
+    """
+    评审问题存储
+
+    查询使用基于 id 的键集分页：游标是上一页最后一条记录的 id，
+    下一页只需在对应索引上从游标处继续扫描，翻页开销与页码无关。
+    """
+
+    def start_run(self, repo: str, pr_number: int, commit_sha: str) -> int:
+        """
+        登记一次评审运行
+
+        Args:
+            repo: 仓库全名 owner/repo
+            pr_number: PR 编号
+            commit_sha: 评审的提交
+
+        Returns:
+            评审运行 ID
+        """
+        with session_scope() as session:
+            run = ReviewRun(repo=normalize_repo(repo), pr_number=pr_number, commit_sha=commit_sha, status="running")
+            session.add(run)
+            session.flush()
+            return run.id
+
+    def complete_run(
+            self,
+            run_id: int,
+            findings: Iterable[ReviewFinding],
+            requested_at: Optional[float] = None,
+            changed_lines: Optional[int] = None
+    ) -> int:
+        """
+        在同一个事务中写入评审运行的全部问题、更新统计汇总并将运行标记为完成
+
+        Args:
+            run_id: 评审运行 ID
+            findings: 评审问题列表
+            requested_at: 评审请求时间，用于统计评审耗时
+            changed_lines: PR 新增与删除的总行数，用于统计 PR 规模分布
+
+        Returns:
+            写入的问题数量
+        """
+        now = time.time()
+        with session_scope() as session:
+            run = session.get(ReviewRun, run_id)
+            if run is None:
+                raise ValueError(f"评审运行不存在: {run_id}")
+            if run.status == "completed":
+                # 重复提交不能再次累加统计汇总
+                logger.warning(f"评审运行 {run_id} 已完成，忽略重复提交")
+                return run.finding_count
+
+            rows = [
+                {
+                    "run_id": run_id,
+                    "repo": run.repo,
+                    "pr_number": run.pr_number,
+                    "commit_sha": run.commit_sha,
+                    "path": finding.path,
+                    "line": finding.line,
+                    "rule": finding.rule,
+                    "severity": finding.severity,
+                    "fingerprint": finding.fingerprint,
+                    "message": finding.message,
+                    "created_at": now
+                }
+                for finding in findings
+            ]
+
+            # 多行参数交给 executemany，避免逐个构造 ORM 对象
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                session.execute(insert(Finding), rows[start:start + INSERT_BATCH_SIZE])
+
+            session.execute(
+                update(ReviewRun)
+                .where(ReviewRun.id == run_id)
+                .values(status="completed", finding_count=len(rows), finished_at=now)
+            )
+            record_run_rollups(session, run, rows, now, requested_at=requested_at, changed_lines=changed_lines)
+
+        logger.info(f"评审运行 {run_id} 已完成，写入 {len(rows)} 条问题")
+        return len(rows)
+
+    def fail_run(self, run_id: int) -> None:
+        """
+        将评审运行标记为失败
+
+        Args:
+            run_id: 评审运行 ID
+        """
+        with session_scope() as session:
+            session.execute(
+                update(ReviewRun)
+                .where(ReviewRun.id == run_id)
+                .values(status="failed", finished_at=time.time())
+            )
+
+    def record_run(
+            self,
+            repo: str,
+            pr_number: int,
+            commit_sha: str,
+            findings: Iterable[ReviewFinding],
+            requested_at: Optional[float] = None,
+            changed_lines: Optional[int] = None
+    ) -> int:
+        """
+        登记并完成一次评审运行
+
+        Args:
+            repo: 仓库全名 owner/repo
+            pr_number: PR 编号
+            commit_sha: 评审的提交
+            findings: 评审问题列表
+            requested_at: 评审请求时间
+            changed_lines: PR 新增与删除的总行数
+
+        Returns:
+            评审运行 ID
+        """
+        run_id = self.start_run(repo, pr_number, commit_sha)
+        try:
+            self.complete_run(run_id, findings, requested_at=requested_at, changed_lines=changed_lines)
+        except Exception:
+            self.fail_run(run_id)
+            raise
+        return run_id
+
+    def query(
+            self,
+            repo: str,
+            pr_number: Optional[int] = None,
+            rule: Optional[str] = None,
+            severity: Optional[str] = None,
+            path: Optional[str] = None,
+            run_id: Optional[int] = None,
+            cursor: Optional[int] = None,
+            limit: int = 50
+    ) -> FindingPage:
+        """
+        按条件查询问题，结果按 id 倒序（最新的在前）
+
+        Args:
+            repo: 仓库全名 owner/repo
+            pr_number: PR 编号过滤
+            rule: 规则过滤
+            severity: 严重程度过滤
+            path: 文件路径过滤
+            run_id: 评审运行过滤
+            cursor: 上一页返回的游标
+            limit: 每页数量
+
+        Returns:
+            查询结果页
+        """
+        statement = select(Finding).where(Finding.repo == normalize_repo(repo))
+        if pr_number is not None:
+            statement = statement.where(Finding.pr_number == pr_number)
+        if rule:
+            statement = statement.where(Finding.rule == rule)
+        if severity:
+            statement = statement.where(Finding.severity == severity)
+        if path:
+            statement = statement.where(Finding.path == path)
+        if run_id is not None:
+            statement = statement.where(Finding.run_id == run_id)
+        if cursor is not None:
+            statement = statement.where(Finding.id < cursor)
+
+        # 多取一条用于判断是否还有下一页
+        statement = statement.order_by(Finding.id.desc()).limit(limit + 1)
+
+        with session_scope() as session:
+            rows = session.scalars(statement).all()
+
+        page = FindingPage(items=[finding_to_dict(row) for row in rows[:limit]])
+        if len(rows) > limit:
+            page.next_cursor = rows[limit - 1].id
+        return page
+
+    def list_runs(
+            self,
+            repo: str,
+            pr_number: Optional[int] = None,
+            cursor: Optional[int] = None,
+            limit: int = 20
+    ) -> FindingPage:
+        """
+        查询仓库的评审运行记录，结果按 id 倒序
+
+        Args:
+            repo: 仓库全名 owner/repo
+            pr_number: PR 编号过滤
+            cursor: 上一页返回的游标
+            limit: 每页数量
+
+        Returns:
+            查询结果页
+        """
+        statement = select(ReviewRun).where(ReviewRun.repo == normalize_repo(repo))
+        if pr_number is not None:
+            statement = statement.where(ReviewRun.pr_number == pr_number)
+        if cursor is not None:
+            statement = statement.where(ReviewRun.id < cursor)
+        statement = statement.order_by(ReviewRun.id.desc()).limit(limit + 1)
+
+        with session_scope() as session:
+            rows = session.scalars(statement).all()
+
+        page = FindingPage(items=[run_to_dict(row) for row in rows[:limit]])
+        if len(rows) > limit:
+            page.next_cursor = rows[limit - 1].id
+        return page
+
+
+# 创建全局问题存储
+finding_store = FindingStore()
@@ -0,0 +1,387 @@
+"""
+GitHub App 认证，签发应用 JWT 并管理安装令牌的缓存与提前刷新
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+import httpx
+import jwt
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.singleflight import SingleFlight
+from app.model.database import session_scope
+from app.model.installation_token import InstallationToken
+from app.services.github_client import github_client
+from app.services.github_repos_service import GitHubApiError
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 应用 JWT 的有效期（GitHub 上限 10 分钟）
+JWT_LIFETIME = 540
+
+# 签发时间向前偏移，容忍与 GitHub 之间的时钟误差
+JWT_CLOCK_SKEW = 60
+
+
+@dataclass
+class CachedToken:
+    """进程内缓存的令牌"""
+    token: str
+    expires_at: float
+
+
+def _parse_expires_at(value: str) -> float:
+    """将 GitHub 返回的 ISO 8601 时间转换为时间戳"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class GitHubAppAuth:
+    """
+    GitHub App 认证管理
+
+    安装令牌有效期一小时，按安装缓存在进程内存和数据库中：
+    - 进程内缓存命中且剩余有效期足够时直接返回；
+    - 否则先读取其他工作进程写入数据库的令牌，仍不可用时才同步签发；
+    - 后台任务在令牌到期前 refresh_margin 秒内提前刷新，通过数据库租约保证
+      同一时刻只有一个工作进程向 GitHub 申请新令牌，请求路径上不会等待签发。
+    """
+
+    def __init__(
+            self,
+            app_id: Optional[str] = None,
+            private_key: Optional[str] = None,
+            api_url: str = "https://api.github.com",
+            refresh_margin: float = 600.0,
+            min_validity: float = 60.0
+    ):
+        """
+        初始化 GitHub App 认证
+
+        Args:
+            app_id: GitHub App ID
+            private_key: PEM 格式的 App 私钥
+            api_url: GitHub API 地址
+            refresh_margin: 距离到期多少秒时开始后台刷新
+            min_validity: 返回给调用方的令牌至少还剩的有效秒数
+        """
+        self.app_id = app_id
+        self.private_key = private_key
+        self.api_url = api_url
+        self.refresh_margin = refresh_margin
+        self.min_validity = min_validity
+
+        self.tokens: Dict[int, CachedToken] = {}
+        self.repo_installations: Dict[str, int] = {}
+        self.flights = SingleFlight()
+        self.minted_count = 0
+        self._jwt: Optional[CachedToken] = None
+        self._fernet: Optional[Fernet] = None
+
+    @property
+    def is_configured(self) -> bool:
+        """是否配置了 GitHub App"""
+        return bool(self.app_id and self.private_key)
+
+    def _require_configured(self) -> None:
+        if not self.is_configured:
+            raise GitHubApiError("未配置 GitHub App（GITHUB_APP_ID / GITHUB_APP_PRIVATE_KEY）")
+
+    @property
+    def fernet(self) -> Fernet:
+        """由 App 私钥派生的加密器，所有工作进程使用同一私钥因此可以互相解密"""
+        if self._fernet is None:
+            digest = hashlib.sha256(b"crag-installation-token:" + self.private_key.encode()).digest()
+            self._fernet = Fernet(base64.urlsafe_b64encode(digest))
+        return self._fernet
+
+    def app_jwt(self) -> str:
+        """
+        获取应用 JWT，到期前一分钟内重新签发
+
+        Returns:
+            RS256 签名的 JWT
+        """
+        self._require_configured()
+        now = time.time()
+        if self._jwt is None or self._jwt.expires_at - now < 60:
+            issued_at = int(now) - JWT_CLOCK_SKEW
+            payload = {"iat": issued_at, "exp": issued_at + JWT_LIFETIME, "iss": str(self.app_id)}
+            token = jwt.encode(payload, self.private_key, algorithm="RS256")
+            self._jwt = CachedToken(token=token, expires_at=float(issued_at + JWT_LIFETIME))
+        return self._jwt.token
+
+    def _app_headers(self) -> Dict[str, str]:
+        return {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+            "Authorization": f"Bearer {self.app_jwt()}"
+        }
+
+    async def get_installation_token(self, installation_id: int) -> str:
+        """
+        获取安装令牌
+
+        Args:
+            installation_id: GitHub App 安装 ID
+
+        Returns:
+            安装令牌
+
+        Raises:
+            GitHubApiError: 签发失败时
+        """
+        cached = self.tokens.get(installation_id)
+        if cached is not None and cached.expires_at - time.time() > self.min_validity:
+            return cached.token
+
+        async def _load() -> str:
+            shared = await asyncio.to_thread(self._load_shared, installation_id)
+            if shared is not None and shared.expires_at - time.time() > self.min_validity:
+                self.tokens[installation_id] = shared
+                return shared.token
+
+            logger.info(f"安装 {installation_id} 没有可用令牌，同步签发")
+            return (await self._mint(installation_id)).token
+
+        return await self.flights.do(installation_id, _load)
+
+    async def installation_headers(self, installation_id: int) -> Dict[str, str]:
+        """
+        获取以安装身份调用 API 的请求头
+
+        Args:
+            installation_id: GitHub App 安装 ID
+
+        Returns:
+            请求头字典
+        """
+        token = await self.get_installation_token(installation_id)
+        return {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+            "Authorization": f"Bearer {token}"
+        }
+
+    async def get_repo_installation(self, owner: str, repo: str) -> int:
+        """
+        查询仓库所属的安装 ID，结果在进程内缓存
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+
+        Returns:
+            安装 ID
+
+        Raises:
+            GitHubApiError: App 未安装到该仓库或请求失败时
+        """
+        key = f"{owner}/{repo}".lower()
+        installation_id = self.repo_installations.get(key)
+        if installation_id is not None:
+            return installation_id
+
+        url = f"{self.api_url}/repos/{owner}/{repo}/installation"
+        try:
+            response = await github_client.get(url, headers=self._app_headers())
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            logger.error(f"查询仓库安装失败: {str(e)}")
+            raise GitHubApiError(f"GitHub App 未安装到 {owner}/{repo}: {str(e)}")
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
+        installation_id = response.json()["id"]
+        self.repo_installations[key] = installation_id
+        return installation_id
+
+    async def _mint(self, installation_id: int) -> CachedToken:
+        """向 GitHub 申请新的安装令牌并写入缓存"""
+        url = f"{self.api_url}/app/installations/{installation_id}/access_tokens"
+        try:
+            response = await github_client.request("POST", url, headers=self._app_headers())
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            logger.error(f"签发安装令牌失败: {str(e)}")
+            raise GitHubApiError(f"签发安装令牌失败: {str(e)}")
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
+        data = response.json()
+        token = CachedToken(token=data["token"], expires_at=_parse_expires_at(data["expires_at"]))
+        self.minted_count += 1
+        self.tokens[installation_id] = token
+        await asyncio.to_thread(self._store_shared, installation_id, token)
+        logger.info(f"安装 {installation_id} 的令牌已签发，有效期至 {data['expires_at']}")
+        return token
+
+    def _load_shared(self, installation_id: int) -> Optional[CachedToken]:
+        """读取数据库中其他工作进程签发的令牌"""
+        with session_scope() as session:
+            row = session.get(InstallationToken, installation_id)
+            if row is None or not row.token:
+                # 只有租约占位、还没有写入令牌的记录同样视为不存在
+                return None
+            token_ciphertext, expires_at = row.token, row.expires_at
+
+        try:
+            token = self.fernet.decrypt(token_ciphertext.encode()).decode()
+        except InvalidToken:
+            # App 私钥轮换后旧令牌无法解密，视为不存在
+            return None
+        return CachedToken(token=token, expires_at=expires_at)
+
+    def _store_shared(self, installation_id: int, token: CachedToken) -> None:
+        """
+        将令牌加密后写入数据库并释放刷新租约
+
+        多个工作进程可能同时首次签发同一安装的令牌，SQLite 和 PostgreSQL 使用
+        INSERT ... ON CONFLICT DO UPDATE，后写入的令牌覆盖先写入的，两者都有效。
+        """
+        values = {
+            "token": self.fernet.encrypt(token.token.encode()).decode(),
+            "expires_at": token.expires_at,
+            "lease_until": None
+        }
+        with session_scope() as session:
+            dialect_insert = _dialect_insert(session)
+            if dialect_insert is not None:
+                statement = dialect_insert(InstallationToken).values(installation_id=installation_id, **values)
+                session.execute(statement.on_conflict_do_update(index_elements=["installation_id"], set_=values))
+                return
+
+            result = session.execute(
+                update(InstallationToken)
+                .where(InstallationToken.installation_id == installation_id)
+                .values(**values)
+            )
+            if result.rowcount == 0:
+                session.execute(insert(InstallationToken).values(installation_id=installation_id, **values))
+
+    def _acquire_lease(self, installation_id: int, duration: float = 30.0) -> bool:
+        """
+        尝试获取刷新租约
+
+        已有记录时只有租约空闲或过期才能获得；还没有记录时插入一条只带租约的占位记录，
+        并发插入中只有一个工作进程成功。
+        """
+        now = time.time()
+        with session_scope() as session:
+            result = session.execute(
+                update(InstallationToken)
+                .where(InstallationToken.installation_id == installation_id,
+                       or_(InstallationToken.lease_until.is_(None), InstallationToken.lease_until < now))
+                .values(lease_until=now + duration)
+            )
+            if result.rowcount == 1:
+                return True
+
+            placeholder = {"installation_id": installation_id, "token": "", "expires_at": 0.0,
+                           "lease_until": now + duration}
+            dialect_insert = _dialect_insert(session)
+            if dialect_insert is not None:
+                result = session.execute(
+                    dialect_insert(InstallationToken).values(**placeholder).on_conflict_do_nothing()
+                )
+                return result.rowcount == 1
+
+            try:
+                with session.begin_nested():
+                    session.execute(insert(InstallationToken).values(**placeholder))
+            except IntegrityError:
+                return False
+            return True
+
+    async def refresh_due(self) -> int:
+        """
+        提前刷新即将到期的令牌，由后台周期任务调用
+
+        Returns:
+            本进程签发的令牌数量
+        """
+        if not self.is_configured:
+            return 0
+
+        minted = 0
+        now = time.time()
+        for installation_id, cached in list(self.tokens.items()):
+            if cached.expires_at - now > self.refresh_margin:
+                continue
+
+            # 其他工作进程可能已经刷新过
+            shared = await asyncio.to_thread(self._load_shared, installation_id)
+            if shared is not None and shared.expires_at - now > self.refresh_margin:
+                self.tokens[installation_id] = shared
+                continue
+
+            if not await asyncio.to_thread(self._acquire_lease, installation_id):
+                continue
+
+            try:
+                await self.flights.do(installation_id, lambda: self._mint(installation_id))
+                minted += 1
+            except (GitHubApiError, CircuitOpenError) as e:
+                logger.warning(f"提前刷新安装 {installation_id} 的令牌失败: {str(e)}")
+        return minted
+
+
+def _dialect_insert(session: Session):
+    """SQLite 和 PostgreSQL 返回支持 ON CONFLICT 的 insert 构造函数，其他数据库返回 None"""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert
+    return None
+
+
+def load_private_key() -> Optional[str]:
+    """
+    读取 GitHub App 私钥，优先使用 GITHUB_APP_PRIVATE_KEY，其次读取 GITHUB_APP_PRIVATE_KEY_PATH 指向的文件
+
+    Returns:
+        PEM 格式私钥，未配置时返回 None
+    """
+    private_key = get_value("GITHUB_APP_PRIVATE_KEY")
+    if private_key:
+        # 环境变量中的换行通常被写成 \n
+        return private_key.replace("\\n", "\n")
+
+    path = get_value("GITHUB_APP_PRIVATE_KEY_PATH")
+    if path:
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+    return None
+
+
+def create_github_app_auth() -> GitHubAppAuth:
+    """
+    根据配置创建 GitHub App 认证
+
+    Returns:
+        GitHubAppAuth 实例
+    """
+    return GitHubAppAuth(
+        app_id=get_value("GITHUB_APP_ID"),
+        private_key=load_private_key(),
+        refresh_margin=float(get_value("GITHUB_APP_TOKEN_REFRESH_MARGIN", 600))
+    )
+
+
+# 创建全局 GitHub App 认证（每个工作进程一个）
+github_app_auth = create_github_app_auth()
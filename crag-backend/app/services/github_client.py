@@ -0,0 +1,469 @@
+"""
+GitHub HTTP 客户端，在每个工作进程内复用同一个连接池
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional
+
+import httpx
+
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.deadline import DeadlineExceeded, budget, remaining
+from app.core.singleflight import SingleFlight
+from app.services.github_transport import create_transport
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+
+def authorization_scope(headers: Optional[Dict[str, str]]) -> str:
+    """
+    计算授权范围标识，只保留授权头的摘要
+
+    Args:
+        headers: 请求头
+
+    Returns:
+        授权范围标识，无授权头时为空字符串
+    """
+    for key, value in (headers or {}).items():
+        if key.lower() == "authorization" and value:
+            return hashlib.sha256(value.encode()).hexdigest()
+    return ""
+
+
+class WriteScheduler:
+    """
+    写请求调度器
+
+    GitHub 建议同一身份的写请求串行发送且间隔至少 1 秒，否则容易触发二级速率限制。
+    调度器按授权范围串行化写请求，并在收到 Retry-After 时暂停该范围的后续写请求。
+    """
+
+    def __init__(self, min_interval: float = 1.0, max_wait: float = 60.0):
+        """
+        初始化写请求调度器
+
+        Args:
+            min_interval: 同一授权范围两次写请求之间的最小间隔（秒）
+            max_wait: 等待暂停结束的最长时间（秒）
+        """
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.next_allowed: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, scope: str) -> AsyncIterator[None]:
+        """
+        获取一个写请求时间片
+
+        等待时间超出当前请求剩余的预算时立即失败，不在持有锁的情况下睡过截止时间，
+        后续排队的写请求也不会因此被拖住。
+
+        Args:
+            scope: 授权范围标识
+
+        Raises:
+            DeadlineExceeded: 剩余预算不足以等到下一个时间片时
+            RateLimitExceededError: 暂停时长超过 max_wait 时
+        """
+        lock = self.locks.setdefault(scope, asyncio.Lock())
+        timeout = budget(self.max_wait)
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout=timeout)
+        except asyncio.TimeoutError as e:
+            if timeout < self.max_wait:
+                raise DeadlineExceeded() from e
+            raise self._rate_limited(self.max_wait) from e
+
+        try:
+            delay = self.next_allowed.get(scope, 0) - time.monotonic()
+            if delay > 0:
+                left = remaining()
+                if left is not None and delay >= left:
+                    raise DeadlineExceeded()
+                if delay > self.max_wait:
+                    raise self._rate_limited(delay)
+                await asyncio.sleep(delay)
+            try:
+                yield
+            finally:
+                self.pause(scope, self.min_interval)
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _rate_limited(delay: float) -> Exception:
+        """构造暂停时间过长时的速率限制异常"""
+        # 延迟导入，github_repos_service 依赖本模块
+        from app.services.github_repos_service import RateLimitExceededError
+        return RateLimitExceededError(int(time.time() + delay))
+
+    def pause(self, scope: str, seconds: float) -> None:
+        """
+        暂停指定授权范围的写请求
+
+        Args:
+            scope: 授权范围标识
+            seconds: 暂停时长（秒）
+        """
+        self.next_allowed[scope] = max(self.next_allowed.get(scope, 0), time.monotonic() + seconds)
+
+
+class GitHubClient:
+    """GitHub HTTP 客户端，封装共享的 httpx.AsyncClient"""
+
+    def __init__(self, api_url: str = "https://api.github.com"):
+        """
+        初始化 GitHub HTTP 客户端
+
+        Args:
+            api_url: GitHub API 地址
+        """
+        self.api_url = api_url
+        self._client: Optional[httpx.AsyncClient] = None
+        # 合并相同的并发 GET 请求
+        self.flights = SingleFlight()
+        self.coalesce = str(get_value("GITHUB_COALESCE_REQUESTS", True)).lower() != "false"
+        self.coalesced_count = 0
+        # 串行化写请求
+        self.write_scheduler = WriteScheduler(
+            float(get_value("GITHUB_WRITE_INTERVAL", 1.0)),
+            float(get_value("GITHUB_WRITE_MAX_WAIT", 60.0)),
+        )
+        # GitHub 持续失败时快速失败
+        self.breaker = CircuitBreaker(
+            "github",
+            failure_ratio=float(get_value("GITHUB_BREAKER_FAILURE_RATIO", 0.5)),
+            min_calls=int(get_value("GITHUB_BREAKER_MIN_CALLS", 20)),
+            window=float(get_value("GITHUB_BREAKER_WINDOW", 30.0)),
+            open_seconds=float(get_value("GITHUB_BREAKER_OPEN_SECONDS", 15.0)),
+        )
+        # 对冲 GET 请求：首个请求超过近期 P95 延迟仍未返回时再发一个，取先返回的结果
+        self.hedge = str(get_value("GITHUB_HEDGE_REQUESTS", False)).lower() == "true"
+        self.hedge_ratio = float(get_value("GITHUB_HEDGE_RATIO", 0.1))
+        self.hedge_min_delay = float(get_value("GITHUB_HEDGE_MIN_DELAY", 0.05))
+        self.latencies: Deque[float] = deque(maxlen=512)
+        self.get_count = 0
+        self.hedged_count = 0
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """根据配置创建带连接池的 httpx 客户端"""
+        limits = httpx.Limits(
+            max_connections=int(get_value("GITHUB_HTTP_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(get_value("GITHUB_HTTP_MAX_KEEPALIVE", 20)),
+        )
+        # 录制或回放模式下替换传输层，关闭客户端时一并关闭
+        return httpx.AsyncClient(limits=limits, transport=create_transport(limits))
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        获取共享客户端，未通过生命周期打开时按需创建
+
+        Returns:
+            httpx.AsyncClient 实例
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def open(self) -> None:
+        """打开连接池"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            logger.info("GitHub 连接池已打开")
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("GitHub 连接池已关闭")
+        self._client = None
+
+    async def request(
+            self,
+            method: str,
+            url: str,
+            headers: Optional[Dict[str, str]] = None,
+            params: Optional[Dict[str, Any]] = None,
+            json: Any = None,
+            timeout: float = 30.0
+    ) -> httpx.Response:
+        """
+        发送 HTTP 请求
+
+        Args:
+            method: HTTP 方法
+            url: 完整 URL
+            headers: 请求头
+            params: 查询参数
+            json: JSON 请求体
+            timeout: 超时时间（秒）
+
+        Returns:
+            响应对象
+
+        Raises:
+            DeadlineExceeded: 当前请求的截止时间已到时
+            CircuitOpenError: GitHub 熔断中时
+        """
+        # 超时时间不超过当前请求剩余的预算
+        effective = budget(timeout)
+        self.breaker.check()
+
+        try:
+            # httpx 的超时只约束单次连接和读写，整体耗时由 wait_for 约束
+            response = await asyncio.wait_for(
+                self.client.request(
+                    method,
+                    url,
+                    headers=headers,
+                    params=params,
+                    json=json,
+                    timeout=effective
+                ),
+                timeout=effective
+            )
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+            if effective < timeout:
+                # 超时由调用方预算不足导致，不计入 GitHub 的失败
+                self.breaker.release()
+                raise DeadlineExceeded() from e
+            self.breaker.record(False)
+            if isinstance(e, httpx.TimeoutException):
+                raise
+            raise httpx.ReadTimeout(f"请求超过 {timeout} 秒未完成") from e
+        except Exception:
+            # 传输错误以及解码失败、重定向过多等其他错误都计为失败，半开状态的探测名额随之归还
+            self.breaker.record(False)
+            raise
+
+        self.breaker.record(response.status_code < 500)
+        return response
+
+    async def get(
+            self,
+            url: str,
+            headers: Optional[Dict[str, str]] = None,
+            params: Optional[Dict[str, Any]] = None,
+            timeout: float = 30.0
+    ) -> httpx.Response:
+        """
+        发送 GET 请求
+
+        URL、查询参数和授权范围都相同的并发请求会合并为一次上游调用，
+        所有等待者共享同一个已读取完毕的响应对象。
+
+        Args:
+            url: 完整 URL
+            headers: 请求头
+            params: 查询参数
+            timeout: 超时时间（秒）
+
+        Returns:
+            响应对象
+        """
+        self.get_count += 1
+        if not self.coalesce:
+            return await self._hedged_get(url, headers, params, timeout)
+
+        key = self.request_key("GET", url, headers, params)
+        if self.flights.in_flight(key):
+            self.coalesced_count += 1
+
+        return await self.flights.do(key, lambda: self._hedged_get(url, headers, params, timeout))
+
+    async def _timed_get(
+            self,
+            url: str,
+            headers: Optional[Dict[str, str]],
+            params: Optional[Dict[str, Any]],
+            timeout: float
+    ) -> httpx.Response:
+        """发送 GET 请求并记录成功响应的延迟"""
+        started = time.monotonic()
+        response = await self.request("GET", url, headers=headers, params=params, timeout=timeout)
+        if response.status_code < 500:
+            self.latencies.append(time.monotonic() - started)
+        return response
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        计算对冲延迟，即近期 GET 请求延迟的 P95
+
+        Returns:
+            延迟秒数，样本不足时返回 None
+        """
+        if len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return max(ordered[int(len(ordered) * 0.95) - 1], self.hedge_min_delay)
+
+    def _may_hedge(self, delay: Optional[float]) -> bool:
+        """判断是否允许对冲：已启用、有延迟样本、剩余预算足够且对冲请求不超过比例上限"""
+        if not self.hedge or delay is None or self.breaker.state != CircuitBreaker.CLOSED:
+            return False
+        left = remaining()
+        if left is not None and left <= delay:
+            return False
+        return self.hedged_count < self.hedge_ratio * self.get_count
+
+    async def _hedged_get(
+            self,
+            url: str,
+            headers: Optional[Dict[str, str]],
+            params: Optional[Dict[str, Any]],
+            timeout: float
+    ) -> httpx.Response:
+        """
+        发送可对冲的 GET 请求
+
+        首个请求超过对冲延迟仍未返回时再发送一个相同的请求，返回先成功的响应并取消另一个。
+        GET 请求是幂等的，重复发送不会产生副作用。
+        """
+        delay = self.hedge_delay()
+        if not self._may_hedge(delay):
+            return await self._timed_get(url, headers, params, timeout)
+
+        loop = asyncio.get_running_loop()
+        pending = {loop.create_task(self._timed_get(url, headers, params, timeout))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done and self._may_hedge(delay):
+                self.hedged_count += 1
+                logger.debug(f"GitHub 请求超过 {delay:.3f} 秒未返回，发送对冲请求: {url}")
+                pending.add(loop.create_task(self._timed_get(url, headers, params, timeout)))
+
+            error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def write(
+            self,
+            method: str,
+            url: str,
+            headers: Optional[Dict[str, str]] = None,
+            json: Any = None,
+            timeout: float = 30.0,
+            max_retries: int = 2
+    ) -> httpx.Response:
+        """
+        通过写请求调度器发送 POST/PATCH/PUT/DELETE 请求
+
+        触发二级速率限制时按 Retry-After 暂停并重试。
+
+        Args:
+            method: HTTP 方法
+            url: 完整 URL
+            headers: 请求头
+            json: JSON 请求体
+            timeout: 超时时间（秒）
+            max_retries: 触发速率限制后的最大重试次数
+
+        Returns:
+            响应对象
+        """
+        scope = authorization_scope(headers)
+        for attempt in range(max_retries + 1):
+            async with self.write_scheduler.slot(scope):
+                response = await self.request(method, url, headers=headers, json=json, timeout=timeout)
+
+            retry_after = self._retry_after(response)
+            if retry_after is None or attempt == max_retries:
+                return response
+
+            logger.warning(f"GitHub 写请求触发速率限制，{retry_after} 秒后重试: {method} {url}")
+            self.write_scheduler.pause(scope, retry_after)
+
+        return response
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取客户端指标
+
+        Returns:
+            指标字典
+        """
+        return {
+            "breaker": self.breaker.metrics(),
+            "get_count": self.get_count,
+            "coalesced": self.coalesced_count,
+            "hedged": self.hedged_count,
+            "hedge_delay": self.hedge_delay()
+        }
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        """解析速率限制响应需要等待的时间，非速率限制响应返回 None"""
+        if response.status_code not in (403, 429):
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                return 60.0
+
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = response.headers.get("X-RateLimit-Reset")
+            if reset and reset.isdigit():
+                return max(float(reset) - time.time(), 1.0)
+
+        if "secondary rate limit" in response.text.lower():
+            return 60.0
+        return None
+
+    @staticmethod
+    def request_key(
+            method: str,
+            url: str,
+            headers: Optional[Dict[str, str]] = None,
+            params: Optional[Dict[str, Any]] = None
+    ) -> Hashable:
+        """
+        计算请求合并键
+
+        授权头只保留摘要，不同令牌的请求不会被合并，也不会在内存中留下令牌副本。
+
+        Args:
+            method: HTTP 方法
+            url: 完整 URL
+            headers: 请求头
+            params: 查询参数
+
+        Returns:
+            合并键
+        """
+        scope = authorization_scope(headers)
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        return (
+            method,
+            url,
+            tuple(sorted((k, str(v)) for k, v in (params or {}).items())),
+            headers.get("accept", ""),
+            headers.get("x-github-api-version", ""),
+            scope,
+        )
+
+
+# 创建全局 GitHub 客户端（每个工作进程一个）
+github_client = GitHubClient()
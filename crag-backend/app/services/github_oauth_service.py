@@ -5,6 +5,7 @@ import secrets
 from typing import Dict, Any, Optional
 from fastapi.responses import RedirectResponse
 from app.util import config
+from app.core.oauth_state_store import OAuthStateStore, create_state_store
 
 # 获取日志记录器
 logger = logging.getLogger(__name__)
@@ -13,12 +14,13 @@ logger = logging.getLogger(__name__)
 class GitHubOAuthService:
     """GitHub OAuth服务"""
 
-    def __init__(self, config_dict: Optional[Dict[str, Any]] = None):
+    def __init__(self, config_dict: Optional[Dict[str, Any]] = None, state_store: Optional[OAuthStateStore] = None):
         """
         初始化 GitHub OAuth 服务
         
         Args:
             config_dict: 可选的配置字典，如果提供则使用，否则从全局配置获取
+            state_store: 可选的状态值存储，默认根据配置创建
         """
         # 获取配置
         if config_dict is None:
@@ -35,8 +37,8 @@ class GitHubOAuthService:
         self.auth_url = "https://github.com/login/oauth/authorize"
         self.token_url = "https://github.com/login/oauth/access_token"
         self.api_url = "https://api.github.com"
-        # 存储状态值，用于防止CSRF攻击
-        self.states = {}
+        # 存储状态值，用于防止CSRF攻击，带过期时间和容量上限
+        self.state_store = state_store or create_state_store()
 
     def generate_state(self) -> str:
         """
@@ -46,7 +48,7 @@ class GitHubOAuthService:
             随机状态字符串
         """
         state = secrets.token_urlsafe(16)
-        self.states[state] = True
+        self.state_store.put(state)
         return state
 
     def validate_state(self, state: str) -> bool:
@@ -59,11 +61,8 @@ class GitHubOAuthService:
         Returns:
             是否有效
         """
-        if state in self.states:
-            # 使用后删除，确保一次性使用
-            del self.states[state]
-            return True
-        return False
+        # 使用后删除，确保一次性使用
+        return self.state_store.consume(state)
 
     def get_authorization_redirect(self, state: Optional[str] = None) -> RedirectResponse:
         """
@@ -1,13 +1,638 @@
+import hashlib
 import logging
-import requests
-from typing import List, Dict, Optional, Union, TypedDict, Tuple
+import re
+import httpx
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Tuple
+from app.services.github_app_auth import github_app_auth
+from app.services.github_client import github_client
+from app.services.github_repos_service import GitHubApiError, RateLimitExceededError, RepoNotFoundError
+from app.util.config import get_value
 
 logger = logging.getLogger(__name__)
 
+# 机器人评论的隐藏标记，用于识别由 CRAG 发布的评论
+COMMENT_MARKER = "<!-- crag"
+
+# 评论中的指纹标记，例如 <!-- crag:fp=0123abcd -->
+_FINGERPRINT_PATTERN = re.compile(r"<!-- crag:fp=([0-9a-f]+) -->")
+
+# 指纹归一化时忽略空白差异
+_WHITESPACE = re.compile(r"\s+")
+# GitHub 评审正文的长度上限
+MAX_REVIEW_BODY_CHARS = 65536
+
+
+@dataclass
+class ReviewFinding:
+    """一次评审产生的单条问题"""
+    path: str
+    line: int
+    rule: str
+    severity: str
+    message: str
+    start_line: Optional[int] = None
+    suggestion: Optional[str] = None
+    # 问题所在行的源码，用于生成不随行号变化的指纹
+    context: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        稳定指纹，不包含行号，代码上下移动后仍能识别为同一问题
+
+        Returns:
+            16 位十六进制指纹
+        """
+        message = _WHITESPACE.sub(" ", self.message.strip().lower())
+        context = _WHITESPACE.sub(" ", (self.context or "").strip())
+        raw = "\0".join([self.path, self.rule, message, context])
+        return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+    def render_body(self) -> str:
+        """
+        生成评论正文
+
+        Returns:
+            Markdown 格式的评论正文
+        """
+        body = f"**[{self.severity}] {self.rule}**\n\n{self.message}"
+        if self.suggestion:
+            body += f"\n\n```suggestion\n{self.suggestion}\n```"
+        return f"{body}\n\n<!-- crag:fp={self.fingerprint} -->"
+
+    def to_review_comment(self) -> Dict[str, Any]:
+        """
+        转换为 GitHub 评审 API 的评论结构
+
+        Returns:
+            评论字典
+        """
+        comment = {"path": self.path, "line": self.line, "side": "RIGHT", "body": self.render_body()}
+        if self.start_line and self.start_line < self.line:
+            comment["start_line"] = self.start_line
+            comment["start_side"] = "RIGHT"
+        return comment
+
+
+def extract_fingerprints(body: Optional[str]) -> Set[str]:
+    """
+    从评论或评审正文中提取全部指纹
+
+    Args:
+        body: 评论或评审正文
+
+    Returns:
+        指纹集合
+    """
+    return set(_FINGERPRINT_PATTERN.findall(body or ""))
+
+
+@dataclass
+class PublishResult:
+    """评审发布结果"""
+    reviews: List[Dict[str, Any]] = field(default_factory=list)
+    published: int = 0
+    duplicates: int = 0
+    unanchored: int = 0
+
+    @property
+    def api_calls(self) -> int:
+        """发布评审使用的写请求次数"""
+        return len(self.reviews)
+
 
 class GithubPullRequestService:
-    def __init__(self, github_token):
-        pass
+    """GitHub Pull Request 服务，用于获取 PR、文件变更和评论"""
+
+    def __init__(self, github_token=None):
+        """
+        初始化 GitHub Pull Request 服务
+
+        Args:
+            github_token: GitHub 访问令牌
+        """
+        self.access_token = github_token
+        self.api_url = "https://api.github.com"
+        self.headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28"
+        }
+
+        if github_token:
+            self.headers["Authorization"] = f"Bearer {github_token}"
+
+    async def _get_json(self, url: str, params: Optional[Dict[str, Any]] = None, action: str = "请求 GitHub API") -> Any:
+        """
+        发送 GET 请求并解析 JSON
+
+        Args:
+            url: 完整 URL
+            params: 查询参数
+            action: 操作描述，用于错误信息
+
+        Returns:
+            解析后的 JSON
+
+        Raises:
+            GitHubApiError: 当 API 调用失败时
+        """
+        try:
+            response = await github_client.get(
+                url,
+                headers=self.headers,
+                params=params,
+                timeout=30.0
+            )
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 403 and "rate limit" in e.response.text.lower():
+                reset_time = e.response.headers.get("X-RateLimit-Reset", "unknown time")
+                logger.error(f"GitHub API 速率限制错误: {reset_time}")
+                raise RateLimitExceededError(reset_time)
+
+            if e.response.status_code == 404:
+                # GitHub 对无权访问的私有仓库同样返回 404
+                raise RepoNotFoundError(f"{action}失败: 资源不存在或无权访问")
+
+            logger.error(f"{action}失败: {str(e)}")
+            raise GitHubApiError(f"{action}失败: {str(e)}")
+
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
+    async def _get_paginated(self, url: str, action: str, max_pages: int = 30) -> List[Dict[str, Any]]:
+        """
+        分页获取列表接口的全部结果
+
+        Args:
+            url: 完整 URL
+            action: 操作描述
+            max_pages: 最多获取的页数，每页 100 条
+
+        Returns:
+            结果列表
+        """
+        items: List[Dict[str, Any]] = []
+        for page in range(1, max_pages + 1):
+            batch = await self._get_json(url, params={"per_page": 100, "page": page}, action=action)
+            items.extend(batch)
+            if len(batch) < 100:
+                break
+        return items
+
+    async def get_pull_request(self, owner: str, repo: str, number: int) -> Dict[str, Any]:
+        """
+        获取 Pull Request 详情
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+
+        Returns:
+            PR 详情，包含 base/head 的 SHA
+
+        Raises:
+            RepoNotFoundError: PR 不存在或无权访问时
+            RateLimitExceededError: 达到速率限制时
+            GitHubApiError: 其他 API 错误
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/pulls/{number}"
+        logger.info(f"获取 PR 信息: {owner}/{repo}#{number}")
+        return await self._get_json(url, action="获取 PR 信息")
+
+    async def list_pull_request_files(self, owner: str, repo: str, number: int) -> List[Dict[str, Any]]:
+        """
+        获取 Pull Request 的文件变更列表（GitHub 最多返回 3000 个文件）
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+
+        Returns:
+            文件变更列表，每项包含 filename、status、patch 等字段
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/pulls/{number}/files"
+        return await self._get_paginated(url, action="获取 PR 文件列表")
+
+    async def compare_commits(self, owner: str, repo: str, base: str, head: str) -> Dict[str, Any]:
+        """
+        比较两个提交
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            base: 基准提交 SHA
+            head: 目标提交 SHA
+
+        Returns:
+            比较结果，status 为 ahead/behind/diverged/identical，files 包含逐文件 patch
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/compare/{base}...{head}"
+        logger.info(f"比较提交: {owner}/{repo} {base[:7]}...{head[:7]}")
+        return await self._get_json(url, action="比较提交")
+
+    async def get_tree(self, owner: str, repo: str, sha: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        递归获取提交中的全部文件
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            sha: 提交或树 SHA
+
+        Returns:
+            (文件条目列表, 是否被截断)，每项包含 path、sha、size；子模块和目录不包含在内。
+            文件树过大时 GitHub 只返回部分文件，此时不能据此判断文件已删除
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/git/trees/{sha}"
+        tree = await self._get_json(url, params={"recursive": "1"}, action="获取文件树")
+        truncated = bool(tree.get("truncated"))
+        if truncated:
+            logger.warning(f"{owner}/{repo}@{sha[:7]} 文件树过大，GitHub 只返回了部分文件")
+        return [entry for entry in tree.get("tree", []) if entry.get("type") == "blob"], truncated
+
+    async def get_blob_content(self, owner: str, repo: str, sha: str) -> bytes:
+        """
+        按 blob SHA 获取原始文件内容
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            sha: blob SHA
+
+        Returns:
+            文件内容
+
+        Raises:
+            GitHubApiError: 当 API 调用失败时
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/git/blobs/{sha}"
+        headers = dict(self.headers, Accept="application/vnd.github.raw")
+
+        try:
+            response = await github_client.get(url, headers=headers, timeout=30.0)
+            response.raise_for_status()
+            return response.content
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"获取文件内容失败: {str(e)}")
+            raise GitHubApiError(f"获取文件内容失败: {str(e)}")
+
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
+    async def get_content_entry(self, owner: str, repo: str, path: str, ref: str) -> Optional[Dict[str, Any]]:
+        """
+        获取指定提交中文件的内容 API 条目（包含 blob SHA 和 base64 编码的内容）
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            path: 文件路径
+            ref: 提交 SHA 或分支名
+
+        Returns:
+            内容条目，文件不存在或路径是目录时返回 None
+
+        Raises:
+            GitHubApiError: 当 API 调用失败时
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/contents/{path}"
+
+        try:
+            response = await github_client.get(url, headers=self.headers, params={"ref": ref}, timeout=30.0)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            entry = response.json()
+            return entry if isinstance(entry, dict) and entry.get("type") == "file" else None
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"获取文件信息失败: {str(e)}")
+            raise GitHubApiError(f"获取文件信息失败: {str(e)}")
+
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
+    async def get_file_content(self, owner: str, repo: str, path: str, ref: str) -> Optional[bytes]:
+        """
+        获取指定提交中的文件内容
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            path: 文件路径
+            ref: 提交 SHA 或分支名
+
+        Returns:
+            文件内容，文件不存在时返回 None
+
+        Raises:
+            GitHubApiError: 当 API 调用失败时
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/contents/{path}"
+        headers = dict(self.headers, Accept="application/vnd.github.raw")
+
+        try:
+            response = await github_client.get(url, headers=headers, params={"ref": ref}, timeout=30.0)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.content
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"获取文件内容失败: {str(e)}")
+            raise GitHubApiError(f"获取文件内容失败: {str(e)}")
+
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
+    async def list_review_comments(self, owner: str, repo: str, number: int) -> List[Dict[str, Any]]:
+        """
+        获取 Pull Request 的行内评审评论
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+
+        Returns:
+            评论列表
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/pulls/{number}/comments"
+        return await self._get_paginated(url, action="获取 PR 评论")
+
+    async def list_bot_comments(self, owner: str, repo: str, number: int) -> List[Dict[str, Any]]:
+        """
+        获取由 CRAG 发布的行内评论
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+
+        Returns:
+            评论列表
+        """
+        comments = await self.list_review_comments(owner, repo, number)
+        return [comment for comment in comments if COMMENT_MARKER in (comment.get("body") or "")]
+
+    async def list_bot_reviews(self, owner: str, repo: str, number: int) -> List[Dict[str, Any]]:
+        """
+        获取由 CRAG 提交的评审（正文中可能包含无法行内评论的问题）
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+
+        Returns:
+            评审列表
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/pulls/{number}/reviews"
+        reviews = await self._get_paginated(url, action="获取 PR 评审")
+        return [review for review in reviews if COMMENT_MARKER in (review.get("body") or "")]
+
+
+    async def create_review(
+            self,
+            owner: str,
+            repo: str,
+            number: int,
+            commit_id: str,
+            body: str,
+            comments: List[Dict[str, Any]],
+            event: str = "COMMENT"
+    ) -> Dict[str, Any]:
+        """
+        一次性提交包含多条行内评论的评审
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+            commit_id: 评论所针对的提交 SHA
+            body: 评审总结
+            comments: 行内评论列表
+            event: 评审事件，可选值：COMMENT, APPROVE, REQUEST_CHANGES
+
+        Returns:
+            创建的评审
+
+        Raises:
+            GitHubApiError: 当 API 调用失败时
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/pulls/{number}/reviews"
+        payload = {"commit_id": commit_id, "body": body, "event": event, "comments": comments}
+
+        try:
+            response = await github_client.write("POST", url, headers=self.headers, json=payload, timeout=60.0)
+            response.raise_for_status()
+            logger.info(f"已提交评审 {owner}/{repo}#{number}，评论 {len(comments)} 条")
+            return response.json()
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"提交评审失败: {str(e)} {e.response.text[:500]}")
+            raise GitHubApiError(f"提交评审失败: {str(e)}")
+
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
+
+class ReviewPublisher:
+    """
+    评审发布器
+
+    将一次评审的全部问题合并为一个 GitHub 评审提交，按指纹跳过已发布过的问题，
+    评论过多时拆分为多个评审。写请求经由 GitHubClient 的写请求调度器串行发送。
+    """
+
+    def __init__(
+            self,
+            pr_service: GithubPullRequestService,
+            max_comments: Optional[int] = None,
+            max_payload_chars: Optional[int] = None
+    ):
+        """
+        初始化评审发布器
+
+        Args:
+            pr_service: GitHub Pull Request 服务
+            max_comments: 单个评审最多包含的评论数量
+            max_payload_chars: 单个评审所有评论正文的最大字符数，同时限制评审正文的长度
+        """
+        self.pr_service = pr_service
+        self.max_comments = max_comments or int(get_value("REVIEW_MAX_COMMENTS", 100))
+        self.max_payload_chars = max_payload_chars or int(get_value("REVIEW_MAX_PAYLOAD_CHARS", 200000))
+
+    async def publish(
+            self,
+            owner: str,
+            repo: str,
+            number: int,
+            commit_id: str,
+            findings: List[ReviewFinding],
+            summary: str = "",
+            existing_comments: Optional[List[Dict[str, Any]]] = None,
+            commentable_lines: Optional[Dict[str, Set[int]]] = None
+    ) -> PublishResult:
+        """
+        发布一次评审的全部问题
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+            commit_id: 评论所针对的 head 提交
+            findings: 本次评审的问题列表
+            summary: 评审总结
+            existing_comments: 已有的机器人评论和评审，未提供时从 GitHub 获取
+            commentable_lines: 每个文件可评论的行号（diff 中的行），
+                不在其中的问题放入评审正文，避免整个评审因 422 被拒绝
+
+        Returns:
+            发布结果
+        """
+        result = PublishResult()
+
+        if existing_comments is None:
+            existing_comments = (await self.pr_service.list_bot_comments(owner, repo, number)
+                                 + await self.pr_service.list_bot_reviews(owner, repo, number))
+        seen: Set[str] = set()
+        for comment in existing_comments:
+            seen |= extract_fingerprints(comment.get("body"))
+
+        # 去重：跳过已发布过的问题以及本次评审内的重复问题
+        inline: List[ReviewFinding] = []
+        unanchored: List[ReviewFinding] = []
+        for finding in findings:
+            fingerprint = finding.fingerprint
+            if fingerprint in seen:
+                result.duplicates += 1
+                continue
+            seen.add(fingerprint)
+
+            if commentable_lines is not None and finding.line not in commentable_lines.get(finding.path, ()):
+                unanchored.append(finding)
+            else:
+                inline.append(finding)
+        result.unanchored = len(unanchored)
+
+        if not inline and not unanchored:
+            logger.info(f"{owner}/{repo}#{number} 没有新的问题需要发布，跳过 {result.duplicates} 条重复问题")
+            return result
+
+        chunks = self._chunk([finding.to_review_comment() for finding in inline])
+        pages = self._render_pages(summary, unanchored)
+        total = max(len(chunks), len(pages))
+
+        for index in range(total):
+            comments = chunks[index] if index < len(chunks) else []
+            parts = [f"（续 {index + 1}/{total}）"] if index else []
+            if index < len(pages) and pages[index]:
+                parts.append(pages[index])
+            chunk_body = "\n\n".join(parts) + f"\n\n{COMMENT_MARKER} review -->"
+            review = await self.pr_service.create_review(owner, repo, number, commit_id, chunk_body, comments)
+            result.reviews.append(review)
+            result.published += len(comments)
+
+        logger.info(
+            f"{owner}/{repo}#{number} 发布 {result.published} 条评论，"
+            f"{result.unanchored} 条放入正文，跳过 {result.duplicates} 条重复，写请求 {result.api_calls} 次"
+        )
+        return result
+
+    def _chunk(self, comments: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """按评论数量和正文长度拆分评审"""
+        chunks: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        size = 0
+        for comment in comments:
+            length = len(comment["body"])
+            if current and (len(current) >= self.max_comments or size + length > self.max_payload_chars):
+                chunks.append(current)
+                current, size = [], 0
+            current.append(comment)
+            size += length
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _render_pages(self, summary: str, unanchored: List[ReviewFinding]) -> List[str]:
+        """
+        生成评审正文，无法定位到 diff 的问题以列表形式附在正文中
+
+        正文超过长度上限时按问题拆分为多页，第一页放入第一个评审，其余各页放入后续的"续"评审
+
+        Args:
+            summary: 评审总结
+            unanchored: 无法定位到 diff 的问题列表
+
+        Returns:
+            每个评审的正文（不含标记），至少包含一页
+        """
+        # 为"续"前缀和评审标记预留空间
+        limit = min(self.max_payload_chars, MAX_REVIEW_BODY_CHARS) - 64
+        header = "以下问题不在本次 diff 的可评论范围内："
+        current = summary[:limit]
+        pages: List[str] = []
+        started = False
+
+        for finding in unanchored:
+            message = finding.message[:limit // 2]
+            line = (f"- `{finding.path}:{finding.line}` **[{finding.severity}] {finding.rule}** {message} "
+                    f"<!-- crag:fp={finding.fingerprint} -->")
+            if started:
+                addition = f"\n{line}"
+            else:
+                addition = f"\n\n{header}\n{line}" if current else f"{header}\n{line}"
+            if current and len(current) + len(addition) > limit:
+                pages.append(current)
+                current = f"以下问题不在本次 diff 的可评论范围内（续）：\n{line}"
+                continue
+            current += addition
+            started = True
+
+        pages.append(current)
+        return pages
+
+
+def create_pull_request_service(access_token=None) -> GithubPullRequestService:
+    """
+    创建 GitHub Pull Request 服务实例
+
+    Args:
+        access_token: GitHub 访问令牌
+
+    Returns:
+        GithubPullRequestService 实例
+    """
+    return GithubPullRequestService(access_token)
+
+
+async def create_installation_pull_request_service(owner: str, repo: str) -> GithubPullRequestService:
+    """
+    以 GitHub App 安装身份创建 Pull Request 服务，供后台评审任务使用
+
+    Args:
+        owner: 仓库所有者
+        repo: 仓库名称
+
+    Returns:
+        GithubPullRequestService 实例
 
-    def get_pull_request(self, repository_name) -> List:
-        pass
+    Raises:
+        GitHubApiError: 未配置 GitHub App 或 App 未安装到仓库时
+    """
+    installation_id = await github_app_auth.get_repo_installation(owner, repo)
+    return GithubPullRequestService(await github_app_auth.get_installation_token(installation_id))
@@ -0,0 +1,110 @@
+"""
+按录制的时间线回放一天的 GitHub 流量，测量共享客户端（合并、对冲、熔断）在同样负载下的吞吐和延迟
+
+    python -m app.services.github_replay github-cassette.jsonl.gz --speed 60 --latency-scale 1
+
+speed 为时间线压缩倍数，例如 60 表示一小时的流量在一分钟内发出；只回放 GET 请求，
+写请求的请求体没有录制，且由写请求调度器串行发送，不反映并发能力。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.services.github_client import GitHubClient
+from app.services.github_transport import ReplayTransport
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values: List[float], ratio: float) -> Optional[float]:
+    """已排序列表的分位数"""
+    if not values:
+        return None
+    return round(values[min(int(len(values) * ratio), len(values) - 1)], 4)
+
+
+async def replay_busy_day(
+        path: str,
+        speed: float = 1.0,
+        latency_scale: float = 1.0,
+        limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    按录制时间线发出请求并汇总结果
+
+    Args:
+        path: 录制文件路径
+        speed: 时间线压缩倍数
+        latency_scale: 回放延迟缩放系数
+        limit: 最多回放的请求数
+
+    Returns:
+        吞吐、延迟分位数和客户端指标
+    """
+    transport = ReplayTransport(path, latency_scale=latency_scale)
+    client = GitHubClient()
+    client._client = httpx.AsyncClient(transport=transport)
+
+    timeline = [item for item in transport.timeline if item.method == "GET"]
+    if limit is not None:
+        timeline = timeline[:limit]
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def send(at: float, url: str, accept: str) -> None:
+        delay = at / speed - (time.monotonic() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        begin = time.monotonic()
+        try:
+            await client.get(url, headers={"Accept": accept})
+        except Exception as e:
+            name = type(e).__name__
+            errors[name] = errors.get(name, 0) + 1
+            return
+        latencies.append(time.monotonic() - begin)
+
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(send(item.at, item.url, item.accept) for item in timeline))
+    finally:
+        await client.aclose()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    recorded = sorted(item.latency * latency_scale for item in timeline)
+    return {
+        "requests": len(timeline),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "errors": errors,
+        "latency": {"p50": _percentile(latencies, 0.5), "p95": _percentile(latencies, 0.95),
+                    "p99": _percentile(latencies, 0.99)},
+        "recorded_latency": {"p50": _percentile(recorded, 0.5), "p95": _percentile(recorded, 0.95),
+                             "p99": _percentile(recorded, 0.99)},
+        "replay": transport.metrics(),
+        "client": client.metrics(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="按录制时间线回放 GitHub 流量")
+    parser.add_argument("cassette", help="录制文件路径（同时加载 <路径>.* 文件）")
+    parser.add_argument("--speed", type=float, default=1.0, help="时间线压缩倍数")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="回放延迟缩放系数")
+    parser.add_argument("--limit", type=int, default=None, help="最多回放的请求数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(replay_busy_day(args.cassette, args.speed, args.latency_scale, args.limit))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import logging
 from typing import List, Dict, Any, Optional
 import httpx
 from app.util import config
+from app.services.github_client import github_client
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +12,11 @@ class GitHubApiError(Exception):
     pass
 
 
+class RepoNotFoundError(GitHubApiError):
+    """仓库不存在或无权访问"""
+    pass
+
+
 class RateLimitExceededError(GitHubApiError):
     """API 速率限制异常"""
 
@@ -96,18 +102,17 @@ class GithubReposService:
         logger.info(f"获取已认证用户的仓库列表, 排序={sort}, 页码={page}")
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                repos = response.json()
-
-                logger.info(f"成功获取 {len(repos)} 个仓库")
-                return repos
+            response = await github_client.get(
+                url,
+                headers=self.headers,
+                params=params,
+                timeout=30.0
+            )
+            response.raise_for_status()
+            repos = response.json()
+
+            logger.info(f"成功获取 {len(repos)} 个仓库")
+            return repos
 
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 403 and "rate limit" in e.response.text.lower():
@@ -122,6 +127,109 @@ class GithubReposService:
             logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
             raise GitHubApiError(f"网络错误: {str(e)}")
 
+    async def get_all_authenticated_user_repos(
+            self,
+            visibility: str = "all",
+            max_pages: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        分页获取已认证用户的全部仓库（按更新时间倒序）
+
+        Args:
+            visibility: 可见性过滤，可选值：all, public, private
+            max_pages: 最多获取的页数，每页 100 个仓库
+
+        Returns:
+            仓库列表
+
+        Raises:
+            GitHubApiError: 当 API 调用失败时
+        """
+        repos: List[Dict[str, Any]] = []
+        for page in range(1, max_pages + 1):
+            batch = await self.get_authenticated_user_repos(
+                sort="updated",
+                direction="desc",
+                per_page=100,
+                page=page,
+                visibility=visibility
+            )
+            repos.extend(batch)
+            if len(batch) < 100:
+                break
+        else:
+            logger.warning(f"仓库数量超过 {max_pages * 100}，仅获取前 {max_pages} 页")
+
+        return repos
+
+    async def get_authenticated_user(self) -> Dict[str, Any]:
+        """
+        获取已认证用户的信息
+
+        Returns:
+            用户信息
+
+        Raises:
+            GitHubApiError: 当 API 调用失败时
+        """
+        if not self.access_token:
+            raise GitHubApiError("需要访问令牌才能获取用户信息")
+
+        url = f"{self.api_url}/user"
+
+        try:
+            response = await github_client.get(
+                url,
+                headers=self.headers,
+                timeout=30.0
+            )
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"获取用户信息失败: {str(e)}")
+            raise GitHubApiError(f"获取用户信息失败: {str(e)}")
+
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
+    async def get_authenticated_user_orgs(self, per_page: int = 100) -> List[Dict[str, Any]]:
+        """
+        获取已认证用户所属的组织列表
+
+        Args:
+            per_page: 每页结果数量
+
+        Returns:
+            组织列表
+
+        Raises:
+            GitHubApiError: 当 API 调用失败时
+        """
+        if not self.access_token:
+            raise GitHubApiError("需要访问令牌才能获取组织列表")
+
+        url = f"{self.api_url}/user/orgs"
+
+        try:
+            response = await github_client.get(
+                url,
+                headers=self.headers,
+                params={"per_page": per_page},
+                timeout=30.0
+            )
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"获取组织列表失败: {str(e)}")
+            raise GitHubApiError(f"获取组织列表失败: {str(e)}")
+
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            logger.error(f"请求 GitHub API 时发生错误: {str(e)}")
+            raise GitHubApiError(f"网络错误: {str(e)}")
+
     async def get_user_repos(
             self,
             username: str,
@@ -161,18 +269,17 @@ class GithubReposService:
         logger.info(f"获取用户 {username} 的仓库列表, 排序={sort}, 页码={page}")
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                repos = response.json()
-
-                logger.info(f"成功获取 {len(repos)} 个仓库")
-                return repos
+            response = await github_client.get(
+                url,
+                headers=self.headers,
+                params=params,
+                timeout=30.0
+            )
+            response.raise_for_status()
+            repos = response.json()
+
+            logger.info(f"成功获取 {len(repos)} 个仓库")
+            return repos
 
         except httpx.HTTPStatusError as e:
             logger.error(f"获取用户仓库列表失败: {str(e)}")
@@ -221,18 +328,17 @@ class GithubReposService:
         logger.info(f"获取组织 {org} 的仓库列表, 排序={sort}, 页码={page}")
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                repos = response.json()
-
-                logger.info(f"成功获取 {len(repos)} 个仓库")
-                return repos
+            response = await github_client.get(
+                url,
+                headers=self.headers,
+                params=params,
+                timeout=30.0
+            )
+            response.raise_for_status()
+            repos = response.json()
+
+            logger.info(f"成功获取 {len(repos)} 个仓库")
+            return repos
 
         except httpx.HTTPStatusError as e:
             logger.error(f"获取组织仓库列表失败: {str(e)}")
@@ -261,19 +367,22 @@ class GithubReposService:
         logger.info(f"获取仓库信息: {owner}/{repo}")
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                return response.json()
+            response = await github_client.get(
+                url,
+                headers=self.headers,
+                timeout=30.0
+            )
+            response.raise_for_status()
+            return response.json()
 
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 404:
                 logger.error(f"仓库不存在: {owner}/{repo}")
-                raise GitHubApiError(f"仓库 {owner}/{repo} 不存在")
+                raise RepoNotFoundError(f"仓库 {owner}/{repo} 不存在")
+            if e.response.status_code == 403 and "rate limit" in e.response.text.lower():
+                reset_time = e.response.headers.get("X-RateLimit-Reset", "unknown time")
+                logger.error(f"GitHub API 速率限制错误: {reset_time}")
+                raise RateLimitExceededError(reset_time)
 
             logger.error(f"获取仓库信息失败: {str(e)}")
             raise GitHubApiError(f"获取仓库信息失败: {str(e)}")
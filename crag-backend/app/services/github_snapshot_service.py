@@ -0,0 +1,223 @@
+"""
+用户 GitHub 快照服务，缓存每个用户的身份信息、仓库列表和组织成员关系
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional
+
+from app.core.snapshot_cache import SnapshotCache
+from app.services.github_repos_service import create_repos_service
+from app.services.repo_search_index import RepoSearchIndex, repo_search_registry
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UserSnapshot:
+    """用户的 GitHub 快照"""
+    user: Dict[str, Any]
+    repos: List[Dict[str, Any]]
+    orgs: List[Dict[str, Any]]
+    fetched_at: float = field(default_factory=time.time)
+
+
+def simplify_repo(repo: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    只保留前端需要的仓库字段，减少快照占用的内存
+
+    Args:
+        repo: GitHub API 返回的仓库信息
+
+    Returns:
+        精简后的仓库信息
+    """
+    owner = repo.get("owner") or {}
+    return {
+        "id": repo.get("id"),
+        "name": repo.get("name"),
+        "full_name": repo.get("full_name"),
+        "description": repo.get("description"),
+        "html_url": repo.get("html_url"),
+        "language": repo.get("language"),
+        "stargazers_count": repo.get("stargazers_count"),
+        "forks_count": repo.get("forks_count"),
+        "visibility": repo.get("visibility"),
+        "default_branch": repo.get("default_branch"),
+        "created_at": repo.get("created_at"),
+        "updated_at": repo.get("updated_at"),
+        "pushed_at": repo.get("pushed_at"),
+        "owner": {
+            "login": owner.get("login"),
+            "avatar_url": owner.get("avatar_url")
+        }
+    }
+
+
+class GithubSnapshotService:
+    """GitHub 快照服务，对同一用户的并发请求只触发一次上游获取"""
+
+    def __init__(self, cache: Optional[SnapshotCache[UserSnapshot]] = None):
+        """
+        初始化快照服务
+
+        Args:
+            cache: 可选的快照缓存，默认根据配置创建
+        """
+        self.cache = cache or SnapshotCache(
+            ttl=float(get_value("REPO_SNAPSHOT_TTL", 60)),
+            max_stale=float(get_value("REPO_SNAPSHOT_MAX_STALE", 3600)),
+            max_entries=int(get_value("REPO_SNAPSHOT_MAX_USERS", 1000)),
+            name="repo_snapshot"
+        )
+        self.max_pages = int(get_value("REPO_SNAPSHOT_MAX_PAGES", 10))
+
+    @staticmethod
+    def snapshot_key(user_id: Optional[Any], access_token: str) -> Hashable:
+        """
+        计算快照缓存键，优先使用用户 ID，缺失时使用令牌摘要
+
+        Args:
+            user_id: GitHub 用户 ID
+            access_token: GitHub 访问令牌
+
+        Returns:
+            缓存键
+        """
+        if user_id is not None:
+            return ("user", user_id)
+        return ("token", hashlib.sha256(access_token.encode()).hexdigest())
+
+    async def get_snapshot(
+            self,
+            user_id: Optional[Any],
+            access_token: str,
+            force_refresh: bool = False
+    ) -> UserSnapshot:
+        """
+        获取用户快照，过期时立即返回旧快照并在后台刷新
+
+        Args:
+            user_id: GitHub 用户 ID
+            access_token: GitHub 访问令牌
+            force_refresh: 是否强制同步刷新
+
+        Returns:
+            用户快照
+
+        Raises:
+            GitHubApiError: 当首次加载时 API 调用失败
+        """
+        key = self.snapshot_key(user_id, access_token)
+        return await self.cache.get(
+            key,
+            lambda: self.fetch_snapshot(access_token),
+            force_refresh=force_refresh
+        )
+
+    async def fetch_snapshot(self, access_token: str) -> UserSnapshot:
+        """
+        从 GitHub 获取用户快照
+
+        Args:
+            access_token: GitHub 访问令牌
+
+        Returns:
+            用户快照
+        """
+        repos_service = create_repos_service(access_token)
+        user, repos, orgs = await asyncio.gather(
+            repos_service.get_authenticated_user(),
+            repos_service.get_all_authenticated_user_repos(max_pages=self.max_pages),
+            repos_service.get_authenticated_user_orgs()
+        )
+
+        logger.info(f"已刷新用户 {user.get('login')} 的快照，仓库 {len(repos)} 个，组织 {len(orgs)} 个")
+        return UserSnapshot(
+            user={
+                "id": user.get("id"),
+                "login": user.get("login"),
+                "name": user.get("name"),
+                "avatar_url": user.get("avatar_url")
+            },
+            repos=[simplify_repo(repo) for repo in repos],
+            orgs=[{"id": org.get("id"), "login": org.get("login"), "avatar_url": org.get("avatar_url")} for org in orgs]
+        )
+
+    async def get_search_index(
+            self,
+            user_id: Optional[Any],
+            access_token: str
+    ) -> RepoSearchIndex:
+        """
+        获取用户的仓库搜索索引，索引随快照增量更新
+
+        Args:
+            user_id: GitHub 用户 ID
+            access_token: GitHub 访问令牌
+
+        Returns:
+            搜索索引
+        """
+        snapshot = await self.get_snapshot(user_id, access_token)
+        key = self.snapshot_key(user_id, access_token)
+        return repo_search_registry.get_index(key, snapshot.repos, snapshot.fetched_at)
+
+    def invalidate(self, user_id: Optional[Any], access_token: str) -> None:
+        """
+        删除用户快照
+
+        Args:
+            user_id: GitHub 用户 ID
+            access_token: GitHub 访问令牌
+        """
+        self.cache.invalidate(self.snapshot_key(user_id, access_token))
+
+
+# 快照排序字段映射
+SORT_FIELDS = {
+    "created": "created_at",
+    "updated": "updated_at",
+    "pushed": "pushed_at",
+    "full_name": "full_name",
+}
+
+
+def query_repos(
+        repos: List[Dict[str, Any]],
+        sort: str = "updated",
+        direction: str = "desc",
+        visibility: str = "all"
+) -> List[Dict[str, Any]]:
+    """
+    在快照中按可见性过滤并排序仓库
+
+    Args:
+        repos: 快照中的仓库列表
+        sort: 排序字段，可选值：created, updated, pushed, full_name
+        direction: 排序方向，可选值：asc, desc
+        visibility: 可见性过滤，可选值：all, public, private
+
+    Returns:
+        过滤排序后的仓库列表
+    """
+    if visibility != "all":
+        repos = [repo for repo in repos if repo.get("visibility") == visibility]
+
+    sort_field = SORT_FIELDS.get(sort, "updated_at")
+    if sort_field == "full_name":
+        key = lambda repo: (repo.get("full_name") or "").lower()
+    else:
+        key = lambda repo: repo.get(sort_field) or ""
+
+    return sorted(repos, key=key, reverse=(direction == "desc"))
+
+
+# 创建全局快照服务（每个工作进程一个）
+snapshot_service = GithubSnapshotService()
+
+# 快照刷新时增量更新对应用户的搜索索引
+snapshot_service.cache.add_listener(repo_search_registry.on_snapshot_refreshed)
@@ -0,0 +1,359 @@
+"""
+GitHub 流量的录制与回放传输层，用于在无网络环境下做可重复的压测和性能分析
+
+录制文件（cassette）为 gzip 压缩的 JSON Lines，包含三类记录：
+- {"session": 开始录制的时间戳}：每次打开录制文件时写入，后续请求的 t 相对于它
+- {"body": 摘要, "data": base64 内容}：响应体，按内容去重，相同的响应体只保存一次
+- {"t": 相对开始时间, "method", "url", "accept", "key", "status", "headers", "body": 摘要, "latency"}：一次请求
+
+每个工作进程录制到各自的 <GITHUB_CASSETTE>.<pid> 文件，重新创建客户端时追加而不是覆盖；
+回放时加载 GITHUB_CASSETTE 本身和所有 <GITHUB_CASSETTE>.* 文件，并容忍进程崩溃留下的不完整结尾。
+
+令牌在写入前被清除：授权相关的请求头不会被记录，URL 中的敏感参数和响应体中形如令牌的字符串被替换。
+"""
+import asyncio
+import base64
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 不记录的请求头和响应头
+_SECRET_HEADERS = {"authorization", "cookie", "set-cookie", "proxy-authorization", "x-github-token"}
+
+# 响应体已解码，重放时不能再带编码和长度头
+_DROP_RESPONSE_HEADERS = _SECRET_HEADERS | {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+# URL 中需要清除的参数
+_SECRET_PARAMS = {"access_token", "client_secret", "code", "state", "token", "refresh_token"}
+
+# 响应体中的 GitHub 令牌，例如 ghp_/gho_/ghs_/ghu_/ghr_ 前缀令牌、细粒度 PAT 和 JSON 中的 token 字段
+_TOKEN_PATTERN = re.compile(
+    rb"\b(?:gh[pousr]_[A-Za-z0-9]{20,}|github_pat_[A-Za-z0-9_]{20,})\b|"
+    rb"(\"(?:token|access_token|refresh_token)\"\s*:\s*\")[^\"]+"
+)
+
+REDACTED = "REDACTED"
+
+# 旧录制文件没有记录 Accept 头时使用的默认值
+DEFAULT_ACCEPT = "application/vnd.github+json"
+
+
+def scrub_url(url: str) -> str:
+    """
+    清除 URL 中的敏感参数，并按参数名排序
+
+    Args:
+        url: 完整 URL
+
+    Returns:
+        清除后的 URL
+    """
+    parts = urlsplit(url)
+    query = sorted(
+        (name, REDACTED if name.lower() in _SECRET_PARAMS else value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+    )
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def scrub_body(body: bytes) -> bytes:
+    """
+    替换响应体中形如令牌的字符串
+
+    Args:
+        body: 响应体
+
+    Returns:
+        清除后的响应体
+    """
+    return _TOKEN_PATTERN.sub(lambda match: (match.group(1) or b"") + REDACTED.encode(), body)
+
+
+def interaction_key(request: httpx.Request, body: bytes) -> str:
+    """
+    计算请求的匹配键：方法、清除后的 URL、Accept 头，写请求还包括请求体
+
+    授权信息不参与匹配，回放时使用的令牌与录制时不同。
+
+    Args:
+        request: 请求
+        body: 请求体
+
+    Returns:
+        匹配键
+    """
+    parts = [request.method, scrub_url(str(request.url)), request.headers.get("accept", "")]
+    if request.method not in ("GET", "HEAD"):
+        parts.append(hashlib.sha256(scrub_body(body)).hexdigest())
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:32]
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    录制传输层，包装真实的传输层，将每次请求和响应追加到录制文件
+
+    写入按 flush_interval 定期刷新到磁盘（gzip 同步刷新点），进程崩溃时只丢失最后一个间隔内的请求。
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, path: str, flush_interval: float = 1.0):
+        """
+        初始化录制传输层
+
+        Args:
+            inner: 实际发送请求的传输层
+            path: 录制文件路径，已存在时追加
+            flush_interval: 刷新到磁盘的最长间隔（秒），0 表示每个请求都刷新
+        """
+        self.inner = inner
+        self.path = path
+        self.flush_interval = flush_interval
+        self.started = time.monotonic()
+        self.bodies: Set[str] = set()
+        self.count = 0
+        self._lock = threading.Lock()
+        self._flushed_at = self.started
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._write({"session": round(time.time(), 4)})
+        self._file.flush()
+        logger.info(f"开始录制 GitHub 流量: {path}")
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request_body = await request.aread()
+        offset = time.monotonic() - self.started
+        response = await self.inner.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        latency = time.monotonic() - self.started - offset
+
+        # 响应体已按 Content-Encoding 解码
+        headers = [(name, value) for name, value in response.headers.items() if name.lower() not in _DROP_RESPONSE_HEADERS]
+        scrubbed = scrub_body(body)
+        digest = hashlib.sha256(scrubbed).hexdigest()[:32]
+
+        with self._lock:
+            if digest not in self.bodies:
+                self.bodies.add(digest)
+                self._write({"body": digest, "data": base64.b64encode(scrubbed).decode()})
+            self._write({
+                "t": round(offset, 4),
+                "method": request.method,
+                "url": scrub_url(str(request.url)),
+                "accept": request.headers.get("accept", ""),
+                "key": interaction_key(request, request_body),
+                "status": response.status_code,
+                "headers": headers,
+                "body": digest,
+                "latency": round(latency, 4),
+            })
+            self.count += 1
+
+            now = time.monotonic()
+            if now - self._flushed_at >= self.flush_interval:
+                self._file.flush()
+                self._flushed_at = now
+
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                logger.info(f"GitHub 流量录制完成: {self.count} 个请求, {len(self.bodies)} 个不同的响应体 -> {self.path}")
+        await self.inner.aclose()
+
+
+def cassette_files(path: str) -> List[str]:
+    """
+    录制文件本身和各工作进程的 <path>.<pid> 文件
+
+    Args:
+        path: GITHUB_CASSETTE 配置的路径
+
+    Returns:
+        存在的文件路径列表
+    """
+    files = [path] if os.path.exists(path) else []
+    files.extend(sorted(glob.glob(glob.escape(path) + ".*")))
+    return files
+
+
+def read_cassette(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    逐条读取录制文件，遇到崩溃留下的截断结尾时停止
+
+    Args:
+        path: 录制文件路径
+
+    Yields:
+        记录
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"跳过录制文件中不完整的记录: {path}")
+    except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+        logger.warning(f"录制文件结尾不完整，已读取到截断位置: {path}: {str(e)}")
+
+
+@dataclass(frozen=True)
+class RecordedRequest:
+    """录制的一次请求，at 为相对于最早一次录制开始的秒数"""
+    at: float
+    method: str
+    url: str
+    accept: str
+    latency: float
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    回放传输层，按录制顺序返回匹配键相同的响应，并按原始延迟乘以缩放系数等待
+
+    同一个匹配键的响应用完后重复使用最后一个；strict 模式下未录制的请求抛出 httpx.ConnectError，
+    否则返回 404，便于发现录制不完整的场景。
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0, strict: bool = False):
+        """
+        加载录制文件
+
+        Args:
+            path: 录制文件路径，同时加载各工作进程的 <path>.<pid> 文件
+            latency_scale: 延迟缩放系数，0 表示不等待，1 表示原始延迟
+            strict: 未匹配的请求是否抛出异常
+        """
+        self.path = path
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self.queues: Dict[str, Deque[Tuple[int, list, str, float]]] = defaultdict(deque)
+        self.bodies: Dict[str, bytes] = {}
+        self.timeline: List[RecordedRequest] = []
+        self.served = 0
+        self.misses = 0
+        self.recorded = 0
+        self.duration = 0.0
+
+        files = cassette_files(path)
+        if not files:
+            raise FileNotFoundError(f"没有找到 GitHub 流量录制: {path}")
+        for name in files:
+            self._load(name)
+
+        # 多个文件和多次录制按录制时间对齐到同一条时间线
+        self.timeline.sort(key=lambda item: item.at)
+        if self.timeline:
+            origin = self.timeline[0].at
+            self.timeline = [
+                RecordedRequest(item.at - origin, item.method, item.url, item.accept, item.latency)
+                for item in self.timeline
+            ]
+            self.duration = max(item.at + item.latency for item in self.timeline)
+
+        logger.info(f"已加载 GitHub 流量录制: {self.recorded} 个请求, 覆盖 {self.duration:.1f} 秒 <- {path}")
+
+    def _load(self, path: str) -> None:
+        """加载一个录制文件，没有 session 记录的旧文件以 0 为起点"""
+        session = 0.0
+        for record in read_cassette(path):
+            if "session" in record:
+                session = record["session"]
+                continue
+            if "data" in record:
+                self.bodies[record["body"]] = base64.b64decode(record["data"])
+                continue
+            self.queues[record["key"]].append(
+                (record["status"], record["headers"], record["body"], record["latency"])
+            )
+            self.timeline.append(RecordedRequest(
+                session + record["t"], record["method"], record["url"],
+                record.get("accept", DEFAULT_ACCEPT), record["latency"]
+            ))
+            self.recorded += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = interaction_key(request, await request.aread())
+        queue = self.queues.get(key)
+        if not queue:
+            self.misses += 1
+            message = f"录制中没有匹配的请求: {request.method} {scrub_url(str(request.url))}"
+            if self.strict:
+                raise httpx.ConnectError(message, request=request)
+            logger.warning(message)
+            return httpx.Response(404, json={"message": message}, request=request)
+
+        status, headers, digest, latency = queue.popleft() if len(queue) > 1 else queue[0]
+        if self.latency_scale > 0:
+            await asyncio.sleep(latency * self.latency_scale)
+
+        self.served += 1
+        return httpx.Response(status, headers=headers, content=self.bodies.get(digest, b""), request=request)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取回放指标
+
+        Returns:
+            指标字典
+        """
+        return {"recorded": self.recorded, "served": self.served, "misses": self.misses}
+
+
+def create_transport(limits: httpx.Limits) -> Optional[httpx.AsyncBaseTransport]:
+    """
+    根据 GITHUB_TRANSPORT_MODE 创建传输层
+
+    - live（默认）: 返回 None，使用 httpx 默认传输层
+    - record: 真实请求，同时录制到 GITHUB_CASSETTE.<pid>
+    - replay: 不访问网络，从 GITHUB_CASSETTE 回放，延迟按 GITHUB_REPLAY_LATENCY_SCALE 缩放
+
+    Args:
+        limits: 连接池限制
+
+    Returns:
+        传输层
+    """
+    mode = str(get_value("GITHUB_TRANSPORT_MODE", "live")).lower()
+    if mode == "live":
+        return None
+
+    path = get_value("GITHUB_CASSETTE", "github-cassette.jsonl.gz")
+    if mode == "record":
+        # 多个工作进程不能写同一个 gzip 文件
+        return RecordingTransport(
+            httpx.AsyncHTTPTransport(limits=limits),
+            f"{path}.{os.getpid()}",
+            flush_interval=float(get_value("GITHUB_CASSETTE_FLUSH_INTERVAL", 1.0))
+        )
+    if mode == "replay":
+        return ReplayTransport(
+            path,
+            latency_scale=float(get_value("GITHUB_REPLAY_LATENCY_SCALE", 1.0)),
+            strict=str(get_value("GITHUB_REPLAY_STRICT", False)).lower() == "true"
+        )
+
+    raise ValueError(f"未知的 GITHUB_TRANSPORT_MODE: {mode}")
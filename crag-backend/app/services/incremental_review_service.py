@@ -0,0 +1,312 @@
+"""
+增量评审服务，只分析自上次评审以来新增或修改的变更块
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.model.database import session_scope
+from app.model.review_state import ReviewState
+from app.services.diff_parser import Hunk, added_line_set, hunks_touching, map_line, parse_patch
+from app.services.file_triage import Category, FileTriage, TriageResult, file_triage
+from app.services.github_pull_request_service import GithubPullRequestService
+from app.services.github_repos_service import GitHubApiError
+from app.services.repo_config import CONFIG_PATH, RepoConfig, RepoConfigLoader, repo_config_loader
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FileDelta:
+    """需要评审的单个文件变更"""
+    path: str
+    status: str
+    hunks: List[Hunk] = field(default_factory=list)
+    previous_path: Optional[str] = None
+    # GitHub 未返回 patch（文件过大或二进制）时需要评审整个文件
+    whole_file: bool = False
+    # head 中的 blob SHA，已删除的文件为 None
+    blob_sha: Optional[str] = None
+
+
+@dataclass
+class AnchoredComment:
+    """重新定位到最新 head 的已有评论"""
+    comment_id: int
+    path: str
+    line: Optional[int]
+    body: str
+
+
+@dataclass
+class ReviewPlan:
+    """一次评审需要处理的内容"""
+    repo: str
+    number: int
+    base_sha: str
+    head_sha: str
+    since_sha: Optional[str] = None
+    files: List[FileDelta] = field(default_factory=list)
+    reanchored: List[AnchoredComment] = field(default_factory=list)
+    outdated: List[AnchoredComment] = field(default_factory=list)
+    # 分诊时跳过的生成文件、第三方依赖和二进制文件
+    skipped: List[TriageResult] = field(default_factory=list)
+    # 基础提交中的仓库配置
+    config: RepoConfig = field(default_factory=RepoConfig)
+    # 自上次评审以来变化的全部文件 (路径, head 中的 blob SHA)，已删除或改名前的路径为 None，用于同步代码索引
+    changed_files: List[Tuple[str, Optional[str]]] = field(default_factory=list)
+
+    @property
+    def incremental(self) -> bool:
+        """是否为增量评审"""
+        return self.since_sha is not None
+
+    @property
+    def up_to_date(self) -> bool:
+        """head 自上次评审后没有变化"""
+        return self.since_sha == self.head_sha
+
+
+class ReviewStateStore:
+    """PR 评审历史存储"""
+
+    def get(self, repo: str, number: int) -> Optional[ReviewState]:
+        """
+        获取 PR 的评审历史
+
+        Args:
+            repo: 仓库全名 owner/repo
+            number: PR 编号
+
+        Returns:
+            评审历史，从未评审过时返回 None
+        """
+        with session_scope() as session:
+            return session.scalar(
+                select(ReviewState).where(ReviewState.repo == repo, ReviewState.pr_number == number)
+            )
+
+    def mark_reviewed(self, repo: str, number: int, head_sha: str, base_sha: str) -> None:
+        """
+        记录 PR 已评审到的提交
+
+        Args:
+            repo: 仓库全名 owner/repo
+            number: PR 编号
+            head_sha: 已评审的 head 提交
+            base_sha: 评审时的 base 提交
+        """
+        with session_scope() as session:
+            state = session.scalar(
+                select(ReviewState).where(ReviewState.repo == repo, ReviewState.pr_number == number)
+            )
+            if state is None:
+                state = ReviewState(repo=repo, pr_number=number)
+                session.add(state)
+            state.head_sha = head_sha
+            state.base_sha = base_sha
+            state.reviewed_at = time.time()
+
+
+def _file_delta(file: Dict[str, Any]) -> FileDelta:
+    """将 GitHub 文件变更转换为 FileDelta"""
+    patch = file.get("patch")
+    return FileDelta(
+        path=file["filename"],
+        status=file.get("status", "modified"),
+        hunks=parse_patch(patch),
+        previous_path=file.get("previous_filename"),
+        whole_file=patch is None and file.get("status") != "removed",
+        blob_sha=file.get("sha") if file.get("status") != "removed" else None
+    )
+
+
+class IncrementalReviewService:
+    """
+    增量评审服务
+
+    每次评审后记录 PR 的 head SHA。下次评审时比较上次 head 与当前 head，
+    只保留同时属于 PR 自身 diff 的新增行所在变更块，合并基础分支带来的改动不会被重复评审。
+    强推（历史分叉）或上次提交已不存在时退回到完整评审。
+    生成文件、第三方依赖、锁文件和二进制文件在分诊阶段被移出计划。
+    """
+
+    def __init__(
+            self,
+            pr_service: GithubPullRequestService,
+            state_store: Optional[ReviewStateStore] = None,
+            triage: Optional[FileTriage] = None,
+            config_loader: Optional[RepoConfigLoader] = None
+    ):
+        """
+        初始化增量评审服务
+
+        Args:
+            pr_service: GitHub Pull Request 服务
+            state_store: 评审历史存储
+            triage: 文件分诊服务，默认使用全局实例
+            config_loader: 仓库配置加载器，默认使用全局实例
+        """
+        self.pr_service = pr_service
+        self.state_store = state_store or ReviewStateStore()
+        self.triage = triage or file_triage
+        self.config_loader = config_loader or repo_config_loader
+
+    async def plan(self, owner: str, repo: str, number: int) -> ReviewPlan:
+        """
+        计算本次评审需要分析的变更块
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+
+        Returns:
+            评审计划
+        """
+        full_name = f"{owner}/{repo}"
+        pr = await self.pr_service.get_pull_request(owner, repo, number)
+        head_sha = pr["head"]["sha"]
+        base_sha = pr["base"]["sha"]
+
+        state = await asyncio.to_thread(self.state_store.get, full_name, number)
+        since_sha = state.head_sha if state else None
+        plan = ReviewPlan(repo=full_name, number=number, base_sha=base_sha, head_sha=head_sha, since_sha=since_sha)
+
+        if plan.up_to_date:
+            logger.info(f"{full_name}#{number} 自上次评审后没有新提交")
+            return plan
+
+        plan.config = await self.config_loader.get(self.pr_service, owner, repo, base_sha)
+        if not plan.config.enabled:
+            logger.info(f"{full_name} 在 {CONFIG_PATH} 中关闭了评审")
+            return plan
+
+        pr_files = await self.pr_service.list_pull_request_files(owner, repo, number)
+        pr_deltas = {file["filename"]: _file_delta(file) for file in pr_files}
+
+        compare_files = await self._compare(owner, repo, since_sha, head_sha) if since_sha else None
+        if compare_files is None:
+            # 首次评审或无法增量比较，评审 PR 的全部变更
+            plan.since_sha = None
+            plan.files = [delta for delta in pr_deltas.values() if delta.status != "removed"]
+            plan.changed_files = [(delta.path, delta.blob_sha) for delta in pr_deltas.values()]
+            plan.changed_files.extend((delta.previous_path, None) for delta in pr_deltas.values() if delta.previous_path)
+            await self._triage(plan, owner, repo)
+            await self._collect_comments(plan, owner, repo, {})
+            logger.info(f"{full_name}#{number} 完整评审 {len(plan.files)} 个文件, 跳过 {len(plan.skipped)} 个")
+            return plan
+
+        compare_hunks: Dict[str, Tuple[Optional[str], List[Hunk]]] = {}
+        for file in compare_files:
+            path = file["filename"]
+            hunks = parse_patch(file.get("patch"))
+            compare_hunks[file.get("previous_filename") or path] = (path, hunks)
+            plan.changed_files.append((path, file.get("sha") if file.get("status") != "removed" else None))
+            if file.get("previous_filename"):
+                plan.changed_files.append((file["previous_filename"], None))
+
+            pr_delta = pr_deltas.get(path)
+            if pr_delta is None or pr_delta.status == "removed" or file.get("status") == "removed":
+                continue
+
+            if pr_delta.whole_file or file.get("patch") is None:
+                plan.files.append(FileDelta(path=path, status=pr_delta.status, whole_file=True,
+                                            previous_path=pr_delta.previous_path, blob_sha=pr_delta.blob_sha))
+                continue
+
+            # 只保留属于 PR 自身 diff 的变更块
+            touched = hunks_touching(hunks, added_line_set(pr_delta.hunks))
+            if touched:
+                plan.files.append(FileDelta(path=path, status=pr_delta.status, hunks=touched,
+                                            previous_path=pr_delta.previous_path, blob_sha=pr_delta.blob_sha))
+
+        await self._triage(plan, owner, repo)
+        await self._collect_comments(plan, owner, repo, compare_hunks)
+        hunk_count = sum(len(delta.hunks) for delta in plan.files)
+        logger.info(
+            f"{full_name}#{number} 增量评审 {since_sha[:7]}..{head_sha[:7]}: "
+            f"{len(plan.files)} 个文件, {hunk_count} 个变更块, 复用 {len(plan.reanchored)} 条评论"
+        )
+        return plan
+
+    async def _triage(self, plan: ReviewPlan, owner: str, repo: str) -> None:
+        """移除计划中不需要评审的文件，并按仓库配置限制文件数量"""
+        if not plan.files:
+            return
+
+        report = await self.triage.triage(
+            self.pr_service,
+            owner,
+            repo,
+            plan.head_sha,
+            [(delta.path, delta.blob_sha) for delta in plan.files],
+            plan.config.triage_rules
+        )
+        plan.skipped = report.skipped
+        plan.files = [delta for delta in plan.files if report.reviewable(delta.path)]
+
+        max_files = plan.config.max_files
+        if max_files is not None and len(plan.files) > max_files:
+            plan.skipped.extend(
+                TriageResult(delta.path, Category.EXCLUDED, f"超过 {CONFIG_PATH} 的 max_files={max_files}")
+                for delta in plan.files[max_files:]
+            )
+            plan.files = plan.files[:max_files]
+
+    async def _compare(self, owner: str, repo: str, since_sha: str, head_sha: str) -> Optional[List[Dict[str, Any]]]:
+        """比较上次评审的 head 与当前 head，无法线性比较时返回 None"""
+        try:
+            comparison = await self.pr_service.compare_commits(owner, repo, since_sha, head_sha)
+        except GitHubApiError as e:
+            logger.warning(f"无法比较 {since_sha[:7]}...{head_sha[:7]}，退回完整评审: {str(e)}")
+            return None
+
+        if comparison.get("status") != "ahead":
+            logger.info(f"提交历史状态为 {comparison.get('status')}，退回完整评审")
+            return None
+
+        return comparison.get("files", [])
+
+    async def _collect_comments(
+            self,
+            plan: ReviewPlan,
+            owner: str,
+            repo: str,
+            compare_hunks: Dict[str, Tuple[Optional[str], List[Hunk]]]
+    ) -> None:
+        """将已有的机器人评论重新定位到当前 head，所在行被修改的评论标记为过期"""
+        comments = await self.pr_service.list_bot_comments(owner, repo, plan.number)
+
+        for comment in comments:
+            path = comment.get("path")
+            line = None
+
+            if plan.incremental and comment.get("original_commit_id") == plan.since_sha:
+                # 评论创建于上次评审的 head，用比较范围的 diff 映射行号
+                line = comment.get("original_line")
+                if path in compare_hunks:
+                    path, hunks = compare_hunks[path]
+                    line = map_line(hunks, line) if line is not None else None
+            else:
+                # 更早的评论由 GitHub 维护当前行号，已过期时为 None
+                line = comment.get("line")
+
+            anchored = AnchoredComment(comment_id=comment["id"], path=path, line=line, body=comment.get("body") or "")
+            if line is None:
+                plan.outdated.append(anchored)
+            else:
+                plan.reanchored.append(anchored)
+
+    async def mark_reviewed(self, plan: ReviewPlan) -> None:
+        """
+        评审完成后记录 head SHA
+
+        Args:
+            plan: 已完成的评审计划
+        """
+        await asyncio.to_thread(self.state_store.mark_reviewed, plan.repo, plan.number, plan.head_sha, plan.base_sha)
@@ -0,0 +1,352 @@
+"""
+仓库级评审配置（.crag.yaml），在 PR 的基础提交上读取，按 blob SHA 缓存编译后的结果
+
+配置示例：
+
+    review:
+      enabled: true
+      max_files: 100
+      min_severity: warning
+      include: ["keep/**/*.lock"]
+      ignore: ["docs/", "*.snap"]
+    rules:
+      disable: [line-length]
+      severity:
+        todo-comment: info
+    paths:
+      - match: "tests/**"
+        disable: [magic-number]
+        min_severity: error
+
+配置从基础提交而不是 head 读取，PR 作者无法在同一个 PR 中放宽自己的评审规则。
+"""
+import base64
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import yaml
+
+from app.core.singleflight import SingleFlight
+from app.services.file_triage import GlobSet, TriageRules
+from app.services.github_pull_request_service import ReviewFinding
+from app.services.github_repos_service import GitHubApiError
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 配置文件路径
+CONFIG_PATH = ".crag.yaml"
+
+# 配置文件大小上限
+MAX_CONFIG_BYTES = 64 * 1024
+
+# 严重程度从低到高
+SEVERITIES = ("info", "warning", "error", "critical")
+
+
+class RepoConfigError(ValueError):
+    """仓库配置格式错误"""
+    pass
+
+
+@dataclass(frozen=True)
+class PathOverride:
+    """对匹配路径生效的规则覆盖"""
+    globs: GlobSet
+    disable: FrozenSet[str] = frozenset()
+    min_severity: Optional[str] = None
+
+
+@dataclass
+class RepoConfig:
+    """编译后的仓库配置"""
+    enabled: bool = True
+    max_files: Optional[int] = None
+    min_severity: str = SEVERITIES[0]
+    triage_rules: TriageRules = field(default_factory=TriageRules)
+    enabled_rules: Optional[FrozenSet[str]] = None
+    disabled_rules: FrozenSet[str] = frozenset()
+    severity_overrides: Dict[str, str] = field(default_factory=dict)
+    path_overrides: List[PathOverride] = field(default_factory=list)
+    # 配置文件的 blob SHA，仓库没有配置文件时为 None
+    blob_sha: Optional[str] = None
+    # 校验错误，存在错误时其余字段为默认值
+    errors: List[str] = field(default_factory=list)
+
+    def severity_for(self, rule: str, severity: str) -> str:
+        """
+        获取规则在本仓库中的严重程度
+
+        Args:
+            rule: 规则
+            severity: 分析器给出的严重程度
+
+        Returns:
+            覆盖后的严重程度
+        """
+        return self.severity_overrides.get(rule, severity)
+
+    def allows(self, rule: str, severity: str, path: str) -> bool:
+        """
+        判断某条问题是否应当报告
+
+        Args:
+            rule: 规则
+            severity: 严重程度（覆盖后）
+            path: 文件路径
+
+        Returns:
+            是否报告
+        """
+        if rule in self.disabled_rules:
+            return False
+        if self.enabled_rules is not None and rule not in self.enabled_rules:
+            return False
+
+        min_severity = self.min_severity
+        for override in self.path_overrides:
+            if override.globs.match(path) is None:
+                continue
+            if rule in override.disable:
+                return False
+            if override.min_severity:
+                min_severity = override.min_severity
+        return severity_rank(severity) >= severity_rank(min_severity)
+
+    def apply(self, findings: List[ReviewFinding]) -> List[ReviewFinding]:
+        """
+        按本仓库的规则覆盖严重程度并过滤问题
+
+        Args:
+            findings: 分析器给出的问题
+
+        Returns:
+            需要报告的问题，严重程度已按 rules.severity 覆盖
+        """
+        kept = []
+        for finding in findings:
+            severity = self.severity_for(finding.rule, finding.severity)
+            if self.allows(finding.rule, severity, finding.path):
+                kept.append(finding if severity == finding.severity else replace(finding, severity=severity))
+        return kept
+
+
+def severity_rank(severity: str) -> int:
+    """严重程度排序值，未知的严重程度视为最低一级之上，不会被过滤掉"""
+    try:
+        return SEVERITIES.index(severity.lower())
+    except ValueError:
+        return 1
+
+
+def _string_list(value: Any, where: str) -> Tuple[str, ...]:
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise RepoConfigError(f"{where} 必须是字符串列表")
+    return tuple(item.strip() for item in value if item.strip())
+
+
+def _severity(value: Any, where: str) -> Optional[str]:
+    if value is None:
+        return None
+    if not isinstance(value, str) or value.lower() not in SEVERITIES:
+        raise RepoConfigError(f"{where} 必须是 {', '.join(SEVERITIES)} 之一")
+    return value.lower()
+
+
+def _mapping(value: Any, where: str, allowed: Tuple[str, ...]) -> Dict[str, Any]:
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise RepoConfigError(f"{where} 必须是映射")
+    unknown = set(value) - set(allowed)
+    if unknown:
+        raise RepoConfigError(f"{where} 包含未知字段: {', '.join(sorted(map(str, unknown)))}")
+    return value
+
+
+def parse_repo_config(text: str) -> RepoConfig:
+    """
+    解析并校验 .crag.yaml
+
+    Args:
+        text: 文件内容
+
+    Returns:
+        编译后的配置
+
+    Raises:
+        RepoConfigError: 格式错误时
+    """
+    try:
+        data = yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        raise RepoConfigError(f"YAML 解析失败: {str(e)}")
+
+    root = _mapping(data, "配置", ("review", "rules", "paths"))
+    review = _mapping(root.get("review"), "review", ("enabled", "max_files", "min_severity", "include", "ignore"))
+    rules = _mapping(root.get("rules"), "rules", ("enable", "disable", "severity"))
+
+    enabled = review.get("enabled", True)
+    if not isinstance(enabled, bool):
+        raise RepoConfigError("review.enabled 必须是布尔值")
+
+    max_files = review.get("max_files")
+    if max_files is not None and (not isinstance(max_files, int) or isinstance(max_files, bool) or max_files <= 0):
+        raise RepoConfigError("review.max_files 必须是正整数")
+
+    severities = rules.get("severity") or {}
+    if not isinstance(severities, dict):
+        raise RepoConfigError("rules.severity 必须是映射")
+    severity_overrides = {
+        str(rule): _severity(severity, f"rules.severity.{rule}") for rule, severity in severities.items()
+    }
+
+    enable = _string_list(rules.get("enable"), "rules.enable")
+
+    paths = root.get("paths") or []
+    if not isinstance(paths, list):
+        raise RepoConfigError("paths 必须是列表")
+    path_overrides = []
+    for index, item in enumerate(paths):
+        where = f"paths[{index}]"
+        item = _mapping(item, where, ("match", "disable", "min_severity"))
+        patterns = _string_list(item.get("match"), f"{where}.match")
+        if not patterns:
+            raise RepoConfigError(f"{where}.match 不能为空")
+        path_overrides.append(PathOverride(
+            globs=GlobSet(patterns),
+            disable=frozenset(_string_list(item.get("disable"), f"{where}.disable")),
+            min_severity=_severity(item.get("min_severity"), f"{where}.min_severity")
+        ))
+
+    return RepoConfig(
+        enabled=enabled,
+        max_files=max_files,
+        min_severity=_severity(review.get("min_severity"), "review.min_severity") or SEVERITIES[0],
+        triage_rules=TriageRules(
+            include=_string_list(review.get("include"), "review.include"),
+            exclude=_string_list(review.get("ignore"), "review.ignore")
+        ),
+        enabled_rules=frozenset(enable) if enable else None,
+        disabled_rules=frozenset(_string_list(rules.get("disable"), "rules.disable")),
+        severity_overrides=severity_overrides,
+        path_overrides=path_overrides
+    )
+
+
+class RepoConfigLoader:
+    """
+    仓库配置加载器
+
+    两级缓存：(仓库, 提交) → 配置文件 blob SHA，blob SHA → 编译后的配置。
+    配置文件没有变化的提交共享同一个编译结果，同一提交的并发任务只获取一次。
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        初始化配置加载器
+
+        Args:
+            max_entries: 每级缓存的最大条目数
+        """
+        self.max_entries = max_entries
+        self.commits: "OrderedDict[Tuple[str, str], Optional[str]]" = OrderedDict()
+        self.configs: "OrderedDict[str, RepoConfig]" = OrderedDict()
+        self.flights = SingleFlight()
+
+    def _remember(self, cache: OrderedDict, key: Any, value: Any) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    async def get(self, pr_service, owner: str, repo: str, commit_sha: str) -> RepoConfig:
+        """
+        获取提交中的仓库配置
+
+        Args:
+            pr_service: GitHub Pull Request 服务
+            owner: 仓库所有者
+            repo: 仓库名称
+            commit_sha: 提交 SHA，通常为 PR 的基础提交
+
+        Returns:
+            编译后的配置，文件不存在、获取失败或格式错误时返回默认配置
+        """
+        key = (f"{owner}/{repo}", commit_sha)
+        if key in self.commits:
+            self.commits.move_to_end(key)
+            blob_sha = self.commits[key]
+            if blob_sha is None:
+                return RepoConfig()
+            config = self.configs.get(blob_sha)
+            if config is not None:
+                self.configs.move_to_end(blob_sha)
+                return config
+
+        return await self.flights.do(key, lambda: self._load(pr_service, owner, repo, commit_sha))
+
+    async def _load(self, pr_service, owner: str, repo: str, commit_sha: str) -> RepoConfig:
+        """获取配置文件并编译，获取失败时不缓存，下次重试"""
+        full_name = f"{owner}/{repo}"
+        try:
+            entry = await pr_service.get_content_entry(owner, repo, CONFIG_PATH, commit_sha)
+        except GitHubApiError as e:
+            logger.warning(f"获取 {full_name}@{commit_sha[:7]} 的 {CONFIG_PATH} 失败，使用默认配置: {str(e)}")
+            return RepoConfig()
+
+        if entry is None:
+            self._remember(self.commits, (full_name, commit_sha), None)
+            return RepoConfig()
+
+        blob_sha = entry["sha"]
+        self._remember(self.commits, (full_name, commit_sha), blob_sha)
+        config = self.configs.get(blob_sha)
+        if config is not None:
+            return config
+
+        try:
+            config = await self._compile(pr_service, owner, repo, entry)
+        except GitHubApiError as e:
+            logger.warning(f"获取 {full_name}@{commit_sha[:7]} 的 {CONFIG_PATH} 内容失败，使用默认配置: {str(e)}")
+            return RepoConfig()
+        config.blob_sha = blob_sha
+        if config.errors:
+            logger.warning(f"{full_name}@{commit_sha[:7]} 的 {CONFIG_PATH} 无效，使用默认配置: {config.errors[0]}")
+        else:
+            logger.info(f"已加载 {full_name}@{commit_sha[:7]} 的 {CONFIG_PATH}")
+        self._remember(self.configs, blob_sha, config)
+        return config
+
+    @staticmethod
+    async def _compile(pr_service, owner: str, repo: str, entry: Dict[str, Any]) -> RepoConfig:
+        """
+        解码内容 API 返回的文件并编译
+
+        Raises:
+            GitHubApiError: 内容 API 没有内联文件内容且下载 blob 失败时
+        """
+        if entry.get("size", 0) > MAX_CONFIG_BYTES:
+            return RepoConfig(errors=[f"配置文件超过 {MAX_CONFIG_BYTES} 字节"])
+
+        if entry.get("encoding") == "base64":
+            content = base64.b64decode(entry.get("content") or "")
+        else:
+            content = await pr_service.get_blob_content(owner, repo, entry["sha"])
+
+        try:
+            return parse_repo_config(content.decode("utf-8"))
+        except UnicodeDecodeError:
+            return RepoConfig(errors=["配置文件不是 UTF-8 编码"])
+        except RepoConfigError as e:
+            return RepoConfig(errors=[str(e)])
+
+
+# 创建全局仓库配置加载器（每个工作进程一个）
+repo_config_loader = RepoConfigLoader(int(get_value("REPO_CONFIG_CACHE_SIZE", 1024)))
@@ -0,0 +1,161 @@
+"""
+批量仓库详情服务，一次请求获取多个仓库的详情，按用户缓存
+"""
+import asyncio
+import logging
+import re
+from typing import Any, Dict, Hashable, List, Optional
+
+from app.core.snapshot_cache import SnapshotCache
+from app.services.github_repos_service import (
+    GitHubApiError,
+    GithubReposService,
+    RateLimitExceededError,
+    RepoNotFoundError,
+)
+from app.services.github_snapshot_service import GithubSnapshotService, simplify_repo
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 仓库全名 owner/repo
+_FULL_NAME = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9-]{0,38})/[A-Za-z0-9._-]{1,100}$")
+
+
+def repo_detail(repo: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    仓库详情字段，在列表字段基础上增加详情页需要的信息
+
+    Args:
+        repo: GitHub API 返回的仓库信息
+
+    Returns:
+        仓库详情
+    """
+    detail = simplify_repo(repo)
+    license_info = repo.get("license") or {}
+    detail.update({
+        "open_issues_count": repo.get("open_issues_count"),
+        "watchers_count": repo.get("subscribers_count", repo.get("watchers_count")),
+        "topics": repo.get("topics") or [],
+        "archived": repo.get("archived"),
+        "fork": repo.get("fork"),
+        "size": repo.get("size"),
+        "license": license_info.get("spdx_id"),
+        "permissions": repo.get("permissions")
+    })
+    return detail
+
+
+def normalize_names(names: List[str]) -> List[str]:
+    """
+    去除空白和重复（不区分大小写），保持原顺序
+
+    Args:
+        names: 仓库全名列表
+
+    Returns:
+        去重后的列表
+    """
+    seen = set()
+    result = []
+    for name in names:
+        name = (name or "").strip().strip("/")
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            result.append(name)
+    return result
+
+
+class RepoDetailsService:
+    """
+    批量仓库详情服务
+
+    每个仓库的详情按 (用户, 仓库) 缓存，私有仓库的详情不会被其他用户看到；
+    未命中的仓库在信号量限制下并发获取，单个仓库失败不影响其他仓库。
+    """
+
+    def __init__(self, cache: Optional[SnapshotCache[Dict[str, Any]]] = None, concurrency: int = 8):
+        """
+        初始化批量仓库详情服务
+
+        Args:
+            cache: 可选的详情缓存，默认根据配置创建
+            concurrency: 单次批量请求访问 GitHub 的最大并发数
+        """
+        self.cache = cache or SnapshotCache(
+            ttl=float(get_value("REPO_DETAIL_TTL", 300)),
+            max_stale=float(get_value("REPO_DETAIL_MAX_STALE", 3600)),
+            max_entries=int(get_value("REPO_DETAIL_MAX_ENTRIES", 10000)),
+            name="repo_detail"
+        )
+        self.concurrency = concurrency
+
+    @staticmethod
+    def _error(code: str, message: str) -> Dict[str, str]:
+        return {"code": code, "message": message}
+
+    async def _get_one(
+            self,
+            repos_service: GithubReposService,
+            scope: Hashable,
+            full_name: str,
+            semaphore: asyncio.Semaphore,
+            refresh: bool
+    ) -> Dict[str, Any]:
+        """获取单个仓库详情，错误转换为条目内的 error 字段"""
+        if not _FULL_NAME.match(full_name):
+            return {"full_name": full_name, "repo": None, "error": self._error("invalid", "仓库名称格式应为 owner/repo")}
+
+        owner, repo = full_name.split("/", 1)
+
+        async def load() -> Dict[str, Any]:
+            # 只有真正访问 GitHub 时才占用并发名额，缓存命中不排队
+            async with semaphore:
+                return repo_detail(await repos_service.get_repository(owner, repo))
+
+        try:
+            detail = await self.cache.get((scope, full_name.lower()), load, force_refresh=refresh)
+            return {"full_name": full_name, "repo": detail, "error": None}
+        except RepoNotFoundError as e:
+            return {"full_name": full_name, "repo": None, "error": self._error("not_found", str(e))}
+        except RateLimitExceededError as e:
+            return {"full_name": full_name, "repo": None, "error": self._error("rate_limited", str(e))}
+        except GitHubApiError as e:
+            return {"full_name": full_name, "repo": None, "error": self._error("upstream", str(e))}
+
+    async def get_many(
+            self,
+            repos_service: GithubReposService,
+            user_id: Optional[Any],
+            access_token: str,
+            names: List[str],
+            refresh: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        批量获取仓库详情
+
+        Args:
+            repos_service: 当前用户的 GitHub 仓库服务
+            user_id: GitHub 用户 ID
+            access_token: GitHub 访问令牌
+            names: 仓库全名列表，需已去重
+            refresh: 是否忽略缓存
+
+        Returns:
+            与 names 顺序一致的结果列表，每项包含 full_name、repo 和 error
+        """
+        scope = GithubSnapshotService.snapshot_key(user_id, access_token)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(
+            self._get_one(repos_service, scope, name, semaphore, refresh) for name in names
+        ))
+
+        failed = sum(1 for item in results if item["error"])
+        if failed:
+            logger.info(f"批量获取仓库详情: {len(results)} 个仓库, {failed} 个失败")
+        return list(results)
+
+
+# 创建全局批量仓库详情服务（每个工作进程一个）
+repo_details_service = RepoDetailsService(concurrency=int(get_value("REPO_BATCH_CONCURRENCY", 8)))
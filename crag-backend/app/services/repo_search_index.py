@@ -0,0 +1,306 @@
+"""
+仓库搜索索引，基于用户快照在本地提供前缀/三元组检索和分面统计
+"""
+import bisect
+import heapq
+import logging
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 分面字段
+FACET_FIELDS = ("language", "visibility")
+
+# 仓库名称分词规则
+_TOKEN_SPLIT = re.compile(r"[/\-_.\s]+")
+
+
+def _trigrams(text: str) -> Set[str]:
+    """计算文本的三元组集合"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class RepoSearchIndex:
+    """
+    单个用户的仓库搜索索引
+
+    - 名称前缀：对 full_name 及其分词建立有序列表，用二分查找定位前缀
+    - 子串匹配：对 full_name 和 description 建立三元组倒排表，取交集后校验
+    - 分面统计：维护 language 和 visibility 的计数
+    快照刷新时按仓库 ID 和 updated_at 做增量更新，只处理发生变化的仓库。
+    """
+
+    def __init__(self):
+        self.docs: Dict[int, Dict[str, Any]] = {}
+        self.versions: Dict[int, Any] = {}
+        self.texts: Dict[int, Tuple[str, str, str]] = {}
+        self.prefixes: List[Tuple[str, int]] = []
+        self.doc_prefixes: Dict[int, List[str]] = {}
+        self.trigrams: Dict[str, Set[int]] = {}
+        self.doc_trigrams: Dict[int, Set[str]] = {}
+        self.facets: Dict[str, Counter] = {field: Counter() for field in FACET_FIELDS}
+        self.source_version: Optional[float] = None
+
+    def update(self, repos: Iterable[Dict[str, Any]], source_version: Optional[float] = None) -> Dict[str, int]:
+        """
+        用最新的仓库列表增量更新索引
+
+        Args:
+            repos: 快照中的仓库列表
+            source_version: 快照版本（获取时间），用于判断索引是否需要更新
+
+        Returns:
+            新增、更新、删除的仓库数量
+        """
+        seen: Set[int] = set()
+        added = updated = 0
+        # 首次构建时先追加前缀、最后统一排序，避免逐条 insort 的 O(n²) 移动；增量更新仍逐条插入
+        pending: Optional[List[Tuple[str, int]]] = [] if not self.docs else None
+
+        for repo in repos:
+            repo_id = repo.get("id")
+            if repo_id is None or repo_id in seen:
+                continue
+            seen.add(repo_id)
+
+            version = (repo.get("updated_at"), repo.get("full_name"), repo.get("description"),
+                       repo.get("language"), repo.get("visibility"))
+            if repo_id in self.docs:
+                if self.versions.get(repo_id) == version:
+                    # 未变化的仓库只替换引用，不重建倒排表
+                    self.docs[repo_id] = repo
+                    continue
+                self._remove(repo_id)
+                updated += 1
+            else:
+                added += 1
+            self._add(repo_id, repo, version, pending)
+
+        if pending:
+            self.prefixes.extend(pending)
+            self.prefixes.sort()
+
+        removed_ids = [repo_id for repo_id in self.docs if repo_id not in seen]
+        for repo_id in removed_ids:
+            self._remove(repo_id)
+
+        self.source_version = source_version
+        return {"added": added, "updated": updated, "removed": len(removed_ids)}
+
+    def _add(
+            self,
+            repo_id: int,
+            repo: Dict[str, Any],
+            version: Any,
+            pending: Optional[List[Tuple[str, int]]] = None
+    ) -> None:
+        """将仓库加入索引，提供 pending 时前缀先放入其中，由调用方统一排序"""
+        full_name = (repo.get("full_name") or repo.get("name") or "").lower()
+        description = (repo.get("description") or "").lower()
+
+        self.docs[repo_id] = repo
+        self.versions[repo_id] = version
+        self.texts[repo_id] = (full_name, description, full_name.rsplit("/", 1)[-1])
+
+        tokens = {full_name} | {token for token in _TOKEN_SPLIT.split(full_name) if token}
+        self.doc_prefixes[repo_id] = sorted(tokens)
+        for token in tokens:
+            if pending is not None:
+                pending.append((token, repo_id))
+            else:
+                bisect.insort(self.prefixes, (token, repo_id))
+
+        grams = _trigrams(full_name) | _trigrams(description)
+        self.doc_trigrams[repo_id] = grams
+        for gram in grams:
+            self.trigrams.setdefault(gram, set()).add(repo_id)
+
+        for field in FACET_FIELDS:
+            self.facets[field][repo.get(field) or "unknown"] += 1
+
+    def _remove(self, repo_id: int) -> None:
+        """将仓库移出索引"""
+        repo = self.docs.pop(repo_id)
+        self.versions.pop(repo_id, None)
+        self.texts.pop(repo_id, None)
+
+        for token in self.doc_prefixes.pop(repo_id, []):
+            i = bisect.bisect_left(self.prefixes, (token, repo_id))
+            if i < len(self.prefixes) and self.prefixes[i] == (token, repo_id):
+                del self.prefixes[i]
+
+        for gram in self.doc_trigrams.pop(repo_id, set()):
+            postings = self.trigrams.get(gram)
+            if postings is not None:
+                postings.discard(repo_id)
+                if not postings:
+                    del self.trigrams[gram]
+
+        for field in FACET_FIELDS:
+            value = repo.get(field) or "unknown"
+            self.facets[field][value] -= 1
+            if self.facets[field][value] <= 0:
+                del self.facets[field][value]
+
+    def _prefix_matches(self, query: str) -> Set[int]:
+        """查找名称或名称分词以查询串开头的仓库"""
+        matches: Set[int] = set()
+        i = bisect.bisect_left(self.prefixes, (query, -1))
+        while i < len(self.prefixes) and self.prefixes[i][0].startswith(query):
+            matches.add(self.prefixes[i][1])
+            i += 1
+        return matches
+
+    def _substring_matches(self, query: str) -> Set[int]:
+        """通过三元组倒排表查找包含查询串的仓库"""
+        grams = sorted(_trigrams(query), key=lambda gram: len(self.trigrams.get(gram, ())))
+        if not grams:
+            return set()
+
+        candidates = set(self.trigrams.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates &= self.trigrams.get(gram, set())
+
+        # 三元组交集可能误报，需要校验真实子串
+        return {
+            repo_id for repo_id in candidates
+            if query in self.texts[repo_id][0] or query in self.texts[repo_id][1]
+        }
+
+    def _score(self, repo_id: int, query: str, prefix_ids: Set[int]) -> int:
+        """计算匹配得分，名称匹配优先于描述匹配"""
+        if not query:
+            return 0
+        full_name, description, name = self.texts[repo_id]
+        if query == name or query == full_name:
+            return 100
+        if name.startswith(query) or full_name.startswith(query):
+            return 60
+        if repo_id in prefix_ids:
+            return 40
+        if query in full_name:
+            return 20
+        return 10
+
+    def search(
+            self,
+            query: str = "",
+            language: Optional[str] = None,
+            visibility: Optional[str] = None,
+            limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        搜索仓库
+
+        Args:
+            query: 查询串，匹配名称前缀或名称/描述子串
+            language: 语言过滤
+            visibility: 可见性过滤
+            limit: 最多返回的结果数量
+
+        Returns:
+            匹配结果、总数和分面统计
+        """
+        query = (query or "").strip().lower()
+
+        if query:
+            prefix_ids = self._prefix_matches(query)
+            matched = prefix_ids | (self._substring_matches(query) if len(query) >= 3 else set())
+        else:
+            prefix_ids = set()
+            matched = None
+
+        # 无查询条件时直接使用维护好的全局分面
+        if matched is None:
+            facets = {field: dict(counter) for field, counter in self.facets.items()}
+            matched_ids: Iterable[int] = self.docs.keys()
+        else:
+            facets = {field: dict(Counter(self.docs[i].get(field) or "unknown" for i in matched))
+                      for field in FACET_FIELDS}
+            matched_ids = matched
+
+        results = [
+            repo_id for repo_id in matched_ids
+            if (not language or (self.docs[repo_id].get("language") or "unknown") == language)
+            and (not visibility or visibility == "all" or self.docs[repo_id].get("visibility") == visibility)
+        ]
+
+        # 只对前 limit 个结果排序
+        top = heapq.nlargest(
+            limit,
+            results,
+            key=lambda repo_id: (self._score(repo_id, query, prefix_ids), self.docs[repo_id].get("updated_at") or "")
+        )
+
+        return {
+            "results": [self.docs[repo_id] for repo_id in top],
+            "total": len(results),
+            "facets": facets
+        }
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+
+class RepoSearchIndexRegistry:
+    """
+    按用户管理搜索索引，超出容量时淘汰最久未使用的索引
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        """
+        初始化索引注册表
+
+        Args:
+            max_entries: 最多保存的索引数量
+        """
+        self.max_entries = max_entries
+        self.indexes: "OrderedDict[Hashable, RepoSearchIndex]" = OrderedDict()
+
+    def get_index(self, key: Hashable, repos: List[Dict[str, Any]], source_version: Optional[float] = None) -> RepoSearchIndex:
+        """
+        获取用户索引，快照版本变化时增量更新
+
+        Args:
+            key: 用户快照键
+            repos: 快照中的仓库列表
+            source_version: 快照版本
+
+        Returns:
+            搜索索引
+        """
+        index = self.indexes.get(key)
+        if index is None:
+            index = RepoSearchIndex()
+            self.indexes[key] = index
+            while len(self.indexes) > self.max_entries:
+                self.indexes.popitem(last=False)
+        self.indexes.move_to_end(key)
+
+        if source_version is None or index.source_version != source_version:
+            index.update(repos, source_version)
+        return index
+
+    def on_snapshot_refreshed(self, key: Hashable, snapshot: Any) -> None:
+        """
+        快照刷新回调，只更新已经建立过的索引
+
+        Args:
+            key: 用户快照键
+            snapshot: 新快照
+        """
+        index = self.indexes.get(key)
+        if index is None:
+            return
+        changes = index.update(snapshot.repos, snapshot.fetched_at)
+        logger.debug(f"仓库索引已增量更新: {changes}")
+
+
+# 创建全局索引注册表（每个工作进程一个）
+repo_search_registry = RepoSearchIndexRegistry(int(get_value("REPO_SNAPSHOT_MAX_USERS", 1000)))
@@ -0,0 +1,249 @@
+"""
+评审流水线：生成增量评审计划，对新增行运行分析器，记录问题、发布评审，最后记录已评审到的提交
+"""
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.code_chunker import ChunkIndexService
+from app.services.code_index import code_index_service
+from app.services.code_search import code_search_service
+from app.services.diff_parser import added_line_set
+from app.services.findings_service import FindingStore, finding_store
+from app.services.github_app_auth import github_app_auth
+from app.services.github_pull_request_service import (
+    GithubPullRequestService,
+    ReviewFinding,
+    ReviewPublisher,
+    create_installation_pull_request_service,
+)
+from app.services.incremental_review_service import FileDelta, IncrementalReviewService, ReviewPlan, ReviewStateStore
+from app.services.review_progress import ReviewProgress
+from app.services.review_scheduler import ReviewJob, ReviewScheduler, review_scheduler
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+
+class Analyzer(ABC):
+    """分析器，对单个文件的新增行给出问题"""
+
+    @abstractmethod
+    def analyze(self, delta: FileDelta) -> List[ReviewFinding]:
+        """
+        分析文件变更
+
+        Args:
+            delta: 文件变更
+
+        Returns:
+            问题列表
+        """
+
+
+class ReviewPipeline:
+    """
+    单个 PR 的评审流水线
+
+    计划 → 逐文件分析 → 记录问题和统计 → 发布评审 → 记录已评审的 head → 同步代码索引。
+    发布失败时运行记录已经写入，但不会记录已评审的 head，下次评审会重新分析同一范围，
+    已发布过的问题由发布器按指纹去重。提供 ReviewProgress 时每个阶段和每个文件的结果
+    实时发布给 SSE 订阅者，结束时发布汇总或错误。
+    """
+
+    def __init__(
+            self,
+            pr_service: GithubPullRequestService,
+            analyzers: Optional[List[Analyzer]] = None,
+            store: Optional[FindingStore] = None,
+            publish: Optional[bool] = None,
+            index_services: Optional[List[ChunkIndexService]] = None
+    ):
+        """
+        初始化评审流水线
+
+        Args:
+            pr_service: GitHub Pull Request 服务
+            analyzers: 分析器列表，默认不运行分析器，只生成计划、记录运行并更新已评审的 head
+            store: 评审问题存储，默认使用全局实例
+            publish: 是否把问题发布到 GitHub，默认读取 REVIEW_PUBLISH
+            index_services: 评审后同步的代码索引，默认为向量索引和关键词索引，REVIEW_INDEX_CODE 为 false 时不同步
+        """
+        self.pr_service = pr_service
+        self.analyzers = list(analyzers or [])
+        self.store = store or finding_store
+        self.publish = publish if publish is not None else str(get_value("REVIEW_PUBLISH", True)).lower() != "false"
+        if index_services is None:
+            enabled = str(get_value("REVIEW_INDEX_CODE", True)).lower() != "false"
+            index_services = [code_index_service, code_search_service] if enabled else []
+        self.index_services = index_services
+        self.incremental = IncrementalReviewService(pr_service)
+
+    async def run(
+            self,
+            owner: str,
+            repo: str,
+            number: int,
+            requested_at: Optional[float] = None,
+            changed_lines: Optional[int] = None,
+            progress: Optional[ReviewProgress] = None
+    ) -> Dict[str, Any]:
+        """
+        执行一次评审
+
+        Args:
+            owner: 仓库所有者
+            repo: 仓库名称
+            number: PR 编号
+            requested_at: 评审请求时间
+            changed_lines: PR 新增与删除的总行数
+            progress: 进度发布器
+
+        Returns:
+            评审汇总
+        """
+        try:
+            summary = await self._run(owner, repo, number, requested_at, changed_lines, progress)
+        except Exception as e:
+            if progress is not None:
+                progress.fail(f"评审失败: {str(e)}")
+            raise
+
+        if progress is not None:
+            progress.summary(summary)
+        return summary
+
+    async def _run(
+            self,
+            owner: str,
+            repo: str,
+            number: int,
+            requested_at: Optional[float],
+            changed_lines: Optional[int],
+            progress: Optional[ReviewProgress]
+    ) -> Dict[str, Any]:
+        """依次执行评审各阶段，返回评审汇总"""
+        if progress is not None:
+            progress.progress("plan", 0, 1)
+        plan = await self.incremental.plan(owner, repo, number)
+        summary: Dict[str, Any] = {
+            "repo": plan.repo,
+            "number": number,
+            "head_sha": plan.head_sha,
+            "incremental": plan.incremental,
+            "files": len(plan.files),
+            "skipped_files": len(plan.skipped)
+        }
+        if plan.up_to_date or not plan.config.enabled:
+            summary["status"] = "skipped"
+            return summary
+
+        findings: List[ReviewFinding] = []
+        for index, delta in enumerate(plan.files):
+            # 仓库配置关闭的规则和低于最低严重程度的问题不记录也不发布
+            file_findings = plan.config.apply(
+                [finding for analyzer in self.analyzers for finding in analyzer.analyze(delta)]
+            )
+            findings.extend(file_findings)
+            if progress is not None:
+                progress.file_findings(delta.path, file_findings)
+                progress.progress("analyze", index + 1, len(plan.files))
+
+        run_id = await asyncio.to_thread(
+            self.store.record_run, plan.repo, number, plan.head_sha, findings,
+            requested_at=requested_at, changed_lines=changed_lines
+        )
+        summary.update(status="completed", run_id=run_id, findings=len(findings), published=0)
+
+        if self.publish:
+            if progress is not None:
+                progress.progress("publish", 0, 1)
+            result = await ReviewPublisher(self.pr_service).publish(
+                owner, repo, number, plan.head_sha, findings,
+                commentable_lines={delta.path: added_line_set(delta.hunks) for delta in plan.files}
+            )
+            summary["published"] = result.published + result.unanchored
+            summary["duplicates"] = result.duplicates
+
+        await self.incremental.mark_reviewed(plan)
+        logger.info(f"{plan.repo}#{number} 评审完成，问题 {len(findings)} 条")
+        await self._sync_indexes(owner, repo, plan)
+        return summary
+
+    async def _sync_indexes(self, owner: str, repo: str, plan: ReviewPlan) -> None:
+        """把本次评审的文件变更同步到代码索引，失败只记录日志，不影响评审结果"""
+        for service in self.index_services:
+            try:
+                await service.sync(
+                    self.pr_service, owner, repo, plan.head_sha, plan.changed_files, plan.config.triage_rules
+                )
+            except Exception as e:
+                logger.warning(f"{service.label} 同步失败 {plan.repo}@{plan.head_sha[:7]}: {str(e)}")
+
+
+async def submit_review(
+        user_pr_service: GithubPullRequestService,
+        owner: str,
+        repo: str,
+        number: int,
+        user_id: Any = None,
+        interactive: bool = False,
+        scheduler: Optional[ReviewScheduler] = None,
+        analyzers: Optional[List[Analyzer]] = None
+) -> Tuple[ReviewJob, ReviewProgress]:
+    """
+    校验 PR 并把评审任务提交到调度器
+
+    PR 用发起者的令牌读取，确认其有权访问；后台评审在配置了 GitHub App 时以安装身份执行，
+    否则沿用发起者的令牌。事件主题在入队前打开，发起者可以立即订阅，排队期间也能收到事件。
+    只有已经评审过的 PR 的重新评审才进入 interactive 通道，首次评审按 PR 大小分配通道。
+
+    Args:
+        user_pr_service: 以发起者身份访问 GitHub 的服务
+        owner: 仓库所有者
+        repo: 仓库名称
+        number: PR 编号
+        user_id: 发起者的用户 ID，只有该用户可以订阅进度
+        interactive: 是否为用户主动发起的重新评审，PR 从未评审过时忽略
+        scheduler: 评审调度器，默认使用全局实例
+        analyzers: 分析器列表
+
+    Returns:
+        (已入队的评审任务, 进度发布器)
+
+    Raises:
+        GitHubApiError: PR 不存在或无权访问时
+        QueueFullError: 评审队列已满时
+    """
+    scheduler = scheduler or review_scheduler
+    pr = await user_pr_service.get_pull_request(owner, repo, number)
+    changed_lines = int(pr.get("additions") or 0) + int(pr.get("deletions") or 0)
+    requested_at = time.time()
+    full_name = f"{owner}/{repo}"
+    if interactive and await asyncio.to_thread(ReviewStateStore().get, full_name, number) is None:
+        interactive = False
+
+    async def run(job: ReviewJob) -> Dict[str, Any]:
+        try:
+            pr_service = (await create_installation_pull_request_service(owner, repo)
+                          if github_app_auth.is_configured else user_pr_service)
+        except Exception as e:
+            progress.fail(f"评审失败: {str(e)}")
+            raise
+        return await ReviewPipeline(pr_service, analyzers).run(
+            owner, repo, number, requested_at=requested_at, changed_lines=changed_lines, progress=progress
+        )
+
+    progress = ReviewProgress.create(user_id, full_name, number)
+    progress.progress("queued", 0, 1)
+    try:
+        job = await scheduler.submit(
+            owner.lower(), full_name, number, run,
+            changed_lines=changed_lines, interactive=interactive, job_id=progress.job_id
+        )
+    except Exception as e:
+        progress.fail(f"评审任务提交失败: {str(e)}")
+        raise
+    return job, progress
@@ -0,0 +1,129 @@
+"""
+评审进度事件，评审流水线通过 ReviewProgress 发布进度，SSE 接口订阅后实时推送给前端
+"""
+import logging
+import secrets
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from app.core.pubsub import PubSub
+from app.services.github_pull_request_service import ReviewFinding
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 创建全局评审事件发布/订阅（每个工作进程一个）
+review_events = PubSub(
+    max_buffer=int(get_value("REVIEW_EVENTS_BUFFER", 256)),
+    history_size=int(get_value("REVIEW_EVENTS_HISTORY", 64)),
+    retention=float(get_value("REVIEW_EVENTS_RETENTION", 300))
+)
+
+
+def topic_for(job_id: str) -> str:
+    """
+    获取评审任务的事件主题
+
+    Args:
+        job_id: 评审任务 ID
+
+    Returns:
+        主题键
+    """
+    return f"review:{job_id}"
+
+
+class ReviewProgress:
+    """
+    单个评审任务的进度发布器
+
+    事件类型：
+        progress: 阶段进度 {stage, done, total}
+        file: 单个文件的评审结果 {path, findings}
+        summary: 评审汇总
+        error: 评审失败 {message}
+        end: 事件流结束
+    """
+
+    def __init__(self, job_id: str, events: Optional[PubSub] = None):
+        """
+        初始化进度发布器
+
+        Args:
+            job_id: 评审任务 ID
+            events: 发布/订阅实例，默认使用全局评审事件
+        """
+        self.job_id = job_id
+        self.events = events or review_events
+        self.topic = topic_for(job_id)
+
+    @classmethod
+    def create(cls, owner_id: Any, repo: str, number: int, events: Optional[PubSub] = None) -> "ReviewProgress":
+        """
+        创建新的评审任务主题
+
+        Args:
+            owner_id: 发起评审的用户 ID，只有该用户可以订阅
+            repo: 仓库全名 owner/repo
+            number: PR 编号
+            events: 发布/订阅实例
+
+        Returns:
+            进度发布器
+        """
+        progress = cls(secrets.token_urlsafe(12), events)
+        progress.events.open(progress.topic, owner_id=owner_id, repo=repo, number=number, created_at=time.time())
+        return progress
+
+    def progress(self, stage: str, done: int, total: int) -> None:
+        """
+        发布阶段进度
+
+        Args:
+            stage: 阶段名称
+            done: 已完成数量
+            total: 总数量
+        """
+        self.events.publish(self.topic, "progress", {"stage": stage, "done": done, "total": total})
+
+    def file_findings(self, path: str, findings: Iterable[ReviewFinding]) -> None:
+        """
+        发布单个文件的评审结果
+
+        Args:
+            path: 文件路径
+            findings: 该文件的问题列表
+        """
+        self.events.publish(self.topic, "file", {
+            "path": path,
+            "findings": [
+                {
+                    "line": finding.line,
+                    "rule": finding.rule,
+                    "severity": finding.severity,
+                    "message": finding.message,
+                    "fingerprint": finding.fingerprint
+                }
+                for finding in findings
+            ]
+        })
+
+    def summary(self, summary: Dict[str, Any]) -> None:
+        """
+        发布评审汇总并结束事件流
+
+        Args:
+            summary: 评审汇总
+        """
+        self.events.publish(self.topic, "summary", summary)
+        self.events.close(self.topic)
+
+    def fail(self, message: str) -> None:
+        """
+        发布评审失败并结束事件流
+
+        Args:
+            message: 错误信息
+        """
+        self.events.publish(self.topic, "error", {"message": message})
+        self.events.close(self.topic)
@@ -0,0 +1,345 @@
+"""
+评审任务调度器，按租户加权公平排队，支持优先级通道、单仓库并发上限和等待老化
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from app.core.lifespan import lifespan_manager
+from app.util.config import get_value
+
+logger = logging.getLogger(__name__)
+
+# 优先级通道，越靠前越优先
+LANES = ["interactive", "small", "normal", "large"]
+
+
+class QueueFullError(Exception):
+    """调度队列已满"""
+    pass
+
+
+@dataclass
+class ReviewJob:
+    """一个待执行的评审任务"""
+    tenant: str
+    repo: str
+    number: int
+    lane: str
+    cost: float
+    run: Callable[["ReviewJob"], Awaitable[Any]]
+    job_id: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    # 加权公平排队的虚拟完成时间
+    virtual_finish: float = 0.0
+    seq: int = 0
+    future: Optional[asyncio.Future] = None
+
+
+@dataclass
+class _Tenant:
+    """租户的公平排队状态"""
+    weight: float = 1.0
+    last_finish: float = 0.0
+    queued: int = 0
+
+
+class ReviewScheduler:
+    """
+    评审任务调度器
+
+    - 加权公平排队：每个租户（安装或仓库所有者）按权重分摊执行份额，任务入队时
+      打上虚拟完成时间 max(全局虚拟时间, 租户上一任务完成时间) + 代价 / 权重，
+      同一通道内虚拟完成时间小的先执行，大型 monorepo 持续提交不会饿死其他租户。
+    - 优先级通道：交互式重新评审和小 PR 先于普通和大型 PR。
+    - 老化：任务每等待 aging_interval 秒提升一个通道，低优先级任务不会无限等待。
+    - 单仓库并发上限：某个仓库正在执行的任务达到上限时跳过它的排队任务。
+    """
+
+    def __init__(
+            self,
+            workers: int = 4,
+            max_queue: int = 1000,
+            repo_concurrency: int = 2,
+            aging_interval: float = 30.0,
+            small_pr_lines: int = 200,
+            large_pr_lines: int = 2000,
+            tenant_weights: Optional[Dict[str, float]] = None
+    ):
+        """
+        初始化调度器
+
+        Args:
+            workers: 同时执行的评审任务数量
+            max_queue: 排队任务数量上限
+            repo_concurrency: 单个仓库同时执行的任务数量上限
+            aging_interval: 每等待多少秒提升一个优先级通道
+            small_pr_lines: 不超过该变更行数的 PR 进入 small 通道
+            large_pr_lines: 超过该变更行数的 PR 进入 large 通道
+            tenant_weights: 租户权重，未配置的租户权重为 1
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.repo_concurrency = repo_concurrency
+        self.aging_interval = aging_interval
+        self.small_pr_lines = small_pr_lines
+        self.large_pr_lines = large_pr_lines
+        self.tenant_weights = tenant_weights or {}
+
+        self.pending: List[ReviewJob] = []
+        self.tenants: Dict[str, _Tenant] = {}
+        self.running: Counter = Counter()
+        self.virtual_time = 0.0
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+
+        # 指标
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_times: Dict[str, Deque[float]] = {lane: deque(maxlen=512) for lane in LANES}
+
+    def classify(self, changed_lines: int, interactive: bool = False) -> str:
+        """
+        根据 PR 规模选择通道
+
+        Args:
+            changed_lines: 新增与删除的总行数
+            interactive: 是否为用户主动发起的重新评审
+
+        Returns:
+            通道名称
+        """
+        if interactive:
+            return "interactive"
+        if changed_lines <= self.small_pr_lines:
+            return "small"
+        if changed_lines > self.large_pr_lines:
+            return "large"
+        return "normal"
+
+    def _condition(self) -> asyncio.Condition:
+        """惰性创建条件变量，确保绑定到当前事件循环"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Condition()
+        return self._wakeup
+
+    def _tenant(self, name: str) -> _Tenant:
+        """获取租户状态"""
+        tenant = self.tenants.get(name)
+        if tenant is None:
+            tenant = _Tenant(weight=max(float(self.tenant_weights.get(name, 1.0)), 0.01))
+            self.tenants[name] = tenant
+        return tenant
+
+    async def submit(
+            self,
+            tenant: str,
+            repo: str,
+            number: int,
+            run: Callable[[ReviewJob], Awaitable[Any]],
+            changed_lines: int = 0,
+            interactive: bool = False,
+            job_id: Optional[str] = None
+    ) -> ReviewJob:
+        """
+        提交评审任务
+
+        Args:
+            tenant: 租户（GitHub App 安装或仓库所有者）
+            repo: 仓库全名 owner/repo
+            number: PR 编号
+            run: 执行评审的异步函数
+            changed_lines: PR 新增与删除的总行数，决定通道和排队代价
+            interactive: 是否为用户主动发起的重新评审
+            job_id: 评审任务 ID
+
+        Returns:
+            评审任务，可等待 job.future 获取结果
+
+        Raises:
+            QueueFullError: 排队任务已达上限时
+        """
+        if len(self.pending) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"评审队列已满（{self.max_queue}）")
+
+        state = self._tenant(tenant)
+        # 代价随规模增长，但不线性放大，避免大 PR 被无限推后
+        cost = 1.0 + (max(changed_lines, 0) / 500.0) ** 0.5
+        job = ReviewJob(
+            tenant=tenant,
+            repo=repo,
+            number=number,
+            lane=self.classify(changed_lines, interactive),
+            cost=cost,
+            run=run,
+            job_id=job_id,
+            seq=next(self._seq),
+            future=asyncio.get_running_loop().create_future()
+        )
+        job.virtual_finish = max(self.virtual_time, state.last_finish) + cost / state.weight
+        state.last_finish = job.virtual_finish
+        state.queued += 1
+
+        condition = self._condition()
+        async with condition:
+            self.pending.append(job)
+            condition.notify()
+
+        logger.info(f"评审任务入队 {repo}#{number}，通道 {job.lane}，排队 {len(self.pending)} 个")
+        return job
+
+    def _effective_lane(self, job: ReviewJob, now: float) -> int:
+        """计算老化后的通道序号"""
+        rank = LANES.index(job.lane)
+        if self.aging_interval > 0:
+            rank -= int((now - job.enqueued_at) // self.aging_interval)
+        return max(rank, 0)
+
+    def _pick(self) -> Optional[ReviewJob]:
+        """选择下一个可执行的任务，所有排队任务都受仓库并发上限阻塞时返回 None"""
+        now = time.monotonic()
+        best: Optional[ReviewJob] = None
+        best_key = None
+        for job in self.pending:
+            if self.running[job.repo] >= self.repo_concurrency:
+                continue
+            key = (self._effective_lane(job, now), job.virtual_finish, job.seq)
+            if best_key is None or key < best_key:
+                best, best_key = job, key
+
+        if best is not None:
+            self.pending.remove(best)
+        return best
+
+    async def _worker(self, index: int) -> None:
+        """工作协程，循环取出任务并执行"""
+        condition = self._condition()
+        while True:
+            async with condition:
+                job = self._pick()
+                while job is None:
+                    # 有任务被仓库并发上限阻塞时定期重试，以便老化生效
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=self.aging_interval or None)
+                    except asyncio.TimeoutError:
+                        pass
+                    job = self._pick()
+
+                self.running[job.repo] += 1
+                self.tenants[job.tenant].queued -= 1
+                self.virtual_time = max(self.virtual_time, job.virtual_finish - job.cost / self.tenants[job.tenant].weight)
+
+            job.started_at = time.monotonic()
+            self.wait_times[job.lane].append(job.started_at - job.enqueued_at)
+            try:
+                result = await job.run(job)
+                self.completed += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"评审任务 {job.repo}#{job.number} 执行失败: {str(e)}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                async with condition:
+                    self.running[job.repo] -= 1
+                    if self.running[job.repo] <= 0:
+                        del self.running[job.repo]
+                    # 仓库并发名额释放后唤醒所有等待者重新选择
+                    condition.notify_all()
+
+    def start(self) -> None:
+        """启动工作协程"""
+        if self._tasks:
+            return
+        self._tasks = [
+            lifespan_manager.spawn(self._worker(index), name=f"review_worker_{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"评审调度器已启动，工作协程 {self.workers} 个")
+
+    def stop(self) -> None:
+        """取消所有排队任务，正在执行的任务由生命周期管理器取消"""
+        for job in self.pending:
+            if not job.future.done():
+                job.future.cancel()
+        self.pending.clear()
+        for state in self.tenants.values():
+            state.queued = 0
+        self._tasks = []
+        # 条件变量绑定在当前事件循环上，重新启动时重新创建
+        self._wakeup = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取调度指标
+
+        Returns:
+            队列深度、执行中任务数量和各通道的等待时间统计
+        """
+        now = time.monotonic()
+        depth = Counter(job.lane for job in self.pending)
+        oldest = min((job.enqueued_at for job in self.pending), default=None)
+
+        wait = {}
+        for lane, samples in self.wait_times.items():
+            ordered = sorted(samples)
+            wait[lane] = {
+                "samples": len(ordered),
+                "p50": ordered[len(ordered) // 2] if ordered else None,
+                "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] if ordered else None,
+                "max": ordered[-1] if ordered else None
+            }
+
+        return {
+            "queue_depth": len(self.pending),
+            "queue_depth_by_lane": {lane: depth[lane] for lane in LANES},
+            "queue_depth_by_tenant": {name: state.queued for name, state in self.tenants.items() if state.queued},
+            "oldest_wait": now - oldest if oldest is not None else None,
+            "running": sum(self.running.values()),
+            "running_by_repo": dict(self.running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_seconds": wait
+        }
+
+
+def create_review_scheduler() -> ReviewScheduler:
+    """
+    根据配置创建评审调度器
+
+    Returns:
+        ReviewScheduler 实例
+    """
+    weights = get_value("REVIEW_TENANT_WEIGHTS") or {}
+    if isinstance(weights, str):
+        # 环境变量格式：owner1=3,owner2=0.5
+        weights = dict(item.split("=", 1) for item in weights.split(",") if "=" in item)
+
+    return ReviewScheduler(
+        workers=int(get_value("REVIEW_WORKERS", 4)),
+        max_queue=int(get_value("REVIEW_MAX_QUEUE", 1000)),
+        repo_concurrency=int(get_value("REVIEW_REPO_CONCURRENCY", 2)),
+        aging_interval=float(get_value("REVIEW_AGING_INTERVAL", 30)),
+        small_pr_lines=int(get_value("REVIEW_SMALL_PR_LINES", 200)),
+        large_pr_lines=int(get_value("REVIEW_LARGE_PR_LINES", 2000)),
+        tenant_weights={name.strip(): float(weight) for name, weight in weights.items()}
+    )
+
+
+# 创建全局评审调度器（每个工作进程一个）
+review_scheduler = create_review_scheduler()
@@ -0,0 +1,23 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 测试使用独立的数据库和数据目录，避免写入开发环境的文件
+_data_dir = tempfile.mkdtemp(prefix="crag-test-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_data_dir, 'crag.db')}")
+for _name in ("BLOB_STORE_DIR", "CODE_INDEX_DIR", "CODE_SEARCH_DIR"):
+    os.environ.setdefault(_name, os.path.join(_data_dir, _name.lower()))
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "crag-backend"))
+
+
+_repo_ids = itertools.count()
+
+
+@pytest.fixture
+def repo_name():
+    """每个测试使用不同的仓库，避免共享数据库中的评审状态互相影响"""
+    return f"repo{next(_repo_ids)}"
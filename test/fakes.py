@@ -0,0 +1,91 @@
+class FakePullRequestService:
+    """只在内存中响应评审流水线用到的 GitHub 接口"""
+
+    def __init__(self, files, blobs=None, config=None, head_sha="head1", base_sha="base1"):
+        self.files = files
+        self.blobs = blobs or {}
+        self.config = config
+        self.head_sha = head_sha
+        self.base_sha = base_sha
+        self.reviews = []
+        self.fail_blobs = False
+        self.tree = []
+        self.truncated = False
+
+    async def get_pull_request(self, owner, repo, number):
+        additions = sum((file.get("patch") or "").count("\n+") for file in self.files)
+        return {"head": {"sha": self.head_sha}, "base": {"sha": self.base_sha}, "additions": additions, "deletions": 0}
+
+    async def list_pull_request_files(self, owner, repo, number):
+        return self.files
+
+    async def compare_commits(self, owner, repo, base, head):
+        return {"status": "ahead", "files": self.files}
+
+    async def list_bot_comments(self, owner, repo, number):
+        return []
+
+    async def list_bot_reviews(self, owner, repo, number):
+        return []
+
+    async def get_file_content(self, owner, repo, path, ref=None):
+        return None
+
+    async def get_content_entry(self, owner, repo, path, ref=None):
+        if self.config is None:
+            return None
+        content = self.config.encode()
+        return {"sha": f"cfg{len(content)}{abs(hash(self.config))}", "size": len(content), "encoding": "none"}
+
+    async def get_tree(self, owner, repo, sha):
+        return self.tree, self.truncated
+
+    async def get_blob_content(self, owner, repo, sha):
+        from app.services.github_repos_service import GitHubApiError
+
+        if self.fail_blobs:
+            raise GitHubApiError("blob 获取失败")
+        if sha.startswith("cfg"):
+            return self.config.encode()
+        return self.blobs[sha]
+
+    async def create_review(self, owner, repo, number, commit_id, body, comments, event="COMMENT"):
+        self.reviews.append({"commit_id": commit_id, "body": body, "comments": comments})
+        return {"id": len(self.reviews)}
+
+
+def python_file(path, lines):
+    """生成新增文件的 PR 文件条目和 blob 内容"""
+    from app.services.blob_store import git_blob_sha
+
+    content = ("\n".join(lines) + "\n").encode()
+    patch = f"@@ -0,0 +1,{len(lines)} @@\n" + "\n".join("+" + line for line in lines)
+    sha = git_blob_sha(content)
+    return {"filename": path, "status": "added", "sha": sha, "patch": patch}, {sha: content}
+
+
+def rule_analyzers():
+    """测试用分析器：过长的新增行和新增的 TODO 注释"""
+    from app.services.github_pull_request_service import ReviewFinding
+    from app.services.review_pipeline import Analyzer
+
+    class RuleAnalyzer(Analyzer):
+        def __init__(self, rule, predicate):
+            self.rule = rule
+            self.predicate = predicate
+
+        def analyze(self, delta):
+            findings = []
+            for hunk in delta.hunks:
+                texts = [line[1:] for line in hunk.lines if line.startswith("+")]
+                for line, text in zip(hunk.added_lines(), texts):
+                    if self.predicate(text):
+                        findings.append(ReviewFinding(
+                            path=delta.path, line=line, rule=self.rule, severity="info", message=self.rule, context=text
+                        ))
+            return findings
+
+    return [
+        RuleAnalyzer("line-length", lambda text: len(text) > 120),
+        RuleAnalyzer("todo-comment", lambda text: "# TODO" in text),
+    ]
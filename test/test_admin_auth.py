@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.session import session_manager
+from app.main import run
+
+ADMIN_TOKEN = "admin-token-for-tests"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", ADMIN_TOKEN)
+    monkeypatch.setenv("ADMIN_LOGINS", "octocat, hubot")
+    return TestClient(run)
+
+
+def _login(client, login):
+    session_id = session_manager.create_session()
+    session_manager.set_session_data(session_id, {"user": {"id": 1, "login": login}})
+    client.cookies.set(session_manager.cookie_name, session_id)
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Admin-Token": "wrong"}, {"X-Admin-Token": ""}])
+def test_missing_or_wrong_admin_token_is_rejected(client, headers):
+    assert client.get("/api/admin/event-loop", headers=headers).status_code == 403
+
+
+def test_admin_token_is_accepted(client):
+    assert client.get("/api/admin/event-loop", headers={"X-Admin-Token": ADMIN_TOKEN}).status_code == 200
+
+
+def test_only_listed_logins_are_admins(client):
+    _login(client, "someone-else")
+    assert client.get("/api/admin/event-loop").status_code == 403
+
+    _login(client, "OctoCat")
+    assert client.get("/api/admin/event-loop").status_code == 200
+
+
+def test_admin_token_is_not_accepted_when_unset(client, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN")
+    assert client.get("/api/admin/tasks", headers={"X-Admin-Token": ""}).status_code == 403
+    assert client.get("/api/admin/tasks", headers={"X-Admin-Token": "None"}).status_code == 403
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController, AdmissionMiddleware, AdmissionRejected, Bulkhead
+
+
+def test_bulkhead_limits_concurrency_and_queues_in_order():
+    async def scenario():
+        bulkhead = Bulkhead("test", max_concurrent=2, max_queue=8, max_wait=5)
+        running, peak, order = 0, 0, []
+
+        async def work(index):
+            nonlocal running, peak
+            async with bulkhead.admit():
+                running += 1
+                peak = max(peak, running)
+                order.append(index)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(work(index) for index in range(6)))
+        return bulkhead, peak, order
+
+    bulkhead, peak, order = asyncio.run(scenario())
+
+    assert peak == 2
+    assert order == list(range(6))
+    assert bulkhead.metrics()["admitted"] == 6
+    assert bulkhead.active == 0 and not bulkhead.waiters
+
+
+def test_bulkhead_rejects_when_queue_is_full():
+    async def scenario():
+        bulkhead = Bulkhead("test", max_concurrent=1, max_queue=1, max_wait=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with bulkhead.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            async with bulkhead.admit():
+                pass
+        release.set()
+        await asyncio.gather(holder, queued)
+        return bulkhead, excinfo.value
+
+    bulkhead, error = asyncio.run(scenario())
+
+    assert error.bulkhead == "test" and error.retry_after >= 1
+    assert bulkhead.metrics()["rejected"] == 1
+    assert bulkhead.active == 0
+
+
+def test_bulkhead_rejects_after_max_wait():
+    async def scenario():
+        bulkhead = Bulkhead("test", max_concurrent=1, max_queue=4, max_wait=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with bulkhead.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            async with bulkhead.admit():
+                pass
+        release.set()
+        await holder
+        return bulkhead
+
+    bulkhead = asyncio.run(scenario())
+
+    assert bulkhead.active == 0 and not bulkhead.waiters
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        bulkhead = Bulkhead("test", max_concurrent=1, max_queue=4, max_wait=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with bulkhead.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        await holder
+        return bulkhead
+
+    bulkhead = asyncio.run(scenario())
+
+    assert bulkhead.active == 0 and not bulkhead.waiters
+
+
+def test_controller_routes_by_longest_prefix():
+    bulkheads = {name: Bulkhead(name, 1, 1, 1) for name in ("default", "cheap", "github", "oauth")}
+    controller = AdmissionController(
+        bulkheads,
+        [("/api/auth/github/", "github"), ("/api/auth/github/callback", "oauth"), ("/health", "cheap")],
+        exempt=["/events", "/api/admin/"]
+    )
+
+    assert controller.route("/api/auth/github/callback").name == "oauth"
+    assert controller.route("/api/auth/github/repos").name == "github"
+    assert controller.route("/health").name == "cheap"
+    assert controller.route("/api/other").name == "default"
+    assert controller.route("/api/reviews/abc/events") is None
+    assert controller.route("/api/admin/metrics") is None
+
+
+def test_middleware_holds_the_slot_until_the_streamed_body_is_sent():
+    bulkhead = Bulkhead("default", max_concurrent=1, max_queue=0, max_wait=1)
+    controller = AdmissionController({"default": bulkhead}, [])
+    active = []
+
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in (b"a", b"b"):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            active.append(bulkhead.active)
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        # 正文发送完毕后的后台任务不再占用名额
+        active.append(bulkhead.active)
+
+    async def scenario():
+        middleware = AdmissionMiddleware(streaming_app, controller)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        await middleware({"type": "http", "path": "/api/stream"}, receive, send)
+        return sent
+
+    sent = asyncio.run(scenario())
+
+    assert active == [1, 1, 0]
+    assert bulkhead.active == 0
+    assert sent[-1]["more_body"] is False
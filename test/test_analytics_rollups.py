@@ -0,0 +1,61 @@
+from sqlalchemy import select
+
+from app.model.database import session_scope
+from app.model.finding import ReviewRun
+from app.model.rollup import PrSizeDailyRollup, RuleDailyRollup, RunDailyRollup
+from app.services.analytics_service import SECONDS_PER_DAY, day_label, record_run_rollups
+from app.services.findings_service import FindingStore
+from app.services.github_pull_request_service import ReviewFinding
+
+DAY = 20000
+
+
+def _rows(*rules):
+    return [{"rule": rule, "severity": "warning"} for rule in rules]
+
+
+def _record(repo, finished_at, rows, started_at=None):
+    run = ReviewRun(repo=repo, pr_number=1, commit_sha="a" * 40, started_at=started_at or finished_at - 2)
+    with session_scope() as session:
+        record_run_rollups(session, run, rows, finished_at)
+
+
+def _rollups(model, repo):
+    with session_scope() as session:
+        return session.scalars(select(model).where(model.repo == repo).order_by(*model.__table__.primary_key)).all()
+
+
+def test_rollups_accumulate_across_runs_on_the_same_day(repo_name):
+    repo = f"owner/{repo_name}"
+    _record(repo, DAY * SECONDS_PER_DAY + 100, _rows("todo", "todo", "length"))
+    _record(repo, DAY * SECONDS_PER_DAY + 200, _rows("todo"))
+
+    rules = {row.rule: row.count for row in _rollups(RuleDailyRollup, repo)}
+    (runs,) = _rollups(RunDailyRollup, repo)
+
+    assert rules == {"todo": 3, "length": 1}
+    assert (runs.day, runs.run_count, runs.finding_count) == (DAY, 2, 4)
+    assert runs.latency_sum == 4.0
+
+
+def test_runs_are_bucketed_by_utc_day(repo_name):
+    repo = f"owner/{repo_name}"
+    _record(repo, DAY * SECONDS_PER_DAY - 1, _rows("todo"))
+    _record(repo, DAY * SECONDS_PER_DAY, _rows("todo"))
+
+    assert [(row.day, row.run_count) for row in _rollups(RunDailyRollup, repo)] == [(DAY - 1, 1), (DAY, 1)]
+    assert day_label(DAY) == "2024-10-04"
+
+
+def test_pr_size_is_counted_on_first_completion_only(repo_name):
+    store = FindingStore()
+    repo = f"owner/{repo_name}"
+    finding = ReviewFinding(path="a.py", line=1, rule="todo", severity="info", message="todo")
+
+    store.record_run(repo, 5, "a" * 40, [finding], changed_lines=30)
+    store.record_run(repo, 5, "b" * 40, [finding], changed_lines=5000)
+    store.record_run(repo, 6, "c" * 40, [], changed_lines=5000)
+
+    sizes = {row.bucket: row.count for row in _rollups(PrSizeDailyRollup, repo)}
+    assert sizes == {"S": 1, "XL": 1}
+    assert sum(row.run_count for row in _rollups(RunDailyRollup, repo)) == 3
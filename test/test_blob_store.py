@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.services.blob_store import BlobStore, BlobStoreError, git_blob_sha
+
+
+def test_put_uses_git_blob_sha(tmp_path):
+    store = BlobStore(root=str(tmp_path))
+    sha = store.put(b"hello\n")
+
+    assert sha == git_blob_sha(b"hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+    assert store.get(sha).text() == "hello\n"
+
+
+def test_lines_are_one_based_and_inclusive(tmp_path):
+    store = BlobStore(root=str(tmp_path))
+    blob = store.get(store.put(b"a\nb\nc"))
+
+    assert blob.line_count == 3
+    assert blob.text(2, 3) == "b\nc"
+    assert bytes(blob.lines(1, 1)) == b"a\n"
+
+
+def test_pinned_blob_survives_eviction_until_released(tmp_path):
+    store = BlobStore(root=str(tmp_path), max_open=1)
+    first = store.put(b"first\n")
+    second = store.put(b"second\n")
+
+    pinned = store.pin(first)
+    store.get(second)
+
+    # 被淘汰但仍在借用，内容可读
+    assert pinned.evicted
+    assert not pinned._file.closed
+    assert pinned.text() == "first\n"
+
+    store.release(pinned)
+    assert pinned._file.closed
+
+
+def test_unpinned_blob_is_closed_on_eviction(tmp_path):
+    store = BlobStore(root=str(tmp_path), max_open=1)
+    blob = store.get(store.put(b"first\n"))
+    store.get(store.put(b"second\n"))
+
+    assert blob._file.closed
+
+
+def test_concurrent_fetches_download_once(tmp_path):
+    store = BlobStore(root=str(tmp_path))
+    content = b"print('hi')\n"
+    sha = git_blob_sha(content)
+    calls = []
+
+    async def fetcher():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return content
+
+    async def main():
+        blobs = await asyncio.gather(*(store.pin_or_fetch(sha, fetcher) for _ in range(5)))
+        texts = [blob.text() for blob in blobs]
+        for blob in blobs:
+            store.release(blob)
+        return texts
+
+    assert asyncio.run(main()) == ["print('hi')\n"] * 5
+    assert calls == [1]
+
+
+def test_put_rejects_content_that_does_not_match_the_sha(tmp_path):
+    store = BlobStore(root=str(tmp_path))
+    sha = git_blob_sha(b"full content\n")
+
+    with pytest.raises(BlobStoreError):
+        store.put(b"full con", sha=sha)
+    assert not store.contains(sha)
+
+    async def truncated():
+        return b"full con"
+
+    with pytest.raises(BlobStoreError):
+        asyncio.run(store.pin_or_fetch(sha, truncated))
+    assert store.put(b"full content\n", sha=sha) == sha
@@ -0,0 +1,167 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.blob_store import git_blob_sha
+from app.services.code_chunker import chunk_file
+from app.services.code_index import CodeIndex, CodeIndexService, top_k
+from app.services.embedding import Embedder, HashingEmbedder, normalize_rows
+
+from .fakes import FakePullRequestService
+
+SOURCE = '''import os
+
+
+def read_config(path):
+    with open(path) as file:
+        return file.read()
+
+
+class Store:
+    def get(self, key):
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+'''
+
+
+def _functions(count, prefix="handler"):
+    text = "\n\n".join(f"def {prefix}_{i}(value):\n    return value + {i}\n" for i in range(count))
+    return text, chunk_file("module.py", text)
+
+
+def test_embedder_is_abstract():
+    with pytest.raises(TypeError):
+        Embedder()
+
+
+def test_chunk_file_splits_functions_and_classes():
+    chunks = chunk_file("config.py", SOURCE)
+
+    names = [chunk.name for chunk in chunks]
+    assert "read_config" in names
+    assert "Store" in names
+    read_config = next(chunk for chunk in chunks if chunk.name == "read_config")
+    assert read_config.text.startswith("def read_config")
+    assert [chunk.start_line for chunk in chunks] == sorted(chunk.start_line for chunk in chunks)
+
+
+def test_chunk_file_splits_long_class_into_methods():
+    chunks = chunk_file("config.py", SOURCE, max_lines=4)
+
+    names = {chunk.name for chunk in chunks}
+    assert {"Store.get", "Store.put"} <= names
+
+
+def test_chunk_file_windows_long_module_code():
+    text = "\n".join(f"value_{i} = {i}" for i in range(25))
+
+    chunks = chunk_file("values.py", text, max_lines=10)
+
+    assert all(chunk.end_line - chunk.start_line + 1 <= 10 for chunk in chunks)
+    assert chunks[0].start_line == 1 and chunks[-1].end_line == 25
+
+
+def test_top_k_matches_brute_force():
+    rng = np.random.default_rng(7)
+    vectors = normalize_rows(rng.standard_normal((500, 32)).astype(np.float32))
+    queries = normalize_rows(rng.standard_normal((4, 32)).astype(np.float32))
+    live = rng.random(500) > 0.3
+
+    ids, scores = top_k(vectors, live, queries, k=10, block_rows=64)
+
+    expected = queries @ vectors.T
+    expected[:, ~live] = -np.inf
+    for row in range(len(queries)):
+        brute = np.argsort(-expected[row], kind="stable")[:10]
+        assert set(ids[row].tolist()) == set(brute.tolist())
+        assert np.allclose(scores[row], expected[row][brute], atol=1e-6)
+        assert all(live[ids[row]])
+
+
+def test_top_k_returns_at_most_live_rows():
+    vectors = normalize_rows(np.eye(4, dtype=np.float32))
+    live = np.array([True, False, True, False])
+
+    ids, scores = top_k(vectors, live, vectors[:1], k=8, block_rows=2)
+
+    assert ids.shape == (1, 2)
+    assert ids[0].tolist() == [0, 2]
+
+
+def test_update_reuses_vectors_and_searches(tmp_path):
+    embedder = HashingEmbedder(64)
+    index = CodeIndex(str(tmp_path), embedder, min_capacity=16)
+    text, chunks = _functions(3)
+
+    first = index.update({"module.py": ("sha1", chunks)}, "c1")
+    second = index.update({"module.py": ("sha2", chunks)}, "c2")
+
+    assert first == {"added": 3, "embedded": 3, "removed": 0}
+    assert second == {"added": 3, "embedded": 0, "removed": 3}
+    assert index.live_count == 3 and index.commit == "c2"
+
+    query = embedder.embed([chunks[1].embedding_text()])
+    hits = index.search(query, k=1)
+    assert hits[0][0][0].name == chunks[1].name
+    assert hits[0][0][0].blob_sha == "sha2"
+
+
+def test_update_removes_deleted_files(tmp_path):
+    index = CodeIndex(str(tmp_path), HashingEmbedder(64), min_capacity=16)
+    _, chunks = _functions(2)
+    index.update({"module.py": ("sha1", chunks), "other.py": ("sha2", chunk_file("other.py", SOURCE))}, "c1")
+
+    result = index.update({"other.py": None}, "c2")
+
+    assert result["added"] == 0 and result["removed"] > 0
+    assert index.live_count == 2
+
+
+def test_compaction_keeps_live_rows_searchable(tmp_path):
+    embedder = HashingEmbedder(64)
+    index = CodeIndex(str(tmp_path), embedder, min_capacity=8)
+    for version in range(5):
+        _, chunks = _functions(4, prefix=f"v{version}")
+        index.update({"module.py": (f"sha{version}", chunks)}, f"c{version}")
+
+    assert index.count == index.live_count == 4
+    assert len(list(tmp_path.glob("vectors-*.npy"))) == 1
+
+    hits = index.search(embedder.embed([chunks[2].embedding_text()]), k=1)
+    assert hits[0][0][0].name == chunks[2].name
+
+
+def test_reload_from_disk(tmp_path):
+    embedder = HashingEmbedder(64)
+    _, chunks = _functions(3)
+    CodeIndex(str(tmp_path), embedder, min_capacity=16).update({"module.py": ("sha1", chunks)}, "c1")
+
+    reloaded = CodeIndex(str(tmp_path), embedder, min_capacity=16)
+    reloaded.refresh()
+
+    assert reloaded.commit == "c1" and reloaded.live_count == 3
+    hits = reloaded.search(embedder.embed([chunks[0].embedding_text()]), k=1)
+    assert hits[0][0][0].name == chunks[0].name
+    assert reloaded.update({"module.py": ("sha1", chunks)})["embedded"] == 0
+
+
+def test_build_keeps_files_missing_from_a_truncated_tree(tmp_path):
+    first = b"def first():\n    return 1\n"
+    second = b"def second():\n    return 2\n"
+    blobs = {git_blob_sha(first): first, git_blob_sha(second): second}
+    service = FakePullRequestService([], blobs)
+    service.tree = [{"path": "a.py", "sha": git_blob_sha(first)}, {"path": "b.py", "sha": git_blob_sha(second)}]
+    indexes = CodeIndexService(HashingEmbedder(64), root=str(tmp_path))
+    asyncio.run(indexes.build(service, "octo", "big", "c1"))
+
+    service.tree, service.truncated = service.tree[:1], True
+    truncated = asyncio.run(indexes.build(service, "octo", "big", "c2"))
+    service.truncated = False
+    complete = asyncio.run(indexes.build(service, "octo", "big", "c3"))
+
+    assert truncated["removed"] == 0
+    assert complete["removed"] == 1
+    assert set(indexes.get_index("octo", "big").path_blobs) == {"a.py"}
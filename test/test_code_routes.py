@@ -0,0 +1,81 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.core.container import RequestAuth, container
+from app.main import run
+from app.routers import findings
+from app.services.code_index import CodeIndexService
+from app.services.code_search import CodeSearchService
+from app.services.embedding import HashingEmbedder
+from app.services.github_snapshot_service import UserSnapshot
+from app.services.review_pipeline import ReviewPipeline
+
+from .fakes import FakePullRequestService, python_file
+
+ENGINE = ["def connect(url):", "    engine = create_engine(url)", "    return engine"]
+SESSION = ["def load_session(user_id):", "    session = fetch(user_id)", "    return session"]
+
+
+def _pipeline(service, tmp_path):
+    indexes = [
+        CodeIndexService(HashingEmbedder(64), root=str(tmp_path / "vectors")),
+        CodeSearchService(root=str(tmp_path / "bm25")),
+    ]
+    return ReviewPipeline(service, index_services=indexes), indexes
+
+
+def test_review_builds_then_updates_code_indexes(tmp_path, repo_name):
+    engine, blobs = python_file("db.py", ENGINE)
+    session, session_blobs = python_file("session.py", SESSION)
+    blobs.update(session_blobs)
+    service = FakePullRequestService([session], blobs)
+    # 首次评审按完整文件树建立索引
+    service.tree = [{"path": "db.py", "sha": engine["sha"]}, {"path": "session.py", "sha": session["sha"]}]
+    pipeline, (vectors, bm25) = _pipeline(service, tmp_path)
+
+    asyncio.run(pipeline.run("octo", repo_name, 1))
+
+    assert set(bm25.get_index("octo", repo_name).path_blobs) == {"db.py", "session.py"}
+    assert vectors.get_index("octo", repo_name).commit == "head1"
+
+    # 之后只同步评审中变化的文件
+    removed = dict(session, status="removed", patch="@@ -1,3 +0,0 @@\n" + "\n".join("-" + line for line in SESSION))
+    service.files, service.head_sha, service.tree = [removed], "head2", []
+    asyncio.run(pipeline.run("octo", repo_name, 1))
+
+    assert set(bm25.get_index("octo", repo_name).path_blobs) == {"db.py"}
+    assert vectors.get_index("octo", repo_name).commit == "head2"
+    hits = asyncio.run(bm25.search("octo", repo_name, "create_engine"))
+    assert hits[0].chunk.path == "db.py" and "create_engine" in hits[0].text
+
+
+def test_code_routes_require_repo_access(monkeypatch, repo_name):
+    engine, blobs = python_file("db.py", ENGINE)
+    service = FakePullRequestService([engine], blobs)
+    service.tree = [{"path": "db.py", "sha": engine["sha"]}]
+    asyncio.run(ReviewPipeline(service).run("octo", repo_name, 1))
+
+    async def snapshot(user_id, access_token, force_refresh=False):
+        return UserSnapshot(user={}, repos=[{"full_name": f"octo/{repo_name}"}], orgs=[])
+
+    monkeypatch.setattr(findings.snapshot_service, "get_snapshot", snapshot)
+    monkeypatch.setattr(container, "resolve", lambda cls, request: RequestAuth(
+        session_id="test", user={"id": 1}, access_token="token"
+    ))
+    client = TestClient(run)
+
+    keyword = client.get("/api/code/search", params={"repo": f"octo/{repo_name}", "q": "create_engine", "mode": "keyword"})
+    semantic = client.get("/api/code/search", params={"repo": f"octo/{repo_name}", "q": "connect engine url"})
+    usages = client.get("/api/code/usages", params={"repo": f"octo/{repo_name}", "identifier": "engine"})
+    context = client.post("/api/code/context", json={
+        "repo": f"octo/{repo_name}",
+        "hunks": [{"path": "app.py", "start_line": 1, "end_line": 2, "text": "engine = connect(url)"}]
+    })
+    denied = client.get("/api/code/search", params={"repo": "octo/other", "q": "engine"})
+
+    assert keyword.json()["hits"][0]["path"] == "db.py"
+    assert semantic.json()["hits"][0]["path"] == "db.py"
+    assert [item["path"] for item in usages.json()["usages"]] == ["db.py"]
+    assert context.json()["contexts"][0][0]["path"] == "db.py"
+    assert denied.status_code == 404
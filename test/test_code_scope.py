@@ -0,0 +1,117 @@
+from app.services import code_scope
+from app.services.blob_store import blob_store
+from app.services.code_chunker import _chunk_blobs
+from app.services.code_scope import ScopeIndex, build_scope_map, scope_index
+
+JS_CLASS = """class Foo extends Base {
+  constructor(x) {
+    this.x = x;
+  }
+  static bar(x = fn(1)) {
+    if (x) { return 1; }
+  }
+  count = compute(2);
+  async baz(): Promise<void> {
+    return 2;
+  }
+}
+const handler = async (req, res) => {
+  return res;
+};
+const result = run(() => {
+  return 1;
+});
+"""
+
+
+def _names(scope_map, lines):
+    return [getattr(scope_map.enclosing(line), "name", None) for line in lines]
+
+
+def test_js_and_ts_class_methods():
+    for path in ("foo.js", "foo.ts"):
+        scope_map = build_scope_map(path, JS_CLASS)
+
+        assert _names(scope_map, [3, 6, 8, 10]) == ["constructor", "bar", "Foo", "baz"]
+        assert [scope.name for scope in scope_map.chain(6)] == ["bar", "Foo"]
+
+
+def test_arrow_functions_assigned_to_declarations():
+    scope_map = build_scope_map("foo.js", JS_CLASS)
+
+    handler = scope_map.enclosing(14)
+    assert (handler.name, handler.kind, handler.start_line, handler.end_line) == ("handler", "function", 13, 15)
+    # 作为参数传入的匿名箭头函数不以变量命名
+    assert scope_map.enclosing(17) is None
+
+
+PYTHON = '''import os
+
+
+class Store:
+    """存储"""
+
+    def get(self, key):
+        value = self.items.get(
+            key,
+        )
+        return value
+
+    # 注释
+
+    def put(self, key, value):
+        self.items[key] = value
+
+
+def helper():
+    return 1
+'''
+
+
+def test_python_scopes_and_nesting():
+    scope_map = build_scope_map("store.py", PYTHON)
+
+    assert _names(scope_map, [1, 8, 9, 15, 19]) == [None, "get", "get", "put", "helper"]
+    assert [scope.name for scope in scope_map.chain(9)] == ["get", "Store"]
+    get = scope_map.enclosing(8)
+    assert (get.start_line, get.end_line) == (7, 11)
+    assert scope_map.enclosing_range(8, 15).name == "Store"
+
+
+def test_brace_language_scopes():
+    source = "package a\n\nfunc Get(x int) int {\n\tif x > 0 {\n\t\treturn x\n\t}\n\treturn 0\n}\n"
+
+    scope_map = build_scope_map("a.go", source)
+
+    assert _names(scope_map, [1, 5, 7]) == [None, "Get", "Get"]
+    assert build_scope_map("notes.unknown-ext", source).enclosing(5) is None
+
+
+def test_scope_index_caches_by_blob_and_language(monkeypatch):
+    calls = []
+    original = code_scope.build_scope_map
+
+    def counting(path, text):
+        calls.append(path)
+        return original(path, text)
+
+    monkeypatch.setattr(code_scope, "build_scope_map", counting)
+    index = ScopeIndex(max_entries=2)
+
+    first = index.get("sha1", "a.py", PYTHON)
+    assert index.get("sha1", "b/other.py", "内容命中缓存时不会被使用") is first
+    index.get("sha1", "a.js", PYTHON)
+    assert calls == ["a.py", "a.js"]
+
+    index.get("sha2", "c.py", PYTHON)
+    index.get("sha1", "a.py", PYTHON)
+    assert len(index.maps) == 2 and calls[-1] == "a.py"
+
+
+def test_chunker_uses_scope_index():
+    sha = blob_store.put(PYTHON.encode())
+    with blob_store.borrow(sha) as blob:
+        files = _chunk_blobs({"store.py": blob}, max_lines=80)
+
+    assert any(key[0] == sha for key in scope_index.maps)
+    assert {chunk.name for chunk in files["store.py"][1]} >= {"Store", "helper"}
@@ -0,0 +1,80 @@
+import numpy as np
+
+from app.services.blob_store import blob_store
+from app.services.code_chunker import chunk_file
+from app.services.code_search import Bm25Index
+
+FILES = {
+    "auth.py": "def set_session_data(session, data):\n    session.update(data)\n    return session\n",
+    "user.py": "def load_user_session(user_id):\n    user_session = fetch(user_id)\n    return user_session\n",
+    "view.js": "function getSession() {\n  return store.getSession();\n}\n",
+    "db.py": "def connect(url):\n    engine = create_engine(url)\n    return engine\n",
+}
+
+
+def _index(tmp_path) -> Bm25Index:
+    index = Bm25Index(str(tmp_path / "index.npz"))
+    files = {}
+    for path, text in FILES.items():
+        sha = blob_store.put(text.encode())
+        files[path] = (sha, chunk_file(path, text))
+    index.update(files, "c1")
+    return index
+
+
+def test_search_ranks_exact_identifier_first(tmp_path):
+    index = _index(tmp_path)
+
+    hits = index.search("create_engine", k=3)
+
+    assert hits[0][0].path == "db.py"
+
+
+def test_usages_of_compound_identifier(tmp_path):
+    index = _index(tmp_path)
+
+    assert [chunk.path for chunk, _ in index.usages("set_session_data")] == ["auth.py"]
+
+
+def test_usages_of_single_part_identifier_skip_subword_matches(tmp_path):
+    index = _index(tmp_path)
+
+    usages = index.usages("session")
+
+    assert [(chunk.path, count) for chunk, count in usages] == [("auth.py", 3)]
+
+
+def test_index_survives_reload_and_deletion(tmp_path):
+    index = _index(tmp_path)
+    index.update({"db.py": None}, "c2")
+
+    reloaded = Bm25Index(str(tmp_path / "index.npz"))
+    reloaded.refresh()
+
+    assert reloaded.usages("create_engine") == []
+    assert [chunk.path for chunk, _ in reloaded.usages("getSession")] == ["view.js"]
+
+
+def test_incremental_update_matches_rebuild(tmp_path):
+    incremental = _index(tmp_path)
+    changed = "def connect(url, pool):\n    engine = create_engine(url, pool=pool)\n    return engine\n"
+    incremental.update({
+        "db.py": (blob_store.put(changed.encode()), chunk_file("db.py", changed)),
+        "view.js": None,
+    }, "c2")
+
+    files = dict(FILES, **{"db.py": changed})
+    del files["view.js"]
+    rebuilt = Bm25Index(str(tmp_path / "rebuilt.npz"))
+    rebuilt.update({path: (blob_store.put(text.encode()), chunk_file(path, text)) for path, text in files.items()}, "c2")
+
+    def postings(index):
+        return {
+            term: sorted((index.docs[doc].path, tf) for doc, tf in zip(*index._postings(term)))
+            for term in index.terms
+        }
+
+    assert postings(incremental) == postings(rebuilt)
+    for start, end in zip(incremental.offsets[:-1], incremental.offsets[1:]):
+        assert np.all(np.diff(incremental.doc_ids[start:end].astype(np.int64)) > 0)
+    assert incremental.search("create_engine pool", k=1)[0][0].path == "db.py"
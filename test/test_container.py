@@ -0,0 +1,73 @@
+import hashlib
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.core.container import Container, Lifetime, RequestAuth, container, load_request_auth
+from app.core.session import session_manager
+from app.main import run
+
+
+class TokenService:
+    def __init__(self, access_token):
+        self.access_token = access_token
+
+
+def _request(token):
+    """只带 request.state 的请求替身，预先放入当前请求的认证信息"""
+    return SimpleNamespace(state=SimpleNamespace(services={RequestAuth: RequestAuth(access_token=token)}))
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _container(**kwargs):
+    services = Container(**kwargs)
+    services.register(RequestAuth, load_request_auth, Lifetime.REQUEST)
+    return services
+
+
+def test_per_token_instances_are_shared_and_evicted_lru():
+    services = _container(max_token_instances=2)
+    services.register(TokenService, TokenService, Lifetime.PER_TOKEN)
+
+    first = services.resolve(TokenService, _request("a"))
+    assert services.resolve(TokenService, _request("a")) is first
+    services.resolve(TokenService, _request("b"))
+    # 再次访问 a，使 b 成为最久未使用的实例
+    services.resolve(TokenService, _request("a"))
+    services.resolve(TokenService, _request("c"))
+
+    # 缓存键只保存令牌摘要，b 作为最久未使用的实例被淘汰
+    assert [token_key for _, token_key in services.token_instances] == [_digest("a"), _digest("c")]
+    assert services.resolve(TokenService, _request("a")) is first
+
+
+def test_request_scoped_instances_are_cached_on_request_state():
+    services = _container()
+    created = []
+    services.register(dict, lambda request: created.append(request) or {}, Lifetime.REQUEST)
+    request = _request(None)
+
+    assert services.resolve(dict, request) is services.resolve(dict, request)
+    assert services.resolve(dict, _request(None)) is not request.state.services[dict]
+    assert len(created) == 2
+
+
+def test_logout_drops_the_token_instances():
+    container.register(TokenService, TokenService, Lifetime.PER_TOKEN)
+    session_id = session_manager.create_session()
+    session_manager.set_session_data(session_id, {"github": {"access_token": "logout-token"}})
+    instance = container.resolve(TokenService, _request("logout-token"))
+    other = container.resolve(TokenService, _request("other-token"))
+    try:
+        client = TestClient(run, cookies={session_manager.cookie_name: session_id})
+        response = client.get("/api/auth/logout", follow_redirects=False)
+
+        assert response.status_code == 307
+        assert instance not in container.token_instances.values()
+        assert other in container.token_instances.values()
+    finally:
+        container.invalidate_token("other-token")
+        container.registrations.pop(TokenService, None)
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.container import RequestAuth
+from app.core.deadline import DeadlineExceeded, deadline_scope, remaining
+from app.core.singleflight import SingleFlight
+from app.main import run
+from app.routers.github import get_request_auth
+from app.services.github_client import WriteScheduler, github_client
+from app.services.github_repos_service import RateLimitExceededError
+
+
+async def _slow_github(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(2)
+    return httpx.Response(200, json=[])
+
+
+@pytest.fixture
+def client():
+    def auth(token: str) -> None:
+        run.dependency_overrides[get_request_auth] = lambda: RequestAuth(session_id="test", user={"id": 1}, access_token=token)
+
+    original = github_client._client
+    github_client._client = httpx.AsyncClient(transport=httpx.MockTransport(_slow_github))
+    yield TestClient(run), auth
+
+    run.dependency_overrides.clear()
+    github_client._client = original
+    github_client.breaker._transition(CircuitBreaker.CLOSED)
+
+
+def test_open_circuit_returns_503_with_retry_after(client):
+    test_client, auth = client
+    auth("token-breaker")
+    github_client.breaker._transition(CircuitBreaker.OPEN)
+
+    response = test_client.get("/api/auth/github/repos")
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_exhausted_deadline_returns_504(client):
+    test_client, auth = client
+    auth("token-deadline")
+
+    started = time.monotonic()
+    response = test_client.get("/api/auth/github/repos", headers={"X-Request-Timeout": "0.2"})
+
+    assert response.status_code == 504
+    assert time.monotonic() - started < 2
+
+
+def test_singleflight_waiters_keep_their_own_deadline():
+    flights = SingleFlight()
+    seen = []
+
+    async def fetch():
+        seen.append(remaining())
+        await asyncio.sleep(0.3)
+        return "ok"
+
+    async def hurried():
+        with deadline_scope(0.05):
+            return await flights.do("key", fetch)
+
+    async def patient():
+        await asyncio.sleep(0.01)
+        with deadline_scope(5):
+            return await flights.do("key", fetch)
+
+    async def main():
+        return await asyncio.gather(hurried(), patient(), return_exceptions=True)
+
+    first, second = asyncio.run(main())
+
+    assert isinstance(first, DeadlineExceeded)
+    assert second == "ok"
+    # 共享调用只执行一次，且不继承第一个调用者的截止时间
+    assert seen == [None]
+
+
+def test_non_transport_errors_return_half_open_probes():
+    async def undecodable(request: httpx.Request) -> httpx.Response:
+        raise httpx.DecodingError("坏的 gzip 数据", request=request)
+
+    async def ok(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={})
+
+    original = github_client._client
+    breaker = github_client.breaker
+    try:
+        breaker._transition(CircuitBreaker.HALF_OPEN)
+        github_client._client = httpx.AsyncClient(transport=httpx.MockTransport(undecodable))
+        with pytest.raises(httpx.DecodingError):
+            asyncio.run(github_client.request("GET", "https://api.github.com/user"))
+        assert breaker.state == CircuitBreaker.OPEN
+
+        breaker._transition(CircuitBreaker.HALF_OPEN)
+        github_client._client = httpx.AsyncClient(transport=httpx.MockTransport(ok))
+        for _ in range(breaker.half_open_calls):
+            asyncio.run(github_client.request("GET", "https://api.github.com/user"))
+        assert breaker.state == CircuitBreaker.CLOSED
+    finally:
+        github_client._client = original
+        breaker._transition(CircuitBreaker.CLOSED)
+
+
+def test_write_slot_fails_fast_instead_of_sleeping_past_the_deadline():
+    scheduler = WriteScheduler(min_interval=0, max_wait=60)
+    scheduler.pause("scope", 3600)
+
+    async def write():
+        async with scheduler.slot("scope"):
+            return "sent"
+
+    async def within(seconds):
+        with deadline_scope(seconds):
+            return await write()
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(within(0.5))
+    with pytest.raises(RateLimitExceededError):
+        asyncio.run(write())
+    assert time.monotonic() - started < 1
+    # 失败后锁已释放，暂停结束后可以继续写入
+    scheduler.next_allowed["scope"] = 0
+    assert asyncio.run(write()) == "sent"
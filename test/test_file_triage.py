@@ -0,0 +1,94 @@
+import asyncio
+
+from app.services.blob_store import git_blob_sha
+from app.services.file_triage import Category, FileTriage, GitAttributes, GlobSet, TriageRules, glob_to_regex, sniff
+
+from .fakes import FakePullRequestService
+
+
+class AttributesPullRequestService(FakePullRequestService):
+    """在提交根目录提供 .gitattributes"""
+
+    def __init__(self, attributes, blobs):
+        super().__init__([], blobs=blobs)
+        self.attributes = attributes
+        self.blob_requests = 0
+
+    async def get_file_content(self, owner, repo, path, ref=None):
+        return self.attributes.encode() if path == ".gitattributes" else None
+
+    async def get_blob_content(self, owner, repo, sha):
+        self.blob_requests += 1
+        return await super().get_blob_content(owner, repo, sha)
+
+
+def test_glob_semantics():
+    assert GlobSet(["*.lock"]).match("deep/dir/yarn.lock") == "*.lock"
+    assert GlobSet(["/build"]).match("build/out.js") == "/build"
+    assert GlobSet(["/build"]).match("src/build/out.js") is None
+    assert GlobSet(["docs/*.md"]).match("docs/a/b.md") is None
+    assert GlobSet(["docs/**/*.md"]).match("docs/a/b.md") == "docs/**/*.md"
+    assert GlobSet(["vendor/"]).match("vendor/lib/x.go") == "vendor/"
+    assert GlobSet(["# comment", ""]).match("anything") is None
+    assert glob_to_regex("file?.[!a]s", match_dirs=False) == r"(?:.*/)?file[^/]\.[^a]s"
+
+
+def test_gitattributes_later_lines_override():
+    attributes = GitAttributes.parse(
+        "*.pb.go linguist-generated\n"
+        "api/*.pb.go -linguist-generated\n"
+        "*.dat binary\n"
+    )
+
+    assert attributes.lookup("x/y.pb.go")["linguist-generated"] is True
+    assert attributes.lookup("api/y.pb.go")["linguist-generated"] is False
+    assert attributes.lookup("a.dat")["diff"] is False
+
+
+def test_classify_path_precedence():
+    triage = FileTriage()
+    attributes = GitAttributes.parse("dist/** -linguist-generated\n")
+    rules = TriageRules(include=("package-lock.json",), exclude=("docs/",))
+
+    assert triage.classify_path("package-lock.json", attributes, rules).category == Category.SOURCE
+    assert triage.classify_path("docs/readme.md", attributes, rules).category == Category.EXCLUDED
+    assert triage.classify_path("yarn.lock", attributes, rules).category == Category.LOCKFILE
+    assert triage.classify_path("logo.png", attributes, rules).category == Category.BINARY
+    assert triage.classify_path("src/app.py", attributes, rules) is None
+
+
+def test_sniff_content():
+    assert sniff("a.bin", b"abc\0def")[0] == Category.BINARY
+    assert sniff("a.go", b"// Code generated by protoc-gen-go. DO NOT EDIT.\npackage a\n")[0] == Category.GENERATED
+    assert sniff("a.min.js", b"var a=1;" * 400)[0] == Category.MINIFIED
+    assert sniff("a.py", b"# Do not edit this section by hand\nx = 1\n") is None
+    assert sniff("a.py", b"def main():\n    pass\n") is None
+
+
+def test_triage_report_and_cache():
+    generated = b"# @generated by tool\nx = 1\n"
+    source = b"def main():\n    pass\n"
+    blobs = {git_blob_sha(generated): generated, git_blob_sha(source): source}
+    service = AttributesPullRequestService("third_party/** linguist-vendored\n", blobs)
+    files = [
+        ("gen.py", git_blob_sha(generated)),
+        ("main.py", git_blob_sha(source)),
+        ("third_party/lib.py", None),
+        ("poetry.lock", None),
+    ]
+    triage = FileTriage()
+
+    report = asyncio.run(triage.triage(service, "octo", "repo", "c1", files))
+
+    assert {result.path: result.category for result in report.skipped} == {
+        "gen.py": Category.GENERATED,
+        "third_party/lib.py": Category.VENDORED,
+        "poetry.lock": Category.LOCKFILE,
+    }
+    assert report.reviewable("main.py")
+    assert report.reviewable("untriaged.py")
+
+    requests = service.blob_requests
+    again = asyncio.run(triage.triage(service, "octo", "repo", "c1", files))
+    assert service.blob_requests == requests
+    assert again.results.keys() == report.results.keys()
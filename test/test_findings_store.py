@@ -0,0 +1,59 @@
+from app.services.findings_service import FindingStore
+from app.services.github_pull_request_service import ReviewFinding
+
+
+def _findings(count, rule="rule"):
+    return [ReviewFinding(path=f"src/m{i}.py", line=i + 1, rule=rule, severity="warning", message=f"问题 {i}")
+            for i in range(count)]
+
+
+def test_keyset_pagination_walks_every_finding_once(repo_name):
+    store = FindingStore()
+    repo = f"owner/{repo_name}"
+    store.record_run(repo, 1, "a" * 40, _findings(5))
+
+    first = store.query(repo, limit=2)
+    second = store.query(repo, cursor=first.next_cursor, limit=2)
+    third = store.query(repo, cursor=second.next_cursor, limit=2)
+
+    ids = [item["id"] for page in (first, second, third) for item in page.items]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 5
+    assert first.next_cursor == first.items[-1]["id"]
+    assert third.next_cursor is None
+
+
+def test_exact_page_boundary_has_no_next_cursor(repo_name):
+    store = FindingStore()
+    repo = f"owner/{repo_name}"
+    store.record_run(repo, 1, "a" * 40, _findings(4))
+
+    first = store.query(repo, limit=2)
+    second = store.query(repo, cursor=first.next_cursor, limit=2)
+
+    assert len(second.items) == 2
+    # 多取一条判断是否还有下一页，最后一页恰好满页时不能返回指向空页的游标
+    assert second.next_cursor is None
+
+
+def test_repo_names_are_stored_and_queried_in_lowercase(repo_name):
+    store = FindingStore()
+    run_id = store.record_run(f"Owner/{repo_name.upper()}", 7, "b" * 40, _findings(2))
+
+    page = store.query(f"OWNER/{repo_name}")
+    runs = store.list_runs(f"owner/{repo_name}")
+
+    assert {item["repo"] for item in page.items} == {f"owner/{repo_name}"}
+    assert len(page.items) == 2
+    assert [run["id"] for run in runs.items] == [run_id]
+
+
+def test_complete_run_ignores_a_second_submission(repo_name):
+    store = FindingStore()
+    repo = f"owner/{repo_name}"
+    run_id = store.start_run(repo, 3, "c" * 40)
+
+    assert store.complete_run(run_id, _findings(3)) == 3
+    assert store.complete_run(run_id, _findings(5)) == 3
+
+    assert len(store.query(repo, run_id=run_id).items) == 3
+    assert store.list_runs(repo).items[0]["finding_count"] == 3
@@ -0,0 +1,31 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.github_app_auth import CachedToken, GitHubAppAuth
+
+
+def test_only_one_worker_wins_the_first_lease():
+    auth = GitHubAppAuth(app_id="1", private_key="test-key")
+    installation_id = 9001
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: auth._acquire_lease(installation_id), range(8)))
+
+    assert results.count(True) == 1
+    # 占位记录没有令牌，不能被当作共享令牌读取
+    assert auth._load_shared(installation_id) is None
+
+
+def test_concurrent_first_stores_do_not_conflict():
+    auth = GitHubAppAuth(app_id="1", private_key="test-key")
+    installation_id = 9002
+    expires_at = time.time() + 3600
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda n: auth._store_shared(installation_id, CachedToken(f"token-{n}", expires_at)), range(4)))
+
+    shared = auth._load_shared(installation_id)
+    assert shared is not None and shared.token.startswith("token-")
+    # 写入令牌同时释放了租约
+    assert auth._acquire_lease(installation_id)
+    assert not auth._acquire_lease(installation_id)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+
+import httpx
+
+from app.services.github_replay import replay_busy_day
+from app.services.github_transport import RecordingTransport, ReplayTransport
+
+
+def _github(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, json={"path": request.url.path, "token": "ghs_" + "a" * 36})
+
+
+async def _record(path: str, urls, flush_interval: float = 0.0) -> RecordingTransport:
+    transport = RecordingTransport(httpx.MockTransport(_github), path, flush_interval=flush_interval)
+    async with httpx.AsyncClient(transport=transport) as client:
+        for url in urls:
+            await client.get(url, headers={"Authorization": "Bearer secret"})
+    return transport
+
+
+def test_recording_appends_and_replays_without_secrets(tmp_path):
+    base = str(tmp_path / "cassette.jsonl.gz")
+    asyncio.run(_record(f"{base}.1", ["https://api.github.com/user"]))
+    # 重新创建客户端时追加，不覆盖已有的录制
+    asyncio.run(_record(f"{base}.1", ["https://api.github.com/user/repos"]))
+    asyncio.run(_record(f"{base}.2", ["https://api.github.com/user/orgs"]))
+
+    replay = ReplayTransport(base, latency_scale=0)
+
+    assert replay.recorded == 3
+    assert [item.url for item in replay.timeline][0] == "https://api.github.com/user"
+
+    async def fetch():
+        async with httpx.AsyncClient(transport=replay) as client:
+            return await client.get("https://api.github.com/user/repos")
+
+    response = asyncio.run(fetch())
+    assert response.json() == {"path": "/user/repos", "token": "REDACTED"}
+
+
+def test_replay_tolerates_truncated_tail(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    urls = [f"https://api.github.com/repos/o/r/pulls/{n}" for n in range(20)]
+
+    async def crash():
+        # 不关闭录制文件，模拟进程崩溃；每个请求都已刷新到磁盘
+        transport = RecordingTransport(httpx.MockTransport(_github), f"{path}.1", flush_interval=0)
+        for url in urls:
+            await transport.handle_async_request(httpx.Request("GET", url))
+
+    asyncio.run(crash())
+    size = os.path.getsize(f"{path}.1")
+    with open(f"{path}.1", "r+b") as file:
+        file.truncate(size // 2)
+
+    replay = ReplayTransport(path, latency_scale=0)
+
+    assert 0 < replay.recorded < len(urls)
+
+
+def test_busy_day_driver_replays_the_timeline(tmp_path):
+    base = str(tmp_path / "cassette.jsonl.gz")
+    urls = [f"https://api.github.com/repos/o/r/pulls/{n}" for n in range(5)]
+    asyncio.run(_record(f"{base}.1", urls + urls))
+
+    report = asyncio.run(replay_busy_day(base, speed=100, latency_scale=0))
+
+    assert report["requests"] == 10
+    assert report["errors"] == {}
+    assert report["replay"]["misses"] == 0
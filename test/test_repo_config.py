@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.services.github_pull_request_service import ReviewFinding
+from app.services.repo_config import RepoConfigError, RepoConfigLoader, parse_repo_config
+from app.services.review_pipeline import ReviewPipeline
+
+from .fakes import FakePullRequestService, python_file, rule_analyzers
+
+CONFIG = """
+review:
+  min_severity: warning
+rules:
+  disable: [line-length]
+  severity:
+    todo-comment: warning
+paths:
+  - match: "tests/**"
+    disable: [todo-comment]
+"""
+
+
+def _finding(rule, severity="info", path="app.py"):
+    return ReviewFinding(path=path, line=1, rule=rule, severity=severity, message=rule)
+
+
+def test_parse_rejects_unknown_fields_and_severities():
+    with pytest.raises(RepoConfigError):
+        parse_repo_config("review:\n  colour: red\n")
+    with pytest.raises(RepoConfigError):
+        parse_repo_config("rules:\n  severity:\n    foo: fatal\n")
+
+
+def test_apply_overrides_severity_and_filters():
+    config = parse_repo_config(CONFIG)
+
+    kept = config.apply([
+        _finding("line-length"),
+        _finding("todo-comment"),
+        _finding("todo-comment", path="tests/test_app.py"),
+        _finding("magic-number"),
+        _finding("security", severity="critical"),
+    ])
+
+    assert [(finding.rule, finding.severity, finding.path) for finding in kept] == [
+        ("todo-comment", "warning", "app.py"),
+        ("security", "critical", "app.py"),
+    ]
+
+
+def test_loader_falls_back_when_blob_fetch_fails():
+    service = FakePullRequestService([], config=CONFIG)
+    service.fail_blobs = True
+    loader = RepoConfigLoader()
+
+    config = asyncio.run(loader.get(service, "octo", "cfg", "base1"))
+    assert config.blob_sha is None and config.disabled_rules == frozenset()
+
+    # 失败结果不缓存，下次重新获取
+    service.fail_blobs = False
+    config = asyncio.run(loader.get(service, "octo", "cfg", "base1"))
+    assert config.disabled_rules == {"line-length"}
+
+
+def test_pipeline_applies_repo_config(repo_name):
+    file, blobs = python_file("app.py", ["# TODO: remove", "x = '" + "y" * 130 + "'"])
+    service = FakePullRequestService([file], blobs, config=CONFIG)
+
+    summary = asyncio.run(ReviewPipeline(service, rule_analyzers()).run("octo", repo_name, 1))
+
+    assert summary["findings"] == 1
+    assert [comment["body"].split("**")[1] for comment in service.reviews[0]["comments"]] == ["[warning] todo-comment"]
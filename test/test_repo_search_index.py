@@ -0,0 +1,25 @@
+from app.services.repo_search_index import RepoSearchIndex
+
+
+def _repo(repo_id, full_name, language="Python", updated_at="2024-01-01"):
+    return {"id": repo_id, "full_name": full_name, "description": f"{full_name} tools",
+            "language": language, "visibility": "public", "updated_at": updated_at}
+
+
+def test_build_and_incremental_update_keep_prefixes_sorted():
+    repos = [_repo(i, f"org/service-{i:03d}") for i in range(200, 0, -1)]
+    built = RepoSearchIndex()
+    built.update(repos)
+
+    incremental = RepoSearchIndex()
+    incremental.update(repos[:1])
+    incremental.update(repos)
+
+    assert built.prefixes == sorted(built.prefixes)
+    assert built.prefixes == incremental.prefixes
+    assert built.search("service-01")["total"] == 10
+
+    result = built.update(repos[:-1] + [_repo(1, "org/renamed", updated_at="2024-02-01")])
+    assert result == {"added": 0, "updated": 1, "removed": 0}
+    assert built.prefixes == sorted(built.prefixes)
+    assert [item["id"] for item in built.search("renamed")["results"]] == [1]
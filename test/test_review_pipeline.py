@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.container import RequestAuth
+from app.main import run
+from app.routers import reviews
+from app.services.findings_service import finding_store
+from app.services.github_repos_service import GitHubApiError, RateLimitExceededError, RepoNotFoundError
+from app.services import review_pipeline
+from app.services.review_pipeline import ReviewPipeline, submit_review
+from app.services.review_scheduler import ReviewScheduler
+from .fakes import FakePullRequestService, python_file, rule_analyzers
+
+LINES = ["import os", "# TODO: remove", "x = '" + "y" * 130 + "'"]
+
+
+def test_pipeline_records_publishes_and_marks_reviewed(repo_name):
+    file, blobs = python_file("app.py", LINES)
+    service = FakePullRequestService([file], blobs)
+    pipeline = ReviewPipeline(service, rule_analyzers())
+
+    summary = asyncio.run(pipeline.run("octo", repo_name, 1))
+
+    assert summary["status"] == "completed"
+    assert summary["findings"] == 2
+    assert sorted(comment["line"] for comment in service.reviews[0]["comments"]) == [2, 3]
+    rules = {item["rule"] for item in finding_store.query(f"octo/{repo_name}").items}
+    assert rules == {"todo-comment", "line-length"}
+
+    # head 没有变化时不再重复评审
+    assert asyncio.run(pipeline.run("octo", repo_name, 1))["status"] == "skipped"
+
+
+def test_submitted_review_runs_on_the_scheduler(repo_name):
+    file, blobs = python_file("app.py", LINES)
+    service = FakePullRequestService([file], blobs)
+    scheduler = ReviewScheduler(workers=1)
+
+    async def main():
+        workers = [asyncio.create_task(scheduler._worker(0))]
+        try:
+            # 首次评审即使请求 interactive 也按 PR 大小分配通道
+            first, _ = await submit_review(
+                service, "octo", repo_name, 7, interactive=True, scheduler=scheduler, analyzers=rule_analyzers()
+            )
+            summary = await asyncio.wait_for(first.future, 5)
+            again, _ = await submit_review(service, "octo", repo_name, 7, interactive=True, scheduler=scheduler)
+            await asyncio.wait_for(again.future, 5)
+            return first, again, summary
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    first, again, summary = asyncio.run(main())
+
+    assert first.lane == "small"
+    assert again.lane == "interactive"
+    assert summary["findings"] == 2
+    assert scheduler.completed == 2
+
+
+def test_scheduler_metrics_require_admin(monkeypatch):
+    client = TestClient(run)
+
+    assert client.get("/api/reviews/scheduler/metrics").status_code == 403
+
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-secret")
+    response = client.get("/api/reviews/scheduler/metrics", headers={"X-Admin-Token": "admin-secret"})
+    assert response.status_code == 200
+    assert "queue_depth" in response.json()
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"]) if fields["data"] != "null" else None))
+    return events
+
+
+def test_review_progress_streams_end_to_end(monkeypatch, repo_name):
+    file, blobs = python_file("app.py", LINES)
+    service = FakePullRequestService([file], blobs)
+    monkeypatch.setattr(reviews, "create_pull_request_service", lambda token: service)
+    monkeypatch.setattr(review_pipeline, "ReviewPipeline", lambda pr_service, analyzers: ReviewPipeline(pr_service, rule_analyzers()))
+    run.dependency_overrides[reviews.get_request_auth] = lambda: RequestAuth(
+        session_id="test", user={"id": 42}, access_token="token"
+    )
+    try:
+        # 进入上下文时执行生命周期钩子，评审调度器的工作协程随之启动
+        with TestClient(run) as client:
+            response = client.post("/api/reviews", json={"repo": f"octo/{repo_name}", "number": 3})
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+
+            with client.stream("GET", f"/api/reviews/{job_id}/events") as stream:
+                events = _parse_sse(stream.read().decode())
+
+            run.dependency_overrides[reviews.get_request_auth] = lambda: RequestAuth(
+                session_id="other", user={"id": 7}, access_token="token"
+            )
+            assert client.get(f"/api/reviews/{job_id}/events").status_code == 404
+    finally:
+        run.dependency_overrides.clear()
+
+    types = [event_type for event_type, _ in events]
+    assert types[0] == "progress" and types[-2:] == ["summary", "end"]
+    files = [data for event_type, data in events if event_type == "file"]
+    assert files[0]["path"] == "app.py" and len(files[0]["findings"]) == 2
+    assert events[-2][1]["status"] == "completed"
+    assert len(service.reviews) == 1
+
+
+@pytest.mark.parametrize("error, status", [
+    (RepoNotFoundError("不存在"), 404),
+    (RateLimitExceededError("1700000000"), 429),
+    (GitHubApiError("网络错误"), 502),
+])
+def test_review_request_maps_github_errors(monkeypatch, error, status):
+    class FailingService(FakePullRequestService):
+        async def get_pull_request(self, owner, repo, number):
+            raise error
+
+    monkeypatch.setattr(reviews, "create_pull_request_service", lambda token: FailingService([]))
+    run.dependency_overrides[reviews.get_request_auth] = lambda: RequestAuth(
+        session_id="test", user={"id": 42}, access_token="token"
+    )
+    try:
+        response = TestClient(run).post("/api/reviews", json={"repo": "octo/missing", "number": 1})
+    finally:
+        run.dependency_overrides.clear()
+
+    assert response.status_code == status
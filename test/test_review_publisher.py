@@ -0,0 +1,40 @@
+import asyncio
+
+from app.services.github_pull_request_service import (
+    MAX_REVIEW_BODY_CHARS, ReviewFinding, ReviewPublisher, extract_fingerprints
+)
+
+from .fakes import FakePullRequestService
+
+
+def _findings(count, message_size=100):
+    return [
+        ReviewFinding(path=f"src/m{i}.py", line=1, rule="rule", severity="warning", message=f"{i} " + "x" * message_size)
+        for i in range(count)
+    ]
+
+
+def test_unanchored_findings_spill_into_continuation_reviews():
+    service = FakePullRequestService([])
+    publisher = ReviewPublisher(service, max_payload_chars=2000)
+    findings = _findings(60)
+
+    result = asyncio.run(publisher.publish("o", "r", 1, "head1", findings, summary="总结",
+                                           existing_comments=[], commentable_lines={}))
+
+    bodies = [review["body"] for review in service.reviews]
+    assert len(bodies) > 1 and all(len(body) <= 2000 for body in bodies)
+    assert bodies[0].startswith("总结") and bodies[1].startswith(f"（续 2/{len(bodies)}）")
+    assert set().union(*map(extract_fingerprints, bodies)) == {finding.fingerprint for finding in findings}
+    assert result.unanchored == 60 and result.published == 0
+
+
+def test_body_is_capped_at_github_limit():
+    service = FakePullRequestService([])
+    publisher = ReviewPublisher(service, max_payload_chars=10 ** 6)
+
+    asyncio.run(publisher.publish("o", "r", 1, "head1", _findings(400, 500), summary="s" * 100000,
+                                  existing_comments=[], commentable_lines={}))
+
+    assert all(len(review["body"]) <= MAX_REVIEW_BODY_CHARS for review in service.reviews)
+    assert all(review["comments"] == [] for review in service.reviews)
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from app.core.session import SessionManager
+from app.core.session_cookie import ClaimsCodec
+
+KEY = "k" * 32
+OLD_KEY = "o" * 32
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可控的时钟，Fernet 的 TTL 校验同样读取 time.time"""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def test_claims_round_trip_and_expire(clock):
+    codec = ClaimsCodec([KEY], lifetime=100)
+    value = codec.encode({"login": "octocat"})
+
+    claims, refresh = codec.decode(value)
+    assert claims["login"] == "octocat" and claims["exp"] == clock[0] + 100
+    assert refresh is False
+
+    clock[0] += 101
+    assert codec.decode(value) == (None, False)
+    assert codec.decode("not-a-token") == (None, False)
+
+
+def test_refresh_is_flagged_after_half_life(clock):
+    codec = ClaimsCodec([KEY], lifetime=100)
+    value = codec.encode({"login": "octocat"})
+
+    clock[0] += 49
+    assert codec.decode(value)[1] is False
+    clock[0] += 2
+    claims, refresh = codec.decode(value)
+    assert claims is not None and refresh is True
+
+
+def test_previous_keys_still_decode_and_request_reissue(clock):
+    old_value = ClaimsCodec([OLD_KEY], lifetime=100).encode({"login": "octocat"})
+
+    rotated = ClaimsCodec([KEY, OLD_KEY], lifetime=100)
+    claims, refresh = rotated.decode(old_value)
+    assert claims["login"] == "octocat" and refresh is True
+    assert rotated.decode(rotated.encode({"login": "octocat"}))[1] is False
+
+    # 旧密钥移出列表后，旧 Cookie 不再有效
+    assert ClaimsCodec([KEY], lifetime=100).decode(old_value) == (None, False)
+
+
+def test_session_manager_reads_previous_keys_from_config(monkeypatch, clock):
+    monkeypatch.setenv("SESSION_MODE", "cookie")
+    monkeypatch.setenv("SESSION_SECRET_KEY", KEY)
+    monkeypatch.setenv("SESSION_PREVIOUS_KEYS", f"{OLD_KEY}, ")
+    old_value = ClaimsCodec([OLD_KEY], lifetime=3600).encode({"login": "octocat"})
+
+    claims, refresh = SessionManager().claims_codec.decode(old_value)
+    assert claims["login"] == "octocat" and refresh is True
+
+
+@pytest.mark.parametrize("secret", [None, "short"])
+def test_cookie_mode_requires_a_long_secret(monkeypatch, secret):
+    monkeypatch.setenv("SESSION_MODE", "cookie")
+    if secret is None:
+        monkeypatch.delenv("SESSION_SECRET_KEY", raising=False)
+    else:
+        monkeypatch.setenv("SESSION_SECRET_KEY", secret)
+
+    with pytest.raises(RuntimeError):
+        SessionManager()
+
+
+def test_cookie_mode_rejects_short_previous_keys(monkeypatch):
+    monkeypatch.setenv("SESSION_MODE", "cookie")
+    monkeypatch.setenv("SESSION_SECRET_KEY", KEY)
+    monkeypatch.setenv("SESSION_PREVIOUS_KEYS", "short")
+
+    with pytest.raises(RuntimeError):
+        SessionManager()
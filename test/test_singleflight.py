@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_with_the_same_key_run_once():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        results = await asyncio.gather(*(flights.do("key", fetch) for _ in range(5)), flights.do("other", fetch))
+        # 调用结束后键被移除，之后的调用重新执行
+        return results, flights.in_flight("key"), await flights.do("key", fetch)
+
+    results, in_flight, later = asyncio.run(main())
+
+    assert results[:5] == [results[0]] * 5 and len(calls) == 3
+    assert in_flight is False and later == 3
+
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("失败")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelling_a_waiter_does_not_cancel_the_shared_call():
+    flights = SingleFlight()
+    finished = []
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+        return "ok"
+
+    async def main():
+        # 发起调用的第一个等待者被取消，其余等待者仍拿到结果
+        first = asyncio.create_task(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flights.do("key", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "ok"
+    assert finished == [1]